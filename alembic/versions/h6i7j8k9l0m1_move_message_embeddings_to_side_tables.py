@@ -0,0 +1,113 @@
+"""move_message_embeddings_to_side_tables
+
+Revision ID: h6i7j8k9l0m1
+Revises: d4e5f6a7b8c9, g5h6i7j8k9l0
+Create Date: 2026-10-18 12:00:00.000000
+
+Online migration plan:
+1. This revision creates message_embeddings / message_18_embeddings, copies
+   existing vectors across in id-range batches and builds the cosine index.
+   INSERT ... SELECT only takes ACCESS SHARE on the source tables, so chat
+   reads and writes keep flowing while it runs.
+2. After every instance runs the new code (which only writes the side tables),
+   re-run the backfill statement below to pick up rows written by old
+   instances during the rollout. It is idempotent (ON CONFLICT DO NOTHING).
+3. A follow-up revision drops messages.embedding / messages_18.embedding once
+   the side tables are verified. Dropping a column is metadata-only in
+   Postgres; VACUUM FULL or pg_repack reclaims the space afterwards.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'h6i7j8k9l0m1'
+down_revision: Union[str, Sequence[str], None] = ('d4e5f6a7b8c9', 'g5h6i7j8k9l0')
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 50_000
+
+BACKFILL_SQL = """
+    INSERT INTO {target} (message_id, chat_id, embedding, created_at)
+    SELECT id, chat_id, embedding, NOW()
+    FROM {source}
+    WHERE id >= :lo AND id < :hi
+      AND embedding IS NOT NULL
+    ON CONFLICT (message_id) DO NOTHING
+"""
+
+
+def _create_side_table(name: str, source: str) -> None:
+    op.create_table(
+        name,
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.String(), nullable=False),
+        sa.Column('embedding', Vector(1536), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['message_id'], [f'{source}.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('message_id'),
+    )
+    op.create_index(op.f(f'ix_{name}_chat_id'), name, ['chat_id'], unique=False)
+
+
+def _backfill(target: str, source: str) -> None:
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text(f"SELECT COALESCE(MAX(id), 0) FROM {source}")).scalar()
+    stmt = sa.text(BACKFILL_SQL.format(target=target, source=source))
+    for lo in range(0, int(max_id) + 1, BACKFILL_BATCH):
+        bind.execute(stmt, {"lo": lo, "hi": lo + BACKFILL_BATCH})
+
+
+def upgrade() -> None:
+    """Create embedding side tables and copy existing vectors into them."""
+    _create_side_table('message_embeddings', 'messages')
+    _create_side_table('message_18_embeddings', 'messages_18')
+
+    _backfill('message_embeddings', 'messages')
+    _backfill('message_18_embeddings', 'messages_18')
+
+    # Build the IVFFlat index after the copy so the lists are trained on real data
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS message_embeddings_embedding_cosine_idx
+        ON message_embeddings
+        USING ivfflat (embedding vector_cosine_ops)
+        WITH (lists = 100)
+    """)
+
+    # Nothing reads messages.embedding any more; stop paying for its index on writes
+    op.execute("DROP INDEX IF EXISTS messages_embedding_cosine_idx")
+
+
+def downgrade() -> None:
+    """Copy vectors back onto the message rows and drop the side tables."""
+    op.execute("""
+        UPDATE messages m
+        SET embedding = e.embedding
+        FROM message_embeddings e
+        WHERE e.message_id = m.id
+          AND m.embedding IS NULL
+    """)
+    op.execute("""
+        UPDATE messages_18 m
+        SET embedding = e.embedding
+        FROM message_18_embeddings e
+        WHERE e.message_id = m.id
+          AND m.embedding IS NULL
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS messages_embedding_cosine_idx
+        ON messages
+        USING ivfflat (embedding vector_cosine_ops)
+        WITH (lists = 100)
+    """)
+
+    op.execute("DROP INDEX IF EXISTS message_embeddings_embedding_cosine_idx")
+    op.drop_index(op.f('ix_message_18_embeddings_chat_id'), table_name='message_18_embeddings')
+    op.drop_table('message_18_embeddings')
+    op.drop_index(op.f('ix_message_embeddings_chat_id'), table_name='message_embeddings')
+    op.drop_table('message_embeddings')
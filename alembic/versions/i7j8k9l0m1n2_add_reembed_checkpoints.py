@@ -0,0 +1,38 @@
+"""add_reembed_checkpoints
+
+Revision ID: i7j8k9l0m1n2
+Revises: h6i7j8k9l0m1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'i7j8k9l0m1n2'
+down_revision: Union[str, Sequence[str], None] = 'h6i7j8k9l0m1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add checkpoint table for resumable re-embedding runs."""
+    op.create_table(
+        'reembed_checkpoints',
+        sa.Column('job', sa.String(), nullable=False),
+        sa.Column('target', sa.String(), nullable=False),
+        sa.Column('last_id', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('processed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('job'),
+    )
+
+
+def downgrade() -> None:
+    """Drop re-embedding checkpoint table."""
+    op.drop_table('reembed_checkpoints')
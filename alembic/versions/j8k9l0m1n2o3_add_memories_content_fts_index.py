@@ -0,0 +1,33 @@
+"""add_memories_content_fts_index
+
+Revision ID: j8k9l0m1n2o3
+Revises: i7j8k9l0m1n2
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'j8k9l0m1n2o3'
+down_revision: Union[str, Sequence[str], None] = 'i7j8k9l0m1n2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add full-text index used by the lexical memory retrieval path."""
+    # Expression must match app/agents/retrieval_gate.py exactly for the planner to use it
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS memories_content_fts_idx
+        ON memories
+        USING gin (to_tsvector('simple', coalesce(content, '')))
+    """)
+
+
+def downgrade() -> None:
+    """Remove full-text index on memories.content."""
+    op.execute("DROP INDEX IF EXISTS memories_content_fts_idx")
@@ -0,0 +1,31 @@
+"""add_relationship_decayed_idle_days
+
+Revision ID: k9l0m1n2o3p4
+Revises: j8k9l0m1n2o3
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'k9l0m1n2o3p4'
+down_revision: Union[str, Sequence[str], None] = 'j8k9l0m1n2o3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Track how much of the current absence the nightly decay job has applied."""
+    op.add_column(
+        'relationship_state',
+        sa.Column('decayed_idle_days', sa.Float(), nullable=False, server_default='0'),
+    )
+
+
+def downgrade() -> None:
+    """Remove decayed_idle_days from relationship_state."""
+    op.drop_column('relationship_state', 'decayed_idle_days')
@@ -0,0 +1,43 @@
+"""add_influencer_relationship_stats
+
+Revision ID: l0m1n2o3p4q5
+Revises: k9l0m1n2o3p4
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'l0m1n2o3p4q5'
+down_revision: Union[str, Sequence[str], None] = 'k9l0m1n2o3p4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add per-influencer relationship counter snapshots and girlfriend_confirmed_at."""
+    op.add_column(
+        'relationship_state',
+        sa.Column('girlfriend_confirmed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_table(
+        'influencer_relationship_stats',
+        sa.Column('influencer_id', sa.String(), sa.ForeignKey('influencers.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('fans', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('stage_counts', sa.JSON(), nullable=False, server_default='{}'),
+        sa.Column('sentiment_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('girlfriends_week', sa.String(), nullable=True),
+        sa.Column('new_girlfriends', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('snapshot_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('reconciled_at', sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Drop influencer_relationship_stats and girlfriend_confirmed_at."""
+    op.drop_table('influencer_relationship_stats')
+    op.drop_column('relationship_state', 'girlfriend_confirmed_at')
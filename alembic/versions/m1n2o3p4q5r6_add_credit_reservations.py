@@ -0,0 +1,50 @@
+"""add_credit_reservations
+
+Revision ID: m1n2o3p4q5r6
+Revises: l0m1n2o3p4q5
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'm1n2o3p4q5r6'
+down_revision: Union[str, Sequence[str], None] = 'l0m1n2o3p4q5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add credit_reservations for per-session credit holds."""
+    op.create_table(
+        'credit_reservations',
+        sa.Column('id', sa.String(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('influencer_id', sa.String(), sa.ForeignKey('influencers.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('is_18', sa.Boolean(), nullable=False, server_default='false'),
+        sa.Column('feature', sa.String(), nullable=False),
+        sa.Column('usage_date', sa.DateTime(), nullable=False),
+        sa.Column('units_reserved', sa.Integer(), nullable=False),
+        sa.Column('free_units', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('unit_price_cents', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('held_cents', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(), nullable=False, server_default='open'),
+        sa.Column('units_used', sa.Integer(), nullable=True),
+        sa.Column('charged_cents', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('settled_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_credit_reservations_user_id', 'credit_reservations', ['user_id'])
+    op.create_index('ix_credit_reservations_status_expires', 'credit_reservations', ['status', 'expires_at'])
+
+
+def downgrade() -> None:
+    """Drop credit_reservations."""
+    op.drop_index('ix_credit_reservations_status_expires', table_name='credit_reservations')
+    op.drop_index('ix_credit_reservations_user_id', table_name='credit_reservations')
+    op.drop_table('credit_reservations')
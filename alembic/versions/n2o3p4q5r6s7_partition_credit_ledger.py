@@ -0,0 +1,176 @@
+"""partition_credit_ledger
+
+Revision ID: n2o3p4q5r6s7
+Revises: m1n2o3p4q5r6
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'n2o3p4q5r6s7'
+down_revision: Union[str, Sequence[str], None] = 'm1n2o3p4q5r6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+_CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    m date;
+BEGIN
+    FOR m IN
+        SELECT generate_series(
+            date_trunc('month', coalesce(
+                (SELECT min(created_at) FROM influencer_credit_transactions_legacy), now()
+            ) AT TIME ZONE 'UTC')::date,
+            (date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months')::date,
+            interval '1 month'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF influencer_credit_transactions FOR VALUES FROM (%L) TO (%L)',
+            'influencer_credit_transactions_' || to_char(m, 'YYYY_MM'),
+            m::timestamp AT TIME ZONE 'UTC',
+            (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+        );
+    END LOOP;
+END $$;
+"""
+
+_ROLLUP_FUNCTION = """
+CREATE OR REPLACE FUNCTION credit_ledger_daily_apply() RETURNS trigger AS $$
+DECLARE
+    r record;
+    sign integer;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        r := NEW;
+        sign := 1;
+    ELSE
+        r := OLD;
+        sign := -1;
+    END IF;
+
+    INSERT INTO credit_ledger_daily AS d
+        (user_id, influencer_id, day, feature, tx_count, units, debit_cents, credit_cents)
+    VALUES (
+        r.user_id, r.influencer_id, (r.created_at AT TIME ZONE 'UTC')::date, r.feature,
+        sign, sign * r.units, sign * greatest(-r.amount_cents, 0), sign * greatest(r.amount_cents, 0)
+    )
+    ON CONFLICT (user_id, influencer_id, day, feature) DO UPDATE SET
+        tx_count = d.tx_count + EXCLUDED.tx_count,
+        units = d.units + EXCLUDED.units,
+        debit_cents = d.debit_cents + EXCLUDED.debit_cents,
+        credit_cents = d.credit_cents + EXCLUDED.credit_cents;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+"""
+
+
+def upgrade() -> None:
+    """Range-partition the credit ledger by month and add daily rollups."""
+    op.execute("ALTER TABLE influencer_credit_transactions RENAME TO influencer_credit_transactions_legacy")
+    op.execute("ALTER TABLE influencer_credit_transactions_legacy RENAME CONSTRAINT influencer_credit_transactions_pkey TO influencer_credit_transactions_legacy_pkey")
+    op.drop_index('ix_infl_tx_user_infl_ts', table_name='influencer_credit_transactions_legacy')
+    op.drop_index('ix_influencer_credit_transactions_influencer_id', table_name='influencer_credit_transactions_legacy')
+    op.drop_index('ix_influencer_credit_transactions_user_id', table_name='influencer_credit_transactions_legacy')
+
+    # The partition key has to be part of the primary key
+    op.execute("""
+        CREATE TABLE influencer_credit_transactions (
+            id integer NOT NULL DEFAULT nextval('influencer_credit_transactions_id_seq'::regclass),
+            user_id integer NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            influencer_id varchar NOT NULL REFERENCES influencers(id) ON DELETE CASCADE,
+            feature varchar NOT NULL,
+            units integer NOT NULL,
+            amount_cents integer NOT NULL,
+            meta json,
+            created_at timestamptz NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE influencer_credit_transactions_id_seq OWNED BY influencer_credit_transactions.id")
+    # Safety net only; partitions are created months ahead by the ledger job
+    op.execute("CREATE TABLE influencer_credit_transactions_default PARTITION OF influencer_credit_transactions DEFAULT")
+    op.execute(_CREATE_MONTHLY_PARTITIONS)
+
+    op.create_index('ix_infl_tx_user_infl_ts', 'influencer_credit_transactions', ['user_id', 'influencer_id', 'created_at'], unique=False)
+    op.create_index('ix_influencer_credit_transactions_influencer_id', 'influencer_credit_transactions', ['influencer_id'], unique=False)
+    op.create_index('ix_influencer_credit_transactions_user_id', 'influencer_credit_transactions', ['user_id'], unique=False)
+
+    op.execute("""
+        INSERT INTO influencer_credit_transactions
+            (id, user_id, influencer_id, feature, units, amount_cents, meta, created_at)
+        SELECT id, user_id, influencer_id, coalesce(feature, ''), coalesce(units, 0),
+               coalesce(amount_cents, 0), meta, created_at
+        FROM influencer_credit_transactions_legacy
+    """)
+    op.drop_table('influencer_credit_transactions_legacy')
+
+    op.create_table(
+        'credit_ledger_daily',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('influencer_id', sa.String(), sa.ForeignKey('influencers.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('feature', sa.String(), primary_key=True),
+        sa.Column('tx_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('units', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('debit_cents', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('credit_cents', sa.BigInteger(), nullable=False, server_default='0'),
+    )
+    op.create_index('ix_credit_ledger_daily_influencer_day', 'credit_ledger_daily', ['influencer_id', 'day'])
+
+    op.execute("""
+        INSERT INTO credit_ledger_daily
+            (user_id, influencer_id, day, feature, tx_count, units, debit_cents, credit_cents)
+        SELECT user_id, influencer_id, (created_at AT TIME ZONE 'UTC')::date, feature,
+               count(*), sum(units), sum(greatest(-amount_cents, 0)), sum(greatest(amount_cents, 0))
+        FROM influencer_credit_transactions
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute(_ROLLUP_FUNCTION)
+    op.execute("""
+        CREATE TRIGGER trg_credit_ledger_daily
+        AFTER INSERT OR DELETE ON influencer_credit_transactions
+        FOR EACH ROW EXECUTE FUNCTION credit_ledger_daily_apply()
+    """)
+
+
+def downgrade() -> None:
+    """Fold the partitions back into a plain table and drop the rollups."""
+    op.execute("DROP TRIGGER IF EXISTS trg_credit_ledger_daily ON influencer_credit_transactions")
+    op.execute("DROP FUNCTION IF EXISTS credit_ledger_daily_apply()")
+    op.drop_index('ix_credit_ledger_daily_influencer_day', table_name='credit_ledger_daily')
+    op.drop_table('credit_ledger_daily')
+
+    op.execute("ALTER TABLE influencer_credit_transactions RENAME TO influencer_credit_transactions_partitioned")
+    op.execute("ALTER SEQUENCE influencer_credit_transactions_id_seq OWNED BY NONE")
+    op.create_table(
+        'influencer_credit_transactions',
+        sa.Column('id', sa.Integer(), server_default=sa.text("nextval('influencer_credit_transactions_id_seq'::regclass)"), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('influencer_id', sa.String(), nullable=False),
+        sa.Column('feature', sa.String(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('amount_cents', sa.Integer(), nullable=False),
+        sa.Column('meta', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['influencer_id'], ['influencers.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO influencer_credit_transactions
+        SELECT id, user_id, influencer_id, feature, units, amount_cents, meta, created_at
+        FROM influencer_credit_transactions_partitioned
+    """)
+    op.execute("ALTER SEQUENCE influencer_credit_transactions_id_seq OWNED BY influencer_credit_transactions.id")
+    op.execute("DROP TABLE influencer_credit_transactions_partitioned")
+    op.create_index('ix_infl_tx_user_infl_ts', 'influencer_credit_transactions', ['user_id', 'influencer_id', 'created_at'], unique=False)
+    op.create_index('ix_influencer_credit_transactions_influencer_id', 'influencer_credit_transactions', ['influencer_id'], unique=False)
+    op.create_index('ix_influencer_credit_transactions_user_id', 'influencer_credit_transactions', ['user_id'], unique=False)
@@ -0,0 +1,64 @@
+"""add_wallet_reconciliation
+
+Revision ID: o3p4q5r6s7t8
+Revises: n2o3p4q5r6s7
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'o3p4q5r6s7t8'
+down_revision: Union[str, Sequence[str], None] = 'n2o3p4q5r6s7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add wallet/ledger reconciliation checkpoints, audit log and cursor."""
+    op.create_table(
+        'wallet_reconcile_checkpoints',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('influencer_id', sa.String(), sa.ForeignKey('influencers.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('last_tx_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('ledger_sum_cents', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('opening_cents', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('drift_cents', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('checked_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        'wallet_reconcile_audit',
+        sa.Column('id', sa.Integer(), autoincrement=True, primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('influencer_id', sa.String(), sa.ForeignKey('influencers.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('balance_cents', sa.BigInteger(), nullable=False),
+        sa.Column('held_cents', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('expected_cents', sa.BigInteger(), nullable=False),
+        sa.Column('drift_cents', sa.BigInteger(), nullable=False),
+        sa.Column('previous_drift_cents', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('last_tx_id', sa.Integer(), nullable=False),
+        sa.Column('detected_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_wallet_reconcile_audit_user_id', 'wallet_reconcile_audit', ['user_id'])
+    op.create_index('ix_wallet_reconcile_audit_detected_at', 'wallet_reconcile_audit', ['detected_at'])
+    op.create_table(
+        'wallet_reconcile_cursor',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('ledger_tx_id', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('wallets_scanned_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_infl_wallet_updated_at', 'influencer_wallets', ['updated_at'])
+
+
+def downgrade() -> None:
+    """Drop the reconciliation tables."""
+    op.drop_index('ix_infl_wallet_updated_at', table_name='influencer_wallets')
+    op.drop_table('wallet_reconcile_cursor')
+    op.drop_index('ix_wallet_reconcile_audit_detected_at', table_name='wallet_reconcile_audit')
+    op.drop_index('ix_wallet_reconcile_audit_user_id', table_name='wallet_reconcile_audit')
+    op.drop_table('wallet_reconcile_audit')
+    op.drop_table('wallet_reconcile_checkpoints')
@@ -0,0 +1,46 @@
+"""add_memory_consolidation_audit
+
+Revision ID: p4q5r6s7t8u9
+Revises: o3p4q5r6s7t8
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'p4q5r6s7t8u9'
+down_revision: Union[str, Sequence[str], None] = 'o3p4q5r6s7t8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Keep a full copy of every memory the consolidation job removes."""
+    op.create_table(
+        'memory_consolidation_audit',
+        sa.Column('id', sa.Integer(), autoincrement=True, primary_key=True),
+        sa.Column('run_id', sa.String(), nullable=False),
+        sa.Column('memory_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=True),
+        sa.Column('embedding', Vector(1536), nullable=True),
+        sa.Column('sender', sa.String(), nullable=True),
+        sa.Column('memory_created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('reason', sa.String(), nullable=False),
+        sa.Column('merged_into', sa.Integer(), nullable=True),
+        sa.Column('removed_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index('ix_memory_consolidation_audit_run_id', 'memory_consolidation_audit', ['run_id'])
+    op.create_index('ix_memory_consolidation_audit_chat_id', 'memory_consolidation_audit', ['chat_id'])
+
+
+def downgrade() -> None:
+    """Drop the consolidation audit table."""
+    op.drop_index('ix_memory_consolidation_audit_chat_id', table_name='memory_consolidation_audit')
+    op.drop_index('ix_memory_consolidation_audit_run_id', table_name='memory_consolidation_audit')
+    op.drop_table('memory_consolidation_audit')
@@ -0,0 +1,38 @@
+"""add_reconcile_checkpoint_created_at
+
+Revision ID: q5r6s7t8u9v0
+Revises: p4q5r6s7t8u9
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'q5r6s7t8u9v0'
+down_revision: Union[str, Sequence[str], None] = 'p4q5r6s7t8u9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Remember the ledger created_at a checkpoint reached, to bound the partitions read."""
+    op.add_column(
+        'wallet_reconcile_checkpoints',
+        sa.Column('last_created_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    # Existing checkpoints would otherwise scan every partition until new rows settle
+    op.execute("""
+        UPDATE wallet_reconcile_checkpoints c
+        SET last_created_at = t.created_at
+        FROM influencer_credit_transactions t
+        WHERE t.id = c.last_tx_id AND c.last_tx_id > 0
+    """)
+
+
+def downgrade() -> None:
+    """Drop the checkpoint created_at."""
+    op.drop_column('wallet_reconcile_checkpoints', 'last_created_at')
@@ -0,0 +1,67 @@
+"""add_wallet_held_cents
+
+Revision ID: r6s7t8u9v0w1
+Revises: q5r6s7t8u9v0
+Create Date: 2026-10-18 23:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'r6s7t8u9v0w1'
+down_revision: Union[str, Sequence[str], None] = 'q5r6s7t8u9v0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Keep reservation holds in held_cents instead of debiting them up front."""
+    op.add_column(
+        'influencer_wallets',
+        sa.Column('held_cents', sa.Integer(), nullable=False, server_default='0'),
+    )
+    # Open reservations debited their hold from the balance; move it across
+    op.execute("""
+        UPDATE influencer_wallets w
+        SET balance_cents = w.balance_cents + h.held, held_cents = h.held
+        FROM (
+            SELECT user_id, influencer_id, is_18, sum(held_cents) AS held
+            FROM credit_reservations
+            WHERE status = 'open'
+            GROUP BY 1, 2, 3
+        ) h
+        WHERE w.user_id = h.user_id AND w.influencer_id = h.influencer_id AND w.is_18 = h.is_18
+    """)
+    # ...and pre-claimed all their units on daily_usage; settlement now adds the used ones
+    op.execute("""
+        UPDATE daily_usage d
+        SET text_count = d.text_count - u.units
+        FROM (
+            SELECT user_id, usage_date, is_18, sum(units_reserved) AS units
+            FROM credit_reservations
+            WHERE status = 'open' AND strpos(feature, 'text') > 0
+            GROUP BY 1, 2, 3
+        ) u
+        WHERE d.user_id = u.user_id AND d.date = u.usage_date AND d.is_18 = u.is_18
+    """)
+
+
+def downgrade() -> None:
+    """Debit open holds from the balance again and drop held_cents."""
+    op.execute("""
+        UPDATE daily_usage d
+        SET text_count = d.text_count + u.units
+        FROM (
+            SELECT user_id, usage_date, is_18, sum(units_reserved) AS units
+            FROM credit_reservations
+            WHERE status = 'open' AND strpos(feature, 'text') > 0
+            GROUP BY 1, 2, 3
+        ) u
+        WHERE d.user_id = u.user_id AND d.date = u.usage_date AND d.is_18 = u.is_18
+    """)
+    op.execute("UPDATE influencer_wallets SET balance_cents = balance_cents - held_cents WHERE held_cents <> 0")
+    op.drop_column('influencer_wallets', 'held_cents')
@@ -159,8 +159,10 @@ async def store_facts_batch(
     
     # 4. Store all facts
     stored = 0
+    unembedded = []
     for fact, emb in zip(new_facts, embeddings):
-        if not emb:  # Skip failed embeddings
+        if not emb:
+            unembedded.append(fact)
             continue
         try:
             await upsert_memory(
@@ -174,6 +176,19 @@ async def store_facts_batch(
         except Exception as exc:
             log.error("Failed to store fact=%r chat=%s: %s", fact, chat_id, exc)
     
+    if unembedded:
+        # Keep the facts without a vector; `python -m app.scripts.reembed --missing-only` fills them
+        try:
+            db.add_all(
+                Memory(chat_id=chat_id, content=fact, sender=sender, embedding=None)
+                for fact in unembedded
+            )
+            await db.commit()
+            log.warning("Stored %d facts without embedding for chat=%s", len(unembedded), chat_id)
+        except Exception as exc:
+            await db.rollback()
+            log.error("Failed to store unembedded facts chat=%s: %s", chat_id, exc)
+
     log.info("Stored %d/%d facts for chat=%s", stored, len(new_facts), chat_id)
     return stored
 
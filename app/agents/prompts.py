@@ -32,6 +32,15 @@ CONVO_ANALYZER = ChatOpenAI(
     store=False
 )
 
+# Scores a chunk of call utterances per request, so it needs a larger output budget
+CALL_CONVO_ANALYZER = ChatOpenAI(
+    openai_api_key=settings.OPENAI_API_KEY,
+    model="gpt-4o-mini",
+    temperature=0.2,
+    max_tokens=2048,
+    store=False
+)
+
 XAI_MODEL = ChatXAI(
     xai_api_key=settings.XAI_API_KEY,
     model="grok-4-1-fast-reasoning",
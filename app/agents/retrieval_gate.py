@@ -0,0 +1,119 @@
+"""
+Retrieval gate: decide how much memory retrieval a user message deserves.
+
+One-word reactions ("ok", "lol", "😘") used to cost an embedding call plus a
+pgvector query each. The gate returns one of:
+
+- "skip":     empty, emoji/punctuation only, or made entirely of phatic
+              expressions -> no memory lookup at all.
+- "lexical":  a few content words -> full-text match on memories.content
+              (GIN index on to_tsvector('simple', content)), no embedding.
+- "semantic": everything else -> embedding + vector search as before.
+
+Decision counts are kept in-process and exposed via get_retrieval_gate_stats().
+"""
+
+import logging
+import os
+import re
+
+from sqlalchemy import text
+
+log = logging.getLogger("retrieval-gate")
+
+RETRIEVAL_GATE_ENABLED = os.getenv("RETRIEVAL_GATE_ENABLED", "true").lower() == "true"
+# Messages with at most this many content words use the lexical path
+RETRIEVAL_LEXICAL_MAX_WORDS = int(os.getenv("RETRIEVAL_LEXICAL_MAX_WORDS", "3"))
+RETRIEVAL_LEXICAL_TOP_K = int(os.getenv("RETRIEVAL_LEXICAL_TOP_K", "5"))
+
+SKIP = "skip"
+LEXICAL = "lexical"
+SEMANTIC = "semantic"
+
+PHATIC = frozenset("""
+    ok okay okk okey k kk kay sure yes yep yeah yea ya yup no nope nah
+    lol lmao lmfao rofl haha hahaha hehe hihi xd omg omfg wow woah whoa
+    ty thx thanks thank tysm np yw welcome hi hey hello hiya yo sup hru wyd
+    bye gn gm goodnight night morning nite cya ttyl brb
+    hmm hm mm mhm ah aw aww oh ooh uh um eh ugh meh
+    cool nice great good fine alright aight bet true same right
+    love luv babe baby bby hun cutie sweet cute
+    u you too me
+""".split())
+
+STOPWORDS = frozenset("""
+    a an the and or but so to of in on at for with from by is am are was were be been
+    i im i'm my mine you your yours u ur he she it we they them this that these those
+    do does did have has had can could will would should what whats when where who why how
+    just really very about not dont don't
+""".split())
+
+_LAUGH = re.compile(r"^(?:a?(?:ha|he|hi)+h?|l+o+l+|lm+f?a+o+|x+d+|o+k+|k+|m+|h+m+|a+w+|u+h+)$")
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?", re.UNICODE)
+
+_stats: dict[str, int] = {SKIP: 0, LEXICAL: 0, SEMANTIC: 0, "lexical_hits": 0}
+
+
+def _is_phatic(word: str) -> bool:
+    return word in PHATIC or bool(_LAUGH.match(word))
+
+
+def classify_retrieval(message: str) -> tuple[str, list[str]]:
+    """Return (decision, content_words) for a user message."""
+    words = _WORD.findall((message or "").lower())
+    if not words or all(_is_phatic(w) for w in words):
+        return SKIP, []
+
+    content = [w for w in words if w not in STOPWORDS and not _is_phatic(w)]
+    if not content:
+        return SKIP, []
+    if len(content) <= RETRIEVAL_LEXICAL_MAX_WORDS and len(words) <= RETRIEVAL_LEXICAL_MAX_WORDS * 2:
+        return LEXICAL, content
+    return SEMANTIC, content
+
+
+def decide_retrieval(message: str) -> tuple[str, list[str]]:
+    """classify_retrieval plus decision counting; always semantic when disabled."""
+    if not RETRIEVAL_GATE_ENABLED:
+        decision, words = SEMANTIC, []
+    else:
+        decision, words = classify_retrieval(message)
+    _stats[decision] += 1
+    return decision, words
+
+
+async def search_memories_lexical(db, chat_id: str, words: list[str], top_k: int = RETRIEVAL_LEXICAL_TOP_K) -> list[str]:
+    """Full-text OR-match of `words` against the chat's memories, best rank first."""
+    words = [w for w in words if w]
+    if not words:
+        return []
+
+    # Each raw word goes through plainto_tsquery so it is split exactly like the
+    # 'simple' tsvector splits content ("dog's" -> 'dog' & 's'); words are OR-ed
+    query = " || ".join(f"plainto_tsquery('simple', :w{i})" for i in range(len(words)))
+    sql = text(f"""
+        WITH q AS (SELECT ({query}) AS query)
+        SELECT content
+        FROM memories, q
+        WHERE chat_id = :chat_id
+          AND to_tsvector('simple', coalesce(content, '')) @@ q.query
+        ORDER BY ts_rank(to_tsvector('simple', coalesce(content, '')), q.query) DESC,
+                 created_at DESC
+        LIMIT :top_k
+    """)
+    params = {f"w{i}": w for i, w in enumerate(words)}
+    result = await db.execute(sql, {"chat_id": chat_id, "top_k": top_k, **params})
+    rows = [row[0] for row in result.fetchall()]
+    if rows:
+        _stats["lexical_hits"] += 1
+    return rows
+
+
+def get_retrieval_gate_stats() -> dict:
+    total = _stats[SKIP] + _stats[LEXICAL] + _stats[SEMANTIC]
+    return {
+        **_stats,
+        "total": total,
+        "embedding_saved_ratio": round((_stats[SKIP] + _stats[LEXICAL]) / total, 3) if total else 0.0,
+        "enabled": RETRIEVAL_GATE_ENABLED,
+    }
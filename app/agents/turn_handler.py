@@ -1,5 +1,6 @@
 import logging
 import asyncio
+from typing import Callable
 from uuid import uuid4
 from fastapi import HTTPException
 
@@ -8,6 +9,7 @@ from langchain_community.chat_message_histories import RedisChatMessageHistory
 
 from app.core.config import settings
 from app.agents.memory import find_similar_memories, store_facts_batch
+from app.agents.retrieval_gate import decide_retrieval, search_memories_lexical, SEMANTIC, LEXICAL
 from app.agents.prompts import MODEL, FACT_EXTRACTOR, CONVO_ANALYZER, get_fact_prompt
 from app.db.session import SessionLocal
 from app.agents.prompt_utils import (
@@ -133,6 +135,7 @@ async def handle_turn(
     db=None,
     is_audio: bool = False,
     user_timezone: str | None = None,
+    on_delta: Callable[[str], None] | None = None,
 ) -> str:
     cid = uuid4().hex[:8]
     log.info("[%s] START persona=%s chat=%s user=%s", cid, influencer_id, chat_id, user_id)
@@ -160,8 +163,10 @@ async def handle_turn(
     if not user_id:
         raise HTTPException(400, "user_id is required for relationship persistence")
 
+    # Short/phatic messages skip the embedding call; a few content words use full-text search
+    retrieval, lexical_words = decide_retrieval(message)
     from app.services.embeddings import get_embedding
-    message_embedding = await get_embedding(message) if (db and user_id) else None
+    message_embedding = await get_embedding(message) if (db and user_id and retrieval == SEMANTIC) else None
 
     rel_pack_task = asyncio.create_task(
         process_relationship_turn(
@@ -176,14 +181,22 @@ async def handle_turn(
         )
     )
     
-    memories_task = asyncio.create_task(
-        find_similar_memories(
+    if not (db and user_id):
+        memories_coro = asyncio.sleep(0, result=[])
+    elif retrieval == SEMANTIC:
+        memories_coro = find_similar_memories(
             db, 
             chat_id, 
             message, 
             embedding=message_embedding  # Reuse precomputed embedding
-        ) if (db and user_id) else asyncio.sleep(0, result=[])
-    )
+        )
+    elif retrieval == LEXICAL:
+        memories_coro = search_memories_lexical(db, chat_id, lexical_words)
+    else:
+        memories_coro = asyncio.sleep(0, result=[])
+    log.info("[%s] memory retrieval=%s", cid, retrieval)
+
+    memories_task = asyncio.create_task(memories_coro)
 
     # Wait for both to complete in parallel
     rel_pack, memories_result = await asyncio.gather(rel_pack_task, memories_task)
@@ -257,11 +270,23 @@ async def handle_turn(
     )
 
     try:
-        result = await runnable.ainvoke(
-            {"input": message},
-            config={"configurable": {"session_id": chat_id}},
-        )
-        reply = result.content
+        if on_delta is None:
+            result = await runnable.ainvoke(
+                {"input": message},
+                config={"configurable": {"session_id": chat_id}},
+            )
+            reply = result.content
+        else:
+            # Streamed so audio replies can start voicing the first sentence
+            parts = []
+            async for chunk in runnable.astream(
+                {"input": message},
+                config={"configurable": {"session_id": chat_id}},
+            ):
+                if isinstance(chunk.content, str) and chunk.content:
+                    parts.append(chunk.content)
+                    on_delta(chunk.content)
+            reply = "".join(parts)
     except Exception as e:
         log.error("[%s] LLM error: %s", cid, e, exc_info=True)
         return "Sorry, something went wrong. 😔"
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+from typing import Callable
 from uuid import uuid4
 from fastapi import HTTPException
 from sqlalchemy import select
@@ -55,6 +56,7 @@ async def handle_turn_18(
     db,
     is_audio: bool = False,
     user_timezone: str | None = None,
+    on_delta: Callable[[str], None] | None = None,
 ) -> str:
     cid = uuid4().hex[:8]
     log.info("[%s] START(18) persona=%s chat=%s user=%s", cid, influencer_id, chat_id, user_id)
@@ -98,7 +100,15 @@ async def handle_turn_18(
     chain = prompt | XAI_MODEL
 
     try:
-        result = await chain.ainvoke({"input": message})
+        if on_delta is None:
+            result = await chain.ainvoke({"input": message})
+        else:
+            # Streamed so audio replies can start voicing the first sentence
+            result = ""
+            async for chunk in chain.astream({"input": message}):
+                if isinstance(chunk.content, str) and chunk.content:
+                    on_delta(chunk.content)
+                result = chunk if not result else result + chunk
         log_prompt(
             log,
             prompt,
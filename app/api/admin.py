@@ -11,6 +11,9 @@ from app.utils.auth.dependencies import get_current_user
 
 from sqlalchemy import select, func, desc
 from app.db.models import RelationshipState, Influencer,User
+from app.relationship.state_cache import evict_relationship
+from app.relationship.aggregates import get_influencer_relationship_stats
+from app.services.wallet_reconciler import list_wallet_drift
 from app.utils.storage.s3 import save_sample_audio_to_s3, generate_presigned_url, delete_file_from_s3
 
 from pydantic import BaseModel, Field
@@ -193,6 +196,30 @@ async def list_relationships(
         for r in rows
     ]
 
+@router.get("/influencers/{influencer_id}/relationship-stats")
+async def influencer_relationship_stats(
+    influencer_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Fans by stage, average sentiment and new girlfriends this week (O(1) read)."""
+    if current_user.id != 1:
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    return await get_influencer_relationship_stats(db, influencer_id)
+
+@router.get("/wallet-drift")
+async def wallet_drift(
+    limit: int = 100,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Wallets that currently disagree with the credit ledger."""
+    if current_user.id != 1:
+        raise HTTPException(status_code=403, detail="Admin only")
+
+    return await list_wallet_drift(db, limit=min(limit, 500))
+
 @router.get("/users")
 async def list_users(
     q: str | None = None,
@@ -258,6 +285,9 @@ async def patch_relationship(
     if current_user.id != 1:
         raise HTTPException(status_code=403, detail="Admin only")
 
+    # Flush and drop the cached copy so the next turn reloads this edit
+    await evict_relationship(payload.user_id, payload.influencer_id)
+
     q = select(RelationshipState).where(
         RelationshipState.user_id == payload.user_id,
         RelationshipState.influencer_id == payload.influencer_id,
@@ -292,6 +322,8 @@ async def patch_relationship(
     if payload.exclusive_agreed is not None:
         rel.exclusive_agreed = payload.exclusive_agreed
     if payload.girlfriend_confirmed is not None:
+        if payload.girlfriend_confirmed and not rel.girlfriend_confirmed:
+            rel.girlfriend_confirmed_at = datetime.now(timezone.utc)
         rel.girlfriend_confirmed = payload.girlfriend_confirmed
 
     if payload.dtr_stage is not None:
@@ -301,6 +333,7 @@ async def patch_relationship(
 
     if payload.last_interaction_at is not None:
         rel.last_interaction_at = payload.last_interaction_at
+        rel.decayed_idle_days = 0.0
 
     if rel.girlfriend_confirmed:
         rel.state = "GIRLFRIEND"
@@ -341,6 +374,9 @@ async def update_relationship(
     if current_user.id != 1:
         raise HTTPException(status_code=403, detail="Admin only")
 
+    # Flush and drop the cached copy so the next turn reloads this edit
+    await evict_relationship(payload.user_id, payload.influencer_id)
+
     q = select(RelationshipState).where(
         RelationshipState.user_id == payload.user_id,
         RelationshipState.influencer_id == payload.influencer_id,
@@ -372,6 +408,8 @@ async def update_relationship(
     if payload.exclusive_agreed is not None:
         rel.exclusive_agreed = payload.exclusive_agreed
     if payload.girlfriend_confirmed is not None:
+        if payload.girlfriend_confirmed and not rel.girlfriend_confirmed:
+            rel.girlfriend_confirmed_at = datetime.now(timezone.utc)
         rel.girlfriend_confirmed = payload.girlfriend_confirmed
 
     if rel.girlfriend_confirmed:
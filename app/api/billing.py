@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
 from app.services.billing import topup_wallet
+from app.services.ledger import get_ledger_summary
 from app.db.models import InfluencerWallet
 from app.schemas.billing import TopUpRequest
 from app.db.session import get_db
@@ -49,6 +50,16 @@ async def get_balance(
         "balance_cents": wallet.balance_cents if wallet else 0,
     }
 
+@router.get("/spending")
+async def get_spending(
+    influencer_id: str = Query(...),
+    days: int = Query(30, ge=1, le=366),
+    db: AsyncSession = Depends(get_db),
+    user=Depends(get_current_user),
+):
+    """Spend and top-ups per feature and per day, from the ledger rollups."""
+    return await get_ledger_summary(db, user_id=user.id, influencer_id=influencer_id, days=days)
+
 @router.post("/topup")
 @rate_limit(max_requests=settings.RATE_LIMIT_BILLING_MAX, window_seconds=settings.RATE_LIMIT_BILLING_WINDOW, key_prefix="billing:topup")
 @idempotent(ttl=settings.IDEMPOTENCY_TTL, key_prefix="topup")
@@ -80,6 +91,16 @@ async def topup(
 
     wallet.balance_cents = (wallet.balance_cents or 0) + int(req.cents)
     db.add(wallet)
+    db.add(
+        InfluencerCreditTransaction(
+            user_id=user.id,
+            influencer_id=req.influencer_id,
+            feature="topup",
+            units=int(req.cents),
+            amount_cents=int(req.cents),
+            meta={"source": "manual_topup"},
+        )
+    )
 
     await db.commit()
     await db.refresh(wallet)
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import io
 import logging
 
 from fastapi import APIRouter, WebSocket, Depends, File, UploadFile, HTTPException, Form, Query
@@ -17,10 +16,12 @@ from app.schemas.chat import ChatCreateRequest, PaginatedMessages
 from app.utils.auth.dependencies import get_current_user
 
 from app.core.config import settings
-from app.utils.messaging.chat import transcribe_audio, synthesize_audio_with_elevenlabs_V3, get_ai_reply_via_websocket
-from app.utils.storage.s3 import save_audio_to_s3, save_ia_audio_to_s3, generate_presigned_url, message_to_schema_with_presigned
-from app.services.billing import charge_feature, get_duration_seconds, can_afford
+from app.utils.messaging.chat import get_ai_reply_via_websocket
+from app.utils.storage.s3 import message_to_schema_with_presigned
+from app.services.billing import can_afford
+from app.services.credit_reservations import CREDIT_RESERVATIONS_ENABLED, CreditSession
 from app.moderation import moderate_message, handle_violation
+from app.services.voice_pipeline import run_voice_turn
 
 # Import shared buffer service
 from app.services.chat_buffer_service import (
@@ -78,6 +79,13 @@ async def websocket_chat(
         log.error("[WS] JWT decode error: %s", e)
         return
 
+    # Message credits are reserved in blocks for the life of the socket
+    credits = (
+        CreditSession(user_id=user_id, influencer_id=influencer_id, feature="text", is_18=False)
+        if CREDIT_RESERVATIONS_ENABLED
+        else None
+    )
+
     try:
         while True:
             raw = await ws.receive_json()
@@ -89,13 +97,15 @@ async def websocket_chat(
             chat_id = raw.get("chat_id") or f"{user_id}_{influencer_id}"
 
             # Check if user can afford the message
-            ok, cost, free_left = await can_afford(
-                db,
-                user_id=user_id,
-                influencer_id=influencer_id,
-                feature="text",
-                units=1
-            )
+            ok = credits is not None and await credits.ensure()
+            if not ok:
+                ok, cost, free_left = await can_afford(
+                    db,
+                    user_id=user_id,
+                    influencer_id=influencer_id,
+                    feature="text",
+                    units=1
+                )
             if not ok:
                 await ws.send_json({
                     "ok": False,
@@ -141,18 +151,19 @@ async def websocket_chat(
                 db=db,
                 config=CHAT_CONFIG,
                 user_timezone=user_timezone,
+                credits=credits,
             )
 
             # Handle final flush request
             if raw.get("final") is True:
                 log.info("[BUF %s] client requested final flush", chat_id)
-                await flush_buffer(chat_id, ws, influencer_id, user_id, db, CHAT_CONFIG)
+                await flush_buffer(chat_id, ws, influencer_id, user_id, db, CHAT_CONFIG, credits)
 
     except WebSocketDisconnect:
         log.info("[WS] Client %s disconnected from %s", user_id, influencer_id)
         try:
             chat_id = f"{user_id}_{influencer_id}"
-            await flush_buffer(chat_id, ws, influencer_id, user_id, db, CHAT_CONFIG)
+            await flush_buffer(chat_id, ws, influencer_id, user_id, db, CHAT_CONFIG, credits)
         except Exception:
             pass
     except Exception:
@@ -161,6 +172,9 @@ async def websocket_chat(
             await ws.close(code=4003)
         except Exception:
             pass
+    finally:
+        if credits is not None:
+            await credits.close()
 
 
 @router.get("/history/{chat_id}", response_model=PaginatedMessages)
@@ -207,6 +221,7 @@ async def chat_audio(
     chat_id: str = Form(...),
     influencer_id: str = Form(""),
     token: str = Form(""),
+    stream: bool = Form(False),
     db: AsyncSession = Depends(get_db),
 ):
     try:
@@ -225,101 +240,24 @@ async def chat_audio(
         except Exception:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        file_bytes = await file.read()
-        if not file_bytes:
-            raise HTTPException(status_code=400, detail="Audio file empty")
-
-        seconds = int(get_duration_seconds(file_bytes, file.content_type))
-
-        ok, cost, free_left = await can_afford(
+        return await run_voice_turn(
             db,
-            user_id=user_id,
+            upload=file,
+            chat_id=chat_id,
             influencer_id=influencer_id,
-            feature="voice",
-            units=seconds,
-        )
-        if not ok:
-            raise HTTPException(
-                status_code=402,
-                detail={
-                    "error": "INSUFFICIENT_CREDITS",
-                    "message": "You're out of free voice and credits. Please top up to continue.",
-                    "needed_cents": cost,
-                    "free_left": free_left,
-                },
-            )
-
-        await charge_feature(
-            db,
             user_id=user_id,
-            influencer_id=influencer_id,
             feature="voice",
-            units=seconds,
-            meta={"chat_id": chat_id, "seconds": seconds},
-        )
-
-        user_audio_key = await save_audio_to_s3(
-            io.BytesIO(file_bytes),
-            file.filename,
-            file.content_type,
-            user_id,
-        )
-
-        transcript = await transcribe_audio(
-            io.BytesIO(file_bytes),
-            file.filename,
-            file.content_type,
-        )
-        if not transcript or "error" in transcript:
-            raise HTTPException(status_code=422, detail=(transcript or {}).get("error", "Transcription error"))
-
-        transcript_text = transcript.get("text") or ""
-        if not transcript_text.strip():
-            raise HTTPException(status_code=422, detail="Empty transcript")
-
-        from app.services.embeddings import get_embedding
-        embedding = await get_embedding(transcript_text)
-        msg_user = Message(
-            chat_id=chat_id,
-            sender="user",
-            content=transcript_text,
-            audio_url=user_audio_key,
-            embedding=embedding,
-        )
-        db.add(msg_user)
-        await db.commit()
-
-        ai_reply = await get_ai_reply_via_websocket(
-            chat_id,
-            transcript_text,
-            influencer_id,
-            user_id,
-            db,
-        )
-        if not ai_reply:
-            raise HTTPException(status_code=500, detail="No AI reply")
-
-        audio_bytes, _ = await synthesize_audio_with_elevenlabs_V3(ai_reply, db, influencer_id)
-        if not audio_bytes:
-            raise HTTPException(status_code=500, detail="No audio returned from any TTS provider")
-
-        ai_audio_key = await save_ia_audio_to_s3(audio_bytes, user_id)
-
-        msg_ai = Message(
-            chat_id=chat_id,
-            sender="ai",
-            content=ai_reply,
-            audio_url=ai_audio_key,
+            message_model=Message,
+            get_reply=lambda text, reply_db, on_delta=None: get_ai_reply_via_websocket(
+                chat_id,
+                text,
+                influencer_id,
+                user_id,
+                reply_db,
+                on_delta=on_delta,
+            ),
+            stream=stream,
         )
-        db.add(msg_ai)
-        await db.commit()
-
-        return {
-            "ai_text": ai_reply,
-            "ai_audio_url": generate_presigned_url(ai_audio_key),
-            "user_audio_url": generate_presigned_url(user_audio_key),
-            "transcript": transcript_text,
-        }
 
     except HTTPException:
         raise
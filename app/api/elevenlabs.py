@@ -4,10 +4,6 @@ import math
 import random
 import json
 from uuid import uuid4
-from app.agents.prompt_utils import build_relationship_prompt, get_global_prompt, get_mbti_rules_for_archetype, get_relationship_stage_prompts, get_time_context
-from app.relationship.dtr import plan_dtr_goal
-from app.relationship.inactivity import apply_inactivity_decay
-from app.relationship.repo import get_or_create_relationship
 import httpx
 from datetime import datetime, timedelta, timezone
 from app.moderation import moderate_message, handle_violation
@@ -25,14 +21,17 @@ from sqlalchemy import select
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.services.billing import can_afford, get_remaining_units
 from app.services.chat_service import get_or_create_chat
+from app.services.call_context import build_call_context, call_prompt, prepare_call_context, stash_call_context
 from app.agents.turn_handler import _norm, _build_user_name_block, redis_history
 from langchain_core.prompts import ChatPromptTemplate
 from app.db.session import SessionLocal
 from app.services.embeddings import get_embedding
+from app.services.embedding_writer import enqueue_message_embedding
 from app.services.system_prompt_service import get_system_prompt
 from app.constants import prompt_keys
 from app.agents.prompts import GREETING_GENERATOR
 from app.utils.logging.prompt_logging import log_prompt
+from app.utils.infrastructure.elevenlabs_client import get_elevenlabs_client
 
 router = APIRouter(prefix="/elevenlabs", tags=["elevenlabs"])
 log = logging.getLogger(__name__)
@@ -41,35 +40,6 @@ ELEVENLABS_API_KEY = settings.ELEVENLABS_API_KEY
 ELEVEN_BASE_URL = settings.ELEVEN_BASE_URL
 DEFAULT_ELEVENLABS_VOICE_ID = settings.ELEVENLABS_VOICE_ID or None
 
-# Shared HTTP client for connection pooling
-_elevenlabs_client: Optional[httpx.AsyncClient] = None
-
-async def get_elevenlabs_client() -> httpx.AsyncClient:
-    """Get or create a shared HTTP client with connection pooling for ElevenLabs API."""
-    global _elevenlabs_client
-    if _elevenlabs_client is None:
-        _elevenlabs_client = httpx.AsyncClient(
-            http2=True,
-            base_url=ELEVEN_BASE_URL,
-            timeout=httpx.Timeout(30.0, connect=10.0),
-            limits=httpx.Limits(
-                max_keepalive_connections=20,
-                max_connections=50,
-                keepalive_expiry=30.0
-            ),
-        )
-        log.info("Created shared ElevenLabs HTTP client with connection pooling")
-    return _elevenlabs_client
-
-
-async def close_elevenlabs_client() -> None:
-    """Close the shared ElevenLabs HTTP client gracefully."""
-    global _elevenlabs_client
-    if _elevenlabs_client is not None:
-        await _elevenlabs_client.aclose()
-        _elevenlabs_client = None
-        log.info("Closed ElevenLabs HTTP client")
-
 def _get_env_suffix() -> str:
     device = settings.DEVICE.upper() if settings.DEVICE else ""
     if device == "SERVER":
@@ -1198,7 +1168,7 @@ async def _persist_transcript_to_chat(
                 return True
         return False
 
-    # PHASE 1: Collect all message data without embedding
+    # PHASE 1: Collect all message data
     pending_entries: List[Dict[str, Any]] = []
     
     for entry in transcript:
@@ -1267,19 +1237,8 @@ async def _persist_transcript_to_chat(
     if not pending_entries:
         return 0
 
-    # PHASE 2: Batch embed all texts in ONE API call (70-80% faster)
-    texts_to_embed = [e["text"] for e in pending_entries]
-    embeddings: List[Optional[List[float]]] = []
-    try:
-        from app.services.embeddings import get_embeddings_batch
-        embeddings = await get_embeddings_batch(texts_to_embed)
-    except Exception as exc:
-        log.warning("persist_transcript.batch_embed_failed chat=%s err=%s", chat_id, exc)
-        embeddings = [None] * len(pending_entries)
-
-    # PHASE 3: Create Message objects with embeddings
-    for i, entry in enumerate(pending_entries):
-        embedding = embeddings[i] if i < len(embeddings) else None
+    # PHASE 2: Create Message objects; embeddings are filled by the background writer
+    for entry in pending_entries:
         new_messages.append(
             Message(
                 chat_id=chat_id,
@@ -1287,7 +1246,6 @@ async def _persist_transcript_to_chat(
                 channel="call",
                 content=entry["text"],
                 created_at=entry["created_at"],
-                embedding=embedding,
                 conversation_id=conversation_id,
             )
         )
@@ -1297,6 +1255,8 @@ async def _persist_transcript_to_chat(
 
     db.add_all(new_messages)
     await db.commit()
+    for msg in new_messages:
+        enqueue_message_embedding(msg)
     try:
         history = redis_history(chat_id)
         for msg in new_messages:
@@ -1395,79 +1355,18 @@ async def get_conversation_token(
     
     agent_id = await get_agent_id_from_influencer(db, influencer_id)
     # Sequential to avoid SQLAlchemy AsyncSession concurrent access issue
-    prompt_template = await get_global_prompt(db, True)
     influencer = await db.get(Influencer, influencer_id)
     chat_id = await get_or_create_chat(db, user_id, influencer_id)
 
     if not influencer:
         raise HTTPException(404, "Influencer not found")
-    
-    bio = influencer.bio_json or {}
-    persona_likes = bio.get("likes", [])
-    persona_dislikes = bio.get("dislikes", [])
-    if not isinstance(persona_likes, list):
-        persona_likes = []
-    if not isinstance(persona_dislikes, list):
-        persona_dislikes = []
-    
-    # Get stage prompts from DB, with potential bio_json override
-    stages = await get_relationship_stage_prompts(db)
-    bio_stages = bio.get("stages", {})
-    if isinstance(bio_stages, dict) and bio_stages:
-        for key, val in bio_stages.items():
-            if val:  # Only override if value is non-empty
-                stages[key.upper()] = val
-    personality_rules = bio.get("personality_rules", "")
-    tone = bio.get("tone", "")
-    mbti_archetype = bio.get("mbti_architype", "")
-    mbti_addon = bio.get("mbti_rules", "")
-    mbti_rules = await get_mbti_rules_for_archetype(db, mbti_archetype, mbti_addon)
-    daily_context = ""
-
-    history = redis_history(chat_id)
-
-    if len(history.messages) > settings.MAX_HISTORY_WINDOW:
-        trimmed = history.messages[-settings.MAX_HISTORY_WINDOW:]
-        history.clear()
-        history.add_messages(trimmed)
-
-    recent_ctx = "\n".join(f"{m.type}: {m.content}" for m in history.messages[-6:])
-
-    now = datetime.now(timezone.utc)
-    rel = await get_or_create_relationship(db, int(user_id), influencer_id)
-    days_idle = apply_inactivity_decay(rel, now)
-
-    can_ask = (
-        rel.state == "DATING"
-        and rel.safety >= 70
-        and rel.trust >= 75
-        and rel.closeness >= 70
-        and rel.attraction >= 65
-    )
 
-    dtr_goal = plan_dtr_goal(rel, can_ask)
-    time_context = get_time_context(user_timezone)
-
-    users_name = await _build_user_name_block(db, user_id)
-
-    prompt = build_relationship_prompt(
-        prompt_template,
-        rel=rel,
-        days_idle=days_idle,
-        dtr_goal=dtr_goal,
-        personality_rules=personality_rules,
-        stages=stages,
-        persona_likes=persona_likes,
-        persona_dislikes=persona_dislikes,
-        mbti_rules=mbti_rules,
-        memories="None",
-        daily_context=daily_context,
-        last_user_message=recent_ctx,
-        mood=time_context,
-        tone=tone,
-        influencer_name=influencer.display_name,
-        users_name=users_name,
+    # The same context later serves /webhooks/reply; register_conversation picks up the stash
+    call_context = await build_call_context(
+        db, user_id, influencer_id, chat_id, user_timezone, with_memories=False
     )
+    await stash_call_context(chat_id, call_context)
+    prompt = call_prompt(call_context)
     
     log_prompt(log, prompt, cid="", input="")
 
@@ -1621,6 +1520,14 @@ async def register_conversation(
         except Exception:
             pass
 
+    try:
+        if chat_id and body.influencer_id:
+            asyncio.create_task(
+                prepare_call_context(conversation_id, current_user.id, body.influencer_id, chat_id)
+            )
+    except Exception as exc:
+        log.warning("register.call_context_failed conv=%s err=%s", conversation_id, exc)
+
     try:
         asyncio.create_task(
             _poll_and_persist_conversation(
@@ -1,7 +1,49 @@
 from fastapi import APIRouter
 
+from app.services.embedding_writer import get_embedding_writer_stats
+from app.agents.retrieval_gate import get_retrieval_gate_stats
+from app.relationship.state_cache import get_relationship_cache_stats
+from app.relationship.signal_model import get_signal_model_stats
+from app.services.inactivity_decay import get_inactivity_decay_stats
+from app.services.reengagement_events import get_reengagement_event_stats
+from app.relationship.aggregates import get_relationship_aggregate_stats
+from app.services.pricing_catalog import get_pricing_catalog_stats
+from app.services.credit_reservations import get_credit_reservation_stats
+from app.services.ledger import get_ledger_stats
+from app.services.wallet_reconciler import get_wallet_reconcile_stats
+from app.services.audio_duration import get_audio_duration_stats
+from app.services.voice_pipeline import get_voice_pipeline_stats
+from app.services.transcription import get_transcription_stats
+from app.services.tts import get_tts_stats
+from app.services.tts_cache import get_tts_cache_stats
+from app.services.tts_pipeline import get_tts_pipeline_stats
+from app.services.call_context import get_call_context_stats
+
 router = APIRouter(prefix="/health", tags=["health"])
 
 @router.get("/")
 def health():
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+@router.get("/workers")
+async def worker_stats():
+    return {
+        "embedding_writer": get_embedding_writer_stats(),
+        "retrieval_gate": get_retrieval_gate_stats(),
+        "relationship_cache": await get_relationship_cache_stats(),
+        "signal_model": get_signal_model_stats(),
+        "inactivity_decay": get_inactivity_decay_stats(),
+        "reengagement_events": get_reengagement_event_stats(),
+        "relationship_aggregates": get_relationship_aggregate_stats(),
+        "pricing_catalog": get_pricing_catalog_stats(),
+        "credit_reservations": get_credit_reservation_stats(),
+        "ledger": get_ledger_stats(),
+        "wallet_reconcile": get_wallet_reconcile_stats(),
+        "audio_duration": get_audio_duration_stats(),
+        "voice_pipeline": get_voice_pipeline_stats(),
+        "transcription": get_transcription_stats(),
+        "tts": get_tts_stats(),
+        "tts_cache": get_tts_cache_stats(),
+        "tts_pipeline": get_tts_pipeline_stats(),
+        "call_context": get_call_context_stats(),
+    }
@@ -13,6 +13,7 @@ from app.db.models import (
     InfluencerSubscriptionPlan,
     InfluencerSubscriptionAddonPurchase,
     InfluencerWallet,
+    InfluencerCreditTransaction,
     User
 )
 from app.services.influencer_subscriptions import get_valid_subscription
@@ -278,6 +279,16 @@ async def paypal_capture_subscription(
     # Add credits to balance
     wallet.balance_cents = (wallet.balance_cents or 0) + int(amount_cents)
     db.add(wallet)
+    db.add(
+        InfluencerCreditTransaction(
+            user_id=user.id,
+            influencer_id=sub.influencer_id,
+            feature="topup",
+            units=int(amount_cents),
+            amount_cents=int(amount_cents),
+            meta={"source": f"subscription:paypal:{order_id}", "subscription_id": sub.id},
+        )
+    )
 
     db.add(sub)
     await db.commit()
@@ -686,6 +697,16 @@ async def purchase_addon(
         occurred_at=datetime.now(timezone.utc),
     )
     db.add(payment)
+    db.add(
+        InfluencerCreditTransaction(
+            user_id=user.id,
+            influencer_id=req.influencer_id,
+            feature="topup",
+            units=credits_to_add,
+            amount_cents=credits_to_add,
+            meta={"source": f"addon:{transaction_id}", "addon_plan_id": addon_plan.id},
+        )
+    )
     
     await db.commit()
     await db.refresh(wallet)
@@ -5,6 +5,7 @@ from sqlalchemy import select
 from app.db.session import get_db
 from app.utils.auth.dependencies import get_current_user
 from app.db.models import RelationshipState, Influencer
+from app.relationship.state_cache import peek_relationship
 from app.services.relationship_dimension_service import (
     get_dimension_descriptions,
     get_stage_requirements
@@ -65,7 +66,7 @@ async def get_relationship(
     if not influencer:
         raise HTTPException(status_code=404, detail=f"Influencer '{influencer_id}' not found")
     
-    rel = await db.scalar(
+    rel = await peek_relationship(user.id, influencer_id) or await db.scalar(
         select(RelationshipState).where(
             RelationshipState.user_id == user.id,
             RelationshipState.influencer_id == influencer_id,
@@ -133,7 +134,7 @@ async def get_relationship_dimensions(
         raise HTTPException(status_code=404, detail=f"Influencer '{influencer_id}' not found")
     
     # Get current relationship state
-    rel = await db.scalar(
+    rel = await peek_relationship(user.id, influencer_id) or await db.scalar(
         select(RelationshipState).where(
             RelationshipState.user_id == user.id,
             RelationshipState.influencer_id == influencer_id,
@@ -6,8 +6,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func
 from app.core.config import settings
-from app.db.models import User, InfluencerWallet, DailyUsage, Pricing
+from app.db.models import User, InfluencerWallet, DailyUsage
 from app.db.session import get_db
+from app.services.pricing_catalog import get_pricing_catalog
 from app.schemas.user import UserOut, UserUpdate, UserAdultPromptUpdate, UserAdultPromptOut
 from app.utils.auth.dependencies import get_current_user
 from app.utils.storage.s3 import (
@@ -49,16 +50,8 @@ async def get_user_usage(
     normal_usage = await db.get(DailyUsage, (id, today, False))
     adult_usage = await db.get(DailyUsage, (id, today, True))
 
-    pricing_result = await db.execute(
-        select(Pricing).where(Pricing.is_active.is_(True))
-    )
-    pricing_map = {p.feature: p for p in pricing_result.scalars().all()}
-
-    def get_price_info(feature: str) -> tuple[int, int]:
-        price = pricing_map.get(feature)
-        if not price:
-            return (0, 0)
-        return (price.price_cents or 0, price.free_allowance or 0)
+    pricing = await get_pricing_catalog()
+    get_price_info = pricing.price_and_free
 
     def get_used_today(usage, usage_field: str) -> int:
         if not usage:
@@ -3,7 +3,7 @@ import asyncio, time, logging, json, hmac
 
 from hashlib import sha256
 from typing import Optional, Any
-from app.agents.prompts import CONVO_ANALYZER
+from app.agents.prompts import CALL_CONVO_ANALYZER
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Header, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,11 +12,19 @@ from app.db.session import get_db
 from app.services.billing import charge_feature, _get_influencer_id_from_chat
 from app.api.elevenlabs import _extract_total_seconds
 from sqlalchemy import select
-from app.db.models import CallRecord, Chat, Influencer
-from app.agents.turn_handler import  handle_turn, redis_history
+from app.db.models import CallRecord, Chat
+from app.agents.turn_handler import  handle_turn
 from app.agents.memory import find_similar_memories, find_similar_messages
+from app.services.call_context import fast_call_reply, finish_call_context
 
-from app.relationship.processor import process_relationship_turn
+from app.relationship.call_processor import (
+    buffer_call_utterance,
+    claim_post_call,
+    drain_call_utterances,
+    release_post_call,
+    process_call_relationship,
+    split_transcript,
+)
 
 
 log = logging.getLogger(__name__)
@@ -97,7 +105,11 @@ async def _resolve_user_for_conversation(db, conversation_id: str):
 
 
 @router.post("/elevenlabs")
-async def elevenlabs_post_call(request: Request, db: AsyncSession = Depends(get_db)):
+async def elevenlabs_post_call(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+):
     client_ip = request.client.host if request.client else "-"
     te = (request.headers.get("transfer-encoding") or "").lower()
     log.info("webhook.receive start ip=%s transfer_encoding=%s", client_ip, te)
@@ -199,6 +211,10 @@ async def elevenlabs_post_call(request: Request, db: AsyncSession = Depends(get_
             reason, _redact(conversation_id), status, _redact(user_id)
         )
 
+    if status == "done":
+        background_tasks.add_task(_process_call_relationship_after_call, conversation_id, transcript_entries)
+        background_tasks.add_task(finish_call_context, conversation_id)
+
     log.info(
         "webhook.response ok=True conv_id=%s status=%s seconds=%s",
         _redact(conversation_id), status, total_seconds
@@ -239,14 +255,13 @@ async def update_relationship_api(
         _process_relationship_update,
         user_text,
         conversation_id,
-        db
     )
     
     return {"status": "processing"}
 
 
-async def _process_relationship_update(user_text: str, conversation_id: str, db: AsyncSession):
-    """Process relationship update in background without blocking webhook response."""
+async def _process_relationship_update(user_text: str, conversation_id: str):
+    """Buffer a mid-call utterance; classify and apply a full chunk in one pass."""
     if not user_text:
         log.warning("[EL TOOL BG] empty user_text")
         return
@@ -256,71 +271,66 @@ async def _process_relationship_update(user_text: str, conversation_id: str, db:
         return
 
     try:
-        res = await db.execute(select(CallRecord).where(CallRecord.conversation_id == conversation_id))
-        call = res.scalar_one_or_none()
+        chunk = await buffer_call_utterance(conversation_id, user_text)
     except Exception as e:
-        log.exception("[EL TOOL BG] CallRecord lookup failed: %s", e)
-        return
+        # Redis unavailable: fall back to applying this utterance on its own
+        log.warning("[EL TOOL BG] buffer failed conv=%s err=%s", conversation_id, e)
+        chunk = [user_text]
 
-    if not call:
-        log.warning("[EL TOOL BG] No CallRecord found for conv=%s", conversation_id)
+    if not chunk:
         return
 
-    user_id = call.user_id
-    influencer_id = call.influencer_id
-    chat_id = call.chat_id
-
-    if not user_id or not influencer_id or not chat_id:
-        log.warning(
-            "[EL TOOL BG] incomplete CallRecord context conv=%s user=%s infl=%s chat=%s",
-            conversation_id, user_id, influencer_id, chat_id
-        )
+    try:
+        res = await process_call_relationship(conversation_id, chunk, CALL_CONVO_ANALYZER)
+    except Exception as e:
+        log.exception("[EL TOOL BG] relationship chunk failed conv=%s: %s", conversation_id, e)
         return
 
-    history = redis_history(chat_id)
-
-    if len(history.messages) > settings.MAX_HISTORY_WINDOW:
-        trimmed = history.messages[-settings.MAX_HISTORY_WINDOW:]
-        history.clear()
-        history.add_messages(trimmed)
+    if res:
+        rel = res["rel"]
+        log.info(
+            "[EL TOOL BG] relationship_metrics conv=%s utterances=%d phase=%s trust=%.1f closeness=%.1f "
+            "attraction=%.1f safety=%.1f days_idle=%.1f dtr_goal=%s",
+            conversation_id, res["utterances"], rel.state, rel.trust, rel.closeness,
+            rel.attraction, rel.safety, res["days_idle"], res["dtr_goal"],
+        )
 
-    recent_ctx = "\n".join(f"{m.type}: {m.content}" for m in history.messages[-6:])
 
-    influencer = await db.get(Influencer, influencer_id)
-    if not influencer:
-        log.warning("[EL TOOL BG] Influencer not found infl=%s conv=%s", influencer_id, conversation_id)
+async def _process_call_relationship_after_call(conversation_id: str, transcript_entries: list):
+    """Apply what the mid-call tool left buffered, or the whole transcript if it never ran."""
+    try:
+        if not await claim_post_call(conversation_id):
+            log.info("[CALL-REL] already applied conv=%s, skipping redelivery", conversation_id)
+            return
+    except Exception as e:
+        # Without the marker a redelivery could double-count; don't guess
+        log.warning("[CALL-REL] claim failed conv=%s err=%s; skipping", conversation_id, e)
         return
 
-    rel_pack = await process_relationship_turn(
-        db=db,
-        user_id=int(user_id),
-        influencer_id=influencer_id,
-        message=user_text,
-        recent_ctx=recent_ctx,
-        cid=f"el_{conversation_id}"[:16],
-        convo_analyzer=CONVO_ANALYZER,
-        influencer=influencer,
-    )
+    try:
+        remaining, seen = await drain_call_utterances(conversation_id)
+    except Exception as e:
+        log.warning("[CALL-REL] drain failed conv=%s err=%s", conversation_id, e)
+        remaining, seen = [], False
 
-    rel = rel_pack["rel"]
-    days_idle = rel_pack["days_idle"]
-    dtr_goal = rel_pack["dtr_goal"]
-
-    relationship = (
-        "# Relationship Metrics:\n"
-        f"- phase: {rel.state}\n"
-        f"- trust: {rel.trust}/100\n"
-        f"- closeness: {rel.closeness}/100\n"
-        f"- attraction: {rel.attraction}/100\n"
-        f"- safety: {rel.safety}/100\n"
-        f"- exclusive_agreed: {rel.exclusive_agreed}\n"
-        f"- girlfriend_confirmed: {rel.girlfriend_confirmed}\n"
-        f"- sentiment_delta: {rel.sentiment_delta}\n"
-        f"- days_idle_before_message: {days_idle}\n"
-        f"- dtr_goal: {dtr_goal}\n"
-    )
+    if seen:
+        utterances, agent_lines = remaining, None
+    else:
+        utterances, agent_lines = split_transcript(transcript_entries)
 
-    log.info("[EL TOOL BG] relationship_metrics conv=%s\n%s", conversation_id, relationship)
+    if not utterances:
+        return
+
+    try:
+        await process_call_relationship(conversation_id, utterances, CALL_CONVO_ANALYZER, agent_lines=agent_lines)
+    except Exception as e:
+        log.exception("[CALL-REL] post-call relationship update failed conv=%s: %s", conversation_id, e)
+        if not seen:
+            # Only the transcript was used, so a redelivery can safely retry it
+            try:
+                await release_post_call(conversation_id)
+            except Exception:
+                pass
 
 def _verify_token(shared: str, token: str | None) -> None:
     if not shared: 
@@ -445,6 +455,22 @@ async def eleven_webhook_reply(
         log.warning("[EL TOOL] missing conversation_id in payload=%s", str(payload)[:300])
         return {"text": "I’m missing the call ID. Please try again."}
 
+    # Fast path: the call's context was built at registration, so only history + LLM run here
+    started = time.perf_counter()
+    try:
+        reply = await asyncio.wait_for(fast_call_reply(conversation_id, user_text), timeout=8.5)
+    except asyncio.TimeoutError:
+        reply = "One sec… could you say that again?"
+    except Exception as e:
+        log.exception("[EL TOOL] fast reply failed, using full turn: %s", e)
+        reply = None
+    if reply is not None:
+        ms = int((time.perf_counter() - started) * 1000)
+        log.info("[EL TOOL] fast reply ms=%d conv=%s", ms, conversation_id)
+        if len(reply) > 320:
+            reply = reply[:317] + "…"
+        return {"text": reply}
+
     try:
         res = await db.execute(
             select(CallRecord).where(CallRecord.conversation_id == conversation_id)
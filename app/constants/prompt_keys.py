@@ -5,6 +5,7 @@ BASE_ADULT_AUDIO_PROMPT = "BASE_ADULT_AUDIO_PROMPT"
 WEEKDAY_TIME_PROMPT = "WEEKDAY_TIME_PROMPT"
 WEEKEND_TIME_PROMPT = "WEEKEND_TIME_PROMPT"
 RELATIONSHIP_SIGNAL_PROMPT = "RELATIONSHIP_SIGNAL_PROMPT"
+RELATIONSHIP_CALL_SIGNAL_PROMPT = "RELATIONSHIP_CALL_SIGNAL_PROMPT"
 RELATIONSHIP_STAGE_PROMPTS = "RELATIONSHIP_STAGE_PROMPTS"
 SURVEY_QUESTIONS_JSON = "SURVEY_QUESTIONS_JSON"
 MBTI_JSON = "MBTI_JSON"
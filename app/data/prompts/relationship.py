@@ -25,6 +25,25 @@ Context:
 User message:
 {message}""".strip()
 
+# Batched signal extraction for a whole voice call (one row per user utterance)
+RELATIONSHIP_CALL_SIGNAL_PROMPT = """Score every numbered user utterance (U1..U{count}) from this voice call.
+Return ONLY valid JSON: {{"signals": [[n, support, affection, flirt, respect, apology, commitment_talk, rude, boundary_push, dislike, hate, accepted_exclusive, accepted_girlfriend], ...]}}
+One row per utterance, n is its number. Scores are 0..1; accepted_exclusive and accepted_girlfriend are 0 or 1.
+Lines starting with A: are the influencer and are context only.
+
+Influencer preferences:
+Likes: {persona_likes}
+Dislikes: {persona_dislikes}
+
+Guidance:
+- If an utterance aligns with Likes -> raise affection/support/respect.
+- If an utterance aligns with Dislikes -> raise dislike (mild), not hate.
+- Use hate only for strong hostility ("I hate you", slurs, wishing harm).
+- accepted_exclusive / accepted_girlfriend only when the user clearly says yes to that question.
+
+Transcript:
+{transcript}""".strip()
+
 # Load relationship stage prompts from JSON config
 _CONFIGS_DIR = Path(__file__).resolve().parent.parent / "configs"
 RELATIONSHIP_STAGE_PROMPTS = json.loads(
@@ -50,6 +69,12 @@ PROMPTS = {
         "prompt": RELATIONSHIP_SIGNAL_PROMPT,
         "type": "normal"
     },
+    prompt_keys.RELATIONSHIP_CALL_SIGNAL_PROMPT: {
+        "name": "Relationship Call Signal Classification",
+        "description": "Prompt for classifying relationship signals for every user utterance of a voice call in one pass.",
+        "prompt": RELATIONSHIP_CALL_SIGNAL_PROMPT,
+        "type": "normal"
+    },
     prompt_keys.RELATIONSHIP_STAGE_PROMPTS: {
         "name": "Relationship Stage Prompts",
         "description": "Stage-specific behavior guidance for relationship states.",
@@ -26,7 +26,17 @@ from .user import User
 from .influencer import Influencer, InfluencerFollower, PreInfluencer
 
 # Chat and messaging models
-from .chat import Chat, Message, Chat18, Message18, Memory, CallRecord
+from .chat import (
+    Chat,
+    Message,
+    Chat18,
+    Message18,
+    MessageEmbedding,
+    Message18Embedding,
+    Memory,
+    MemoryConsolidationAudit,
+    CallRecord,
+)
 
 # Billing and subscription models
 from .billing import (
@@ -34,7 +44,12 @@ from .billing import (
     Pricing,
     InfluencerWallet,
     InfluencerCreditTransaction,
+    CreditLedgerDaily,
     DailyUsage,
+    CreditReservation,
+    WalletReconcileCheckpoint,
+    WalletReconcileAudit,
+    WalletReconcileCursor,
     InfluencerSubscriptionPlan,
     InfluencerSubscription,
     InfluencerSubscriptionAddonPurchase,
@@ -43,13 +58,13 @@ from .billing import (
 )
 
 # Relationship models
-from .relationship import RelationshipState
+from .relationship import RelationshipState, InfluencerRelationshipStats
 
 # Content moderation and engagement
 from .content import ContentViolation, ReEngagementLog
 
 # System models
-from .system import SystemPrompt
+from .system import SystemPrompt, ReembedCheckpoint
 
 # Verification models
 from .verification import IdentityVerification
@@ -69,14 +84,22 @@ __all__ = [
     "Message",
     "Chat18",
     "Message18",
+    "MessageEmbedding",
+    "Message18Embedding",
     "Memory",
+    "MemoryConsolidationAudit",
     "CallRecord",
     # Billing
     "Subscription",
     "Pricing",
     "InfluencerWallet",
     "InfluencerCreditTransaction",
+    "CreditLedgerDaily",
     "DailyUsage",
+    "CreditReservation",
+    "WalletReconcileCheckpoint",
+    "WalletReconcileAudit",
+    "WalletReconcileCursor",
     "InfluencerSubscriptionPlan",
     "InfluencerSubscription",
     "InfluencerSubscriptionAddonPurchase",
@@ -84,11 +107,13 @@ __all__ = [
     "PayPalTopUp",
     # Relationship
     "RelationshipState",
+    "InfluencerRelationshipStats",
     # Content
     "ContentViolation",
     "ReEngagementLog",
     # System
     "SystemPrompt",
+    "ReembedCheckpoint",
     # Verification
     "IdentityVerification",
 ]
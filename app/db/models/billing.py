@@ -1,9 +1,9 @@
 """Billing, subscription, and payment database models."""
 
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 
 from sqlalchemy import (
-    Integer, String, Boolean, Text, ForeignKey, DateTime, JSON, 
+    Integer, BigInteger, String, Boolean, Text, ForeignKey, Date, DateTime, JSON, 
     Index, UniqueConstraint
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -63,6 +63,9 @@ class InfluencerWallet(Base):
 
     # Single balance for all credits (subscription + add-ons)
     balance_cents: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Part of the balance held by open text reservations; only text charges
+    # treat it as spent, and it is debited when the reservation settles
+    held_cents: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
@@ -80,11 +83,19 @@ class InfluencerWallet(Base):
     __table_args__ = (
         UniqueConstraint("user_id", "influencer_id", "is_18", name="uq_user_influencer_wallet_mode"),
         Index("ix_infl_wallet_user_infl_mode", "user_id", "influencer_id", "is_18"),
+        Index("ix_infl_wallet_updated_at", "updated_at"),
     )
 
 
 class InfluencerCreditTransaction(Base):
-    """Individual credit transaction for billing."""
+    """
+    Individual credit transaction for billing.
+
+    Range-partitioned by month on created_at (app/services/ledger.py keeps
+    partitions ahead of time and archives old ones), so created_at is part
+    of the primary key. Every insert/delete is folded into CreditLedgerDaily
+    by a trigger.
+    """
     
     __tablename__ = "influencer_credit_transactions"
 
@@ -100,12 +111,34 @@ class InfluencerCreditTransaction(Base):
     
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
+        primary_key=True,
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
     )
 
     __table_args__ = (
         Index("ix_infl_tx_user_infl_ts", "user_id", "influencer_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+class CreditLedgerDaily(Base):
+    """Per-day ledger totals per (user, influencer, feature); trigger-maintained."""
+
+    __tablename__ = "credit_ledger_daily"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    influencer_id: Mapped[str] = mapped_column(ForeignKey("influencers.id", ondelete="CASCADE"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    feature: Mapped[str] = mapped_column(String, primary_key=True)
+
+    tx_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    units: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    debit_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    credit_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_credit_ledger_daily_influencer_day", "influencer_id", "day"),
     )
 
 
@@ -129,6 +162,102 @@ class DailyUsage(Base):
     live_secs: Mapped[int] = mapped_column(Integer, default=0)
 
 
+class CreditReservation(Base):
+    """Block of credits held from a wallet for one chat session."""
+
+    __tablename__ = "credit_reservations"
+
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    influencer_id: Mapped[str] = mapped_column(ForeignKey("influencers.id", ondelete="CASCADE"))
+    is_18: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="false")
+    feature: Mapped[str] = mapped_column(String, nullable=False)
+
+    # daily_usage row the used units are counted on when the block settles
+    usage_date: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    units_reserved: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Free units granted with the block; new blocks are all paid, free units
+    # are claimed per message instead
+    free_units: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unit_price_cents: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    held_cents: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    status: Mapped[str] = mapped_column(String, nullable=False, default="open", server_default="open")
+    units_used: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    charged_cents: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    settled_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_credit_reservations_status_expires", "status", "expires_at"),
+    )
+
+
+class WalletReconcileCheckpoint(Base):
+    """
+    How far a (user, influencer) pair's wallets have been reconciled against
+    the ledger. Both is_18 wallets are checked together because ledger rows
+    don't carry the mode.
+    """
+
+    __tablename__ = "wallet_reconcile_checkpoints"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    influencer_id: Mapped[str] = mapped_column(ForeignKey("influencers.id", ondelete="CASCADE"), primary_key=True)
+
+    last_tx_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Newest ledger created_at covered by last_tx_id; bounds the partitions read
+    last_created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Balance implied by the ledger up to last_tx_id (opening balance included)
+    ledger_sum_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    # Balance the pair had before it was first reconciled and wasn't ledgered
+    opening_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    drift_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    checked_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
+class WalletReconcileAudit(Base):
+    """A change in a pair's wallet/ledger drift, as found by the reconciler."""
+
+    __tablename__ = "wallet_reconcile_audit"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    influencer_id: Mapped[str] = mapped_column(ForeignKey("influencers.id", ondelete="CASCADE"))
+    balance_cents: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    held_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    expected_cents: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    drift_cents: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    previous_drift_cents: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    last_tx_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    detected_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+        index=True,
+    )
+
+
+class WalletReconcileCursor(Base):
+    """Single row: how far the reconciler has scanned the ledger and wallets."""
+
+    __tablename__ = "wallet_reconcile_cursor"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, default=1)
+    ledger_tx_id: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    wallets_scanned_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
 class InfluencerSubscriptionPlan(Base):
     """Available subscription plan definitions."""
     
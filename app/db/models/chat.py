@@ -45,7 +45,6 @@ class Message(Base):
     content: Mapped[str] = mapped_column(Text)
     audio_url: Mapped[str] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    embedding: Mapped[list[float]] = mapped_column(Vector(1536), nullable=True)
     conversation_id: Mapped[str | None] = mapped_column(ForeignKey("calls.conversation_id"), nullable=True)
     
     # Relationships
@@ -81,7 +80,43 @@ class Message18(Base):
         DateTime(timezone=True), 
         default=lambda: datetime.now(timezone.utc)
     )
-    embedding: Mapped[list[float] | None] = mapped_column(Vector(1536), nullable=True)
+
+
+class MessageEmbedding(Base):
+    """
+    Vector embedding for a message, stored apart from the messages table.
+
+    Keeping the 1536-dim vector out of `messages` keeps history pages and
+    context reads narrow; only semantic search joins this table.
+    """
+
+    __tablename__ = "message_embeddings"
+
+    message_id: Mapped[int] = mapped_column(
+        ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True
+    )
+    chat_id: Mapped[str] = mapped_column(String, index=True)
+    embedding: Mapped[list[float]] = mapped_column(Vector(1536))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class Message18Embedding(Base):
+    """Vector embedding for an adult (18+) message, stored apart from messages_18."""
+
+    __tablename__ = "message_18_embeddings"
+
+    message_id: Mapped[int] = mapped_column(
+        ForeignKey("messages_18.id", ondelete="CASCADE"), primary_key=True
+    )
+    chat_id: Mapped[str] = mapped_column(String, index=True)
+    embedding: Mapped[list[float]] = mapped_column(Vector(1536))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc)
+    )
 
 
 class Memory(Base):
@@ -100,6 +135,28 @@ class Memory(Base):
     )
 
 
+class MemoryConsolidationAudit(Base):
+    """A memory removed by the consolidation job, kept whole so it can be restored."""
+
+    __tablename__ = "memory_consolidation_audit"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    run_id: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    memory_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    chat_id: Mapped[str] = mapped_column(String, nullable=False, index=True)
+    content: Mapped[str | None] = mapped_column(Text, nullable=True)
+    embedding = mapped_column(Vector(1536), nullable=True)
+    sender: Mapped[str | None] = mapped_column(String, nullable=True)
+    memory_created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    reason: Mapped[str] = mapped_column(String, nullable=False)  # 'merged' or 'evicted'
+    merged_into: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    removed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
+
+
 class CallRecord(Base):
     """Voice call session record."""
     
@@ -2,7 +2,7 @@
 
 from datetime import datetime, timezone
 
-from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, Float, Index
+from sqlalchemy import Integer, String, Boolean, ForeignKey, DateTime, Float, Index, JSON
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -29,6 +29,7 @@ class RelationshipState(Base):
     # Define The Relationship (DTR) tracking
     exclusive_agreed: Mapped[bool] = mapped_column(Boolean, default=False)
     girlfriend_confirmed: Mapped[bool] = mapped_column(Boolean, default=False)
+    girlfriend_confirmed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     dtr_stage: Mapped[int] = mapped_column(Integer, default=0)
     dtr_cooldown_until: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -38,6 +39,9 @@ class RelationshipState(Base):
     sentiment_score: Mapped[float] = mapped_column(Float, default=0.0)
     sentiment_delta: Mapped[float] = mapped_column(Float, default=0.0)
 
+    # Idle days already decayed since last_interaction_at (nightly job / lazy path)
+    decayed_idle_days: Mapped[float] = mapped_column(Float, default=0.0, server_default="0")
+
     last_interaction_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
@@ -54,3 +58,26 @@ class RelationshipState(Base):
     __table_args__ = (
         Index("ix_rel_user_influencer", "user_id", "influencer_id", unique=True),
     )
+
+
+class InfluencerRelationshipStats(Base):
+    """
+    Snapshot of the per-influencer relationship counters kept in Redis
+    (app/relationship/aggregates.py); rewritten exactly by the nightly reconcile.
+    """
+
+    __tablename__ = "influencer_relationship_stats"
+
+    influencer_id: Mapped[str] = mapped_column(
+        ForeignKey("influencers.id", ondelete="CASCADE"), primary_key=True
+    )
+    fans: Mapped[int] = mapped_column(Integer, default=0)
+    stage_counts: Mapped[dict] = mapped_column(JSON, default=dict)
+    sentiment_sum: Mapped[float] = mapped_column(Float, default=0.0)
+    # ISO week ("2026-W42") the new_girlfriends counter belongs to
+    girlfriends_week: Mapped[str | None] = mapped_column(String, nullable=True)
+    new_girlfriends: Mapped[int] = mapped_column(Integer, default=0)
+    snapshot_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    reconciled_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
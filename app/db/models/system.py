@@ -2,7 +2,7 @@
 
 from datetime import datetime, timezone
 
-from sqlalchemy import String, Text, DateTime
+from sqlalchemy import String, Text, DateTime, BigInteger
 from sqlalchemy.orm import Mapped, mapped_column
 
 from .base import Base
@@ -28,3 +28,21 @@ class SystemPrompt(Base):
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
     )
+
+
+class ReembedCheckpoint(Base):
+    """Progress of a resumable re-embedding run (see app.services.reembed)."""
+
+    __tablename__ = "reembed_checkpoints"
+
+    job: Mapped[str] = mapped_column(String, primary_key=True)
+    target: Mapped[str] = mapped_column(String, nullable=False)
+    last_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    processed: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
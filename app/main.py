@@ -29,6 +29,9 @@ from app.api import system_prompts as system_prompts_router
 
 from .api import health_router
 from app.scheduler import start_scheduler, stop_scheduler
+from app.services.embedding_writer import start_embedding_writer, stop_embedding_writer
+from app.relationship.state_cache import start_relationship_flusher, stop_relationship_flusher
+from app.services.reengagement_events import start_reengagement_worker, stop_reengagement_worker
 
 log = logging.getLogger("teaseme")
 logging.basicConfig(
@@ -41,18 +44,36 @@ origins = [origin.strip() for origin in origins_str.split(",") if origin.strip()
 
 
 from app.utils.infrastructure.redis_pool import close_redis
-from app.api.elevenlabs import close_elevenlabs_client
+from app.utils.infrastructure.elevenlabs_client import close_elevenlabs_client
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     log.info("Starting re-engagement scheduler...")
     start_scheduler()
+
+    log.info("Starting embedding writer...")
+    start_embedding_writer()
+
+    log.info("Starting relationship state flusher...")
+    start_relationship_flusher()
+
+    log.info("Starting re-engagement event worker...")
+    start_reengagement_worker()
     
     yield
     
     log.info("Stopping re-engagement scheduler...")
     stop_scheduler()
+
+    log.info("Draining embedding writer...")
+    await stop_embedding_writer()
+
+    log.info("Draining re-engagement event worker...")
+    await stop_reengagement_worker()
+
+    log.info("Flushing relationship state cache...")
+    await stop_relationship_flusher()
     
     log.info("Closing Redis connection pool...")
     await close_redis()
@@ -12,7 +12,9 @@ Main entry point is `process_relationship_turn` in processor.py.
 """
 
 from .processor import process_relationship_turn
+from .call_processor import process_call_relationship
 from .repo import get_or_create_relationship, get_relationship_payload
+from .state_cache import load_relationship, save_relationship, flush_dirty_relationships
 from .engine import Signals, RelOut, update_relationship, compute_state
 from .signals import classify_signals
 from .dtr import plan_dtr_goal
@@ -21,8 +23,12 @@ from .inactivity import apply_inactivity_decay, check_and_trigger_reengagement
 __all__ = [
     # Main functions
     "process_relationship_turn",
+    "process_call_relationship",
     "get_or_create_relationship",
     "get_relationship_payload",
+    "load_relationship",
+    "save_relationship",
+    "flush_dirty_relationships",
     
     # Core engine
     "Signals",
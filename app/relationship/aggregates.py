@@ -0,0 +1,300 @@
+"""
+Per-influencer relationship counters for dashboards.
+
+Fans by stage, summed sentiment and new girlfriends this week are kept in a
+Redis hash per influencer (relagg:{influencer_id}) and updated incrementally:
+save_relationship queues the deltas between the state a turn loaded and the
+state it saves in the same MULTI round trip, and a newly created
+relationship_state row bumps its influencer's fan count. Reads are one
+HGETALL.
+
+- snapshot_relationship_aggregates copies the hashes into
+  influencer_relationship_stats periodically, so a Redis loss falls back to
+  recent numbers instead of a full-table scan.
+- reconcile_relationship_aggregates recomputes everything from
+  relationship_state nightly (one GROUP BY) and overwrites both, which also
+  corrects drift from direct edits (admin patch, Redis fallback writes).
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.models import InfluencerRelationshipStats, RelationshipState
+from app.db.session import SessionLocal
+from app.utils.infrastructure.redis_pool import get_redis
+
+log = logging.getLogger("relationship-aggregates")
+
+STAGES = ["HATE", "DISLIKE", "STRANGERS", "FRIENDS", "FLIRTING", "DATING", "GIRLFRIEND"]
+
+# Reset the weekly girlfriend counter when the ISO week rolls over, then count
+_GIRLFRIEND_LUA = """
+if redis.call('HGET', KEYS[1], 'gf_week') ~= ARGV[1] then
+    redis.call('HSET', KEYS[1], 'gf_week', ARGV[1], 'gf_new', 0)
+end
+return redis.call('HINCRBY', KEYS[1], 'gf_new', 1)
+"""
+
+_last_reconcile: dict = {}
+
+
+@dataclass(slots=True)
+class AggregateSnapshot:
+    state: str
+    sentiment: float
+    girlfriend: bool
+
+
+def agg_key(influencer_id: str) -> str:
+    return f"relagg:{influencer_id}"
+
+
+def iso_week(now: datetime) -> str:
+    year, week, _ = now.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_start(now: datetime) -> datetime:
+    day = now.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+
+def aggregate_snapshot(rel) -> AggregateSnapshot:
+    """The fields the counters track, taken right after a turn loads `rel`."""
+    return AggregateSnapshot(
+        state=rel.state or "STRANGERS",
+        sentiment=float(rel.sentiment_score or 0.0),
+        girlfriend=bool(rel.girlfriend_confirmed),
+    )
+
+
+def queue_counter_updates(pipe, before: AggregateSnapshot, rel, now: datetime) -> None:
+    """Add the counter deltas between `before` and `rel` to a Redis pipeline."""
+    key = agg_key(rel.influencer_id)
+    after = aggregate_snapshot(rel)
+    if after.state != before.state:
+        pipe.hincrby(key, f"stage:{before.state}", -1)
+        pipe.hincrby(key, f"stage:{after.state}", 1)
+    if after.sentiment != before.sentiment:
+        pipe.hincrbyfloat(key, "sentiment_sum", after.sentiment - before.sentiment)
+    if after.girlfriend and not before.girlfriend:
+        pipe.eval(_GIRLFRIEND_LUA, 1, key, iso_week(now))
+
+
+async def record_new_fan(influencer_id: str, state: str = "STRANGERS", sentiment: float = 0.0) -> None:
+    """Count a freshly created relationship_state row; best effort."""
+    try:
+        r = await get_redis()
+        key = agg_key(influencer_id)
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, "fans", 1)
+            pipe.hincrby(key, f"stage:{state}", 1)
+            if sentiment:
+                pipe.hincrbyfloat(key, "sentiment_sum", sentiment)
+            await pipe.execute()
+    except Exception as exc:
+        log.warning("[RELAGG] new fan count failed infl=%s err=%s", influencer_id, exc)
+
+
+def _format(influencer_id: str, fans: int, stage_counts: dict, sentiment_sum: float,
+            gf_week: str | None, gf_new: int, source: str, now: datetime) -> dict:
+    return {
+        "influencer_id": influencer_id,
+        "fans": fans,
+        "by_stage": {s: int(stage_counts.get(s, 0)) for s in STAGES},
+        "avg_sentiment": round(sentiment_sum / fans, 2) if fans else 0.0,
+        "new_girlfriends_this_week": gf_new if gf_week == iso_week(now) else 0,
+        "week": iso_week(now),
+        "source": source,
+    }
+
+
+def _from_hash(raw: dict) -> tuple[int, dict, float, str | None, int]:
+    stage_counts = {k[len("stage:"):]: int(v) for k, v in raw.items() if k.startswith("stage:")}
+    return (
+        int(raw.get("fans") or 0),
+        stage_counts,
+        float(raw.get("sentiment_sum") or 0.0),
+        raw.get("gf_week"),
+        int(raw.get("gf_new") or 0),
+    )
+
+
+async def _compute_from_db(db, now: datetime, influencer_ids: list[str] | None = None) -> dict[str, dict]:
+    """Exact counters per influencer from relationship_state."""
+    t = RelationshipState.__table__
+    stmt = select(
+        t.c.influencer_id,
+        t.c.state,
+        func.count().label("n"),
+        func.coalesce(func.sum(t.c.sentiment_score), 0.0).label("sentiment"),
+        func.count().filter(t.c.girlfriend_confirmed_at >= week_start(now)).label("gf_new"),
+    ).group_by(t.c.influencer_id, t.c.state)
+    if influencer_ids is not None:
+        stmt = stmt.where(t.c.influencer_id.in_(influencer_ids))
+
+    out: dict[str, dict] = {}
+    for row in (await db.execute(stmt)).all():
+        agg = out.setdefault(
+            row.influencer_id, {"fans": 0, "stage_counts": {}, "sentiment_sum": 0.0, "gf_new": 0}
+        )
+        agg["fans"] += int(row.n)
+        agg["stage_counts"][row.state or "STRANGERS"] = int(row.n)
+        agg["sentiment_sum"] += float(row.sentiment)
+        agg["gf_new"] += int(row.gf_new)
+    return out
+
+
+async def _write_hash(r, influencer_id: str, agg: dict, now: datetime) -> None:
+    mapping = {
+        "fans": agg["fans"],
+        "sentiment_sum": agg["sentiment_sum"],
+        "gf_week": iso_week(now),
+        "gf_new": agg["gf_new"],
+        **{f"stage:{s}": n for s, n in agg["stage_counts"].items()},
+    }
+    key = agg_key(influencer_id)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        await pipe.execute()
+
+
+async def _upsert_snapshots(db, rows: list[dict]) -> None:
+    if not rows:
+        return
+    stmt = pg_insert(InfluencerRelationshipStats).values(rows)
+    update_cols = [c for c in rows[0] if c != "influencer_id"]
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["influencer_id"],
+        set_={c: getattr(stmt.excluded, c) for c in update_cols},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+async def get_influencer_relationship_stats(db, influencer_id: str) -> dict:
+    """Counters for one influencer: Redis, else the last snapshot, else computed."""
+    now = datetime.now(timezone.utc)
+    try:
+        r = await get_redis()
+        raw = await r.hgetall(agg_key(influencer_id))
+    except Exception as exc:
+        log.warning("[RELAGG] redis read failed infl=%s err=%s", influencer_id, exc)
+        r, raw = None, {}
+
+    if raw:
+        return _format(influencer_id, *_from_hash(raw), source="live", now=now)
+
+    snap = await db.get(InfluencerRelationshipStats, influencer_id)
+    if snap is not None and r is None:
+        return _format(
+            influencer_id, snap.fans, snap.stage_counts or {}, snap.sentiment_sum,
+            snap.girlfriends_week, snap.new_girlfriends, source="snapshot", now=now,
+        )
+
+    # Cold Redis: compute this influencer once and seed the hash
+    agg = (await _compute_from_db(db, now, [influencer_id])).get(influencer_id)
+    if agg is None:
+        agg = {"fans": 0, "stage_counts": {}, "sentiment_sum": 0.0, "gf_new": 0}
+    if r is not None:
+        try:
+            await _write_hash(r, influencer_id, agg, now)
+        except Exception as exc:
+            log.warning("[RELAGG] seed failed infl=%s err=%s", influencer_id, exc)
+    return _format(
+        influencer_id, agg["fans"], agg["stage_counts"], agg["sentiment_sum"],
+        iso_week(now), agg["gf_new"], source="computed", now=now,
+    )
+
+
+async def snapshot_relationship_aggregates() -> int:
+    """Copy every Redis counter hash into influencer_relationship_stats."""
+    now = datetime.now(timezone.utc)
+    r = await get_redis()
+    rows = []
+    async for key in r.scan_iter(match="relagg:*", count=500):
+        raw = await r.hgetall(key)
+        if not raw:
+            continue
+        fans, stage_counts, sentiment_sum, gf_week, gf_new = _from_hash(raw)
+        rows.append({
+            "influencer_id": key[len("relagg:"):],
+            "fans": fans,
+            "stage_counts": stage_counts,
+            "sentiment_sum": sentiment_sum,
+            "girlfriends_week": gf_week,
+            "new_girlfriends": gf_new,
+            "snapshot_at": now,
+        })
+
+    async with SessionLocal() as db:
+        await _upsert_snapshots(db, rows)
+    log.info("[RELAGG] snapshot influencers=%d", len(rows))
+    return len(rows)
+
+
+async def reconcile_relationship_aggregates() -> dict:
+    """
+    Recompute every influencer's counters from relationship_state and
+    overwrite Redis and the snapshot table. Returns drift metrics.
+    """
+    global _last_reconcile
+    from app.relationship.state_cache import flush_dirty_relationships
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    try:
+        await flush_dirty_relationships()
+    except Exception as exc:
+        log.warning("[RELAGG] pre-reconcile cache flush failed: %s", exc)
+
+    async with SessionLocal() as db:
+        exact = await _compute_from_db(db, now)
+
+    r = await get_redis()
+    drifted, fan_drift = 0, 0
+    rows = []
+    for influencer_id, agg in exact.items():
+        live_fans, live_stages, _, _, _ = _from_hash(await r.hgetall(agg_key(influencer_id)))
+        if live_fans != agg["fans"] or any(
+            live_stages.get(s, 0) != agg["stage_counts"].get(s, 0) for s in STAGES
+        ):
+            drifted += 1
+            fan_drift += abs(live_fans - agg["fans"])
+        await _write_hash(r, influencer_id, agg, now)
+        rows.append({
+            "influencer_id": influencer_id,
+            "fans": agg["fans"],
+            "stage_counts": agg["stage_counts"],
+            "sentiment_sum": agg["sentiment_sum"],
+            "girlfriends_week": iso_week(now),
+            "new_girlfriends": agg["gf_new"],
+            "snapshot_at": now,
+            "reconciled_at": now,
+        })
+
+    async with SessionLocal() as db:
+        await _upsert_snapshots(db, rows)
+
+    _last_reconcile = {
+        "influencers": len(exact),
+        "drifted": drifted,
+        "fan_drift": fan_drift,
+        "duration_secs": round(time.perf_counter() - started, 2),
+        "finished_at": now.isoformat(),
+    }
+    log.info(
+        "[RELAGG] reconcile influencers=%d drifted=%d fan_drift=%d in %.1fs",
+        len(exact), drifted, fan_drift, _last_reconcile["duration_secs"],
+    )
+    return _last_reconcile
+
+
+def get_relationship_aggregate_stats() -> dict:
+    return {"last_reconcile": _last_reconcile or None}
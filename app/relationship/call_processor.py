@@ -0,0 +1,204 @@
+"""
+Call-level relationship processing for voice calls.
+
+Running process_relationship_turn per spoken utterance costs one LLM
+classification and one state write each, so a long call replays dozens of
+them back to back. Here a call's user utterances are classified together
+(classify_call_signals: local model first, then one LLM request per chunk),
+folded through the same pure engine step as chat turns (apply_turn_signals)
+in memory, and the state is saved once.
+
+Mid-call, /webhooks/update_relationship only buffers utterances in Redis and
+processes them once CALL_REL_FLUSH_UTTERANCES have accumulated; the
+post-call webhook processes whatever is left, or the full transcript when
+the tool was never called for that conversation. The post-call pass claims
+a per-conversation marker first (claim_post_call), so a redelivered webhook
+does not apply the call twice.
+"""
+
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from app.db.models import CallRecord, Influencer
+from app.db.session import SessionLocal
+from app.relationship.dtr import plan_dtr_goal
+from app.relationship.engine import Signals
+from app.relationship.inactivity import apply_inactivity_decay
+from app.relationship.processor import apply_turn_signals, persona_preferences
+from app.relationship.signals import classify_call_signals
+from app.relationship.state_cache import load_relationship, save_relationship
+from app.relationship.aggregates import aggregate_snapshot
+from app.services.reengagement_events import emit_user_returned
+from app.utils.infrastructure.redis_pool import get_redis
+
+log = logging.getLogger("teachme-relationship")
+
+CALL_REL_FLUSH_UTTERANCES = int(os.getenv("CALL_REL_FLUSH_UTTERANCES", "10"))
+CALL_REL_BUFFER_TTL_SECS = int(os.getenv("CALL_REL_BUFFER_TTL_SECS", "7200"))
+# How long a processed conversation is remembered against webhook redelivery
+CALL_REL_APPLIED_TTL_SECS = int(os.getenv("CALL_REL_APPLIED_TTL_SECS", str(3 * 86400)))
+
+
+def _buffer_key(conversation_id: str) -> str:
+    return f"callrel:{conversation_id}"
+
+
+def _seen_key(conversation_id: str) -> str:
+    return f"callrel:{conversation_id}:seen"
+
+
+def _applied_key(conversation_id: str) -> str:
+    return f"callrel:{conversation_id}:applied"
+
+
+async def _take_buffer(r, key: str) -> list[str]:
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        items, _ = await pipe.execute()
+    return items
+
+
+async def buffer_call_utterance(conversation_id: str, text: str) -> list[str]:
+    """
+    Buffer one mid-call utterance. Returns the buffered chunk (and clears it)
+    once CALL_REL_FLUSH_UTTERANCES are waiting, otherwise [].
+    """
+    key = _buffer_key(conversation_id)
+    r = await get_redis()
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.rpush(key, text)
+        pipe.expire(key, CALL_REL_BUFFER_TTL_SECS)
+        pipe.set(_seen_key(conversation_id), 1, ex=CALL_REL_BUFFER_TTL_SECS)
+        pending = (await pipe.execute())[0]
+
+    if int(pending) < CALL_REL_FLUSH_UTTERANCES:
+        return []
+    return await _take_buffer(r, key)
+
+
+async def claim_post_call(conversation_id: str) -> bool:
+    """True for the first post-call pass of a conversation, False on a redelivery."""
+    r = await get_redis()
+    return bool(await r.set(_applied_key(conversation_id), 1, nx=True, ex=CALL_REL_APPLIED_TTL_SECS))
+
+
+async def release_post_call(conversation_id: str) -> None:
+    """Let a later delivery retry; only safe when nothing was drained from the buffer."""
+    r = await get_redis()
+    await r.delete(_applied_key(conversation_id))
+
+
+async def drain_call_utterances(conversation_id: str) -> tuple[list[str], bool]:
+    """(utterances still buffered, whether the tool buffered anything this call)."""
+    r = await get_redis()
+    seen = bool(await r.exists(_seen_key(conversation_id)))
+    items = await _take_buffer(r, _buffer_key(conversation_id))
+    await r.delete(_seen_key(conversation_id))
+    return items, seen
+
+
+def split_transcript(entries: list[dict]) -> tuple[list[str], list[str | None]]:
+    """User utterances of an ElevenLabs transcript plus the agent line before each."""
+    utterances: list[str] = []
+    agent_lines: list[str | None] = []
+    last_agent: str | None = None
+    for entry in entries or []:
+        if not isinstance(entry, dict):
+            continue
+        text = (entry.get("message") or "").strip()
+        if not text:
+            continue
+        if entry.get("role") == "user":
+            utterances.append(text)
+            agent_lines.append(last_agent)
+            last_agent = None
+        else:
+            last_agent = text
+    return utterances, agent_lines
+
+
+async def apply_call_signals(
+    db,
+    user_id: int,
+    influencer_id: str,
+    signals: list[dict],
+    cid: str,
+) -> Dict[str, Any]:
+    """Fold per-utterance signals into the relationship in order and save once."""
+    now = datetime.now(timezone.utc)
+    rel = await load_relationship(db, int(user_id), influencer_id)
+
+    before = aggregate_snapshot(rel)
+    previous_interaction_at = rel.last_interaction_at
+    days_idle = apply_inactivity_decay(rel, now)
+    emit_user_returned(int(user_id), influencer_id, days_idle, previous_interaction_at)
+
+    sp_before, state_before = float(rel.stage_points or 0.0), rel.state
+    dims_before = (rel.trust, rel.closeness, rel.attraction, rel.safety)
+    can_ask = False
+    for sig_dict in signals:
+        can_ask = apply_turn_signals(rel, Signals(**sig_dict))["can_ask"]
+
+    dtr_goal = plan_dtr_goal(rel, can_ask)
+
+    if rel.girlfriend_confirmed and not before.girlfriend:
+        rel.girlfriend_confirmed_at = now
+    rel.last_interaction_at = now
+    rel.decayed_idle_days = 0.0
+    rel.updated_at = now
+
+    log.info(
+        "[REL %s] CALL utterances=%d t %.2f->%.2f c %.2f->%.2f a %.2f->%.2f s %.2f->%.2f sp %.2f->%.2f state %s->%s",
+        cid, len(signals),
+        dims_before[0], rel.trust, dims_before[1], rel.closeness,
+        dims_before[2], rel.attraction, dims_before[3], rel.safety,
+        sp_before, float(rel.stage_points or 0.0), state_before, rel.state,
+    )
+
+    await save_relationship(db, rel, before=before)
+
+    return {
+        "rel": rel,
+        "utterances": len(signals),
+        "days_idle": days_idle,
+        "dtr_goal": dtr_goal,
+        "can_ask": can_ask,
+        "timestamp": now,
+    }
+
+
+async def process_call_relationship(
+    conversation_id: str,
+    utterances: list[str],
+    convo_analyzer,
+    agent_lines: list[str | None] | None = None,
+) -> Dict[str, Any] | None:
+    """
+    Classify and apply a batch of a call's user utterances. Uses its own
+    session so it can run after the webhook has responded.
+    """
+    utterances = [u for u in utterances if u and u.strip()]
+    if not utterances:
+        return None
+
+    async with SessionLocal() as db:
+        call = await db.get(CallRecord, conversation_id)
+        if not call or not call.user_id or not call.influencer_id:
+            log.warning("[CALL-REL] no usable CallRecord conv=%s", conversation_id)
+            return None
+
+        influencer = await db.get(Influencer, call.influencer_id)
+        if influencer is None:
+            log.warning("[CALL-REL] influencer not found infl=%s conv=%s", call.influencer_id, conversation_id)
+            return None
+
+        persona_likes, persona_dislikes = persona_preferences(influencer)
+        signals = await classify_call_signals(
+            db, utterances, persona_likes, persona_dislikes, convo_analyzer, agent_lines=agent_lines
+        )
+        return await apply_call_signals(
+            db, int(call.user_id), call.influencer_id, signals, cid=f"el_{conversation_id}"[:16]
+        )
@@ -1,4 +1,3 @@
-import asyncio
 import logging
 from datetime import datetime
 from typing import TYPE_CHECKING
@@ -13,7 +12,36 @@ REENGAGEMENT_INACTIVE_DAYS = 3
 REENGAGEMENT_MIN_BALANCE_CENTS = 10_000  # $100
 
 
+# (dimension, min idle days, idle-day offset, points per day, cap) — shared with
+# the nightly set-based job in app/services/inactivity_decay.py
+DECAY_RULES = (
+    ("closeness", 2.0, 0.0, 1.5, 8.0),
+    ("attraction", 3.0, 0.0, 1.8, 10.0),
+    ("trust", 7.0, 6.0, 0.8, 5.0),
+)
+# Girlfriends get reduced decay rates (50% slower)
+GIRLFRIEND_DECAY_MULTIPLIER = 0.5
+# Past this many idle days every dimension has hit its cap for every row
+DECAY_SATURATION_DAYS = max(
+    offset + cap / (rate * GIRLFRIEND_DECAY_MULTIPLIER) for _, _, offset, rate, cap in DECAY_RULES
+)
+
+
+def decay_amount(days_idle: float, start: float, offset: float, rate: float, cap: float, multiplier: float) -> float:
+    """Total points a dimension loses over an absence of `days_idle` days."""
+    if days_idle < start:
+        return 0.0
+    return min(cap, (days_idle - offset) * rate * multiplier)
+
+
 def apply_inactivity_decay(rel, now: datetime) -> float:
+    """
+    Bring `rel` up to date with its current absence and return days idle.
+
+    Decay is a function of the whole absence, so only the part not yet applied
+    (by the nightly job or an earlier call) is subtracted: the nightly job
+    records how far it got in decayed_idle_days, and a turn resets it to 0.
+    """
     last = rel.last_interaction_at or rel.updated_at
     if not last:
         return 0.0
@@ -22,18 +50,20 @@ def apply_inactivity_decay(rel, now: datetime) -> float:
     if days_idle < 2:
         return days_idle
 
-    # Girlfriends get reduced decay rates (50% slower)
+    already = float(getattr(rel, "decayed_idle_days", 0.0) or 0.0)
     is_girlfriend = getattr(rel, 'girlfriend_confirmed', False)
-    decay_multiplier = 0.5 if is_girlfriend else 1.0
-
-    rel.closeness = max(0.0, rel.closeness - min(8.0, days_idle * 1.5 * decay_multiplier))
-
-    if days_idle >= 3:
-        rel.attraction = max(0.0, rel.attraction - min(10.0, days_idle * 1.8 * decay_multiplier))
-
-    if days_idle >= 7:
-        rel.trust = max(0.0, rel.trust - min(5.0, (days_idle - 6) * 0.8 * decay_multiplier))
-
+    decay_multiplier = GIRLFRIEND_DECAY_MULTIPLIER if is_girlfriend else 1.0
+
+    for field, start, offset, rate, cap in DECAY_RULES:
+        if days_idle >= start:
+            amount = max(
+                0.0,
+                decay_amount(days_idle, start, offset, rate, cap, decay_multiplier)
+                - decay_amount(already, start, offset, rate, cap, decay_multiplier),
+            )
+            setattr(rel, field, max(0.0, getattr(rel, field) - amount))
+
+    rel.decayed_idle_days = max(already, days_idle)
     return days_idle
 
 
@@ -42,54 +72,74 @@ async def check_and_trigger_reengagement(
     user_id: int,
     influencer_id: str,
     days_idle: float,
+    last_interaction_at: datetime | None = None,
 ) -> bool:
+    """
+    Send a re-engagement notification if the pair qualifies.
+
+    Runs in the re-engagement worker (app/services/reengagement_events.py)
+    with its own session, never on the turn path. `last_interaction_at` is
+    the interaction before the return; without it the stored value is used.
+    Eligibility is read in one round trip.
+    """
     if days_idle < REENGAGEMENT_INACTIVE_DAYS:
         return False
 
-    from sqlalchemy import select, and_
-    from app.db.models import InfluencerWallet, ReEngagementLog, Influencer, Subscription
-
-    wallet_result = await db.execute(
-        select(InfluencerWallet).where(
-            InfluencerWallet.user_id == user_id,
-            InfluencerWallet.influencer_id == influencer_id,
+    from sqlalchemy import select, func, literal, DateTime
+    from app.db.models import InfluencerWallet, ReEngagementLog, Influencer, Subscription, RelationshipState
+
+    if last_interaction_at is not None:
+        last_expr = literal(last_interaction_at, DateTime(timezone=True))
+    else:
+        last_expr = (
+            select(RelationshipState.last_interaction_at)
+            .where(
+                RelationshipState.user_id == user_id,
+                RelationshipState.influencer_id == influencer_id,
+            )
+            .scalar_subquery()
         )
-    )
-    wallets = wallet_result.scalars().all()
-    
-    total_balance = sum(w.balance_cents or 0 for w in wallets)
-    
-    if total_balance < REENGAGEMENT_MIN_BALANCE_CENTS:
-        return False
 
-    from app.db.models import RelationshipState
-    rel_result = await db.execute(
-        select(RelationshipState.last_interaction_at).where(
-            RelationshipState.user_id == user_id,
-            RelationshipState.influencer_id == influencer_id,
+    row = (
+        await db.execute(
+            select(
+                select(func.coalesce(func.sum(InfluencerWallet.balance_cents), 0))
+                .where(
+                    InfluencerWallet.user_id == user_id,
+                    InfluencerWallet.influencer_id == influencer_id,
+                )
+                .scalar_subquery()
+                .label("balance"),
+                select(ReEngagementLog.id)
+                .where(
+                    ReEngagementLog.user_id == user_id,
+                    ReEngagementLog.influencer_id == influencer_id,
+                    ReEngagementLog.triggered_at > last_expr,
+                )
+                .exists()
+                .label("notified"),
+                select(Influencer.display_name)
+                .where(Influencer.id == influencer_id)
+                .scalar_subquery()
+                .label("influencer_name"),
+                select(Influencer.id)
+                .where(Influencer.id == influencer_id)
+                .exists()
+                .label("influencer_exists"),
+                select(Subscription.id)
+                .where(Subscription.user_id == user_id)
+                .exists()
+                .label("has_subscription"),
+            )
         )
-    )
-    last_interaction = rel_result.scalar()
-
-    if last_interaction:
-        log_result = await db.execute(
-            select(ReEngagementLog.id).where(
-                ReEngagementLog.user_id == user_id,
-                ReEngagementLog.influencer_id == influencer_id,
-                ReEngagementLog.triggered_at > last_interaction,
-            ).limit(1)
-        )
-        if log_result.scalar():
-            return False
+    ).one()
 
-    influencer = await db.get(Influencer, influencer_id)
-    if not influencer:
+    total_balance = int(row.balance or 0)
+    if total_balance < REENGAGEMENT_MIN_BALANCE_CENTS:
         return False
-
-    sub_result = await db.execute(
-        select(Subscription).where(Subscription.user_id == user_id).limit(1)
-    )
-    if not sub_result.scalar():
+    if row.notified or not row.influencer_exists:
+        return False
+    if not row.has_subscription:
         log.info(f"[RE-ENGAGE] User {user_id} has no push subscriptions, skipping")
         return False
 
@@ -100,17 +150,12 @@ async def check_and_trigger_reengagement(
         f"balance=${total_balance/100:.2f} days_idle={days_idle:.1f}"
     )
 
-    task = asyncio.create_task(
-        send_reengagement_notification(
-            db=db,
-            user_id=user_id,
-            influencer_id=influencer_id,
-            influencer_name=influencer.display_name,
-            balance_cents=total_balance,
-            days_inactive=int(days_idle),
-        )
+    await send_reengagement_notification(
+        db=db,
+        user_id=user_id,
+        influencer_id=influencer_id,
+        influencer_name=row.influencer_name,
+        balance_cents=total_balance,
+        days_inactive=int(days_idle),
     )
-    # Prevent garbage collection of background task
-    task.add_done_callback(lambda t: None)
-
     return True
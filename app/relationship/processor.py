@@ -3,11 +3,13 @@ from datetime import datetime, timezone
 from typing import Any, Dict, List
 
 from app.db.models import Influencer
-from app.relationship.repo import get_or_create_relationship
-from app.relationship.inactivity import apply_inactivity_decay, check_and_trigger_reengagement
+from app.relationship.state_cache import load_relationship, save_relationship
+from app.relationship.aggregates import aggregate_snapshot
+from app.relationship.inactivity import apply_inactivity_decay
 from app.relationship.signals import classify_signals
 from app.relationship.engine import Signals, update_relationship
 from app.relationship.dtr import plan_dtr_goal
+from app.services.reengagement_events import emit_user_returned
 
 log = logging.getLogger("teachme-relationship")
 
@@ -100,56 +102,13 @@ def compute_sentiment_delta(sig) -> float:
   return max(-3.0, min(2.0, d))
 
 
-async def process_relationship_turn(
-    *,
-    db,
-    user_id: int,
-    influencer_id: str,
-    message: str,
-    recent_ctx: str,
-    cid: str,
-    convo_analyzer,
-    influencer: Any | None = None,
-) -> Dict[str, Any]:
+def apply_turn_signals(rel, sig: Signals) -> Dict[str, Any]:
     """
-    Shared relationship update pipeline used by chat turns and webhooks.
-    Returns the updated RelationshipState plus derived metadata.
+    Apply one turn's signals to `rel` in place (sentiment, dimensions, stage
+    points, state and DTR flags). Pure: no I/O, so the vectorized engine and
+    simulator can be checked against it.
     """
-    now = datetime.now(timezone.utc)
-    log.info("[REL %s] START user_id=%s influencer_id=%s", cid, user_id, influencer_id)
-
-    rel = await get_or_create_relationship(db, int(user_id), influencer_id)
-
-    days_idle = apply_inactivity_decay(rel, now)
-
-    if days_idle >= 3:
-        await check_and_trigger_reengagement(
-            db=db,
-            user_id=int(user_id),
-            influencer_id=influencer_id,
-            days_idle=days_idle,
-        )
-
-    if influencer is None:
-        influencer = await db.get(Influencer, influencer_id)
-    if influencer is None:
-        raise ValueError(f"Influencer not found: {influencer_id}")
-
-    bio = influencer.bio_json or {}
-
-    persona_likes: List[str] = bio.get("likes", []) or []
-    persona_dislikes: List[str] = bio.get("dislikes", []) or []
-
-    if not isinstance(persona_likes, list):
-        persona_likes = []
-    if not isinstance(persona_dislikes, list):
-        persona_dislikes = []
-
-    sig_dict = await classify_signals(
-        db, message, recent_ctx, persona_likes, persona_dislikes, convo_analyzer
-    )
-    log.info("[%s] SIG_DICT=%s", cid, sig_dict)
-    sig = Signals(**sig_dict)
+    before = (rel.trust, rel.closeness, rel.attraction, rel.safety)
 
     d_sent = compute_sentiment_delta(sig)
     prev_sentiment = float(rel.sentiment_score or 0.0)
@@ -178,15 +137,6 @@ async def process_relationship_turn(
     else:
         out = update_relationship(rel.trust, rel.closeness, rel.attraction, rel.safety, rel.state, sig)
 
-    log.info(
-        "[%s] DIM before->after | t %.4f->%.4f c %.4f->%.4f a %.4f->%.4f s %.4f->%.4f",
-        cid,
-        rel.trust, out.trust,
-        rel.closeness, out.closeness,
-        rel.attraction, out.attraction,
-        rel.safety, out.safety,
-    )
-
     rel.trust = out.trust
     rel.closeness = out.closeness
     rel.attraction = out.attraction
@@ -232,6 +182,76 @@ async def process_relationship_turn(
         rel.exclusive_agreed = True
         rel.state = "GIRLFRIEND"
 
+    return {"before": before, "prev_sp": prev_sp, "delta": delta, "can_ask": can_ask}
+
+
+def persona_preferences(influencer) -> tuple[List[str], List[str]]:
+    """(likes, dislikes) from the influencer bio, tolerating malformed values."""
+    bio = influencer.bio_json or {}
+
+    persona_likes: List[str] = bio.get("likes", []) or []
+    persona_dislikes: List[str] = bio.get("dislikes", []) or []
+
+    if not isinstance(persona_likes, list):
+        persona_likes = []
+    if not isinstance(persona_dislikes, list):
+        persona_dislikes = []
+    return persona_likes, persona_dislikes
+
+
+async def process_relationship_turn(
+    *,
+    db,
+    user_id: int,
+    influencer_id: str,
+    message: str,
+    recent_ctx: str,
+    cid: str,
+    convo_analyzer,
+    influencer: Any | None = None,
+) -> Dict[str, Any]:
+    """
+    Shared relationship update pipeline used by chat turns and webhooks.
+    Returns the updated RelationshipState plus derived metadata.
+    """
+    now = datetime.now(timezone.utc)
+    log.info("[REL %s] START user_id=%s influencer_id=%s", cid, user_id, influencer_id)
+
+    rel = await load_relationship(db, int(user_id), influencer_id)
+
+    before = aggregate_snapshot(rel)
+    previous_interaction_at = rel.last_interaction_at
+    days_idle = apply_inactivity_decay(rel, now)
+
+    # Handled by the re-engagement worker; the turn never waits on it
+    emit_user_returned(int(user_id), influencer_id, days_idle, previous_interaction_at)
+
+    if influencer is None:
+        influencer = await db.get(Influencer, influencer_id)
+    if influencer is None:
+        raise ValueError(f"Influencer not found: {influencer_id}")
+
+    persona_likes, persona_dislikes = persona_preferences(influencer)
+
+    sig_dict = await classify_signals(
+        db, message, recent_ctx, persona_likes, persona_dislikes, convo_analyzer
+    )
+    log.info("[%s] SIG_DICT=%s", cid, sig_dict)
+    sig = Signals(**sig_dict)
+
+    turn = apply_turn_signals(rel, sig)
+    can_ask = turn["can_ask"]
+    prev_sp, delta = turn["prev_sp"], turn["delta"]
+
+    log.info(
+        "[%s] DIM before->after | t %.4f->%.4f c %.4f->%.4f a %.4f->%.4f s %.4f->%.4f",
+        cid,
+        turn["before"][0], rel.trust,
+        turn["before"][1], rel.closeness,
+        turn["before"][2], rel.attraction,
+        turn["before"][3], rel.safety,
+    )
+
     dtr_goal = plan_dtr_goal(rel, can_ask)
 
     log.info(
@@ -239,11 +259,14 @@ async def process_relationship_turn(
         cid, prev_sp, delta, rel.stage_points, rel.state, can_ask
     )
 
+    if rel.girlfriend_confirmed and not before.girlfriend:
+        rel.girlfriend_confirmed_at = now
     rel.last_interaction_at = now
+    rel.decayed_idle_days = 0.0
     rel.updated_at = now
 
     log.info(
-        "[REL %s] BEFORE COMMIT id=%s user=%s infl=%s trust=%.4f close=%.4f attr=%.4f safe=%.4f sp=%.2f state=%s sent=%.2f",
+        "[REL %s] SAVE id=%s user=%s infl=%s trust=%.4f close=%.4f attr=%.4f safe=%.4f sp=%.2f state=%s sent=%.2f",
         cid,
         getattr(rel, "id", None),
         rel.user_id,
@@ -254,18 +277,8 @@ async def process_relationship_turn(
         float(rel.sentiment_score or 0.0),
     )
 
-    db.add(rel)
-    await db.commit()
-    await db.refresh(rel)
-
-    log.info(
-        "[REL %s] AFTER COMMIT updated_at=%s trust=%.4f sp=%.2f state=%s",
-        cid,
-        rel.updated_at,
-        rel.trust,
-        float(rel.stage_points or 0.0),
-        rel.state,
-    )
+    # Write-behind: Redis now, relationship_state on the next flush
+    await save_relationship(db, rel, before=before)
 
     return {
         "rel": rel,
@@ -3,6 +3,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import RelationshipState
+from app.relationship.state_cache import peek_relationship
 
 
 async def get_or_create_relationship(db, user_id: int, influencer_id: str) -> RelationshipState:
@@ -67,7 +68,8 @@ async def get_relationship_payload(db: AsyncSession, user_id: int, influencer_id
     Returns:
         Dictionary with relationship state fields
     """
-    rel = await db.scalar(
+    # The cached copy is ahead of the row until the write-behind flush
+    rel = await peek_relationship(user_id, influencer_id) or await db.scalar(
         select(RelationshipState).where(
             RelationshipState.user_id == user_id,
             RelationshipState.influencer_id == influencer_id,
@@ -0,0 +1,207 @@
+"""
+Local relationship-signal classifier.
+
+A multi-output linear model over hashed word/bigram/char-trigram features,
+trained offline (app/scripts/train_signal_model.py) on logged
+(message, LLM signals) pairs. Weights are a NumPy array of shape
+(n_features, n_outputs); prediction is a sparse row gather plus a sigmoid and
+takes microseconds.
+
+classify_signals uses it to skip the CONVO_ANALYZER call when every output is
+far from the 0.5 boundary and no high-impact signal (hate,
+accepted_exclusive, accepted_girlfriend) looks even slightly likely. Without
+an artifact at SIGNAL_MODEL_PATH every turn goes to the LLM as before.
+"""
+
+import json
+import logging
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+log = logging.getLogger("signal-model")
+
+SIGNAL_MODEL_PATH = os.getenv("SIGNAL_MODEL_PATH", "")
+# Every output must be at least this far from 0.5 for the local answer to be used
+SIGNAL_MIN_MARGIN = float(os.getenv("SIGNAL_MIN_MARGIN", "0.3"))
+# Any high-impact output at or above this sends the turn to the LLM
+SIGNAL_HIGH_IMPACT_GUARD = float(os.getenv("SIGNAL_HIGH_IMPACT_GUARD", "0.1"))
+
+OUTPUT_KEYS = [
+    "support", "affection", "flirt", "respect", "apology", "commitment_talk",
+    "rude", "boundary_push", "dislike", "hate",
+    "accepted_exclusive", "accepted_girlfriend",
+]
+BOOL_KEYS = ("accepted_exclusive", "accepted_girlfriend")
+HIGH_IMPACT_KEYS = ("hate", "accepted_exclusive", "accepted_girlfriend")
+
+DEFAULT_N_FEATURES = 1 << 16
+
+# Redis list classify_signals appends (message, LLM signals) training pairs to
+SIGNAL_SAMPLES_KEY = "sig:samples"
+# Samples hold raw user text; the key expires and older samples are not trained on
+SIGNAL_SAMPLE_TTL_DAYS = int(os.getenv("SIGNAL_SAMPLE_TTL_DAYS", "14"))
+
+_WORD = re.compile(r"[^\W_]+(?:'[^\W_]+)?|[^\w\s]", re.UNICODE)
+
+
+def tokenize(message: str) -> list[str]:
+    words = _WORD.findall((message or "").lower())
+    feats = [f"w:{w}" for w in words]
+    feats += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        if len(w) > 2:
+            padded = f"<{w}>"
+            feats += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return feats
+
+
+def featurize(message: str, n_features: int = DEFAULT_N_FEATURES) -> tuple[np.ndarray, np.ndarray]:
+    """Hashed sparse features: (indices, L2-normalised values)."""
+    tokens = tokenize(message)
+    if not tokens:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    idx = np.fromiter((zlib.crc32(t.encode()) % n_features for t in tokens), dtype=np.int64, count=len(tokens))
+    uniq, counts = np.unique(idx, return_counts=True)
+    vals = counts.astype(np.float32)
+    vals /= np.linalg.norm(vals)
+    return uniq, vals
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+class SignalModel:
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, meta: dict | None = None):
+        self.weights = weights.astype(np.float32, copy=False)  # (n_features, n_outputs)
+        self.bias = bias.astype(np.float32, copy=False)
+        self.n_features = int(weights.shape[0])
+        self.meta = meta or {}
+
+    def predict_proba(self, message: str) -> np.ndarray:
+        idx, vals = featurize(message, self.n_features)
+        logits = self.bias + vals @ self.weights[idx] if idx.size else self.bias
+        return _sigmoid(logits)
+
+    def predict(self, message: str) -> tuple[dict, bool, str]:
+        """Return (signals, confident, reason); reason explains an LLM fallback."""
+        probs = self.predict_proba(message)
+        signals = {
+            k: (bool(p >= 0.5) if k in BOOL_KEYS else float(p))
+            for k, p in zip(OUTPUT_KEYS, probs)
+        }
+
+        for k in HIGH_IMPACT_KEYS:
+            if probs[OUTPUT_KEYS.index(k)] >= SIGNAL_HIGH_IMPACT_GUARD:
+                return signals, False, f"high_impact:{k}"
+        if float(np.min(np.abs(probs - 0.5))) < SIGNAL_MIN_MARGIN:
+            return signals, False, "low_confidence"
+        return signals, True, "confident"
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            meta=np.array(json.dumps({**self.meta, "keys": OUTPUT_KEYS})),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "SignalModel":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("keys") != OUTPUT_KEYS:
+                raise ValueError(f"signal model keys mismatch: {meta.get('keys')}")
+            return cls(data["weights"], data["bias"], meta)
+
+
+_model: SignalModel | None = None
+_model_loaded = False
+
+_stats: dict[str, float] = {
+    "local": 0,
+    "llm": 0,
+    "llm_low_confidence": 0,
+    "llm_high_impact": 0,
+    "llm_no_model": 0,
+    "shadow_compared": 0,
+    "shadow_agree": 0,
+    "shadow_abs_err_sum": 0.0,
+    "predict_us_total": 0.0,
+}
+
+
+def get_signal_model() -> SignalModel | None:
+    """Load the artifact once per process; None when unset or unreadable."""
+    global _model, _model_loaded
+    if _model_loaded:
+        return _model
+    _model_loaded = True
+    if not SIGNAL_MODEL_PATH:
+        return None
+    try:
+        _model = SignalModel.load(SIGNAL_MODEL_PATH)
+        log.info("[SIGMODEL] loaded %s features=%d meta=%s", SIGNAL_MODEL_PATH, _model.n_features, _model.meta.get("trained_at"))
+    except Exception as exc:
+        log.error("[SIGMODEL] failed to load %s: %s", SIGNAL_MODEL_PATH, exc)
+        _model = None
+    return _model
+
+
+def predict_local(message: str) -> tuple[dict | None, str]:
+    """Local signals if the model is confident, else (None, reason). Records metrics."""
+    model = get_signal_model()
+    if model is None:
+        _stats["llm"] += 1
+        _stats["llm_no_model"] += 1
+        return None, "no_model"
+
+    started = time.perf_counter()
+    signals, confident, reason = model.predict(message)
+    _stats["predict_us_total"] += (time.perf_counter() - started) * 1e6
+
+    if confident:
+        _stats["local"] += 1
+        return signals, reason
+
+    _stats["llm"] += 1
+    _stats["llm_high_impact" if reason.startswith("high_impact") else "llm_low_confidence"] += 1
+    return None, reason
+
+
+def _as_float(v) -> float:
+    try:
+        return float(v or 0.0)
+    except (TypeError, ValueError):
+        return 1.0 if str(v).lower() == "true" else 0.0
+
+
+def record_shadow_comparison(local: dict, llm: dict) -> None:
+    """Agreement between a confident local answer and the LLM on the same turn."""
+    errs = []
+    agree = True
+    for k in OUTPUT_KEYS:
+        a, b = _as_float(local.get(k)), _as_float(llm.get(k))
+        errs.append(abs(a - b))
+        agree &= (a >= 0.5) == (b >= 0.5)
+    _stats["shadow_compared"] += 1
+    _stats["shadow_agree"] += int(agree)
+    _stats["shadow_abs_err_sum"] += sum(errs) / len(errs)
+
+
+def get_signal_model_stats() -> dict:
+    predicted = _stats["local"] + _stats["llm"] - _stats["llm_no_model"]
+    compared = _stats["shadow_compared"]
+    model = get_signal_model()
+    return {
+        **_stats,
+        "local_ratio": round(_stats["local"] / (_stats["local"] + _stats["llm"]), 3) if (_stats["local"] + _stats["llm"]) else 0.0,
+        "avg_predict_us": round(_stats["predict_us_total"] / predicted, 1) if predicted else 0.0,
+        "shadow_agreement": round(_stats["shadow_agree"] / compared, 3) if compared else None,
+        "shadow_mae": round(_stats["shadow_abs_err_sum"] / compared, 4) if compared else None,
+        "model": model.meta if model else None,
+    }
@@ -1,6 +1,35 @@
+import asyncio
 import json
+import logging
+import os
+import random
+import time
+
 from app.services.system_prompt_service import get_system_prompt
 from app.constants import prompt_keys
+from app.data.prompts.relationship import RELATIONSHIP_CALL_SIGNAL_PROMPT
+from app.relationship.signal_model import (
+    OUTPUT_KEYS,
+    SIGNAL_SAMPLE_TTL_DAYS,
+    SIGNAL_SAMPLES_KEY,
+    predict_local,
+    record_shadow_comparison,
+)
+from app.utils.infrastructure.redis_pool import get_redis
+
+log = logging.getLogger("relationship-signals")
+
+# Fraction of LLM-classified turns logged as training data for the local model.
+# Samples hold raw user text, so logging is opt-in. 18+ turns never reach the
+# classifier (turn_handler_18 does no relationship scoring), so none are logged.
+SIGNAL_SAMPLE_RATE = float(os.getenv("SIGNAL_SAMPLE_RATE", "0"))
+SIGNAL_SAMPLE_MAX = int(os.getenv("SIGNAL_SAMPLE_MAX", "200000"))
+# Fraction of confident local answers still sent to the LLM to measure agreement
+SIGNAL_SHADOW_RATE = float(os.getenv("SIGNAL_SHADOW_RATE", "0.05"))
+# User utterances scored per LLM request by classify_call_signals
+CALL_SIGNAL_CHUNK_SIZE = int(os.getenv("CALL_SIGNAL_CHUNK_SIZE", "20"))
+
+_sample_tasks: set[asyncio.Task] = set()
 
 DEFAULT = {
     "support": 0.0, "affection": 0.0, "flirt": 0.0, "respect": 0.0,
@@ -30,21 +59,25 @@ async def classify_signals(
     recent_ctx: str,
     persona_likes: list[str],
     persona_dislikes: list[str],
-    llm
+    llm,
 ) -> dict:
-    prompt_template = await get_system_prompt(db, prompt_keys.RELATIONSHIP_SIGNAL_PROMPT)
-    prompt = prompt_template.format(
-        persona_likes=persona_likes,
-        persona_dislikes=persona_dislikes,
-        recent_ctx=recent_ctx,
-        message=message
-    )
-    try:
-        r = await llm.ainvoke(prompt)
-        data = json.loads((r.content or "").strip())
-    except Exception:
-        data = {}
+    local, _reason = predict_local(message)
+    shadow = local is not None and random.random() < SIGNAL_SHADOW_RATE
 
+    if local is not None and not shadow:
+        data = local
+    else:
+        data = await _classify_with_llm(db, message, recent_ctx, persona_likes, persona_dislikes, llm)
+        if data:
+            _log_training_sample(message, data)
+            if shadow:
+                record_shadow_comparison(local, data)
+
+    return normalize_signals(data, message)
+
+
+def normalize_signals(data: dict, message: str) -> dict:
+    """Clamp raw scores to the DEFAULT schema and damp them for short messages."""
     out = dict(DEFAULT)
     for k in NUM_KEYS:
         out[k] = _clampf(data.get(k, 0.0))
@@ -65,3 +98,139 @@ async def classify_signals(
         out[k] *= scale
 
     return out
+
+
+async def _classify_with_llm(db, message, recent_ctx, persona_likes, persona_dislikes, llm) -> dict:
+    prompt_template = await get_system_prompt(db, prompt_keys.RELATIONSHIP_SIGNAL_PROMPT)
+    prompt = prompt_template.format(
+        persona_likes=persona_likes,
+        persona_dislikes=persona_dislikes,
+        recent_ctx=recent_ctx,
+        message=message
+    )
+    try:
+        r = await llm.ainvoke(prompt)
+        return json.loads((r.content or "").strip())
+    except Exception:
+        return {}
+
+
+async def classify_call_signals(
+    db,
+    utterances: list[str],
+    persona_likes: list[str],
+    persona_dislikes: list[str],
+    llm,
+    agent_lines: list[str | None] | None = None,
+    chunk_size: int = CALL_SIGNAL_CHUNK_SIZE,
+) -> list[dict]:
+    """
+    Signals for every user utterance of a call, in order.
+
+    Confident local predictions are used as-is; the rest are scored
+    `chunk_size` at a time, one LLM request per chunk (chunks run
+    concurrently). `agent_lines[i]` is the influencer line before utterance i
+    and is passed as context only. Utterances the LLM did not score get
+    neutral signals.
+    """
+    raw: list[dict] = [{} for _ in utterances]
+    pending: list[int] = []
+    for i, message in enumerate(utterances):
+        local, _reason = predict_local(message)
+        if local is not None:
+            raw[i] = local
+        else:
+            pending.append(i)
+
+    if pending:
+        prompt_template = (
+            await get_system_prompt(db, prompt_keys.RELATIONSHIP_CALL_SIGNAL_PROMPT)
+            or RELATIONSHIP_CALL_SIGNAL_PROMPT
+        )
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        scored = await asyncio.gather(*(
+            _classify_chunk_with_llm(
+                prompt_template,
+                [utterances[i] for i in chunk],
+                [agent_lines[i] if agent_lines else None for i in chunk],
+                persona_likes,
+                persona_dislikes,
+                llm,
+            )
+            for chunk in chunks
+        ))
+        for chunk, rows in zip(chunks, scored):
+            for n, idx in enumerate(chunk, start=1):
+                data = rows.get(n)
+                if data:
+                    raw[idx] = data
+                    _log_training_sample(utterances[idx], data)
+
+        log.info(
+            "[CALL-SIG] utterances=%d local=%d llm_calls=%d",
+            len(utterances), len(utterances) - len(pending), len(chunks),
+        )
+
+    return [normalize_signals(data, message) for data, message in zip(raw, utterances)]
+
+
+async def _classify_chunk_with_llm(
+    prompt_template, messages, agent_lines, persona_likes, persona_dislikes, llm
+) -> dict[int, dict]:
+    lines = []
+    for n, (message, agent) in enumerate(zip(messages, agent_lines), start=1):
+        if agent:
+            lines.append(f"A: {agent}")
+        lines.append(f"U{n}: {message}")
+
+    prompt = prompt_template.format(
+        count=len(messages),
+        persona_likes=persona_likes,
+        persona_dislikes=persona_dislikes,
+        transcript="\n".join(lines),
+    )
+    try:
+        r = await llm.ainvoke(prompt)
+        rows = json.loads((r.content or "").strip()).get("signals") or []
+    except Exception as exc:
+        log.warning("[CALL-SIG] chunk of %d failed: %s", len(messages), exc)
+        return {}
+
+    out: dict[int, dict] = {}
+    for row in rows:
+        if not isinstance(row, list) or len(row) != len(OUTPUT_KEYS) + 1:
+            continue
+        try:
+            n = int(row[0])
+        except (TypeError, ValueError):
+            continue
+        out[n] = {
+            k: (_clampf(v) >= 0.5 if k in ("accepted_exclusive", "accepted_girlfriend") else v)
+            for k, v in zip(OUTPUT_KEYS, row[1:])
+        }
+    return out
+
+
+def _log_training_sample(message: str, data: dict) -> None:
+    """Fire-and-forget push of (message, raw LLM scores) for train_signal_model."""
+    if random.random() >= SIGNAL_SAMPLE_RATE:
+        return
+
+    async def _push():
+        try:
+            r = await get_redis()
+            sample = json.dumps(
+                {"message": message, "signals": data, "ts": int(time.time())},
+                ensure_ascii=False,
+            )
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.lpush(SIGNAL_SAMPLES_KEY, sample)
+                pipe.ltrim(SIGNAL_SAMPLES_KEY, 0, SIGNAL_SAMPLE_MAX - 1)
+                pipe.expire(SIGNAL_SAMPLES_KEY, SIGNAL_SAMPLE_TTL_DAYS * 86400)
+                await pipe.execute()
+        except Exception as exc:
+            log.debug("signal sample log failed: %s", exc)
+
+    task = asyncio.create_task(_push())
+    _sample_tasks.add(task)
+    task.add_done_callback(_sample_tasks.discard)
@@ -0,0 +1,402 @@
+"""
+Write-behind Redis cache for relationship_state.
+
+Every chat/webhook turn used to SELECT, UPDATE, COMMIT and REFRESH the same
+relationship_state row. Now the hot copy lives in a Redis hash per
+user x influencer:
+
+- load_relationship: HGETALL; on a miss the row is fetched (or created) with a
+  single INSERT ... ON CONFLICT DO NOTHING RETURNING and seeded into Redis.
+- save_relationship: one MULTI round trip that writes the hash, bumps its
+  version/pending counters, refreshes the TTL and marks the key dirty.
+- The flusher bulk-upserts dirty hashes into relationship_state every
+  REL_FLUSH_INTERVAL_SECS, or immediately for a key with
+  REL_FLUSH_AFTER_UPDATES pending updates. A key only leaves the dirty set if
+  its version did not change while it was being flushed.
+
+Durability: Postgres lags Redis by at most REL_FLUSH_INTERVAL_SECS. An app
+crash loses nothing (the dirty set is in Redis and is flushed on the next
+start); losing Redis itself loses at most that window of updates. When
+Redis is unreachable both paths fall back to reading/writing the row directly.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.models import RelationshipState
+from app.db.session import SessionLocal
+from app.relationship.aggregates import AggregateSnapshot, queue_counter_updates, record_new_fan
+from app.utils.infrastructure.redis_pool import get_redis
+
+log = logging.getLogger("relationship-cache")
+
+REL_CACHE_TTL_SECS = int(os.getenv("REL_CACHE_TTL_SECS", "86400"))
+REL_FLUSH_INTERVAL_SECS = float(os.getenv("REL_FLUSH_INTERVAL_SECS", "5"))
+REL_FLUSH_AFTER_UPDATES = int(os.getenv("REL_FLUSH_AFTER_UPDATES", "20"))
+REL_FLUSH_BATCH = int(os.getenv("REL_FLUSH_BATCH", "500"))
+
+DIRTY_KEY = "rel:dirty"
+
+_FLOAT_FIELDS = ("trust", "closeness", "attraction", "safety", "stage_points", "sentiment_score", "sentiment_delta", "decayed_idle_days")
+_BOOL_FIELDS = ("exclusive_agreed", "girlfriend_confirmed")
+_INT_FIELDS = ("id", "user_id", "dtr_stage")
+_DT_FIELDS = ("dtr_cooldown_until", "girlfriend_confirmed_at", "last_interaction_at", "created_at", "updated_at")
+_STR_FIELDS = ("influencer_id", "state")
+_FIELDS = _INT_FIELDS + _STR_FIELDS + _FLOAT_FIELDS + _BOOL_FIELDS + _DT_FIELDS
+
+# Columns the flusher may overwrite; identity and created_at stay as in Postgres
+_UPSERT_FIELDS = tuple(f for f in _FIELDS if f not in ("id", "user_id", "influencer_id", "created_at"))
+
+# Seed the hash only if no other worker got there first, then return it
+_SEED_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+    redis.call('HSET', KEYS[1], '_ver', 0, '_pending', 0)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# Clear the dirty mark only if nothing was written since we read the hash
+_ACK_LUA = """
+local ver = redis.call('HGET', KEYS[1], '_ver')
+if ver == false or ver == ARGV[1] then
+    if ver ~= false then redis.call('HSET', KEYS[1], '_pending', 0) end
+    redis.call('ZREM', KEYS[2], KEYS[1])
+    return 1
+end
+return 0
+"""
+
+# Delete a cached hash unless it has unflushed writes
+_DROP_CLEAN_LUA = """
+if redis.call('ZSCORE', KEYS[2], KEYS[1]) == false then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_flusher_task: asyncio.Task | None = None
+_inline_flushes: set[asyncio.Task] = set()
+_stats: dict[str, float] = {
+    "hits": 0,
+    "misses": 0,
+    "saves": 0,
+    "flushed_rows": 0,
+    "flushes": 0,
+    "fallback_writes": 0,
+    "last_flush_ms": 0.0,
+}
+
+
+def _key(user_id: int, influencer_id: str) -> str:
+    return f"rel:{int(user_id)}:{influencer_id}"
+
+
+def _default_values(user_id: int, influencer_id: str, now: datetime) -> dict:
+    return {
+        "user_id": user_id,
+        "influencer_id": influencer_id,
+        "trust": 10.0,
+        "closeness": 10.0,
+        "attraction": 5.0,
+        "safety": 95.0,
+        "state": "STRANGERS",
+        "exclusive_agreed": False,
+        "girlfriend_confirmed": False,
+        "girlfriend_confirmed_at": None,
+        "dtr_stage": 0,
+        "stage_points": 0.0,
+        "sentiment_score": 0.0,
+        "sentiment_delta": 0.0,
+        "decayed_idle_days": 0.0,
+        "dtr_cooldown_until": None,
+        "last_interaction_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _encode(values: dict) -> dict[str, str]:
+    out = {}
+    for f in _FIELDS:
+        v = values.get(f)
+        if f in _BOOL_FIELDS:
+            out[f] = "1" if v else "0"
+        elif f in _DT_FIELDS:
+            out[f] = v.isoformat() if v else ""
+        else:
+            out[f] = "" if v is None else str(v)
+    return out
+
+
+def _decode(raw: dict[str, str]) -> dict:
+    values: dict = {}
+    for f in _FIELDS:
+        v = raw.get(f, "")
+        if f in _BOOL_FIELDS:
+            values[f] = v == "1"
+        elif f in _DT_FIELDS:
+            values[f] = datetime.fromisoformat(v) if v else None
+        elif f in _FLOAT_FIELDS:
+            values[f] = float(v or 0.0)
+        elif f in _INT_FIELDS:
+            values[f] = int(v) if v else None
+        else:
+            values[f] = v
+    return values
+
+
+def _row_values(rel) -> dict:
+    return {f: getattr(rel, f, None) for f in _FIELDS}
+
+
+def _transient(values: dict) -> RelationshipState:
+    """A detached RelationshipState; mutate it freely and pass it to save_relationship."""
+    return RelationshipState(**values)
+
+
+async def _fetch_or_create_row(db, user_id: int, influencer_id: str) -> dict:
+    table = RelationshipState.__table__
+    now = datetime.now(timezone.utc)
+    row = (
+        await db.execute(
+            pg_insert(RelationshipState)
+            .values(**_default_values(user_id, influencer_id, now))
+            .on_conflict_do_nothing(index_elements=["user_id", "influencer_id"])
+            .returning(*table.c)
+        )
+    ).mappings().first()
+    if row is None:
+        row = (
+            await db.execute(
+                select(*table.c).where(
+                    table.c.user_id == user_id,
+                    table.c.influencer_id == influencer_id,
+                )
+            )
+        ).mappings().first()
+    else:
+        await db.commit()
+        await record_new_fan(influencer_id, row["state"], float(row["sentiment_score"] or 0.0))
+    return dict(row)
+
+
+async def load_relationship(db, user_id: int, influencer_id: str) -> RelationshipState:
+    """Return the current state for user x influencer, creating it if needed."""
+    key = _key(user_id, influencer_id)
+    try:
+        r = await get_redis()
+        raw = await r.hgetall(key)
+    except Exception as exc:
+        log.warning("[RELCACHE] redis read failed key=%s err=%s; using db", key, exc)
+        return _transient(await _fetch_or_create_row(db, int(user_id), influencer_id))
+
+    if raw:
+        _stats["hits"] += 1
+        return _transient(_decode(raw))
+
+    _stats["misses"] += 1
+    values = await _fetch_or_create_row(db, int(user_id), influencer_id)
+    try:
+        flat = [x for kv in _encode(values).items() for x in kv]
+        seeded = await r.eval(_SEED_LUA, 1, key, REL_CACHE_TTL_SECS, *flat)
+        raw = dict(zip(seeded[::2], seeded[1::2]))
+        return _transient(_decode(raw))
+    except Exception as exc:
+        log.warning("[RELCACHE] redis seed failed key=%s err=%s", key, exc)
+        return _transient(values)
+
+
+async def peek_relationship(user_id: int, influencer_id: str) -> RelationshipState | None:
+    """Cached state if present; never touches Postgres."""
+    try:
+        r = await get_redis()
+        raw = await r.hgetall(_key(user_id, influencer_id))
+    except Exception:
+        return None
+    return _transient(_decode(raw)) if raw else None
+
+
+async def _write_rows(db, rows: list[dict]) -> None:
+    stmt = pg_insert(RelationshipState).values(
+        [{k: v for k, v in row.items() if k != "id"} for row in rows]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "influencer_id"],
+        set_={f: getattr(stmt.excluded, f) for f in _UPSERT_FIELDS},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+async def save_relationship(db, rel, before: AggregateSnapshot | None = None) -> None:
+    """
+    Persist `rel` to Redis in one round trip; Postgres is updated by the flusher.
+    With `before` (aggregate_snapshot taken at load), the per-influencer
+    counters are updated in the same round trip.
+    """
+    values = _row_values(rel)
+    key = _key(values["user_id"], values["influencer_id"])
+    try:
+        r = await get_redis()
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=_encode(values))
+            pipe.hincrby(key, "_ver", 1)
+            pipe.hincrby(key, "_pending", 1)
+            pipe.expire(key, REL_CACHE_TTL_SECS)
+            pipe.zadd(DIRTY_KEY, {key: time.time()}, nx=True)
+            if before is not None:
+                queue_counter_updates(pipe, before, rel, datetime.now(timezone.utc))
+            results = await pipe.execute()
+    except Exception as exc:
+        log.warning("[RELCACHE] redis write failed key=%s err=%s; writing db", key, exc)
+        _stats["fallback_writes"] += 1
+        await _write_rows(db, [values])
+        return
+
+    _stats["saves"] += 1
+    pending = int(results[2])
+    if pending >= REL_FLUSH_AFTER_UPDATES:
+        task = asyncio.create_task(_flush_keys([key]))
+        _inline_flushes.add(task)
+        task.add_done_callback(_inline_flushes.discard)
+
+
+async def _flush_keys(keys: list[str]) -> int:
+    if not keys:
+        return 0
+    started = time.perf_counter()
+    r = await get_redis()
+
+    async with r.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        raws = await pipe.execute()
+
+    rows, versions, gone = [], {}, []
+    for key, raw in zip(keys, raws):
+        if not raw:
+            gone.append(key)  # expired; nothing left to write
+            continue
+        rows.append(_decode(raw))
+        versions[key] = raw.get("_ver", "0")
+
+    if rows:
+        async with SessionLocal() as db:
+            try:
+                await _write_rows(db, rows)
+            except Exception:
+                await db.rollback()
+                raise
+
+    for key in gone:
+        await r.zrem(DIRTY_KEY, key)
+    for key, ver in versions.items():
+        await r.eval(_ACK_LUA, 2, key, DIRTY_KEY, ver)
+
+    _stats["flushes"] += 1
+    _stats["flushed_rows"] += len(rows)
+    _stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return len(rows)
+
+
+async def flush_dirty_relationships(limit: int = REL_FLUSH_BATCH) -> int:
+    """Write every hash that was dirty when the pass started to relationship_state."""
+    r = await get_redis()
+    keys = await r.zrangebyscore(DIRTY_KEY, "-inf", time.time())
+    total = 0
+    for i in range(0, len(keys), limit):
+        total += await _flush_keys(keys[i:i + limit])
+    return total
+
+
+async def evict_relationship(user_id: int, influencer_id: str) -> None:
+    """Flush then drop the cached copy, e.g. before editing the row directly."""
+    key = _key(user_id, influencer_id)
+    try:
+        await _flush_keys([key])
+        r = await get_redis()
+        await r.delete(key)
+        await r.zrem(DIRTY_KEY, key)
+    except Exception as exc:
+        log.warning("[RELCACHE] evict failed key=%s err=%s", key, exc)
+
+
+async def drop_clean_relationships(pairs: list[tuple[int, str]]) -> int:
+    """
+    Drop cached copies of rows that were just updated in Postgres directly
+    (e.g. by the nightly decay job). Dirty keys are kept: a turn raced the
+    update and its own write supersedes it on the next flush.
+    """
+    if not pairs:
+        return 0
+    try:
+        r = await get_redis()
+        async with r.pipeline(transaction=False) as pipe:
+            for user_id, influencer_id in pairs:
+                pipe.eval(_DROP_CLEAN_LUA, 2, _key(user_id, influencer_id), DIRTY_KEY)
+            results = await pipe.execute()
+    except Exception as exc:
+        log.warning("[RELCACHE] drop clean failed n=%d err=%s", len(pairs), exc)
+        return 0
+    return sum(int(x) for x in results)
+
+
+async def get_relationship_cache_stats() -> dict:
+    try:
+        r = await get_redis()
+        dirty = await r.zcard(DIRTY_KEY)
+        oldest = await r.zrange(DIRTY_KEY, 0, 0, withscores=True)
+    except Exception:
+        dirty, oldest = None, []
+    return {
+        **_stats,
+        "dirty": dirty,
+        "oldest_dirty_secs": round(time.time() - oldest[0][1], 1) if oldest else 0.0,
+        "running": _flusher_task is not None and not _flusher_task.done(),
+    }
+
+
+async def _flusher_loop() -> None:
+    # First pass recovers keys left dirty by a crashed or killed instance
+    while True:
+        try:
+            await flush_dirty_relationships()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            log.exception("[RELCACHE] flush failed: %s", exc)
+        await asyncio.sleep(REL_FLUSH_INTERVAL_SECS)
+
+
+def start_relationship_flusher() -> None:
+    global _flusher_task
+    if _flusher_task is not None:
+        log.warning("[RELCACHE] flusher already running")
+        return
+    _flusher_task = asyncio.create_task(_flusher_loop())
+    log.info(
+        "[RELCACHE] flusher started interval=%.1fs after_updates=%d",
+        REL_FLUSH_INTERVAL_SECS, REL_FLUSH_AFTER_UPDATES,
+    )
+
+
+async def stop_relationship_flusher() -> None:
+    """Stop the loop and write out everything still dirty."""
+    global _flusher_task
+    if _flusher_task is None:
+        return
+    _flusher_task.cancel()
+    _flusher_task = None
+    try:
+        flushed = await flush_dirty_relationships()
+        log.info("[RELCACHE] flusher stopped, final flush rows=%d", flushed)
+    except Exception as exc:
+        log.error("[RELCACHE] final flush failed (will be recovered on next start): %s", exc)
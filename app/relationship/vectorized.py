@@ -0,0 +1,283 @@
+"""
+NumPy-vectorized relationship engine.
+
+Array versions of engine.update_relationship, processor.apply_turn_signals
+(sentiment, stage points, state machine, DTR flags) and
+inactivity.apply_inactivity_decay. Each function processes N relationships at
+once and must stay numerically equivalent to the scalar code it mirrors;
+`check_equivalence` compares the two on random inputs and is run by
+`python -m app.scripts.simulate_relationships --check`.
+
+K tables can be overridden per call, which is what the simulator uses to try
+progression tuning offline.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.relationship.engine import K_UP_BY_STAGE, K_DOWN_BY_STAGE
+
+STAGE_NAMES = ["HATE", "DISLIKE", "STRANGERS", "FRIENDS", "FLIRTING", "DATING", "GIRLFRIEND", "STRAINED", "BROKEN"]
+STAGE_CODE = {name: i for i, name in enumerate(STAGE_NAMES)}
+HATE, DISLIKE, STRANGERS, FRIENDS, FLIRTING, DATING, GIRLFRIEND = range(7)
+
+SIGNAL_KEYS = [
+    "support", "affection", "flirt", "respect", "rude", "boundary_push",
+    "dislike", "hate", "apology", "commitment_talk",
+    # Read with getattr(..., 0.0) by the scalar code; absent from Signals today
+    "threat", "rejecting", "insult",
+]
+
+
+def k_table(table: dict, default: float) -> np.ndarray:
+    """Stage-indexed array for a K_UP/K_DOWN style dict."""
+    return np.array([table.get(name, default) for name in STAGE_NAMES], dtype=np.float64)
+
+
+@dataclass
+class RelArrays:
+    trust: np.ndarray
+    closeness: np.ndarray
+    attraction: np.ndarray
+    safety: np.ndarray
+    stage_points: np.ndarray
+    sentiment_score: np.ndarray
+    state: np.ndarray  # int codes into STAGE_NAMES
+    girlfriend_confirmed: np.ndarray
+    exclusive_agreed: np.ndarray
+    sentiment_delta: np.ndarray = field(default=None)
+
+    @classmethod
+    def new(cls, n: int) -> "RelArrays":
+        """N relationships with get_or_create_relationship defaults."""
+        return cls(
+            trust=np.full(n, 10.0),
+            closeness=np.full(n, 10.0),
+            attraction=np.full(n, 5.0),
+            safety=np.full(n, 95.0),
+            stage_points=np.zeros(n),
+            sentiment_score=np.zeros(n),
+            state=np.full(n, STRANGERS, dtype=np.int8),
+            girlfriend_confirmed=np.zeros(n, dtype=bool),
+            exclusive_agreed=np.zeros(n, dtype=bool),
+            sentiment_delta=np.zeros(n),
+        )
+
+
+def _sig(sig: dict, key: str, n: int) -> np.ndarray:
+    v = sig.get(key)
+    return np.zeros(n) if v is None else np.asarray(v, dtype=np.float64)
+
+
+def sat_up_staged(x, delta, state, k_up):
+    k = k_up[state]
+    return np.where(delta > 0, x + (100 - x) * (1 - np.exp(-k * delta)), x)
+
+
+def sat_down_staged(x, delta, state, k_down):
+    k = k_down[state]
+    return np.where(delta > 0, x - x * (1 - np.exp(-k * delta)), x)
+
+
+def update_relationship(trust, closeness, attraction, safety, state, sig: dict, k_up=None, k_down=None):
+    """Vectorized engine.update_relationship; returns (trust, closeness, attraction, safety)."""
+    n = trust.shape[0]
+    k_up = k_table(K_UP_BY_STAGE, 0.025) if k_up is None else k_up
+    k_down = k_table(K_DOWN_BY_STAGE, 0.03) if k_down is None else k_down
+    support, respect, apology = _sig(sig, "support", n), _sig(sig, "respect", n), _sig(sig, "apology", n)
+    rude, push = _sig(sig, "rude", n), _sig(sig, "boundary_push", n)
+    affection, flirt = _sig(sig, "affection", n), _sig(sig, "flirt", n)
+
+    trust_pos = np.minimum(5 * support + 4 * respect + 3 * apology, 1.0)
+    trust_neg = np.minimum(9 * rude + 12 * push, 4.0)
+    close_pos = np.minimum(4 * affection + 4 * support, 1.0)
+    close_neg = np.minimum(5 * rude, 4.0)
+    attr_pos = np.minimum(5 * flirt * respect + 1.5 * flirt + 2 * affection, 1.8)
+    attr_neg = np.minimum(10 * push + 6 * rude, 3.5)
+    safety_pos = np.minimum(6 * respect + 4 * apology, 1.5)
+    safety_neg = np.minimum(10 * push + 8 * rude, 3.5)
+
+    trust = sat_down_staged(sat_up_staged(trust, trust_pos, state, k_up), trust_neg, state, k_down)
+    closeness = sat_down_staged(sat_up_staged(closeness, close_pos, state, k_up), close_neg, state, k_down)
+    attraction = sat_down_staged(sat_up_staged(attraction, attr_pos, state, k_up), attr_neg, state, k_down)
+    safety = sat_down_staged(sat_up_staged(safety, safety_pos, state, k_up), safety_neg, state, k_down)
+
+    return (
+        np.clip(trust, 0, 100),
+        np.clip(closeness, 0, 100),
+        np.clip(attraction, 0, 100),
+        np.clip(safety, 0, 100),
+    )
+
+
+def compute_stage_delta(sig: dict, n: int) -> np.ndarray:
+    g = lambda k: _sig(sig, k, n)  # noqa: E731
+    delta = 2.0 * g("support") + 1.6 * g("affection") + 1.6 * g("respect") + 1.4 * g("flirt")
+    delta -= 5.0 * g("boundary_push")
+    delta -= 3.5 * g("rude")
+    delta -= 4.0 * g("dislike")
+    delta -= 8.0 * g("hate")
+    delta -= 10.0 * g("threat")
+    delta -= 4.0 * g("rejecting")
+    delta -= 2.0 * g("insult")
+
+    calm = (
+        (g("rude") < 0.1) & (g("boundary_push") < 0.1) & (g("dislike") < 0.1)
+        & (g("hate") < 0.1) & (g("threat") < 0.05) & (g("rejecting") < 0.1)
+    )
+    delta += np.where(calm, 0.25, 0.0)
+    return np.clip(delta, -8.0, 3.0)
+
+
+def compute_sentiment_delta(sig: dict, n: int) -> np.ndarray:
+    g = lambda k: _sig(sig, k, n)  # noqa: E731
+    d = (
+        + 2.0 * g("respect")
+        + 2.0 * g("support")
+        + 1.5 * g("affection")
+        + 2.0 * g("apology")
+        - 3.0 * g("rude")
+        - 4.0 * g("boundary_push")
+        - 2.5 * g("dislike")
+        - 5.0 * g("hate")
+        - 6.0 * g("threat")
+        - 2.0 * g("insult")
+        - 2.0 * g("rejecting")
+    )
+    return np.clip(d, -3.0, 2.0)
+
+
+def stage_from_points(stage_points: np.ndarray) -> np.ndarray:
+    """Vectorized processor.stage_from_signals_and_points."""
+    # Bins: <=-11 HATE, <0 DISLIKE, <25 STRANGERS, <50 FRIENDS, <75 FLIRTING, <90 DATING, else GIRLFRIEND
+    out = np.full(stage_points.shape, GIRLFRIEND, dtype=np.int8)
+    out[stage_points < 90.0] = DATING
+    out[stage_points < 75.0] = FLIRTING
+    out[stage_points < 50.0] = FRIENDS
+    out[stage_points < 25.0] = STRANGERS
+    out[stage_points < 0.0] = DISLIKE
+    out[stage_points <= -11.0] = HATE
+    return out
+
+
+def apply_inactivity_decay(rel: RelArrays, days_idle: np.ndarray) -> None:
+    """Vectorized inactivity.apply_inactivity_decay (in place)."""
+    mult = np.where(rel.girlfriend_confirmed, 0.5, 1.0)
+    active = days_idle >= 2
+    rel.closeness = np.where(active, np.maximum(0.0, rel.closeness - np.minimum(8.0, days_idle * 1.5 * mult)), rel.closeness)
+    rel.attraction = np.where(
+        days_idle >= 3, np.maximum(0.0, rel.attraction - np.minimum(10.0, days_idle * 1.8 * mult)), rel.attraction
+    )
+    rel.trust = np.where(
+        days_idle >= 7, np.maximum(0.0, rel.trust - np.minimum(5.0, (days_idle - 6) * 0.8 * mult)), rel.trust
+    )
+
+
+def apply_turn_signals(rel: RelArrays, sig: dict, k_up=None, k_down=None) -> np.ndarray:
+    """
+    Vectorized processor.apply_turn_signals (in place). `sig` maps signal
+    names to arrays plus boolean accepted_exclusive / accepted_girlfriend.
+    Returns the can_ask mask.
+    """
+    n = rel.trust.shape[0]
+    gf = rel.girlfriend_confirmed
+
+    d_sent = compute_sentiment_delta(sig, n)
+    rel.sentiment_score = np.clip(rel.sentiment_score + d_sent, -100.0, 100.0)
+    rel.sentiment_delta = d_sent
+
+    # Girlfriends feel 40% of rude/boundary_push (the only negatives update_relationship reads)
+    dampened = dict(sig)
+    dampened["rude"] = np.where(gf, _sig(sig, "rude", n) * 0.4, _sig(sig, "rude", n))
+    dampened["boundary_push"] = np.where(gf, _sig(sig, "boundary_push", n) * 0.4, _sig(sig, "boundary_push", n))
+    rel.trust, rel.closeness, rel.attraction, rel.safety = update_relationship(
+        rel.trust, rel.closeness, rel.attraction, rel.safety, rel.state, dampened, k_up, k_down
+    )
+
+    rel.stage_points = np.clip(rel.stage_points + compute_stage_delta(sig, n), -20.0, 100.0)
+
+    hate = _sig(sig, "hate", n)
+    to_hate = gf & ((hate > 0.6) | (_sig(sig, "threat", n) > 0.20))
+    to_dislike = gf & ~to_hate & ((_sig(sig, "dislike", n) > 0.4) | (_sig(sig, "rejecting", n) > 0.40))
+    state = np.where(gf, GIRLFRIEND, stage_from_points(rel.stage_points)).astype(np.int8)
+    state[to_hate] = HATE
+    state[to_dislike] = DISLIKE
+    broke_up = to_hate | to_dislike
+    gf = gf & ~broke_up
+    excl = rel.exclusive_agreed & ~broke_up
+
+    can_ask = (
+        (state == DATING)
+        & (rel.safety >= 70) & (rel.trust >= 75) & (rel.closeness >= 70) & (rel.attraction >= 65)
+    )
+
+    accepted_excl = np.asarray(sig.get("accepted_exclusive", np.zeros(n, dtype=bool)), dtype=bool)
+    accepted_gf = np.asarray(sig.get("accepted_girlfriend", np.zeros(n, dtype=bool)), dtype=bool)
+    excl = excl | (accepted_excl & ((state == DATING) | (state == GIRLFRIEND)))
+
+    promote = accepted_gf & can_ask
+    gf = gf | promote
+    excl = excl | promote
+    state[promote] = GIRLFRIEND
+
+    rel.state = state
+    rel.girlfriend_confirmed = gf
+    rel.exclusive_agreed = excl
+    return can_ask
+
+
+def check_equivalence(n: int = 20_000, turns: int = 50, seed: int = 0) -> dict:
+    """
+    Run random trajectories through the scalar and vectorized code and return
+    the max absolute difference per field plus state/flag mismatches.
+    """
+    from types import SimpleNamespace
+
+    from app.relationship.engine import Signals
+    from app.relationship.inactivity import apply_inactivity_decay as scalar_decay
+    from app.relationship.processor import apply_turn_signals as scalar_turn
+
+    rng = np.random.default_rng(seed)
+    vec = RelArrays.new(n)
+    scalar = [
+        SimpleNamespace(
+            trust=10.0, closeness=10.0, attraction=5.0, safety=95.0, stage_points=0.0,
+            sentiment_score=0.0, sentiment_delta=0.0, state="STRANGERS",
+            girlfriend_confirmed=False, exclusive_agreed=False,
+            last_interaction_at=None, updated_at=None,
+        )
+        for _ in range(n)
+    ]
+    scalar_keys = [k for k in SIGNAL_KEYS if k not in ("threat", "rejecting", "insult")]
+
+    for _ in range(turns):
+        sig = {k: rng.random(n) ** 3 for k in scalar_keys}
+        sig["accepted_exclusive"] = rng.random(n) < 0.2
+        sig["accepted_girlfriend"] = rng.random(n) < 0.2
+        apply_turn_signals(vec, sig)
+        for i, r in enumerate(scalar):
+            s = Signals(
+                **{k: float(sig[k][i]) for k in scalar_keys},
+                accepted_exclusive=bool(sig["accepted_exclusive"][i]),
+                accepted_girlfriend=bool(sig["accepted_girlfriend"][i]),
+            )
+            scalar_turn(r, s)
+
+    # Decay is stateless on its inputs; check it on the final state
+    days = rng.random(n) * 14
+    from datetime import datetime, timedelta, timezone
+    now = datetime.now(timezone.utc)
+    for i, r in enumerate(scalar):
+        r.last_interaction_at = now - timedelta(days=float(days[i]))
+        scalar_decay(r, now)
+    apply_inactivity_decay(vec, days)
+
+    report = {}
+    for f in ("trust", "closeness", "attraction", "safety", "stage_points", "sentiment_score"):
+        s = np.array([getattr(r, f) for r in scalar])
+        report[f"max_abs_diff_{f}"] = float(np.max(np.abs(s - getattr(vec, f))))
+    report["state_mismatches"] = int(sum(STAGE_CODE[r.state] != c for r, c in zip(scalar, vec.state)))
+    report["girlfriend_mismatches"] = int(sum(r.girlfriend_confirmed != g for r, g in zip(scalar, vec.girlfriend_confirmed)))
+    report["exclusive_mismatches"] = int(sum(r.exclusive_agreed != e for r, e in zip(scalar, vec.exclusive_agreed)))
+    return report
@@ -5,6 +5,13 @@ from datetime import datetime, timezone
 
 from app.db.session import SessionLocal
 from app.services.re_engagement import run_reengagement_job
+from app.services.memory_consolidation import run_memory_consolidation_job
+from app.services.inactivity_decay import run_inactivity_decay_job
+from app.relationship.aggregates import reconcile_relationship_aggregates, snapshot_relationship_aggregates
+from app.services.credit_reservations import settle_expired_reservations
+from app.services.ledger import run_ledger_maintenance
+from app.services.wallet_reconciler import run_wallet_reconciliation
+from app.services.tts_cache import run_tts_prerender
 
 log = logging.getLogger("scheduler")
 
@@ -13,7 +20,30 @@ REENGAGEMENT_INTERVAL_HOURS = int(os.getenv("REENGAGEMENT_INTERVAL_HOURS", "24")
 REENGAGEMENT_INACTIVE_DAYS = int(os.getenv("REENGAGEMENT_INACTIVE_DAYS", "3"))
 REENGAGEMENT_MIN_BALANCE_CENTS = int(os.getenv("REENGAGEMENT_MIN_BALANCE_CENTS", "5000"))
 
+# Deletes memories, so off by default; when enabled it only reports until DRY_RUN=false
+MEMORY_CONSOLIDATION_ENABLED = os.getenv("MEMORY_CONSOLIDATION_ENABLED", "false").lower() == "true"
+MEMORY_CONSOLIDATION_DRY_RUN = os.getenv("MEMORY_CONSOLIDATION_DRY_RUN", "true").lower() == "true"
+MEMORY_CONSOLIDATION_INTERVAL_HOURS = int(os.getenv("MEMORY_CONSOLIDATION_INTERVAL_HOURS", "24"))
+
+INACTIVITY_DECAY_ENABLED = os.getenv("INACTIVITY_DECAY_ENABLED", "true").lower() == "true"
+INACTIVITY_DECAY_INTERVAL_HOURS = int(os.getenv("INACTIVITY_DECAY_INTERVAL_HOURS", "24"))
+
+RELATIONSHIP_AGGREGATES_ENABLED = os.getenv("RELATIONSHIP_AGGREGATES_ENABLED", "true").lower() == "true"
+RELATIONSHIP_AGGREGATES_SNAPSHOT_HOURS = float(os.getenv("RELATIONSHIP_AGGREGATES_SNAPSHOT_HOURS", "0.25"))
+RELATIONSHIP_AGGREGATES_RECONCILE_HOURS = float(os.getenv("RELATIONSHIP_AGGREGATES_RECONCILE_HOURS", "24"))
+
+CREDIT_RESERVATION_SWEEP_HOURS = float(os.getenv("CREDIT_RESERVATION_SWEEP_HOURS", "0.05"))
+
+LEDGER_MAINTENANCE_INTERVAL_HOURS = float(os.getenv("LEDGER_MAINTENANCE_INTERVAL_HOURS", "24"))
+
+WALLET_RECONCILE_ENABLED = os.getenv("WALLET_RECONCILE_ENABLED", "true").lower() == "true"
+WALLET_RECONCILE_INTERVAL_HOURS = float(os.getenv("WALLET_RECONCILE_INTERVAL_HOURS", "0.25"))
+
+TTS_PRERENDER_ENABLED = os.getenv("TTS_PRERENDER_ENABLED", "false").lower() == "true"
+TTS_PRERENDER_INTERVAL_HOURS = float(os.getenv("TTS_PRERENDER_INTERVAL_HOURS", "24"))
+
 _scheduler_task: asyncio.Task | None = None
+_periodic_tasks: list[asyncio.Task] = []
 
 
 async def _run_reengagement_once():
@@ -37,6 +67,95 @@ async def _run_reengagement_once():
             return {"error": str(e)}
 
 
+async def _run_memory_consolidation_once():
+    try:
+        return await run_memory_consolidation_job(dry_run=MEMORY_CONSOLIDATION_DRY_RUN)
+    except Exception as e:
+        log.exception(f"[SCHEDULER] Memory consolidation job failed: {e}")
+        return {"error": str(e)}
+
+
+async def _run_inactivity_decay_once():
+    try:
+        return await run_inactivity_decay_job()
+    except Exception as e:
+        log.exception(f"[SCHEDULER] Inactivity decay job failed: {e}")
+        return {"error": str(e)}
+
+
+async def _run_relationship_aggregates_snapshot():
+    try:
+        return await snapshot_relationship_aggregates()
+    except Exception as e:
+        log.exception(f"[SCHEDULER] Relationship aggregates snapshot failed: {e}")
+        return {"error": str(e)}
+
+
+async def _run_relationship_aggregates_reconcile():
+    try:
+        return await reconcile_relationship_aggregates()
+    except Exception as e:
+        log.exception(f"[SCHEDULER] Relationship aggregates reconcile failed: {e}")
+        return {"error": str(e)}
+
+
+async def _run_credit_reservation_sweep():
+    try:
+        return await settle_expired_reservations()
+    except Exception as e:
+        log.exception(f"[SCHEDULER] Credit reservation sweep failed: {e}")
+        return {"error": str(e)}
+
+
+async def _run_ledger_maintenance_once():
+    try:
+        return await run_ledger_maintenance()
+    except Exception as e:
+        log.exception(f"[SCHEDULER] Ledger maintenance failed: {e}")
+        return {"error": str(e)}
+
+
+async def _run_wallet_reconcile_once():
+    try:
+        return await run_wallet_reconciliation()
+    except Exception as e:
+        log.exception(f"[SCHEDULER] Wallet reconciliation failed: {e}")
+        return {"error": str(e)}
+
+
+async def _run_tts_prerender_once():
+    try:
+        return await run_tts_prerender()
+    except Exception as e:
+        log.exception(f"[SCHEDULER] TTS prerender failed: {e}")
+        return {"error": str(e)}
+
+
+async def _periodic_loop(name: str, interval_hours: float, job, initial_delay: int = 60):
+    """Run `job` every `interval_hours`, surviving individual failures."""
+    await asyncio.sleep(initial_delay)
+
+    while True:
+        try:
+            log.info(f"[SCHEDULER] Running {name} job at {datetime.now(timezone.utc).isoformat()}")
+            await job()
+        except asyncio.CancelledError:
+            log.info(f"[SCHEDULER] {name} loop cancelled, shutting down")
+            break
+        except Exception as e:
+            log.exception(f"[SCHEDULER] Unexpected error in {name}: {e}")
+
+        log.info(f"[SCHEDULER] Next {name} run in {interval_hours} hours")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+def _start_periodic(name: str, interval_hours: float, job, initial_delay: int = 60):
+    _periodic_tasks.append(
+        asyncio.create_task(_periodic_loop(name, interval_hours, job, initial_delay))
+    )
+    log.info(f"[SCHEDULER] {name} scheduler started (interval={interval_hours}h)")
+
+
 async def _scheduler_loop():
     interval_seconds = REENGAGEMENT_INTERVAL_HOURS * 3600
     
@@ -65,6 +184,81 @@ async def _scheduler_loop():
 
 def start_scheduler():
     global _scheduler_task
+
+    if not _periodic_tasks:
+        if MEMORY_CONSOLIDATION_ENABLED:
+            _start_periodic(
+                "memory-consolidation",
+                MEMORY_CONSOLIDATION_INTERVAL_HOURS,
+                _run_memory_consolidation_once,
+                initial_delay=300,
+            )
+        else:
+            log.info("[SCHEDULER] Memory consolidation is disabled (MEMORY_CONSOLIDATION_ENABLED=false)")
+
+        if INACTIVITY_DECAY_ENABLED:
+            _start_periodic(
+                "inactivity-decay",
+                INACTIVITY_DECAY_INTERVAL_HOURS,
+                _run_inactivity_decay_once,
+                initial_delay=120,
+            )
+        else:
+            log.info("[SCHEDULER] Inactivity decay is disabled (INACTIVITY_DECAY_ENABLED=false)")
+
+        if RELATIONSHIP_AGGREGATES_ENABLED:
+            # Reconcile first so a fresh deploy starts from exact counters
+            _start_periodic(
+                "relationship-aggregates-reconcile",
+                RELATIONSHIP_AGGREGATES_RECONCILE_HOURS,
+                _run_relationship_aggregates_reconcile,
+                initial_delay=90,
+            )
+            _start_periodic(
+                "relationship-aggregates-snapshot",
+                RELATIONSHIP_AGGREGATES_SNAPSHOT_HOURS,
+                _run_relationship_aggregates_snapshot,
+                initial_delay=600,
+            )
+        else:
+            log.info("[SCHEDULER] Relationship aggregates are disabled (RELATIONSHIP_AGGREGATES_ENABLED=false)")
+
+        # Runs even with reservations disabled so blocks held before a config
+        # change still get settled
+        _start_periodic(
+            "credit-reservation-sweep",
+            CREDIT_RESERVATION_SWEEP_HOURS,
+            _run_credit_reservation_sweep,
+            initial_delay=45,
+        )
+
+        # Always on: inserts fail once the ledger runs out of partitions
+        _start_periodic(
+            "ledger-maintenance",
+            LEDGER_MAINTENANCE_INTERVAL_HOURS,
+            _run_ledger_maintenance_once,
+            initial_delay=30,
+        )
+
+        if WALLET_RECONCILE_ENABLED:
+            _start_periodic(
+                "wallet-reconcile",
+                WALLET_RECONCILE_INTERVAL_HOURS,
+                _run_wallet_reconcile_once,
+                initial_delay=240,
+            )
+        else:
+            log.info("[SCHEDULER] Wallet reconciliation is disabled (WALLET_RECONCILE_ENABLED=false)")
+
+        if TTS_PRERENDER_ENABLED:
+            _start_periodic(
+                "tts-prerender",
+                TTS_PRERENDER_INTERVAL_HOURS,
+                _run_tts_prerender_once,
+                initial_delay=900,
+            )
+        else:
+            log.info("[SCHEDULER] TTS prerender is disabled (TTS_PRERENDER_ENABLED=false)")
     
     if not REENGAGEMENT_ENABLED:
         log.info("[SCHEDULER] Re-engagement scheduler is disabled (REENGAGEMENT_ENABLED=false)")
@@ -80,6 +274,10 @@ def start_scheduler():
 
 def stop_scheduler():
     global _scheduler_task
+
+    for task in _periodic_tasks:
+        task.cancel()
+    _periodic_tasks.clear()
     
     if _scheduler_task is not None:
         _scheduler_task.cancel()
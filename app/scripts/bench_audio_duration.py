@@ -0,0 +1,224 @@
+"""
+Correctness check and benchmark for the audio duration parser.
+
+Corpus: builds one synthetic file per supported container (WAV, streaming
+WAV, CBR and Xing MP3, ADTS AAC, Ogg Opus, FLAC, WebM with and without a
+Duration element, M4A) with a known duration and checks parse_duration gets
+within --tolerance seconds of it. With --corpus DIR, every file in DIR is
+also parsed and compared against ffprobe.
+
+Bench: times parse_duration against the ffprobe fallback for each file,
+--runs times, and reports the median of each.
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import struct
+import time
+import wave
+
+from app.services.audio_duration import parse_duration, probe_duration
+
+
+def _wav(seconds: float, streaming: bool = False) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(b"\x00\x00" * int(16000 * seconds))
+    data = bytearray(buf.getvalue())
+    if streaming:
+        data[data.index(b"data") + 4:data.index(b"data") + 8] = b"\xff\xff\xff\xff"
+    return bytes(data)
+
+
+def _mp3_frames(frames: int) -> bytes:
+    # MPEG-1 layer III, 128 kbps, 44.1 kHz, joint stereo: 417 bytes per frame
+    return (b"\xff\xfb\x90\x44" + b"\x00" * 413) * frames
+
+
+def _mp3(seconds: float) -> tuple[bytes, float]:
+    frames = round(seconds * 44100 / 1152)
+    id3 = b"ID3\x03\x00\x00\x00\x00\x00\x0a" + b"\x00" * 10
+    return id3 + _mp3_frames(frames), frames * 1152 / 44100
+
+
+def _mp3_xing(seconds: float) -> tuple[bytes, float]:
+    frames = round(seconds * 44100 / 1152)
+    info = bytearray(_mp3_frames(1))
+    info[36:48] = b"Xing" + struct.pack(">II", 1, frames)
+    # Only a few audio frames are present; the Xing count is what matters
+    return bytes(info) + _mp3_frames(3), frames * 1152 / 44100
+
+
+def _adts(seconds: float) -> tuple[bytes, float]:
+    frames = round(seconds * 44100 / 1024)
+    frame_len = 7 + 100
+    header = bytes([
+        0xFF, 0xF1,
+        (1 << 6) | (4 << 2),  # AAC LC, 44.1 kHz
+        (2 << 6) | ((frame_len >> 11) & 3),
+        (frame_len >> 3) & 0xFF,
+        ((frame_len & 7) << 5) | 0x1F,
+        0xFC,
+    ])
+    return (header + b"\x00" * 100) * frames, frames * 1024 / 44100
+
+
+def _ogg_page(payload: bytes, granule: int, seq: int, header_type: int = 0) -> bytes:
+    segments = []
+    left = len(payload)
+    while left >= 255:
+        segments.append(255)
+        left -= 255
+    segments.append(left)
+    return (
+        b"OggS" + bytes([0, header_type]) + struct.pack("<qIII", granule, 0x1234, seq, 0)
+        + bytes([len(segments)]) + bytes(segments) + payload
+    )
+
+
+def _opus(seconds: float) -> bytes:
+    pre_skip = 312
+    head = b"OpusHead" + bytes([1, 1]) + struct.pack("<HIhB", pre_skip, 48000, 0, 0)
+    pages = [
+        _ogg_page(head, 0, 0, header_type=2),
+        _ogg_page(b"OpusTags" + b"\x00" * 8, 0, 1),
+        _ogg_page(b"\x00" * 400, int(48000 * seconds / 2) + pre_skip, 2),
+        _ogg_page(b"\x00" * 400, int(48000 * seconds) + pre_skip, 3, header_type=4),
+    ]
+    return b"".join(pages)
+
+
+def _flac(seconds: float) -> bytes:
+    samples = int(44100 * seconds)
+    info = (44100 << 44) | (1 << 41) | (15 << 36) | samples
+    streaminfo = struct.pack(">HH", 4096, 4096) + b"\x00" * 6 + info.to_bytes(8, "big") + b"\x00" * 16
+    return b"fLaC" + bytes([0x80, 0, 0, 34]) + streaminfo + b"\x00" * 256
+
+
+def _ebml(eid: int, body: bytes, unknown: bool = False) -> bytes:
+    eid_bytes = eid.to_bytes((eid.bit_length() + 7) // 8, "big")
+    if unknown:
+        return eid_bytes + b"\x01\xff\xff\xff\xff\xff\xff\xff" + body
+    return eid_bytes + (0x10000000 | len(body)).to_bytes(4, "big") + body
+
+
+def _webm(seconds: float, with_duration: bool) -> bytes:
+    header = _ebml(0x1A45DFA3, _ebml(0x4282, b"webm"))
+    info = _ebml(0x1549A966, _ebml(0x2AD7B1, (1_000_000).to_bytes(3, "big")) + (
+        _ebml(0x4489, struct.pack(">d", seconds * 1000)) if with_duration else b""
+    ))
+    tracks = _ebml(0x1654AE6B, _ebml(0xAE, _ebml(0xD7, b"\x01") + _ebml(0x83, b"\x02")))
+    clusters = b""
+    frame_ms = 20
+    total = int(seconds * 1000) // frame_ms
+    for start in range(0, total, 50):
+        cluster_tc = start * frame_ms
+        blocks = b"".join(
+            _ebml(0xA3, b"\x81" + struct.pack(">h", (i - start) * frame_ms) + b"\x80" + b"\x00" * 40)
+            for i in range(start, min(start + 50, total))
+        )
+        # MediaRecorder writes clusters without a size
+        clusters += _ebml(0x1F43B675, _ebml(0xE7, cluster_tc.to_bytes(4, "big")) + blocks, unknown=True)
+    return header + _ebml(0x18538067, info + tracks + clusters, unknown=True)
+
+
+def _m4a(seconds: float) -> bytes:
+    def box(kind: bytes, body: bytes) -> bytes:
+        return struct.pack(">I4s", 8 + len(body), kind) + body
+
+    mvhd = box(b"mvhd", b"\x00\x00\x00\x00" + struct.pack(">IIII", 0, 0, 1000, int(seconds * 1000)) + b"\x00" * 80)
+    return box(b"ftyp", b"M4A \x00\x00\x00\x00isom") + box(b"mdat", b"\x00" * 2048) + box(b"moov", mvhd)
+
+
+def build_corpus(seconds: float) -> list[tuple[str, str, bytes, float]]:
+    """(name, suffix, bytes, expected seconds) for every supported container."""
+    mp3, mp3_secs = _mp3(seconds)
+    xing, xing_secs = _mp3_xing(seconds)
+    aac, aac_secs = _adts(seconds)
+    return [
+        ("wav", ".wav", _wav(seconds), seconds),
+        ("wav-streaming", ".wav", _wav(seconds, streaming=True), seconds),
+        ("mp3-cbr", ".mp3", mp3, mp3_secs),
+        ("mp3-xing", ".mp3", xing, xing_secs),
+        ("aac-adts", ".aac", aac, aac_secs),
+        ("ogg-opus", ".ogg", _opus(seconds), seconds),
+        ("flac", ".flac", _flac(seconds), seconds),
+        ("webm-duration", ".webm", _webm(seconds, with_duration=True), seconds),
+        ("webm-cluster-scan", ".webm", _webm(seconds, with_duration=False), seconds),
+        ("m4a", ".m4a", _m4a(seconds), seconds),
+    ]
+
+
+async def _time_probe(data: bytes, suffix: str, runs: int) -> tuple[float, float]:
+    samples = []
+    duration = 0.0
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        duration = await probe_duration(data, suffix)
+        samples.append(time.perf_counter() - t0)
+    return duration, statistics.median(samples)
+
+
+def _time_parse(data: bytes, runs: int) -> tuple[float | None, float]:
+    samples = []
+    duration = None
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        duration, _ = parse_duration(data)
+        samples.append(time.perf_counter() - t0)
+    return duration, statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=7.3)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--corpus", help="Directory of real recordings to compare against ffprobe")
+    parser.add_argument("--no-ffprobe", action="store_true", help="Skip the ffprobe comparison")
+    args = parser.parse_args()
+
+    files = [(name, suffix, data, expected) for name, suffix, data, expected in build_corpus(args.seconds)]
+    if args.corpus:
+        for name in sorted(os.listdir(args.corpus)):
+            path = os.path.join(args.corpus, name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    files.append((name, os.path.splitext(name)[1] or ".wav", f.read(), None))
+
+    failures = 0
+    print(f"{'file':<28} {'parsed':>9} {'expected':>9} {'parse ms':>9} {'ffprobe ms':>11}")
+    for name, suffix, data, expected in files:
+        parsed, parse_secs = _time_parse(data, args.runs)
+        probe_ms = "-"
+        if not args.no_ffprobe:
+            probed, probe_secs = await _time_probe(data, suffix, max(1, args.runs // 4))
+            probe_ms = f"{probe_secs * 1000:.2f}"
+            if expected is None:
+                expected = probed or None
+
+        ok = parsed is not None and expected is not None and abs(parsed - expected) <= args.tolerance
+        failures += 0 if ok else 1
+        print(
+            f"{name:<28} {parsed if parsed is not None else float('nan'):>9.3f} "
+            f"{expected if expected is not None else float('nan'):>9.3f} "
+            f"{parse_secs * 1000:>9.3f} {probe_ms:>11} {'' if ok else 'FAIL'}"
+        )
+
+    if failures:
+        raise SystemExit(f"{failures} file(s) out of tolerance")
+    print(f"all {len(files)} files within {args.tolerance}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.bench_audio_duration --no-ffprobe
+# poetry run python -m app.scripts.bench_audio_duration --corpus ./voice-samples
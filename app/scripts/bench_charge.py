@@ -0,0 +1,161 @@
+"""
+Concurrency check and round-trip benchmark for charge_feature.
+
+Runs against a throwaway user, influencer and wallet (app.scripts.fixtures)
+that are created here and deleted afterwards, with everything they wrote.
+
+Check: tops the wallet up to exactly enough for --charges billable charges, fires --concurrency times that many charges at once, and
+verifies that exactly --charges succeeded, the rest got 402 and the balance
+never went negative.
+
+Bench: runs --runs sequential charges and reports statements per charge and
+p50/p95/max latency.
+
+Use a feature whose free allowance is 0, or it will be consumed before
+billing.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from fastapi import HTTPException
+from sqlalchemy import event, select
+
+from app.db.models import InfluencerWallet
+from app.db.session import SessionLocal, engine
+from app.scripts.fixtures import fixture_pair
+from app.services.billing import charge_feature
+from app.services.pricing_catalog import get_price
+
+BENCH_META = {"source": "bench_charge"}
+
+_statements = 0
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _count_statement(*_args) -> None:
+    global _statements
+    _statements += 1
+
+
+async def _charge(user_id: int, influencer_id: str, feature: str, units: int, is_18: bool) -> int | None:
+    async with SessionLocal() as db:
+        try:
+            return await charge_feature(
+                db, user_id=user_id, influencer_id=influencer_id, feature=feature,
+                units=units, is_18=is_18, meta=BENCH_META,
+            )
+        except HTTPException as exc:
+            if exc.status_code == 402:
+                return None
+            raise
+
+
+async def _wallet(db, user_id: int, influencer_id: str, is_18: bool) -> InfluencerWallet:
+    wallet = await db.scalar(
+        select(InfluencerWallet).where(
+            InfluencerWallet.user_id == user_id,
+            InfluencerWallet.influencer_id == influencer_id,
+            InfluencerWallet.is_18 == is_18,
+        )
+    )
+    if wallet is None:
+        raise SystemExit(f"No wallet for user={user_id} influencer={influencer_id} is_18={is_18}")
+    return wallet
+
+
+async def _set_balance(user_id: int, influencer_id: str, is_18: bool, cents: int) -> None:
+    async with SessionLocal() as db:
+        wallet = await _wallet(db, user_id, influencer_id, is_18)
+        wallet.balance_cents = cents
+        await db.commit()
+
+
+async def check(user_id: int, influencer_id: str, feature: str, units: int, is_18: bool,
+                charges: int, concurrency: int, unit_cost: int) -> bool:
+    await _set_balance(user_id, influencer_id, is_18, unit_cost * charges)
+
+    attempts = charges * concurrency
+    results = await asyncio.gather(
+        *(_charge(user_id, influencer_id, feature, units, is_18) for _ in range(attempts))
+    )
+    ok = sum(1 for r in results if r is not None)
+
+    async with SessionLocal() as db:
+        balance = (await _wallet(db, user_id, influencer_id, is_18)).balance_cents
+
+    passed = ok == charges and balance == 0
+    print(
+        f"check: attempts={attempts} succeeded={ok} (expected {charges}) "
+        f"refused={attempts - ok} final_balance={balance} -> {'OK' if passed else 'FAIL'}"
+    )
+    return passed
+
+
+async def bench(user_id: int, influencer_id: str, feature: str, units: int, is_18: bool,
+                runs: int, unit_cost: int) -> None:
+    global _statements
+    await _set_balance(user_id, influencer_id, is_18, unit_cost * runs)
+
+    latencies: list[float] = []
+    _statements = 0
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_statement)
+    try:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            await _charge(user_id, influencer_id, feature, units, is_18)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count_statement)
+
+    print(
+        f"bench: statements/charge={_statements / runs:.1f} "
+        f"p50={statistics.median(latencies):.2f}ms p95={_percentile(latencies, 0.95):.2f}ms "
+        f"max={max(latencies):.2f}ms (runs={runs})"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--feature", default="text")
+    parser.add_argument("--units", type=int, default=1)
+    parser.add_argument("--is-18", action="store_true")
+    parser.add_argument("--charges", type=int, default=20, help="Charges the wallet is funded for")
+    parser.add_argument("--concurrency", type=int, default=5, help="Attempts per funded charge")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    price = await get_price(args.feature)
+    if price is None or not price.price_cents:
+        raise SystemExit(f"Feature {args.feature!r} has no active paid pricing")
+    if price.free_allowance:
+        print(f"warning: free_allowance={price.free_allowance} for {args.feature!r}, results will be skewed")
+    unit_cost = args.units * price.price_cents
+
+    async with fixture_pair("bench-charge") as (user_id, influencer_id):
+        async with SessionLocal() as db:
+            db.add(InfluencerWallet(user_id=user_id, influencer_id=influencer_id, is_18=args.is_18, balance_cents=0))
+            await db.commit()
+
+        passed = await check(
+            user_id, influencer_id, args.feature, args.units, args.is_18,
+            args.charges, args.concurrency, unit_cost,
+        )
+        await bench(user_id, influencer_id, args.feature, args.units, args.is_18, args.runs, unit_cost)
+
+    if not passed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.bench_charge
@@ -0,0 +1,120 @@
+"""
+Benchmark history-page latency for a chat.
+
+Runs the same queries as GET /chat/history/{chat_id} and the context loaders
+(count + newest page) and reports p50/p95/max plus the buffer usage of the
+page query. Use --seed to grow an existing chat with synthetic messages (and
+side-table embeddings) first, e.g. to measure behaviour at 1M+ rows.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import select, func, text
+
+from app.db.models import Message
+from app.db.session import SessionLocal
+
+SEED_MESSAGES_SQL = text("""
+    INSERT INTO messages (chat_id, sender, channel, content, created_at)
+    SELECT :chat_id,
+           CASE WHEN g % 2 = 0 THEN 'user' ELSE 'ai' END,
+           'text',
+           repeat('benchmark message ', 1 + (g % 12)),
+           NOW() - (g || ' seconds')::interval
+    FROM generate_series(1, :n) AS g
+""")
+
+SEED_EMBEDDINGS_SQL = text("""
+    INSERT INTO message_embeddings (message_id, chat_id, embedding, created_at)
+    SELECT m.id, m.chat_id,
+           (SELECT array_agg(random())::vector(1536) FROM generate_series(1, 1536)),
+           NOW()
+    FROM messages m
+    LEFT JOIN message_embeddings e ON e.message_id = m.id
+    WHERE m.chat_id = :chat_id AND e.message_id IS NULL
+""")
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def seed(chat_id: str, n: int, with_embeddings: bool) -> None:
+    async with SessionLocal() as db:
+        await db.execute(SEED_MESSAGES_SQL, {"chat_id": chat_id, "n": n})
+        if with_embeddings:
+            await db.execute(SEED_EMBEDDINGS_SQL, {"chat_id": chat_id})
+        await db.commit()
+        await db.execute(text("ANALYZE messages"))
+        await db.execute(text("ANALYZE message_embeddings"))
+    print(f"Seeded {n} messages into chat {chat_id}")
+
+
+async def bench(chat_id: str, page: int, page_size: int, runs: int) -> None:
+    page_ms: list[float] = []
+    count_ms: list[float] = []
+
+    async with SessionLocal() as db:
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            await db.execute(select(func.count()).where(Message.chat_id == chat_id))
+            count_ms.append((time.perf_counter() - t0) * 1000)
+
+            t0 = time.perf_counter()
+            res = await db.execute(
+                select(Message)
+                .where(Message.chat_id == chat_id)
+                .order_by(Message.created_at.desc())
+                .offset((page - 1) * page_size)
+                .limit(page_size)
+            )
+            res.scalars().all()
+            page_ms.append((time.perf_counter() - t0) * 1000)
+            db.expunge_all()
+
+        plan = await db.execute(
+            text("""
+                EXPLAIN (ANALYZE, BUFFERS)
+                SELECT id, chat_id, sender, channel, content, audio_url, created_at, conversation_id
+                FROM messages
+                WHERE chat_id = :chat_id
+                ORDER BY created_at DESC
+                OFFSET :offset LIMIT :limit
+            """),
+            {"chat_id": chat_id, "offset": (page - 1) * page_size, "limit": page_size},
+        )
+        plan_lines = [row[0] for row in plan.fetchall()]
+
+    for label, samples in (("count", count_ms), ("page", page_ms)):
+        print(
+            f"{label:>5}: p50={statistics.median(samples):.2f}ms "
+            f"p95={_percentile(samples, 0.95):.2f}ms max={max(samples):.2f}ms (runs={runs})"
+        )
+    print("\n".join(plan_lines))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chat-id", required=True, help="Existing chat to benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Insert N synthetic messages first")
+    parser.add_argument("--seed-embeddings", action="store_true", help="Also seed side-table embeddings")
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.seed:
+        await seed(args.chat_id, args.seed, args.seed_embeddings)
+    await bench(args.chat_id, args.page, args.page_size, args.runs)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.bench_chat_history --chat-id <chat_id> --seed 1000000
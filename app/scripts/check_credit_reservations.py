@@ -0,0 +1,190 @@
+"""
+Exact-accounting check for credit reservations.
+
+Against a real database and Redis, for a throwaway user, influencer and
+wallet (app.scripts.fixtures) that are created here and deleted afterwards:
+
+- session: a CreditSession spends --messages messages across several blocks
+  and is closed.
+- concurrent: like session, but every consume() races an ensure(), as the
+  websocket receive loop and the flush task do. A block reserved twice
+  would be left open.
+- crash: a session spends --crash-messages messages and is abandoned, its
+  reservation is backdated past expiry and settle_expired_reservations
+  settles it.
+
+Each scenario must end with exactly the wallet debit, daily_usage increment
+and ledger rows that charging every message with charge_feature would have
+produced, no open reservation and nothing left in the wallet's held_cents.
+The fixture starts with no usage today, so the first messages are free.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+
+from app.db.models import CreditReservation, DailyUsage, InfluencerCreditTransaction, InfluencerWallet
+from app.db.session import SessionLocal
+from app.scripts.fixtures import fixture_pair
+from app.services.billing import _USAGE_COLUMN, _today_midnight_naive, _usage_key
+from app.services.credit_reservations import (
+    CREDIT_RESERVATION_SWEEP_GRACE_SECS,
+    CREDIT_RESERVATION_TTL_SECS,
+    CreditSession,
+    settle_expired_reservations,
+)
+from app.services.pricing_catalog import get_price
+
+CHECK_META = {"source": "check_credit_reservations"}
+
+
+async def _state(user_id: int, influencer_id: str, is_18: bool, col: str) -> dict:
+    async with SessionLocal() as db:
+        balance, held = (
+            await db.execute(
+                select(InfluencerWallet.balance_cents, InfluencerWallet.held_cents).where(
+                    InfluencerWallet.user_id == user_id,
+                    InfluencerWallet.influencer_id == influencer_id,
+                    InfluencerWallet.is_18 == is_18,
+                )
+            )
+        ).one()
+        usage = await db.get(DailyUsage, (user_id, _today_midnight_naive(), is_18))
+        rows, amount = (
+            await db.execute(
+                select(func.count(), func.coalesce(func.sum(InfluencerCreditTransaction.amount_cents), 0))
+                .where(
+                    InfluencerCreditTransaction.user_id == user_id,
+                    InfluencerCreditTransaction.influencer_id == influencer_id,
+                    InfluencerCreditTransaction.meta["source"].as_string() == CHECK_META["source"],
+                )
+            )
+        ).one()
+        open_reservations = await db.scalar(
+            select(func.count()).where(
+                CreditReservation.user_id == user_id,
+                CreditReservation.influencer_id == influencer_id,
+                CreditReservation.status == "open",
+            )
+        )
+    return {
+        "balance": int(balance or 0),
+        "held": int(held or 0),
+        "used": int(getattr(usage, col, 0) or 0) if usage else 0,
+        "ledger_rows": int(rows),
+        "ledger_cents": int(amount),
+        "open": int(open_reservations or 0),
+    }
+
+
+def _expected_cost(used_before: int, messages: int, price_cents: int, free_allowance: int) -> int:
+    free = min(messages, max(free_allowance - used_before, 0))
+    return (messages - free) * price_cents
+
+
+def _verify(name: str, before: dict, after: dict, messages: int, cost: int) -> bool:
+    got = {
+        "debit": before["balance"] - after["balance"],
+        "usage": after["used"] - before["used"],
+        "ledger_rows": after["ledger_rows"] - before["ledger_rows"],
+        "ledger_cents": before["ledger_cents"] - after["ledger_cents"],
+        "open": after["open"],
+        "held": after["held"],
+    }
+    want = {"debit": cost, "usage": messages, "ledger_rows": messages, "ledger_cents": cost, "open": 0, "held": 0}
+    passed = got == want
+    print(f"{name}: {'OK' if passed else 'FAIL'} got={got} want={want}")
+    return passed
+
+
+async def _spend(session: CreditSession, messages: int) -> int:
+    spent = 0
+    for _ in range(messages):
+        spent += int(await session.consume(1, meta=CHECK_META))
+    return spent
+
+
+async def _spend_racing(session: CreditSession, messages: int) -> int:
+    spent = 0
+    for _ in range(messages):
+        _, ok = await asyncio.gather(session.ensure(), session.consume(1, meta=CHECK_META))
+        spent += int(ok)
+    return spent
+
+
+async def _run(user_id: int, influencer_id: str, args, price, col: str) -> list[bool]:
+    key = dict(user_id=user_id, influencer_id=influencer_id, is_18=args.is_18)
+    results = []
+
+    before = await _state(user_id, influencer_id, args.is_18, col)
+    session = CreditSession(feature=args.feature, block_units=args.block, **key)
+    spent = await _spend(session, args.messages)
+    await session.close()
+    after = await _state(user_id, influencer_id, args.is_18, col)
+    cost = _expected_cost(before["used"], spent, price.price_cents, price.free_allowance)
+    results.append(spent == args.messages and _verify("session", before, after, spent, cost))
+
+    before = after
+    session = CreditSession(feature=args.feature, block_units=args.block, **key)
+    spent = await _spend_racing(session, args.messages)
+    await session.close()
+    after = await _state(user_id, influencer_id, args.is_18, col)
+    cost = _expected_cost(before["used"], spent, price.price_cents, price.free_allowance)
+    results.append(spent == args.messages and _verify("concurrent", before, after, spent, cost))
+
+    before = after
+    session = CreditSession(feature=args.feature, block_units=args.block, **key)
+    spent = await _spend(session, args.crash_messages)
+    expired = datetime.now(timezone.utc) - timedelta(seconds=CREDIT_RESERVATION_SWEEP_GRACE_SECS + 1)
+    async with SessionLocal() as db:
+        await db.execute(
+            update(CreditReservation)
+            .where(CreditReservation.user_id == user_id, CreditReservation.status == "open")
+            .values(expires_at=expired)
+        )
+        await db.commit()
+    await settle_expired_reservations()
+    after = await _state(user_id, influencer_id, args.is_18, col)
+    cost = _expected_cost(before["used"], spent, price.price_cents, price.free_allowance)
+    results.append(spent == args.crash_messages and _verify("crash", before, after, spent, cost))
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--feature", default="text")
+    parser.add_argument("--is-18", action="store_true")
+    parser.add_argument("--messages", type=int, default=47)
+    parser.add_argument("--crash-messages", type=int, default=7)
+    parser.add_argument("--block", type=int, default=20)
+    args = parser.parse_args()
+
+    price = await get_price(args.feature)
+    if price is None:
+        raise SystemExit(f"Feature {args.feature!r} has no active pricing")
+    col = _USAGE_COLUMN[_usage_key(args.feature)]
+
+    async with fixture_pair("credit-check") as (user_id, influencer_id):
+        async with SessionLocal() as db:
+            # Enough for every message plus an odd remainder that must survive
+            db.add(InfluencerWallet(
+                user_id=user_id,
+                influencer_id=influencer_id,
+                is_18=args.is_18,
+                balance_cents=(2 * args.messages + args.crash_messages) * price.price_cents + 37,
+            ))
+            await db.commit()
+        results = await _run(user_id, influencer_id, args, price, col)
+
+    if not all(results):
+        raise SystemExit(1)
+    print(f"all checks passed (block={args.block}, ttl={CREDIT_RESERVATION_TTL_SECS}s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.check_credit_reservations
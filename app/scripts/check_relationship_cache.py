@@ -0,0 +1,198 @@
+"""
+Crash-recovery check for the write-behind relationship cache.
+
+Against a real database and Redis, for a throwaway user x influencer pair
+(app.scripts.fixtures) that is created here and deleted afterwards:
+
+- recovery: --updates saves go to Redis only (inline flushes are held off),
+  the in-process flusher is dropped without its final flush, as in a crash,
+  and a fresh flusher is started. Its first pass must write the
+  relationship_state row to exactly the last cached version and clear the
+  dirty mark.
+- race: a save lands while a flush is writing (between reading the hash and
+  acking it). The _ACK_LUA version check must keep the key dirty, and the
+  next flush must write the newer version.
+
+Run it with no app instance using the same Redis, or another flusher may
+write the row first.
+"""
+
+import argparse
+import asyncio
+import math
+import time
+
+from sqlalchemy import select
+
+from app.db.models import RelationshipState
+from app.db.session import SessionLocal
+from app.relationship import state_cache
+from app.relationship.state_cache import (
+    DIRTY_KEY,
+    _UPSERT_FIELDS,
+    _decode,
+    _key,
+    flush_dirty_relationships,
+    load_relationship,
+    save_relationship,
+    start_relationship_flusher,
+)
+from app.scripts.fixtures import fixture_pair
+from app.utils.infrastructure.redis_pool import get_redis
+
+
+async def _row(user_id: int, influencer_id: str) -> dict | None:
+    table = RelationshipState.__table__
+    async with SessionLocal() as db:
+        row = (
+            await db.execute(
+                select(*table.c).where(
+                    table.c.user_id == user_id,
+                    table.c.influencer_id == influencer_id,
+                )
+            )
+        ).mappings().first()
+    return dict(row) if row else None
+
+
+async def _cached(key: str) -> tuple[dict, str]:
+    r = await get_redis()
+    raw = await r.hgetall(key)
+    return _decode(raw), raw.get("_ver", "")
+
+
+async def _is_dirty(key: str) -> bool:
+    r = await get_redis()
+    return await r.zscore(DIRTY_KEY, key) is not None
+
+
+def _diff(row: dict | None, cached: dict) -> dict:
+    if row is None:
+        return {"row": "missing"}
+    out = {}
+    for f in _UPSERT_FIELDS:
+        a, b = row.get(f), cached.get(f)
+        if isinstance(a, float) or isinstance(b, float):
+            if not math.isclose(float(a or 0.0), float(b or 0.0), rel_tol=1e-9, abs_tol=1e-9):
+                out[f] = (a, b)
+        elif a != b:
+            out[f] = (a, b)
+    return out
+
+
+def _report(name: str, passed: bool, detail) -> bool:
+    print(f"{name}: {'OK' if passed else 'FAIL'} {detail}")
+    return passed
+
+
+async def _bump(db, user_id: int, influencer_id: str, step: int) -> None:
+    """One turn's worth of changes, saved the way the turn pipeline saves."""
+    rel = await load_relationship(db, user_id, influencer_id)
+    rel.trust = min(100.0, (rel.trust or 0.0) + 0.25)
+    rel.closeness = min(100.0, (rel.closeness or 0.0) + 0.5)
+    rel.stage_points = (rel.stage_points or 0.0) + 1.0
+    rel.sentiment_delta = float(step)
+    await save_relationship(db, rel)
+
+
+def _crash() -> None:
+    """Drop the flusher and any inline flushes without the final flush."""
+    if state_cache._flusher_task is not None:
+        state_cache._flusher_task.cancel()
+        state_cache._flusher_task = None
+    for task in list(state_cache._inline_flushes):
+        task.cancel()
+
+
+async def _wait_clean(key: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not await _is_dirty(key):
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+async def _run(user_id: int, influencer_id: str, args) -> list[bool]:
+    key = _key(user_id, influencer_id)
+    r = await get_redis()
+
+    # Keep every save in Redis until the crash
+    state_cache.REL_FLUSH_AFTER_UPDATES = args.updates + 10
+    results = []
+    write_rows = state_cache._write_rows
+    try:
+        async with SessionLocal() as db:
+            for step in range(args.updates):
+                await _bump(db, user_id, influencer_id, step)
+
+        cached, _ = await _cached(key)
+        stale = _diff(await _row(user_id, influencer_id), cached)
+        if not stale:
+            print("note: row already matches the cache; another flusher is running against this Redis")
+        print(f"before recovery: dirty={await _is_dirty(key)} fields behind={sorted(stale)}")
+
+        _crash()
+        start_relationship_flusher()
+        clean = await _wait_clean(key, args.timeout)
+        _crash()
+        cached, _ = await _cached(key)
+        diff = _diff(await _row(user_id, influencer_id), cached)
+        results.append(_report("recovery", clean and not diff, {"clean": clean, "diff": diff}))
+
+        # A save that lands after the flush read the hash but before it acks
+        async def _write_then_save(db, rows):
+            await write_rows(db, rows)
+            async with SessionLocal() as other:
+                await _bump(other, user_id, influencer_id, -1)
+
+        async with SessionLocal() as db:
+            await _bump(db, user_id, influencer_id, args.updates)
+        _, ver_read = await _cached(key)
+        state_cache._write_rows = _write_then_save
+        try:
+            await state_cache._flush_keys([key])
+        finally:
+            state_cache._write_rows = write_rows
+        cached, ver_now = await _cached(key)
+        dirty = await _is_dirty(key)
+        behind = _diff(await _row(user_id, influencer_id), cached)
+        results.append(_report(
+            "race",
+            dirty and ver_now != ver_read and bool(behind),
+            {"dirty": dirty, "ver_read": ver_read, "ver_now": ver_now, "fields_behind": sorted(behind)},
+        ))
+
+        await flush_dirty_relationships()
+        cached, _ = await _cached(key)
+        diff = _diff(await _row(user_id, influencer_id), cached)
+        dirty = await _is_dirty(key)
+        results.append(_report("race-reflush", not dirty and not diff, {"dirty": dirty, "diff": diff}))
+    finally:
+        state_cache._write_rows = write_rows
+        _crash()
+        await r.delete(key)
+        await r.zrem(DIRTY_KEY, key)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--updates", type=int, default=30)
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for the start-up flush")
+    args = parser.parse_args()
+
+    # The relationship row cascades with the fixture pair
+    async with fixture_pair("relcache-check") as (user_id, influencer_id):
+        results = await _run(user_id, influencer_id, args)
+
+    if not all(results):
+        raise SystemExit(1)
+    print(f"all checks passed (updates={args.updates})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.check_relationship_cache
@@ -0,0 +1,129 @@
+"""
+Golden check and benchmark for the TTS sanitizer.
+
+Golden: every string in the corpus must come out of sanitize_tts_text
+exactly as it comes out of _sanitize_tts_text_reference (the original
+multi-pass version). Then "".join() of what TTSTextStream returns must
+equal sanitize_tts_text, with the text fed in random-sized deltas. The
+corpus is a fixed list of awkward replies (entities, emoji, markdown,
+audio tags, tab/space runs, break tags) plus --fuzz random strings built
+from the same pieces.
+
+Bench: median time per call of both versions over the corpus, --runs times.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from app.utils.messaging.tts_sanitizer import (
+    TTSTextStream,
+    _sanitize_tts_text_reference,
+    sanitize_tts_text,
+)
+
+GOLDEN = [
+    "",
+    "   ",
+    "Hello there!",
+    "  Hey\t\tyou,   how's it   going?  ",
+    "[chuckles] Oh stop it... [whispers] you're too sweet.",
+    "[SIGHS] fine [unknown] tag [Laughs]",
+    "**Bold** and _italic_ and `code` and ~~strike~~ # heading > quote",
+    "I miss you 😘💕 so much ✨✨",
+    "Tom &amp; Jerry &lt;3 &gt; &quot;quoted&quot; &#39;single&#39; &#128512; &#x2728;",
+    "&ampersand &copy2024 &notit; &nbsp;spaced",
+    'Wait <break time="1.5s"/> for it <b>bold</b> <i>it</i>',
+    "Math $begin:math:display$$end:math:display$$begin:math:text$$end:math:text$ gone",
+    "Split $begin:math:dis*play$$end:math:display$$begin:math:text$$end:math:text$ marker",
+    "a * b _ c\t*\t d",
+    "😀",
+    "**",
+    "\n\n*\n",
+    "Line one.\nLine two!\n\nLine three?",
+    "Trailing spaces before emoji 😀   ",
+    "V3TAG000V3 literal marker [sad]",
+    "__V3_TAG_1__ old marker",
+    "Ellipsis… then more…   and more.",
+    "Tabs\tinside\t\twords",
+    "&#9;tab entity &#32;&#32;space entities",
+    "Unicode spaces  here",
+]
+
+_PIECES = [
+    " ", "  ", "\t", "\n", "a", "word", "Hi", ".", "!", "?", "…", "*", "_", "`", "~", "#", ">", "<",
+    "😀", "✨", "💕", "&amp;", "&amp", "&lt;", "&#128512;", "&#x2728;", "&#9;", "&", "&#", "&co", "py",
+    "[sad]", "[chuckles]", "[nope]", "[", "]", '<break time="1s"/>', "$", "begin:math:display",
+    "$begin:math:display$$end:math:display$$begin:math:text$$end:math:text$", " ", "é",
+]
+
+
+def _fuzz(n: int, rng: random.Random) -> list[str]:
+    return ["".join(rng.choice(_PIECES) for _ in range(rng.randint(1, 40))) for _ in range(n)]
+
+
+def _stream(text: str, rng: random.Random) -> str:
+    sanitizer = TTSTextStream()
+    out = []
+    i = 0
+    while i < len(text):
+        step = rng.randint(1, 12)
+        out += sanitizer.feed(text[i:i + step])
+        i += step
+    out += sanitizer.finish()
+    return "".join(out)
+
+
+def _bench(fn, corpus: list[str], runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        samples.append((time.perf_counter() - t0) / len(corpus))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fuzz", type=int, default=20000, help="Random strings on top of the golden list")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = GOLDEN + _fuzz(args.fuzz, rng)
+
+    mismatches = 0
+    stream_mismatches = 0
+    for text in corpus:
+        expected = _sanitize_tts_text_reference(text)
+        got = sanitize_tts_text(text)
+        if got != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"MISMATCH {text!r}: {got!r} != {expected!r}")
+        if "V3TAG" in text or not text:
+            continue
+        streamed = _stream(text, rng)
+        if streamed != got:
+            stream_mismatches += 1
+            if stream_mismatches <= 5:
+                print(f"STREAM MISMATCH {text!r}: {streamed!r} != {got!r}")
+
+    bench_corpus = GOLDEN * 20
+    old_us = _bench(_sanitize_tts_text_reference, bench_corpus, args.runs) * 1e6
+    new_us = _bench(sanitize_tts_text, bench_corpus, args.runs) * 1e6
+    print(f"{len(corpus)} strings, {mismatches} mismatches, {stream_mismatches} stream mismatches")
+    print(f"reference {old_us:.2f} us/call, single pass {new_us:.2f} us/call")
+
+    if mismatches or stream_mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# to run:
+# poetry run python -m app.scripts.check_tts_sanitizer
@@ -0,0 +1,71 @@
+"""
+Merge near-duplicate memories and enforce the per-chat memory cap.
+
+Runs the same job the scheduler runs nightly. Use --dry-run to see how many
+rows would be merged/evicted without deleting anything. Every real run
+prints a run_id; --restore <run_id> puts that run's removed memories back
+from memory_consolidation_audit.
+"""
+
+import argparse
+import asyncio
+import json
+
+from app.services.memory_consolidation import (
+    MEMORY_CAP_PER_CHAT,
+    MEMORY_MERGE_DISTANCE,
+    MEMORY_RECENCY_HALF_LIFE_DAYS,
+    MEMORY_CONSOLIDATION_BATCH,
+    MEMORY_CONSOLIDATION_CONCURRENCY,
+    MEMORY_CONSOLIDATION_MIN_COUNT,
+    consolidate_chat_memories,
+    restore_consolidation_run,
+    run_memory_consolidation_job,
+)
+from app.db.session import SessionLocal
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chat-id", help="Only consolidate this chat")
+    parser.add_argument("--cap", type=int, default=MEMORY_CAP_PER_CHAT)
+    parser.add_argument("--distance", type=float, default=MEMORY_MERGE_DISTANCE, help="Cosine distance for merging")
+    parser.add_argument("--half-life-days", type=float, default=MEMORY_RECENCY_HALF_LIFE_DAYS)
+    parser.add_argument("--batch-size", type=int, default=MEMORY_CONSOLIDATION_BATCH)
+    parser.add_argument("--concurrency", type=int, default=MEMORY_CONSOLIDATION_CONCURRENCY)
+    parser.add_argument("--min-count", type=int, default=MEMORY_CONSOLIDATION_MIN_COUNT)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--restore", metavar="RUN_ID", help="Undo a previous run (with --chat-id, only that chat)")
+    args = parser.parse_args()
+
+    if args.restore:
+        async with SessionLocal() as db:
+            result = await restore_consolidation_run(db, args.restore, chat_id=args.chat_id)
+    elif args.chat_id:
+        async with SessionLocal() as db:
+            result = await consolidate_chat_memories(
+                db,
+                args.chat_id,
+                cap=args.cap,
+                distance_threshold=args.distance,
+                half_life_days=args.half_life_days,
+                dry_run=args.dry_run,
+            )
+    else:
+        result = await run_memory_consolidation_job(
+            cap=args.cap,
+            distance_threshold=args.distance,
+            half_life_days=args.half_life_days,
+            batch_size=args.batch_size,
+            concurrency=args.concurrency,
+            min_count=args.min_count,
+            dry_run=args.dry_run,
+        )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.consolidate_memories --dry-run
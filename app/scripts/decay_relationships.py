@@ -0,0 +1,35 @@
+"""
+Apply inactivity decay to every idle relationship_state row.
+
+Runs the same job the scheduler runs nightly. Use --dry-run to see how many
+rows would be decayed and by how many points, without writing anything.
+"""
+
+import argparse
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from app.services.inactivity_decay import INACTIVITY_DECAY_CHUNK_SIZE, run_inactivity_decay_job
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-size", type=int, default=INACTIVITY_DECAY_CHUNK_SIZE, help="Ids per UPDATE/commit")
+    parser.add_argument("--now", type=datetime.fromisoformat, help="Decay as of this ISO timestamp (default: now)")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    now = args.now
+    if now is not None and now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+
+    result = await run_inactivity_decay_job(chunk_size=args.chunk_size, dry_run=args.dry_run, now=now)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.decay_relationships --dry-run
@@ -0,0 +1,44 @@
+"""
+Throwaway user x influencer pair for the check and bench scripts.
+
+fixture_pair() creates a user and an influencer with random ids, yields
+(user_id, influencer_id) and deletes both afterwards. Wallets, ledger rows,
+reservations and relationship rows cascade with them; daily_usage does not,
+so it is deleted here. Redis keys are the caller's to clean up.
+"""
+
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import delete
+
+from app.db.models import DailyUsage, Influencer, User
+from app.db.session import SessionLocal
+
+
+@asynccontextmanager
+async def fixture_pair(tag: str):
+    suffix = uuid.uuid4().hex[:12]
+    influencer_id = f"{tag}-{suffix}"
+    async with SessionLocal() as db:
+        user = User(
+            email=f"{tag}-{suffix}@fixture.invalid",
+            username=f"{tag}-{suffix}",
+            password_hash="!",
+            is_verified=True,
+            created_at=datetime.now(timezone.utc),
+        )
+        db.add(user)
+        db.add(Influencer(id=influencer_id, display_name=tag, prompt_template=""))
+        await db.commit()
+        user_id = user.id
+
+    try:
+        yield user_id, influencer_id
+    finally:
+        async with SessionLocal() as db:
+            await db.execute(delete(DailyUsage).where(DailyUsage.user_id == user_id))
+            await db.execute(delete(Influencer).where(Influencer.id == influencer_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
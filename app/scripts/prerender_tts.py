@@ -0,0 +1,29 @@
+"""
+Voice the canned replies in every influencer voice and store them in the
+TTS cache.
+
+Runs the same job the scheduler runs daily when TTS_PRERENDER_ENABLED=true. Lines already cached are
+skipped, so re-running only pays for new influencers or changed lines.
+"""
+
+import argparse
+import asyncio
+import json
+
+from app.services.tts_cache import TTS_PRERENDER_TIME_BUDGET_SECS, get_tts_cache_stats, run_tts_prerender
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget", type=float, default=TTS_PRERENDER_TIME_BUDGET_SECS, help="Time budget in seconds")
+    args = parser.parse_args()
+
+    result = await run_tts_prerender(time_budget_secs=args.budget)
+    print(json.dumps({"result": result, "stats": get_tts_cache_stats()}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.prerender_tts
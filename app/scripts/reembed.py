@@ -0,0 +1,74 @@
+"""
+Re-embed memories and messages, resumably.
+
+Examples:
+  # fill rows whose embedding failed
+  python -m app.scripts.reembed memories --missing-only
+  # re-embed everything after changing EMBEDDING_MODEL
+  python -m app.scripts.reembed memories messages messages_18 --restart
+  # exercise the pipeline without calling OpenAI
+  python -m app.scripts.reembed memories --provider fake --job smoke --limit 1000
+"""
+
+import argparse
+import asyncio
+import json
+
+from app.services.embeddings import get_embeddings_batch
+from app.services.reembed import (
+    REEMBED_CONCURRENCY,
+    REEMBED_MAX_BATCH_ITEMS,
+    REEMBED_MAX_BATCH_TOKENS,
+    REEMBED_PAGE_SIZE,
+    REEMBED_REQUESTS_PER_MIN,
+    REEMBED_TOKENS_PER_MIN,
+    TARGETS,
+    fake_embeddings,
+    run_reembed,
+)
+
+PROVIDERS = {
+    "openai": get_embeddings_batch,
+    "fake": fake_embeddings,
+}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="+", choices=sorted(TARGETS))
+    parser.add_argument("--missing-only", action="store_true", help="Only rows without an embedding")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+    parser.add_argument("--job", help="Checkpoint name (default: <target>:all|missing)")
+    parser.add_argument("--provider", choices=sorted(PROVIDERS), default="openai")
+    parser.add_argument("--page-size", type=int, default=REEMBED_PAGE_SIZE)
+    parser.add_argument("--batch-items", type=int, default=REEMBED_MAX_BATCH_ITEMS)
+    parser.add_argument("--batch-tokens", type=int, default=REEMBED_MAX_BATCH_TOKENS)
+    parser.add_argument("--concurrency", type=int, default=REEMBED_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=REEMBED_REQUESTS_PER_MIN, help="Requests per minute")
+    parser.add_argument("--tpm", type=int, default=REEMBED_TOKENS_PER_MIN, help="Tokens per minute")
+    parser.add_argument("--limit", type=int, help="Stop after about N rows per target")
+    args = parser.parse_args()
+
+    for target in args.targets:
+        result = await run_reembed(
+            target,
+            job=f"{args.job}:{target}" if args.job and len(args.targets) > 1 else args.job,
+            missing_only=args.missing_only,
+            restart=args.restart,
+            embed_fn=PROVIDERS[args.provider],
+            page_size=args.page_size,
+            max_items=args.batch_items,
+            max_tokens=args.batch_tokens,
+            concurrency=args.concurrency,
+            requests_per_min=args.rpm,
+            tokens_per_min=args.tpm,
+            limit=args.limit,
+        )
+        print(json.dumps(result, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.reembed memories --missing-only
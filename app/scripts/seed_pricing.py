@@ -3,6 +3,7 @@ from sqlalchemy import select
 
 from app.db.models import Pricing
 from app.db.session import SessionLocal
+from app.services.pricing_catalog import bump_pricing_version
 
 PRICING_ROWS = [
     {
@@ -60,6 +61,7 @@ async def main():
                 db.add(Pricing(**row))
                 print(f"Inserted pricing for {row['feature']}")
         await db.commit()
+    await bump_pricing_version()
     print("Done.")
 
 
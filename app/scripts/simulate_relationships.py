@@ -0,0 +1,165 @@
+"""
+Simulate relationship progression with the vectorized engine.
+
+Runs N synthetic users for T turns with signals drawn from behaviour
+profiles and reports, per profile, how many users reach each stage and the
+turns-to-stage distribution. K tables can be overridden with JSON to try
+tuning offline, e.g.
+
+  python -m app.scripts.simulate_relationships --users 1000000 --turns 200 \\
+      --k-up '{"STRANGERS": 0.08, "FRIENDS": 0.05}'
+
+--check compares the vectorized engine against the scalar one instead and
+exits non-zero if any field differs by more than --tolerance or any
+state/flag disagrees.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from app.relationship.engine import K_UP_BY_STAGE, K_DOWN_BY_STAGE
+from app.relationship.vectorized import (
+    FRIENDS,
+    FLIRTING,
+    DATING,
+    GIRLFRIEND,
+    RelArrays,
+    apply_inactivity_decay,
+    apply_turn_signals,
+    check_equivalence,
+    k_table,
+)
+
+# Per-signal (probability the signal fires on a turn, max intensity when it does)
+PROFILES: dict[str, dict[str, tuple[float, float]]] = {
+    "sweet": {"support": (0.5, 0.8), "affection": (0.5, 0.8), "respect": (0.6, 0.7), "flirt": (0.2, 0.5),
+              "apology": (0.05, 0.5), "commitment_talk": (0.1, 0.6)},
+    "flirty": {"flirt": (0.7, 0.9), "affection": (0.4, 0.7), "respect": (0.3, 0.6), "support": (0.2, 0.5),
+               "boundary_push": (0.05, 0.5), "commitment_talk": (0.1, 0.5)},
+    "neutral": {"support": (0.15, 0.4), "respect": (0.2, 0.4), "affection": (0.1, 0.3), "flirt": (0.05, 0.3)},
+    "rude": {"rude": (0.4, 0.7), "boundary_push": (0.2, 0.6), "dislike": (0.2, 0.6), "hate": (0.05, 0.7),
+             "flirt": (0.2, 0.5), "apology": (0.1, 0.5)},
+}
+DEFAULT_MIX = {"sweet": 0.3, "flirty": 0.3, "neutral": 0.3, "rude": 0.1}
+TRACKED = {"FRIENDS": FRIENDS, "FLIRTING": FLIRTING, "DATING": DATING, "GIRLFRIEND": GIRLFRIEND}
+
+
+def _profile_tables(profile_idx: np.ndarray, names: list[str]) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """Per-user (fire probability, peak) arrays for every signal any profile uses."""
+    keys = sorted({k for p in PROFILES.values() for k in p})
+    tables = {}
+    for key in keys:
+        p_fire = np.array([PROFILES[name].get(key, (0.0, 0.0))[0] for name in names], dtype=np.float32)
+        peak = np.array([PROFILES[name].get(key, (0.0, 0.0))[1] for name in names], dtype=np.float32)
+        tables[key] = (p_fire[profile_idx], peak[profile_idx])
+    return tables
+
+
+def _draw_signals(rng, tables: dict, n: int, accept_rate: float) -> dict:
+    sig = {}
+    for key, (p_fire, peak) in tables.items():
+        u = rng.random(n, dtype=np.float32)
+        # One uniform per signal: fires when u < p_fire, intensity rescaled from u
+        sig[key] = np.where(u < p_fire, (u / np.maximum(p_fire, 1e-9)) * peak, 0.0)
+    sig["accepted_exclusive"] = rng.random(n, dtype=np.float32) < accept_rate
+    sig["accepted_girlfriend"] = rng.random(n, dtype=np.float32) < accept_rate
+    return sig
+
+
+def simulate(
+    users: int,
+    turns: int,
+    mix: dict[str, float],
+    k_up: np.ndarray,
+    k_down: np.ndarray,
+    accept_rate: float,
+    idle_every: int,
+    idle_days: float,
+    seed: int,
+) -> dict:
+    rng = np.random.default_rng(seed)
+    names = list(mix)
+    weights = np.array([mix[n] for n in names], dtype=np.float64)
+    profile_idx = rng.choice(len(names), size=users, p=weights / weights.sum())
+
+    tables = _profile_tables(profile_idx, names)
+    rel = RelArrays.new(users)
+    first_turn = {stage: np.full(users, -1, dtype=np.int32) for stage in TRACKED}
+
+    for t in range(1, turns + 1):
+        if idle_every and t % idle_every == 0:
+            apply_inactivity_decay(rel, rng.exponential(idle_days, users))
+        apply_turn_signals(rel, _draw_signals(rng, tables, users, accept_rate), k_up, k_down)
+        for stage, code in TRACKED.items():
+            newly = (first_turn[stage] < 0) & (rel.state >= code) & (rel.state <= GIRLFRIEND)
+            first_turn[stage][newly] = t
+
+    report = {}
+    for p, name in enumerate(names):
+        mask = profile_idx == p
+        per_stage = {}
+        for stage in TRACKED:
+            reached = first_turn[stage][mask]
+            reached = reached[reached > 0]
+            per_stage[stage] = {
+                "reached": round(reached.size / max(1, int(mask.sum())), 4),
+                "p10": int(np.percentile(reached, 10)) if reached.size else None,
+                "p50": int(np.percentile(reached, 50)) if reached.size else None,
+                "p90": int(np.percentile(reached, 90)) if reached.size else None,
+            }
+        final = np.bincount(rel.state[mask].astype(np.int64), minlength=9)
+        report[name] = {"users": int(mask.sum()), "time_to_stage": per_stage, "final_state_counts": final.tolist()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX, help='e.g. \'{"sweet": 0.5, "rude": 0.5}\'')
+    parser.add_argument("--k-up", type=json.loads, default={}, help="Overrides for K_UP_BY_STAGE")
+    parser.add_argument("--k-down", type=json.loads, default={}, help="Overrides for K_DOWN_BY_STAGE")
+    parser.add_argument("--accept-rate", type=float, default=0.3, help="Chance a user accepts exclusivity/girlfriend when asked")
+    parser.add_argument("--idle-every", type=int, default=0, help="Apply inactivity decay every N turns")
+    parser.add_argument("--idle-days", type=float, default=2.0, help="Mean idle gap (exponential) in days")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true", help="Verify vectorized == scalar and exit")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Max abs diff allowed per field for --check")
+    args = parser.parse_args()
+
+    if args.check:
+        report = check_equivalence()
+        print(json.dumps(report, indent=2))
+        drift = {k: v for k, v in report.items() if k.startswith("max_abs_diff_") and v > args.tolerance}
+        mismatches = {k: v for k, v in report.items() if k.endswith("_mismatches") and v}
+        if drift or mismatches:
+            print(f"FAIL: over tolerance={drift} mismatches={mismatches}")
+            raise SystemExit(1)
+        print(f"OK: vectorized matches scalar within {args.tolerance}")
+        return
+
+    unknown = set(args.mix) - set(PROFILES)
+    if unknown:
+        raise SystemExit(f"Unknown profiles: {sorted(unknown)} (have {sorted(PROFILES)})")
+
+    k_up = k_table({**K_UP_BY_STAGE, **args.k_up}, 0.025)
+    k_down = k_table({**K_DOWN_BY_STAGE, **args.k_down}, 0.03)
+
+    started = time.perf_counter()
+    report = simulate(
+        args.users, args.turns, args.mix, k_up, k_down,
+        args.accept_rate, args.idle_every, args.idle_days, args.seed,
+    )
+    elapsed = time.perf_counter() - started
+    print(json.dumps(report, indent=2))
+    print(f"Simulated {args.users} users x {args.turns} turns in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
+
+# to run:
+# poetry run python -m app.scripts.simulate_relationships --users 1000000 --turns 200
@@ -0,0 +1,202 @@
+"""
+Train the local relationship-signal classifier.
+
+Samples are the (message, LLM signals) pairs classify_signals logs to the
+Redis list sig:samples (only when SIGNAL_SAMPLE_RATE > 0; samples older
+than SIGNAL_SAMPLE_TTL_DAYS are ignored), or a JSONL file with
+{"message": ..., "signals": {...}} per line. Trains a multi-output logistic model (soft targets) with AdaGrad on
+hashed features, then reports on a held-out split:
+
+- per-key MAE and 0.5-threshold agreement with the LLM
+- coverage: share of turns the model would answer locally, and the
+  agreement on exactly those turns
+- mean/p95 prediction latency
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.relationship.signal_model import (
+    BOOL_KEYS,
+    DEFAULT_N_FEATURES,
+    OUTPUT_KEYS,
+    SIGNAL_SAMPLE_TTL_DAYS,
+    SIGNAL_SAMPLES_KEY,
+    SignalModel,
+    featurize,
+)
+
+
+def _target(signals: dict) -> np.ndarray:
+    out = []
+    for k in OUTPUT_KEYS:
+        v = signals.get(k, 0.0)
+        if k in BOOL_KEYS:
+            out.append(1.0 if v is True or str(v).lower() == "true" else 0.0)
+        else:
+            try:
+                out.append(max(0.0, min(1.0, float(v))))
+            except (TypeError, ValueError):
+                out.append(0.0)
+    return np.array(out, dtype=np.float32)
+
+
+async def load_samples(path: str | None, limit: int) -> list[tuple[str, np.ndarray]]:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            raw = [json.loads(line) for line in f if line.strip()]
+    else:
+        from app.utils.infrastructure.redis_pool import get_redis
+
+        r = await get_redis()
+        raw = [json.loads(x) for x in await r.lrange(SIGNAL_SAMPLES_KEY, 0, limit - 1)]
+
+    cutoff = time.time() - SIGNAL_SAMPLE_TTL_DAYS * 86400
+    samples = []
+    for item in raw[:limit]:
+        if item.get("ts") is not None and item["ts"] < cutoff:
+            continue
+        message = (item.get("message") or "").strip()
+        if message and isinstance(item.get("signals"), dict):
+            samples.append((message, _target(item["signals"])))
+    return samples
+
+
+def _batch_logits(weights, bias, feats):
+    logits = np.tile(bias, (len(feats), 1))
+    for i, (idx, vals) in enumerate(feats):
+        if idx.size:
+            logits[i] += vals @ weights[idx]
+    return logits
+
+
+def train(
+    samples: list[tuple[str, np.ndarray]],
+    n_features: int,
+    epochs: int,
+    lr: float,
+    l2: float,
+    batch_size: int,
+) -> SignalModel:
+    n_out = len(OUTPUT_KEYS)
+    weights = np.zeros((n_features, n_out), dtype=np.float32)
+    bias = np.zeros(n_out, dtype=np.float32)
+    g2_w = np.full((n_features, n_out), 1e-8, dtype=np.float32)
+    g2_b = np.full(n_out, 1e-8, dtype=np.float32)
+
+    feats = [featurize(m, n_features) for m, _ in samples]
+    targets = np.stack([y for _, y in samples])
+    order = np.arange(len(samples))
+
+    for epoch in range(epochs):
+        np.random.shuffle(order)
+        loss = 0.0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            bf = [feats[i] for i in batch]
+            probs = 1.0 / (1.0 + np.exp(-_batch_logits(weights, bias, bf)))
+            y = targets[batch]
+            loss += float(-np.sum(y * np.log(probs + 1e-7) + (1 - y) * np.log(1 - probs + 1e-7)))
+
+            err = (probs - y) / len(batch)
+            idx_all = np.concatenate([f[0] for f in bf])
+            contrib = np.concatenate([f[1][:, None] * err[i] for i, f in enumerate(bf)]) if idx_all.size else None
+
+            if contrib is not None:
+                uniq, inv = np.unique(idx_all, return_inverse=True)
+                grad = np.zeros((uniq.size, n_out), dtype=np.float32)
+                np.add.at(grad, inv, contrib)
+                grad += l2 * weights[uniq]
+                g2_w[uniq] += grad ** 2
+                weights[uniq] -= lr * grad / np.sqrt(g2_w[uniq])
+
+            grad_b = err.sum(axis=0)
+            g2_b += grad_b ** 2
+            bias -= lr * grad_b / np.sqrt(g2_b)
+
+        print(f"epoch {epoch + 1}/{epochs} loss={loss / max(1, len(order)):.4f}")
+
+    return SignalModel(weights, bias)
+
+
+def evaluate(model: SignalModel, samples: list[tuple[str, np.ndarray]]) -> dict:
+    probs, targets, confident, latencies = [], [], [], []
+    for message, y in samples:
+        t0 = time.perf_counter()
+        p = model.predict_proba(message)
+        latencies.append((time.perf_counter() - t0) * 1e6)
+        _, ok, _ = model.predict(message)
+        probs.append(p)
+        targets.append(y)
+        confident.append(ok)
+
+    probs = np.stack(probs)
+    targets = np.stack(targets)
+    confident = np.array(confident, dtype=bool)
+    agree_rows = np.all((probs >= 0.5) == (targets >= 0.5), axis=1)
+
+    return {
+        "n": len(samples),
+        "mae": {k: round(float(np.mean(np.abs(probs[:, i] - targets[:, i]))), 4) for i, k in enumerate(OUTPUT_KEYS)},
+        "agreement": {
+            k: round(float(np.mean((probs[:, i] >= 0.5) == (targets[:, i] >= 0.5))), 4)
+            for i, k in enumerate(OUTPUT_KEYS)
+        },
+        "agreement_all_keys": round(float(np.mean(agree_rows)), 4),
+        "coverage": round(float(np.mean(confident)), 4),
+        "agreement_when_local": round(float(np.mean(agree_rows[confident])), 4) if confident.any() else None,
+        "latency_us_mean": round(float(np.mean(latencies)), 1),
+        "latency_us_p95": round(float(np.percentile(latencies, 95)), 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="JSONL samples (default: Redis list sig:samples)")
+    parser.add_argument("--output", required=True, help="Where to write the .npz artifact")
+    parser.add_argument("--limit", type=int, default=200_000)
+    parser.add_argument("--features", type=int, default=DEFAULT_N_FEATURES)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--lr", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-5)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--holdout", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+
+    samples = await load_samples(args.input, args.limit)
+    if len(samples) < 100:
+        raise SystemExit(f"Not enough samples to train: {len(samples)}")
+
+    random.shuffle(samples)
+    n_holdout = max(1, int(len(samples) * args.holdout))
+    holdout, train_set = samples[:n_holdout], samples[n_holdout:]
+
+    model = train(train_set, args.features, args.epochs, args.lr, args.l2, args.batch_size)
+    metrics = evaluate(model, holdout)
+    model.meta = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "train_samples": len(train_set),
+        "features": args.features,
+        "holdout": metrics,
+    }
+    model.save(args.output)
+
+    print(json.dumps(metrics, indent=2))
+    print(f"Saved model to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+# to run:
+# poetry run python -m app.scripts.train_signal_model --output signal_model.npz
@@ -0,0 +1,516 @@
+"""
+Audio duration from container headers.
+
+Voice notes are billed per second, so every upload needs its duration.
+parse_duration reads it straight from the in-memory bytes:
+
+- WAV: fmt/data chunks (byte rate)
+- MP3: Xing/Info or VBRI frame count, otherwise a frame scan
+- AAC (ADTS): frame scan
+- Ogg Opus/Vorbis: granule position of the last page
+- FLAC: STREAMINFO total samples
+- WebM/Matroska: Info/Duration, or a cluster scan when the recorder didn't
+  write one (MediaRecorder in Chrome never does)
+- MP4/M4A: mvhd
+
+Anything it can't read falls back to ffprobe (and an ffmpeg decode as a last
+resort), run with asyncio.create_subprocess_exec so the event loop isn't
+blocked, at most AUDIO_PROBE_CONCURRENCY at a time.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+import tempfile
+
+log = logging.getLogger("audio-duration")
+
+AUDIO_PROBE_CONCURRENCY = int(os.getenv("AUDIO_PROBE_CONCURRENCY", "4"))
+AUDIO_PROBE_TIMEOUT_SECS = float(os.getenv("AUDIO_PROBE_TIMEOUT_SECS", "15"))
+
+_probe_semaphore: asyncio.Semaphore | None = None
+
+_stats: dict[str, int] = {
+    "parsed": 0,
+    "ffprobe": 0,
+    "ffmpeg_decode": 0,
+    "failed": 0,
+    "probe_timeouts": 0,
+}
+_parsed_by_format: dict[str, int] = {}
+
+
+def _wav_duration(data: bytes) -> float | None:
+    if len(data) < 12 or data[:4] not in (b"RIFF", b"RF64") or data[8:12] != b"WAVE":
+        return None
+    byte_rate = 0
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = struct.unpack_from("<I", data, pos + 4)[0]
+        body = pos + 8
+        if chunk_id == b"fmt " and body + 16 <= len(data):
+            byte_rate = struct.unpack_from("<I", data, body + 8)[0]
+        elif chunk_id == b"data":
+            available = len(data) - body
+            # Streaming writers leave the size at 0 or 0xFFFFFFFF
+            if size in (0, 0xFFFFFFFF) or size > available:
+                size = available
+            return size / byte_rate if byte_rate else None
+        pos = body + size + (size & 1)
+    return None
+
+
+_MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+_ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+
+def _mp3_frame(data: bytes, pos: int) -> tuple[int, int, int, int, int] | None:
+    """(frame_len, samples, sample_rate, version, channel_mode) or None."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = {0: 25, 2: 2, 3: 1}.get((b1 >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b1 >> 1) & 3)
+    bitrate_idx, rate_idx = b2 >> 4, (b2 >> 2) & 3
+    if version is None or layer is None or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    bitrate = _MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_idx] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_idx]
+    padding = (b2 >> 1) & 1
+    if layer == 1:
+        samples = 384
+        frame_len = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        frame_len = samples // 8 * bitrate // sample_rate + padding
+    return frame_len, samples, sample_rate, version, b3 >> 6
+
+
+def _skip_id3(data: bytes) -> int:
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] & 0x7F) << 21 | (data[7] & 0x7F) << 14 | (data[8] & 0x7F) << 7 | (data[9] & 0x7F)
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def _mp3_duration(data: bytes) -> float | None:
+    start = _skip_id3(data)
+    # First frame whose successor also lines up, so stray 0xFF bytes don't count
+    pos = start
+    first = None
+    limit = min(len(data), start + 64 * 1024)
+    while pos < limit:
+        pos = data.find(b"\xff", pos, limit)
+        if pos < 0:
+            return None
+        frame = _mp3_frame(data, pos)
+        if frame and frame[0] > 4:
+            nxt = pos + frame[0]
+            if nxt + 4 > len(data) or _mp3_frame(data, nxt):
+                first = frame
+                break
+        pos += 1
+    if first is None:
+        return None
+
+    _, samples, sample_rate, version, channel_mode = first
+    side_info = (32 if channel_mode != 3 else 17) if version == 1 else (17 if channel_mode != 3 else 9)
+    xing = pos + 4 + side_info
+    if data[xing:xing + 4] in (b"Xing", b"Info") and xing + 12 <= len(data):
+        flags = struct.unpack_from(">I", data, xing + 4)[0]
+        if flags & 1:
+            frames = struct.unpack_from(">I", data, xing + 8)[0]
+            if frames:
+                return frames * samples / sample_rate
+    vbri = pos + 4 + 32
+    if data[vbri:vbri + 4] == b"VBRI" and vbri + 18 <= len(data):
+        frames = struct.unpack_from(">I", data, vbri + 14)[0]
+        if frames:
+            return frames * samples / sample_rate
+
+    total = 0
+    while pos + 4 <= len(data):
+        frame = _mp3_frame(data, pos)
+        if frame is None:
+            if data[pos:pos + 3] == b"TAG":
+                break
+            # Resync on the next candidate header
+            nxt = data.find(b"\xff", pos + 1)
+            if nxt < 0:
+                break
+            pos = nxt
+            continue
+        frame_len, frame_samples, frame_rate = frame[0], frame[1], frame[2]
+        if frame_len <= 4:
+            break
+        total += frame_samples / frame_rate
+        pos += frame_len
+    return total or None
+
+
+def _adts_duration(data: bytes) -> float | None:
+    start = _skip_id3(data)
+    pos = start
+    total = 0.0
+    while pos + 7 <= len(data):
+        if data[pos] != 0xFF or (data[pos + 1] & 0xF6) != 0xF0:
+            break
+        rate_idx = (data[pos + 2] >> 2) & 0xF
+        if rate_idx >= len(_ADTS_SAMPLE_RATES):
+            break
+        frame_len = ((data[pos + 3] & 3) << 11) | (data[pos + 4] << 3) | (data[pos + 5] >> 5)
+        if frame_len < 7:
+            break
+        blocks = (data[pos + 6] & 3) + 1
+        total += 1024 * blocks / _ADTS_SAMPLE_RATES[rate_idx]
+        pos += frame_len
+    return total or None
+
+
+def _ogg_duration(data: bytes) -> float | None:
+    if len(data) < 28 or data[:4] != b"OggS":
+        return None
+    serial = struct.unpack_from("<I", data, 14)[0]
+    segments = data[26]
+    packet = data[27 + segments:27 + segments + 64]
+    if packet.startswith(b"OpusHead") and len(packet) >= 12:
+        sample_rate = 48000
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+    elif packet.startswith(b"\x01vorbis") and len(packet) >= 16:
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+        pre_skip = 0
+    else:
+        return None
+    if not sample_rate:
+        return None
+
+    pos = len(data)
+    while True:
+        pos = data.rfind(b"OggS", 0, pos)
+        if pos < 0:
+            return None
+        if pos + 27 <= len(data) and data[pos + 4] == 0 and struct.unpack_from("<I", data, pos + 14)[0] == serial:
+            granule = struct.unpack_from("<q", data, pos + 6)[0]
+            if granule >= 0:
+                return max(granule - pre_skip, 0) / sample_rate or None
+
+
+def _flac_duration(data: bytes) -> float | None:
+    # STREAMINFO is always the first metadata block
+    if len(data) < 26 or data[:4] != b"fLaC" or (data[4] & 0x7F) != 0:
+        return None
+    info = int.from_bytes(data[18:26], "big")
+    sample_rate = info >> 44
+    total_samples = info & ((1 << 36) - 1)
+    return total_samples / sample_rate if sample_rate and total_samples else None
+
+
+_EBML_HEADER = 0x1A45DFA3
+_MKV_SEGMENT = 0x18538067
+_MKV_INFO = 0x1549A966
+_MKV_TIMECODE_SCALE = 0x2AD7B1
+_MKV_DURATION = 0x4489
+_MKV_TRACKS = 0x1654AE6B
+_MKV_TRACK_ENTRY = 0xAE
+_MKV_TRACK_NUMBER = 0xD7
+_MKV_TRACK_TYPE = 0x83
+_MKV_DEFAULT_DURATION = 0x23E383
+_MKV_CLUSTER = 0x1F43B675
+_MKV_CLUSTER_TIMECODE = 0xE7
+_MKV_BLOCK_GROUP = 0xA0
+_MKV_BLOCK = 0xA1
+_MKV_SIMPLE_BLOCK = 0xA3
+_MKV_BLOCK_DURATION = 0x9B
+# Masters we step into instead of skipping; works with unknown sizes too
+_MKV_MASTERS = {_MKV_SEGMENT, _MKV_INFO, _MKV_TRACKS, _MKV_TRACK_ENTRY, _MKV_CLUSTER, _MKV_BLOCK_GROUP}
+
+
+def _vint(data: bytes, pos: int, keep_marker: bool) -> tuple[int, int] | None:
+    """(value, length) of an EBML variable-length integer; value -1 means unknown size."""
+    if pos >= len(data) or data[pos] == 0:
+        return None
+    first = data[pos]
+    length = 8 - first.bit_length() + 1
+    if pos + length > len(data):
+        return None
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    for b in data[pos + 1:pos + length]:
+        value = (value << 8) | b
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = -1
+    return value, length
+
+
+def _ebml_uint(body: bytes) -> int:
+    return int.from_bytes(body, "big") if body else 0
+
+
+def _mkv_duration(data: bytes) -> float | None:
+    if len(data) < 4 or int.from_bytes(data[:4], "big") != _EBML_HEADER:
+        return None
+
+    scale = 1_000_000
+    audio_tracks: set[int] = set()
+    track_number = track_type = 0
+    default_frame_ns = 0
+    cluster_tc = 0
+    last_ts: dict[int, int] = {}
+    frame_ticks: dict[int, int] = {}
+    block_duration = 0
+
+    pos = 0
+    while pos < len(data):
+        eid = _vint(data, pos, keep_marker=True)
+        if eid is None:
+            break
+        size = _vint(data, pos + eid[1], keep_marker=False)
+        if size is None:
+            break
+        eid, body, size = eid[0], pos + eid[1] + size[1], size[0]
+        if eid in _MKV_MASTERS:
+            if eid == _MKV_TRACK_ENTRY:
+                track_number = track_type = 0
+            pos = body
+            continue
+        if size < 0:
+            break
+        end = body + size
+        value = data[body:end]
+
+        if eid == _MKV_TIMECODE_SCALE:
+            scale = _ebml_uint(value) or scale
+        elif eid == _MKV_DURATION and size in (4, 8) and end <= len(data):
+            duration = struct.unpack(">f" if size == 4 else ">d", value)[0]
+            if duration > 0:
+                return duration * scale / 1e9
+        elif eid in (_MKV_TRACK_NUMBER, _MKV_TRACK_TYPE, _MKV_DEFAULT_DURATION):
+            if eid == _MKV_TRACK_NUMBER:
+                track_number = _ebml_uint(value)
+            elif eid == _MKV_TRACK_TYPE:
+                track_type = _ebml_uint(value)
+            else:
+                default_frame_ns = default_frame_ns or _ebml_uint(value)
+            if track_type == 2 and track_number:
+                audio_tracks.add(track_number)
+        elif eid == _MKV_CLUSTER_TIMECODE:
+            cluster_tc = _ebml_uint(value)
+        elif eid == _MKV_BLOCK_DURATION:
+            block_duration = _ebml_uint(value)
+        elif eid in (_MKV_SIMPLE_BLOCK, _MKV_BLOCK):
+            block_duration = 0
+            track = _vint(data, body, keep_marker=False)
+            if track is None or body + track[1] + 2 > len(data):
+                break
+            if not audio_tracks or track[0] in audio_tracks:
+                rel = struct.unpack_from(">h", data, body + track[1])[0]
+                ts = cluster_tc + rel
+                prev = last_ts.get(track[0])
+                if prev is not None and ts > prev:
+                    frame_ticks[track[0]] = ts - prev
+                last_ts[track[0]] = ts
+        pos = end
+
+    if not last_ts:
+        return None
+    track, ts = max(last_ts.items(), key=lambda kv: kv[1])
+    # The last frame's own length: explicit, from the track, or the frame spacing
+    tail = block_duration or (default_frame_ns / scale if default_frame_ns else frame_ticks.get(track, 0))
+    return (ts + tail) * scale / 1e9 or None
+
+
+def _mp4_boxes(data: bytes, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1 and pos + 16 <= end:
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield kind, pos + header, min(pos + size, end)
+        pos += size
+
+
+def _mp4_duration(data: bytes) -> float | None:
+    if data[4:8] != b"ftyp":
+        return None
+    for kind, body, end in _mp4_boxes(data, 0, len(data)):
+        if kind != b"moov":
+            continue
+        for child, cbody, cend in _mp4_boxes(data, body, end):
+            if child != b"mvhd" or cbody + 20 > cend:
+                continue
+            if data[cbody] == 1:
+                if cbody + 32 > cend:
+                    return None
+                timescale, duration = struct.unpack_from(">IQ", data, cbody + 20)
+                unknown = 0xFFFFFFFFFFFFFFFF
+            else:
+                timescale, duration = struct.unpack_from(">II", data, cbody + 12)
+                unknown = 0xFFFFFFFF
+            if not timescale or duration in (0, unknown):
+                return None
+            return duration / timescale
+    return None
+
+
+def _sniff(data: bytes) -> str | None:
+    if data[:4] in (b"RIFF", b"RF64"):
+        return "wav"
+    if data[:4] == b"OggS":
+        return "ogg"
+    if data[:4] == b"fLaC":
+        return "flac"
+    if data[:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if data[4:8] == b"ftyp":
+        return "mp4"
+    start = _skip_id3(data)
+    if start + 2 <= len(data) and data[start] == 0xFF:
+        # ADTS has layer bits 00, MPEG audio never does
+        return "aac" if (data[start + 1] & 0xF6) == 0xF0 else "mp3"
+    if start:
+        return "mp3"
+    return None
+
+
+_PARSERS = {
+    "wav": _wav_duration,
+    "ogg": _ogg_duration,
+    "flac": _flac_duration,
+    "webm": _mkv_duration,
+    "mp4": _mp4_duration,
+    "mp3": _mp3_duration,
+    "aac": _adts_duration,
+}
+
+
+def parse_duration(data: bytes) -> tuple[float | None, str | None]:
+    """(seconds, format) from the container; seconds is None when unknown."""
+    fmt = _sniff(data)
+    if fmt is None:
+        return None, None
+    try:
+        duration = _PARSERS[fmt](data)
+    except (struct.error, IndexError, ValueError, OverflowError) as e:
+        log.debug("[AUDIO] %s parse failed: %s", fmt, e)
+        return None, fmt
+    if duration is None or duration != duration or duration <= 0:
+        return None, fmt
+    return duration, fmt
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _probe_semaphore
+    if _probe_semaphore is None:
+        _probe_semaphore = asyncio.Semaphore(AUDIO_PROBE_CONCURRENCY)
+    return _probe_semaphore
+
+
+async def _run(*cmd: str) -> tuple[str, str]:
+    """stdout and stderr of `cmd`, bounded by the probe pool and timeout."""
+    async with _semaphore():
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            return "", ""
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), timeout=AUDIO_PROBE_TIMEOUT_SECS)
+        except asyncio.TimeoutError:
+            _stats["probe_timeouts"] += 1
+            proc.kill()
+            await proc.wait()
+            return "", ""
+    return out.decode(errors="ignore").strip(), err.decode(errors="ignore")
+
+
+def _to_float(output: str) -> float:
+    try:
+        return float(output)
+    except ValueError:
+        return 0.0
+
+
+def _decode_time(stderr: str) -> float:
+    last_time = None
+    for line in stderr.splitlines():
+        if "time=" in line:
+            last_time = line.split("time=")[-1].split()[0]
+    if not last_time:
+        return 0.0
+    try:
+        h, m, s = last_time.split(":")
+        return float(h) * 3600.0 + float(m) * 60.0 + float(s)
+    except ValueError:
+        return 0.0
+
+
+def _write_temp(data: bytes, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(data)
+        return tmp.name
+
+
+async def probe_duration(data: bytes, suffix: str) -> float:
+    """ffprobe format/stream duration, then a full ffmpeg decode; 0.0 if all fail."""
+    path = await asyncio.to_thread(_write_temp, data, suffix)
+    try:
+        fields = "-of", "default=noprint_wrappers=1:nokey=1"
+        out, _ = await _run("ffprobe", "-v", "error", "-show_entries", "format=duration", *fields, path)
+        duration = _to_float(out)
+        if duration <= 0:
+            out, _ = await _run(
+                "ffprobe", "-v", "error", "-select_streams", "a:0",
+                "-show_entries", "stream=duration", *fields, path,
+            )
+            duration = _to_float(out)
+        if duration > 0:
+            _stats["ffprobe"] += 1
+            return duration
+
+        _, err = await _run("ffmpeg", "-hide_banner", "-i", path, "-f", "null", "-")
+        duration = _decode_time(err)
+        if duration > 0:
+            _stats["ffmpeg_decode"] += 1
+        return duration
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+async def get_audio_duration(data: bytes, suffix: str = ".wav") -> float:
+    """Duration in seconds, from the headers when possible; 0.0 if unknown."""
+    duration, fmt = parse_duration(data)
+    if duration is not None:
+        _stats["parsed"] += 1
+        _parsed_by_format[fmt] = _parsed_by_format.get(fmt, 0) + 1
+        return duration
+
+    duration = await probe_duration(data, suffix)
+    if duration <= 0:
+        _stats["failed"] += 1
+        log.warning("[AUDIO] no duration for %d bytes (format=%s)", len(data), fmt)
+    return duration
+
+
+def get_audio_duration_stats() -> dict:
+    return {**_stats, "parsed_by_format": dict(_parsed_by_format)}
@@ -1,15 +1,92 @@
-import subprocess
-import tempfile
-import os
 import math
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, text, bindparam, Integer, String, Boolean, DateTime, JSON
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
 
 from fastapi import HTTPException
-from app.db.models import InfluencerWallet, InfluencerCreditTransaction, DailyUsage, Pricing, User, Chat, Influencer
+from app.db.models import InfluencerWallet, InfluencerCreditTransaction, DailyUsage, User, Chat, Influencer
+from app.services.pricing_catalog import get_price
+from app.services.audio_duration import get_audio_duration
 from datetime import datetime, date
 
+LOW_BALANCE_THRESHOLD_CENTS = 1000
+
+# Daily usage counter each feature draws its free allowance from
+_USAGE_COLUMN = {"text": "text_count", "voice": "voice_secs", "live": "live_secs"}
+
+# One statement per charge: bump today's usage (the upsert row-locks it, so
+# the free allowance is priced against what was used before this charge), debit
+# the wallet only if it covers the cost and write the ledger row only if the
+# debit happened (or nothing was owed). Concurrent charges serialize on the
+# wallet row and re-check `balance_cents >= cost`, so a wallet can't overdraw.
+# Text charges also leave the wallet's held_cents (open text reservations)
+# alone; other features may spend it.
+_CHARGE_SQL_TEMPLATE = """
+WITH usage AS (
+    INSERT INTO daily_usage AS du (user_id, date, is_18, free_allowance, text_count, voice_secs, live_secs)
+    VALUES (:user_id, :today, :is_18, 0, {text_count}, {voice_secs}, {live_secs})
+    ON CONFLICT (user_id, date, is_18) DO UPDATE SET {col} = coalesce(du.{col}, 0) + EXCLUDED.{col}
+    RETURNING du.{col} - :units AS used_before
+),
+cost AS (
+    SELECT greatest(:units - greatest(:free_allowance - usage.used_before, 0), 0) * :price_cents AS cost
+    FROM usage
+),
+wallet AS (
+    UPDATE influencer_wallets AS w
+    SET balance_cents = w.balance_cents - cost.cost, updated_at = now()
+    FROM cost
+    WHERE w.user_id = :user_id AND w.influencer_id = :influencer_id AND w.is_18 = :is_18
+      AND cost.cost > 0 AND {spendable} >= cost.cost
+    RETURNING w.balance_cents AS new_balance
+),
+ledger AS (
+    INSERT INTO influencer_credit_transactions (user_id, influencer_id, feature, units, amount_cents, meta, created_at)
+    SELECT :user_id, :influencer_id, :feature, 0 - :units, 0 - cost.cost, :meta, now()
+    FROM cost
+    WHERE cost.cost = 0 OR EXISTS (SELECT 1 FROM wallet)
+    RETURNING id
+)
+SELECT cost.cost,
+       wallet.new_balance,
+       coalesce(wallet.new_balance + cost.cost >= :threshold AND wallet.new_balance < :threshold, false)
+           AS crossed_threshold,
+       (SELECT id FROM ledger) AS ledger_id
+FROM cost
+LEFT JOIN wallet ON true
+"""
+
+_CHARGE_SQL = {
+    key: text(
+        _CHARGE_SQL_TEMPLATE.format(
+            col=col,
+            spendable="w.balance_cents - w.held_cents" if key == "text" else "w.balance_cents",
+            **{c: (":units" if c == col else "0") for c in _USAGE_COLUMN.values()},
+        )
+    ).bindparams(
+        bindparam("user_id", type_=Integer),
+        bindparam("influencer_id", type_=String),
+        bindparam("feature", type_=String),
+        bindparam("units", type_=Integer),
+        bindparam("is_18", type_=Boolean),
+        bindparam("today", type_=DateTime),
+        bindparam("meta", type_=JSON),
+        bindparam("threshold", type_=Integer),
+        bindparam("price_cents", type_=Integer),
+        bindparam("free_allowance", type_=Integer),
+    )
+    for key, col in _USAGE_COLUMN.items()
+}
+
+
+def _usage_key(feature: str) -> str:
+    if "text" in feature:
+        return "text"
+    if "voice" in feature:
+        return "voice"
+    return "live"
+
+
 async def charge_feature(
     db: AsyncSession,
     *,
@@ -20,93 +97,50 @@ async def charge_feature(
     is_18: bool = False,
     meta: dict | None = None,
 ) -> int:
-    today = date.today()
-
-    usage = await db.get(DailyUsage, (user_id, today, is_18))
-    if not usage:
-        usage = DailyUsage(user_id=user_id, date=today, is_18=is_18)
-
-    for field in ["text_count", "voice_secs", "live_secs"]:
-        if getattr(usage, field, None) is None:
-            setattr(usage, field, 0)
-
-    price: Pricing | None = await db.scalar(
-        select(Pricing).where(Pricing.feature == feature, Pricing.is_active.is_(True))
-    )
+    """
+    Record `units` of `feature` usage and debit the wallet for whatever the
+    daily free allowance doesn't cover, atomically, in one round trip plus
+    the commit. Raises 402 (nothing recorded) if the wallet can't cover it.
+    """
+    price = await get_price(feature)
     if not price:
         raise HTTPException(500, "Pricing not configured")
 
-    used = {
-        "text": usage.text_count or 0,
-        "voice": usage.voice_secs or 0,
-        "live_chat": usage.live_secs or 0,
-        "text_18": usage.text_count or 0,
-        "voice_18": usage.voice_secs or 0,
-    }[feature]
-
-    free_left = max((price.free_allowance or 0) - used, 0)
-    billable = max(units - free_left, 0)
-    cost = billable * (price.price_cents or 0)
-
-    if "text" in feature:
-        usage.text_count += units
-    elif "voice" in feature:
-        usage.voice_secs += units
-    else:
-        usage.live_secs += units
-    db.add(usage)
-
-    if cost:
-        wallet = await db.scalar(
-            select(InfluencerWallet).where(
-                and_(
-                    InfluencerWallet.user_id == user_id,
-                    InfluencerWallet.influencer_id == influencer_id,
-                    InfluencerWallet.is_18 == is_18,
-                )
-            )
+    row = (
+        await db.execute(
+            _CHARGE_SQL[_usage_key(feature)],
+            {
+                "user_id": int(user_id),
+                "influencer_id": influencer_id,
+                "feature": feature,
+                "units": int(units),
+                "is_18": bool(is_18),
+                "today": _today_midnight_naive(),
+                "meta": meta,
+                "threshold": LOW_BALANCE_THRESHOLD_CENTS,
+                "price_cents": price.price_cents,
+                "free_allowance": price.free_allowance,
+            },
         )
+    ).one()
 
-        if not wallet:
-            wallet = InfluencerWallet(
-                user_id=user_id,
-                influencer_id=influencer_id,
-                is_18=is_18,
-                balance_cents=0,
-            )
-            db.add(wallet)
-            await db.flush()
-
-        old_balance = wallet.balance_cents or 0
-        if old_balance < cost:
-            raise HTTPException(402, "Insufficient credits")
-
-        wallet.balance_cents = old_balance - cost
-        db.add(wallet)
-
-        new_balance = wallet.balance_cents
-        THRESHOLD = 1000
-        if old_balance >= THRESHOLD and new_balance < THRESHOLD:
-            user_obj = await db.get(User, user_id)
-            if user_obj and user_obj.email:
-                try:
-                    from app.api.notify_ws import notify_low_balance
-                    await notify_low_balance(user_obj.email, new_balance)
-                except Exception as e:
-                    print(f"Error sending low balance notification: {e}")
-
-    db.add(
-        InfluencerCreditTransaction(
-            user_id=user_id,
-            influencer_id=influencer_id,
-            feature=feature,
-            units=-units,
-            amount_cents=-cost,
-            meta=meta,
-        )
-    )
+    cost = int(row.cost or 0)
+    if cost and row.new_balance is None:
+        # Undo the usage bump so a refused charge leaves no trace
+        await db.rollback()
+        raise HTTPException(402, "Insufficient credits")
 
     await db.commit()
+
+    if row.crossed_threshold:
+        user_obj = await db.get(User, user_id)
+        if user_obj and user_obj.email:
+            try:
+                from app.api.notify_ws import notify_low_balance
+                await notify_low_balance(user_obj.email, int(row.new_balance))
+            except Exception as e:
+                print(f"Error sending low balance notification: {e}")
+
     return cost
 
 async def topup_wallet(
@@ -171,25 +205,6 @@ async def topup_wallet(
     await db.flush()
     return int(wallet.balance_cents or 0)
 
-def get_audio_duration_ffmpeg(file_bytes: bytes) -> float:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as tmp:
-        tmp.write(file_bytes)
-        tmp_path = tmp.name
-    try:
-        result = subprocess.run(
-            ["ffprobe", "-v", "error", "-show_entries",
-             "format=duration", "-of",
-             "default=noprint_wrappers=1:nokey=1", tmp_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
-        )
-        duration = float(result.stdout.decode().strip())
-        return duration
-    except Exception as e:
-        print(f"ffmpeg duration error: {e}")
-        return 10.0  # fallback
-    
-
 MIME_TO_SUFFIX = {
     "audio/webm": ".webm",
     "audio/wav":  ".wav",
@@ -204,88 +219,13 @@ MIME_TO_SUFFIX = {
     "audio/x-aac": ".aac",
 }
 
-def _duration_via_ffprobe(data: bytes, suffix: str) -> float:
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
-
-    try:
-        result = subprocess.run(
-            [
-                "ffprobe", "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                tmp_path,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        )
-        output = result.stdout.decode().strip()
-        try:
-            duration = float(output)
-        except Exception:
-            duration = 0.0
-            if output in ("", "N/A", "nan", "NaN"):
-                result = subprocess.run(
-                    [
-                        "ffprobe", "-v", "error",
-                        "-select_streams", "a:0",
-                        "-show_entries", "stream=duration",
-                        "-of", "default=noprint_wrappers=1:nokey=1",
-                        tmp_path,
-                    ],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                )
-                output = result.stdout.decode().strip()
-                try:
-                    duration = float(output)
-                except Exception:
-                    duration = 0.0
-            if duration <= 0.0:
-                duration = _duration_via_ffmpeg_decode(tmp_path)
-            if duration <= 0.0:
-                print(f"[WARN] ffprobe failed: {output!r}")
-        return duration
-    finally:
-        try:
-            os.unlink(tmp_path)
-        except Exception:
-            pass
-
-def _duration_via_ffmpeg_decode(tmp_path: str) -> float:
-    try:
-        result = subprocess.run(
-            ["ffmpeg", "-hide_banner", "-i", tmp_path, "-f", "null", "-"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-    except FileNotFoundError:
-        return 0.0
-
-    text = result.stderr.decode(errors="ignore")
-    last_time = None
-    for line in text.splitlines():
-        if "time=" in line:
-            parts = line.split("time=")
-            if len(parts) > 1:
-                last_time = parts[-1].split()[0]
-    if not last_time:
-        return 0.0
-
-    try:
-        h, m, s = last_time.split(":")
-        return (float(h) * 3600.0) + (float(m) * 60.0) + float(s)
-    except Exception:
-        return 0.0
-
-def get_duration_seconds(file_bytes: bytes, mime: str | None = None) -> int:
+async def get_duration_seconds(file_bytes: bytes, mime: str | None = None) -> int:
     """
-    Returns duration in whole seconds (>=1), fallback 10s if ffprobe fails.
+    Returns duration in whole seconds (>=1), fallback 10s if it can't be read.
     """
     normalized_mime = (mime or "").split(";")[0].strip().lower()
     suffix = MIME_TO_SUFFIX.get(normalized_mime, ".wav")
-    duration = _duration_via_ffprobe(file_bytes, suffix)
+    duration = await get_audio_duration(file_bytes, suffix)
     if duration <= 0:
         duration = 10.0
     return max(1, math.ceil(duration))
@@ -312,12 +252,7 @@ async def can_afford(
     is_18: bool = False,
 ) -> tuple[bool, int, int]:
 
-    price: Pricing | None = await db.scalar(
-        select(Pricing).where(
-            Pricing.feature == feature,
-            Pricing.is_active.is_(True),
-        )
-    )
+    price = await get_price(feature)
     if not price:
         raise HTTPException(
             status_code=500,
@@ -332,9 +267,9 @@ async def can_afford(
 
     used = _used_units_for_feature(usage, feature)
 
-    free_left = max((price.free_allowance or 0) - used, 0)
+    free_left = max(price.free_allowance - used, 0)
     billable = max(int(units) - free_left, 0)
-    cost_cents = billable * int(price.price_cents or 0)
+    cost_cents = billable * price.price_cents
 
     wallet = await db.scalar(
         select(InfluencerWallet).where(
@@ -347,6 +282,8 @@ async def can_afford(
     )
 
     balance = int(wallet.balance_cents) if wallet and wallet.balance_cents is not None else 0
+    if wallet and _usage_key(feature) == "text":
+        balance -= int(wallet.held_cents or 0)
 
     ok = balance >= cost_cents
     return (ok or cost_cents == 0), cost_cents, free_left
@@ -363,14 +300,12 @@ async def get_remaining_units(
     feature: str,
     is_18: bool = False,
 ) -> int:
-    price: Pricing | None = await db.scalar(
-        select(Pricing).where(Pricing.feature == feature, Pricing.is_active.is_(True))
-    )
+    price = await get_price(feature)
     if not price:
         return 0
 
-    unit_price_cents = int(price.price_cents or 0)
-    free_allowance = int(price.free_allowance or 0)
+    unit_price_cents = price.price_cents
+    free_allowance = price.free_allowance
 
     today_dt = _today_midnight_naive()
 
@@ -0,0 +1,350 @@
+"""
+Pre-built prompt context for live voice calls.
+
+/webhooks/reply used to run the whole handle_turn for every utterance:
+CallRecord and Chat lookups, an embedding, relationship classification,
+memory search and a prompt build, all inside ElevenLabs' tool timeout.
+None of that changes much within one call, so it is done once instead.
+
+get_conversation_token builds the call's context (the audio system prompt
+with the persona, relationship snapshot and user block filled in) and
+stashes it under the chat. register_conversation then adds the chat's top
+memories and stores it under the conversation_id, call:ctx:<conversation_id>.
+fast_call_reply only loads that bundle, appends to the Redis history and
+calls the LLM.
+
+Relationship work already happens outside the reply: /webhooks/update_relationship
+buffers utterances and the post-call webhook applies the rest. Fact
+extraction is deferred the same way; each utterance is queued in Redis and
+finish_call_context extracts facts once the call is over.
+
+When no bundle exists (registration failed, Redis down, flag off), the
+reply falls back to handle_turn.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from app.agents.memory import find_similar_memories
+from app.agents.prompt_utils import (
+    build_relationship_prompt,
+    get_base_system,
+    get_mbti_rules_for_archetype,
+    get_relationship_stage_prompts,
+    get_time_context,
+)
+from app.agents.prompts import MODEL
+from app.agents.turn_handler import (
+    _build_user_name_block,
+    _norm,
+    extract_and_store_facts_for_turn,
+    redis_history,
+)
+from app.core.config import settings
+from app.db.models import Influencer
+from app.db.session import SessionLocal
+from app.relationship.dtr import plan_dtr_goal
+from app.relationship.inactivity import apply_inactivity_decay
+from app.relationship.state_cache import load_relationship
+from app.utils.infrastructure.redis_pool import get_redis
+from app.utils.messaging.tts_sanitizer import sanitize_tts_text
+
+log = logging.getLogger("call-context")
+
+CALL_CONTEXT_ENABLED = os.getenv("CALL_CONTEXT_ENABLED", "true").lower() == "true"
+CALL_CONTEXT_TTL_SECS = int(os.getenv("CALL_CONTEXT_TTL_SECS", "7200"))
+CALL_CONTEXT_STASH_TTL_SECS = int(os.getenv("CALL_CONTEXT_STASH_TTL_SECS", "600"))
+CALL_CONTEXT_MEMORIES = int(os.getenv("CALL_CONTEXT_MEMORIES", "8"))
+
+_stats: dict = {
+    "built": 0,
+    "reused_stash": 0,
+    "build_errors": 0,
+    "hits": 0,
+    "misses": 0,
+    "replies": 0,
+    "failed": 0,
+    "reply_ms_total": 0.0,
+    "facts_deferred": 0,
+    "facts_extracted": 0,
+}
+
+
+def _context_key(conversation_id: str) -> str:
+    return f"call:ctx:{conversation_id}"
+
+
+def _stash_key(chat_id: str) -> str:
+    return f"call:ctx:chat:{chat_id}"
+
+
+def _facts_key(conversation_id: str) -> str:
+    return f"call:facts:{conversation_id}"
+
+
+async def _memory_block(db, chat_id: str, recent_ctx: str) -> str:
+    """Top memories for where the conversation left off; "None" without history."""
+    if not recent_ctx:
+        return "None"
+    memories = await find_similar_memories(db, chat_id, recent_ctx, top_k=CALL_CONTEXT_MEMORIES)
+    block = "\n".join(s for s in (_norm(m) for m in memories or []) if s)
+    return block or "None"
+
+
+async def build_call_context(
+    db,
+    user_id: int,
+    influencer_id: str,
+    chat_id: str,
+    user_timezone: str | None = "UTC",
+    with_memories: bool = True,
+) -> dict:
+    """Everything a call's replies need except the history; JSON-serializable."""
+    system = await get_base_system(db, isAudio=True)
+    influencer = await db.get(Influencer, influencer_id)
+    if not influencer:
+        raise ValueError(f"Influencer {influencer_id} not found")
+
+    bio = influencer.bio_json or {}
+    persona_likes = bio.get("likes", [])
+    persona_dislikes = bio.get("dislikes", [])
+    if not isinstance(persona_likes, list):
+        persona_likes = []
+    if not isinstance(persona_dislikes, list):
+        persona_dislikes = []
+
+    stages = await get_relationship_stage_prompts(db)
+    bio_stages = bio.get("stages", {})
+    if isinstance(bio_stages, dict) and bio_stages:
+        for key, val in bio_stages.items():
+            if val:
+                stages[key.upper()] = val
+    mbti_rules = await get_mbti_rules_for_archetype(
+        db, bio.get("mbti_architype", ""), bio.get("mbti_rules", "")
+    )
+
+    history = redis_history(chat_id)
+    if len(history.messages) > settings.MAX_HISTORY_WINDOW:
+        trimmed = history.messages[-settings.MAX_HISTORY_WINDOW:]
+        history.clear()
+        history.add_messages(trimmed)
+    recent_ctx = "\n".join(f"{m.type}: {m.content}" for m in history.messages[-6:])
+
+    now = datetime.now(timezone.utc)
+    rel = await load_relationship(db, int(user_id), influencer_id)
+    days_idle = apply_inactivity_decay(rel, now)
+    can_ask = (
+        rel.state == "DATING"
+        and rel.safety >= 70
+        and rel.trust >= 75
+        and rel.closeness >= 70
+        and rel.attraction >= 65
+    )
+    dtr_goal = plan_dtr_goal(rel, can_ask)
+
+    users_name = await _build_user_name_block(db, user_id)
+    memories = await _memory_block(db, chat_id, recent_ctx) if with_memories else "None"
+
+    prompt = build_relationship_prompt(
+        ChatPromptTemplate.from_messages([("system", system), ("user", "{input}")]),
+        rel=rel,
+        days_idle=days_idle,
+        dtr_goal=dtr_goal,
+        personality_rules=bio.get("personality_rules", ""),
+        stages=stages,
+        persona_likes=persona_likes,
+        persona_dislikes=persona_dislikes,
+        mbti_rules=mbti_rules,
+        memories=memories,
+        daily_context="",
+        last_user_message=recent_ctx,
+        mood=get_time_context(user_timezone),
+        tone=bio.get("tone", ""),
+        influencer_name=influencer.display_name,
+        users_name=users_name,
+    )
+    _stats["built"] += 1
+    return {
+        "user_id": int(user_id),
+        "influencer_id": influencer_id,
+        "chat_id": chat_id,
+        "user_timezone": user_timezone,
+        "with_memories": with_memories,
+        "system": system,
+        "vars": dict(prompt.partial_variables),
+        "built_at": now.isoformat(),
+    }
+
+
+def call_prompt(context: dict, recent_ctx: str | None = None) -> ChatPromptTemplate:
+    """The prompt a context was built from, optionally with fresher recent history."""
+    variables = dict(context["vars"])
+    if recent_ctx is not None and "last_user_message" in variables:
+        variables["last_user_message"] = recent_ctx
+    prompt = ChatPromptTemplate.from_messages([("system", context["system"]), ("user", "{input}")])
+    return prompt.partial(**variables)
+
+
+async def stash_call_context(chat_id: str, context: dict) -> None:
+    """Keep a token-time context until the call registers; never raises."""
+    if not CALL_CONTEXT_ENABLED:
+        return
+    try:
+        r = await get_redis()
+        await r.set(_stash_key(chat_id), json.dumps(context), ex=CALL_CONTEXT_STASH_TTL_SECS)
+    except Exception as e:
+        log.warning("[CALL-CTX] stash failed chat=%s err=%s", chat_id, e)
+
+
+async def prepare_call_context(
+    conversation_id: str,
+    user_id: int,
+    influencer_id: str,
+    chat_id: str,
+) -> None:
+    """
+    Store the context for a registered call. Reuses the stash from
+    get_conversation_token when it belongs to the same user and persona,
+    otherwise builds from scratch. Meant to run in the background.
+    """
+    if not CALL_CONTEXT_ENABLED or not (user_id and influencer_id and chat_id):
+        return
+    try:
+        r = await get_redis()
+        raw = await r.get(_stash_key(chat_id))
+        stashed = json.loads(raw) if raw else None
+        async with SessionLocal() as db:
+            if (
+                stashed
+                and stashed.get("user_id") == int(user_id)
+                and stashed.get("influencer_id") == influencer_id
+            ):
+                context = stashed
+                if not context.get("with_memories") and "memories" in context["vars"]:
+                    context["vars"]["memories"] = await _memory_block(
+                        db, chat_id, context["vars"].get("last_user_message", "")
+                    )
+                context["with_memories"] = True
+                _stats["reused_stash"] += 1
+            else:
+                context = await build_call_context(db, user_id, influencer_id, chat_id)
+        await r.set(_context_key(conversation_id), json.dumps(context), ex=CALL_CONTEXT_TTL_SECS)
+    except Exception as e:
+        _stats["build_errors"] += 1
+        log.warning("[CALL-CTX] prepare failed conv=%s err=%s", conversation_id, e)
+        return
+    log.info("[CALL-CTX] ready conv=%s chat=%s", conversation_id, chat_id)
+
+
+async def get_call_context(conversation_id: str) -> dict | None:
+    if not CALL_CONTEXT_ENABLED:
+        return None
+    try:
+        r = await get_redis()
+        raw = await r.get(_context_key(conversation_id))
+    except Exception as e:
+        log.warning("[CALL-CTX] lookup failed conv=%s err=%s", conversation_id, e)
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def _defer_facts(conversation_id: str, chat_id: str, message: str, recent_ctx: str) -> None:
+    key = _facts_key(conversation_id)
+    r = await get_redis()
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.rpush(key, json.dumps({"chat_id": chat_id, "msg": message, "ctx": recent_ctx}))
+        pipe.expire(key, CALL_CONTEXT_TTL_SECS)
+        await pipe.execute()
+    _stats["facts_deferred"] += 1
+
+
+async def fast_call_reply(conversation_id: str, message: str) -> str | None:
+    """
+    Reply to one utterance from the call's pre-built context. Returns None
+    when the call has no context, so the caller can fall back to handle_turn.
+    """
+    context = await get_call_context(conversation_id)
+    if context is None:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+
+    cid = uuid4().hex[:8]
+    chat_id = context["chat_id"]
+    started = time.perf_counter()
+
+    history = redis_history(chat_id)
+    if len(history.messages) > settings.MAX_HISTORY_WINDOW:
+        trimmed = history.messages[-settings.MAX_HISTORY_WINDOW:]
+        history.clear()
+        history.add_messages(trimmed)
+    recent_ctx = "\n".join(f"{m.type}: {m.content}" for m in history.messages[-6:])
+
+    runnable = RunnableWithMessageHistory(
+        call_prompt(context, recent_ctx) | MODEL,
+        lambda _: history,
+        input_messages_key="input",
+        history_messages_key="history",
+    )
+    try:
+        result = await runnable.ainvoke(
+            {"input": message},
+            config={"configurable": {"session_id": chat_id}},
+        )
+    except Exception as e:
+        _stats["failed"] += 1
+        log.error("[CALL-CTX %s] LLM error conv=%s: %s", cid, conversation_id, e, exc_info=True)
+        return "Sorry, something went wrong."
+
+    _stats["replies"] += 1
+    _stats["reply_ms_total"] += (time.perf_counter() - started) * 1000
+
+    try:
+        await _defer_facts(conversation_id, chat_id, message, recent_ctx)
+    except Exception as e:
+        log.warning("[CALL-CTX %s] could not defer facts conv=%s err=%s", cid, conversation_id, e)
+
+    return sanitize_tts_text(result.content)
+
+
+async def finish_call_context(conversation_id: str) -> None:
+    """After the call: extract facts from the queued utterances and drop the context."""
+    try:
+        r = await get_redis()
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.lrange(_facts_key(conversation_id), 0, -1)
+            pipe.delete(_facts_key(conversation_id), _context_key(conversation_id))
+            items, _ = await pipe.execute()
+    except Exception as e:
+        log.warning("[CALL-CTX] drain failed conv=%s err=%s", conversation_id, e)
+        return
+
+    for raw in items:
+        item = json.loads(raw)
+        await extract_and_store_facts_for_turn(
+            message=item["msg"],
+            recent_ctx=item["ctx"],
+            chat_id=item["chat_id"],
+            cid=f"call-{conversation_id[:8]}",
+        )
+        _stats["facts_extracted"] += 1
+    if items:
+        log.info("[CALL-CTX] extracted facts for %d utterances conv=%s", len(items), conversation_id)
+
+
+def get_call_context_stats() -> dict:
+    replies = _stats["replies"]
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **{k: v for k, v in _stats.items() if k != "reply_ms_total"},
+        "enabled": CALL_CONTEXT_ENABLED,
+        "hit_rate": round(_stats["hits"] / lookups, 3) if lookups else None,
+        "avg_reply_ms": round(_stats["reply_ms_total"] / replies, 1) if replies else None,
+    }
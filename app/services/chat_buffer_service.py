@@ -19,8 +19,10 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.models import Message, Message18, Chat, Chat18
-from app.services.embeddings import get_embedding
+from app.services.embeddings import add_message_embeddings
+from app.services.embedding_writer import enqueue_message_embedding
 from app.services.billing import charge_feature
+from app.services.credit_reservations import CreditSession
 from app.relationship import get_relationship_payload
 from app.services.user import _get_usage_snapshot_simple
 
@@ -138,6 +140,7 @@ async def queue_message(
     config: ChatConfig,
     user_timezone: Optional[str] = None,
     timeout_sec: float = 2.5,
+    credits: Optional[CreditSession] = None,
 ) -> None:
     """
     Queue a message for processing with smart batching.
@@ -156,6 +159,7 @@ async def queue_message(
         config: Chat configuration (regular or 18+)
         user_timezone: Optional user timezone
         timeout_sec: Seconds to wait before auto-flush
+        credits: Optional session reservation to charge from
     """
     buf = _buffers.setdefault(chat_id, _Buf())
 
@@ -181,7 +185,7 @@ async def queue_message(
             async def _wait_and_flush():
                 try:
                     await asyncio.sleep(timeout_sec)
-                    await flush_buffer(chat_id, ws, influencer_id, user_id, db, config)
+                    await flush_buffer(chat_id, ws, influencer_id, user_id, db, config, credits)
                 except asyncio.CancelledError:
                     raise  # Re-raise as required by asyncio best practices
                 except Exception:
@@ -192,7 +196,7 @@ async def queue_message(
     if flush_now:
         log.info("[BUF %s] ends_thought=True -> flush now", chat_id)
         try:
-            await flush_buffer(chat_id, ws, influencer_id, user_id, db, config)
+            await flush_buffer(chat_id, ws, influencer_id, user_id, db, config, credits)
         except Exception:
             log.exception("[BUF %s] flush-now failed", chat_id)
 
@@ -204,6 +208,7 @@ async def flush_buffer(
     user_id: int,
     db: AsyncSession,
     config: ChatConfig,
+    credits: Optional[CreditSession] = None,
 ) -> None:
     """
     Flush buffered messages and process them through the AI.
@@ -222,6 +227,8 @@ async def flush_buffer(
         user_id: User identifier
         db: Database session
         config: Chat configuration (regular or 18+)
+        credits: Optional session reservation; charge_feature is used when
+            it is missing, closed or can't be refilled
     """
     buf = _buffers.get(chat_id)
     if not buf:
@@ -243,15 +250,17 @@ async def flush_buffer(
 
     # Charge for the message
     try:
-        await charge_feature(
-            db,
-            user_id=user_id,
-            influencer_id=influencer_id,
-            feature=config.text_feature,
-            units=1,
-            is_18=config.is_18plus,
-            meta={"chat_id": chat_id},
-        )
+        charged = credits is not None and await credits.consume(1, meta={"chat_id": chat_id})
+        if not charged:
+            await charge_feature(
+                db,
+                user_id=user_id,
+                influencer_id=influencer_id,
+                feature=config.text_feature,
+                units=1,
+                is_18=config.is_18plus,
+                meta={"chat_id": chat_id},
+            )
     except Exception:
         try:
             await db.rollback()
@@ -339,20 +348,29 @@ async def save_user_message(
     embedding: Optional[List[float]] = None,
 ) -> None:
     """
-    Save user message to database with embedding.
+    Save user message to database; the embedding is written in the background.
+    
+    The row is committed immediately and queued for the batched embedding
+    writer, so the websocket path never waits on the embeddings API.
     
     Args:
         db: Database session
         chat_id: Chat identifier
         text: Message text
         message_model: Message or Message18 class
-        embedding: Optional precomputed embedding (avoids duplicate API call)
+        embedding: Optional precomputed embedding (stored inline, skips the queue)
     """
     try:
-        emb = embedding if embedding is not None else await get_embedding(text)
-        db.add(message_model(chat_id=chat_id, sender="user", content=text, embedding=emb))
+        msg = message_model(chat_id=chat_id, sender="user", content=text)
+        db.add(msg)
+        if embedding is not None:
+            await db.flush()
+            add_message_embeddings(db, [msg], [embedding])
         await db.commit()
     except Exception:
         await db.rollback()
         log.exception("[WS %s] Failed to save user message", chat_id)
         raise
+
+    if embedding is None:
+        enqueue_message_embedding(msg, text)
@@ -0,0 +1,560 @@
+"""
+Per-session credit reservations for chat messages.
+
+Charging a text message used to cost a daily_usage update, a wallet update
+and a ledger insert, committed per message. A chat websocket instead holds a
+CreditSession. While the daily free allowance lasts, each message claims its
+free unit with one conditional upsert (claim_free_units), so a socket never
+holds free units another chat could use. After that the session reserves a
+block of CREDIT_RESERVATION_UNITS paid messages in one transaction, adding
+their price to the wallet's held_cents. The balance itself is untouched, so
+voice and live charges can still spend it; only text charges and new
+reservations treat held cents as spent.
+
+Each paid message then only runs a Redis script that decrements the
+reservation's counter (DECRBY) and appends a ledger entry to a Redis list.
+The block is settled when it runs out, when the socket closes or when it
+expires: the used units are added to daily_usage, what they cost is debited
+from the balance, the hold is released and the ledger rows are inserted in
+one batch, all in one transaction. A voice charge made meanwhile can leave
+the balance short of the hold, so a settlement may take the balance below
+zero by at most one block.
+
+Crash recovery: a reservation whose owner died stays "open" in
+credit_reservations with its Redis counter and entries (kept well past
+expiry). settle_expired_reservations, run by the scheduler, settles every
+reservation past expires_at from that state. If the Redis state is gone the
+whole block is refunded and counted as state_lost.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import JSON, Boolean, DateTime, Integer, String, and_, bindparam, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.models import CreditReservation, DailyUsage, InfluencerCreditTransaction, InfluencerWallet, User
+from app.db.session import SessionLocal
+from app.services.billing import LOW_BALANCE_THRESHOLD_CENTS, _USAGE_COLUMN, _today_midnight_naive, _usage_key
+from app.services.pricing_catalog import get_price
+from app.utils.infrastructure.redis_pool import get_redis
+
+log = logging.getLogger("credit-reservations")
+
+CREDIT_RESERVATIONS_ENABLED = os.getenv("CREDIT_RESERVATIONS_ENABLED", "true").lower() == "true"
+CREDIT_RESERVATION_UNITS = int(os.getenv("CREDIT_RESERVATION_UNITS", "20"))
+CREDIT_RESERVATION_TTL_SECS = int(os.getenv("CREDIT_RESERVATION_TTL_SECS", "900"))
+# Expired reservations are left to their session this long before the sweep takes over
+CREDIT_RESERVATION_SWEEP_GRACE_SECS = int(os.getenv("CREDIT_RESERVATION_SWEEP_GRACE_SECS", "60"))
+# Redis state outlives the reservation so a crashed session can still be settled
+CREDIT_RESERVATION_STATE_TTL_SECS = int(os.getenv("CREDIT_RESERVATION_STATE_TTL_SECS", str(7 * 86400)))
+
+# Take `units` from the counter and log the entry; returns the index of the
+# first unit taken, or -1 when the block can't cover it (or was closed)
+_CONSUME_LUA = """
+local left = tonumber(redis.call('GET', KEYS[1]) or '0')
+local units = tonumber(ARGV[1])
+if left < units then
+    return -1
+end
+left = redis.call('DECRBY', KEYS[1], units)
+redis.call('RPUSH', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return tonumber(ARGV[3]) - left - units
+"""
+
+# Stop further consumption and return every entry logged so far
+_CLOSE_LUA = """
+local existed = redis.call('EXISTS', KEYS[1])
+redis.call('SET', KEYS[1], 0, 'EX', ARGV[1])
+return {existed, redis.call('LRANGE', KEYS[2], 0, -1)}
+"""
+
+# Count `units` as free usage only if they still fit in today's allowance, and
+# write the zero-cost ledger row charge_feature would have written. The caller
+# checks units <= free_allowance, so a fresh row always fits.
+_FREE_CLAIM_SQL_TEMPLATE = """
+WITH usage AS (
+    INSERT INTO daily_usage AS du (user_id, date, is_18, free_allowance, text_count, voice_secs, live_secs)
+    VALUES (:user_id, :today, :is_18, 0, {text_count}, {voice_secs}, {live_secs})
+    ON CONFLICT (user_id, date, is_18) DO UPDATE SET {col} = coalesce(du.{col}, 0) + EXCLUDED.{col}
+    WHERE coalesce(du.{col}, 0) + EXCLUDED.{col} <= :free_allowance
+    RETURNING 1
+)
+INSERT INTO influencer_credit_transactions (user_id, influencer_id, feature, units, amount_cents, meta, created_at)
+SELECT :user_id, :influencer_id, :feature, 0 - :units, 0, :meta, now()
+FROM usage
+RETURNING id
+"""
+
+_FREE_CLAIM_SQL = {
+    key: text(
+        _FREE_CLAIM_SQL_TEMPLATE.format(
+            col=col, **{c: (":units" if c == col else "0") for c in _USAGE_COLUMN.values()}
+        )
+    ).bindparams(
+        bindparam("user_id", type_=Integer),
+        bindparam("influencer_id", type_=String),
+        bindparam("feature", type_=String),
+        bindparam("units", type_=Integer),
+        bindparam("is_18", type_=Boolean),
+        bindparam("today", type_=DateTime),
+        bindparam("meta", type_=JSON),
+        bindparam("free_allowance", type_=Integer),
+    )
+    for key, col in _USAGE_COLUMN.items()
+}
+
+_stats: dict[str, int] = {
+    "free_claimed": 0,
+    "reserved": 0,
+    "reserve_failed": 0,
+    "consumed": 0,
+    "settled": 0,
+    "swept": 0,
+    "refunded_cents": 0,
+    "state_lost": 0,
+    "settle_failed": 0,
+}
+
+
+def _left_key(reservation_id: str) -> str:
+    return f"creditres:{reservation_id}:left"
+
+
+def _entries_key(reservation_id: str) -> str:
+    return f"creditres:{reservation_id}:entries"
+
+
+def _paid_units(start: int, units: int, free_units: int) -> int:
+    """Units of [start, start + units) that fall past the free part of a block."""
+    return max(0, min(units, start + units - free_units))
+
+
+async def free_units_left(*, user_id: int, feature: str, is_18: bool = False) -> int:
+    """Today's free allowance for `feature` not yet used (a read, nothing claimed)."""
+    price = await get_price(feature)
+    if not price or price.free_allowance <= 0:
+        return 0
+    usage_t = DailyUsage.__table__
+    col = _USAGE_COLUMN[_usage_key(feature)]
+    async with SessionLocal() as db:
+        used = await db.scalar(
+            select(usage_t.c[col]).where(
+                usage_t.c.user_id == user_id,
+                usage_t.c.date == _today_midnight_naive(),
+                usage_t.c.is_18 == is_18,
+            )
+        )
+    return max(price.free_allowance - int(used or 0), 0)
+
+
+async def claim_free_units(
+    *,
+    user_id: int,
+    influencer_id: str,
+    feature: str,
+    is_18: bool = False,
+    units: int = 1,
+    meta: dict | None = None,
+) -> bool:
+    """
+    Spend `units` from today's free allowance, in one statement. False
+    (nothing recorded) when the allowance can't cover all of them.
+    """
+    price = await get_price(feature)
+    if not price or units > price.free_allowance:
+        return False
+    async with SessionLocal() as db:
+        ledger_id = await db.scalar(
+            _FREE_CLAIM_SQL[_usage_key(feature)],
+            {
+                "user_id": int(user_id),
+                "influencer_id": influencer_id,
+                "feature": feature,
+                "units": int(units),
+                "is_18": bool(is_18),
+                "today": _today_midnight_naive(),
+                "meta": meta,
+                "free_allowance": price.free_allowance,
+            },
+        )
+        if ledger_id is None:
+            await db.rollback()
+            return False
+        await db.commit()
+    _stats["free_claimed"] += units
+    return True
+
+
+async def reserve_credits(
+    *,
+    user_id: int,
+    influencer_id: str,
+    feature: str,
+    is_18: bool = False,
+    units: int = CREDIT_RESERVATION_UNITS,
+) -> CreditReservation | None:
+    """
+    Hold up to `units` paid units of `feature` for one session, fewer if the
+    wallet's unheld balance can't cover them all. None if not even one unit
+    is affordable. Free units are not part of a block; see claim_free_units.
+    """
+    price = await get_price(feature)
+    if not price or price.price_cents <= 0:
+        return None
+
+    today = _today_midnight_naive()
+    now = datetime.now(timezone.utc)
+
+    async with SessionLocal() as db:
+        wallet = await db.scalar(
+            select(InfluencerWallet)
+            .where(
+                and_(
+                    InfluencerWallet.user_id == user_id,
+                    InfluencerWallet.influencer_id == influencer_id,
+                    InfluencerWallet.is_18 == is_18,
+                )
+            )
+            .with_for_update()
+        )
+        available = int(wallet.balance_cents or 0) - int(wallet.held_cents or 0) if wallet else 0
+
+        units = min(units, max(available, 0) // price.price_cents)
+        held_cents = units * price.price_cents
+        if units <= 0:
+            await db.rollback()
+            _stats["reserve_failed"] += 1
+            return None
+
+        wallet.held_cents = int(wallet.held_cents or 0) + held_cents
+
+        reservation = CreditReservation(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            influencer_id=influencer_id,
+            is_18=is_18,
+            feature=feature,
+            usage_date=today,
+            units_reserved=units,
+            free_units=0,
+            unit_price_cents=price.price_cents,
+            held_cents=held_cents,
+            status="open",
+            created_at=now,
+            expires_at=now + timedelta(seconds=CREDIT_RESERVATION_TTL_SECS),
+        )
+        db.add(reservation)
+
+        # Redis state first: a committed reservation without a counter would
+        # only be refunded by the sweep, never used
+        r = await get_redis()
+        await r.set(_left_key(reservation.id), units, ex=CREDIT_RESERVATION_STATE_TTL_SECS)
+        await db.commit()
+
+    _stats["reserved"] += 1
+    log.info(
+        "[CREDITS] reserved id=%s user=%s infl=%s feature=%s units=%d held=%d",
+        reservation.id, user_id, influencer_id, feature, units, held_cents,
+    )
+    return reservation
+
+
+async def consume_reserved(reservation: CreditReservation, units: int = 1, meta: dict | None = None) -> int:
+    """
+    Take `units` from an open reservation. Returns the index of the first
+    unit within the block, or -1 if the block is exhausted or closed.
+    """
+    entry = json.dumps({
+        "units": units,
+        "meta": meta,
+        "ts": datetime.now(timezone.utc).isoformat(),
+    })
+    r = await get_redis()
+    start = int(await r.eval(
+        _CONSUME_LUA, 2,
+        _left_key(reservation.id), _entries_key(reservation.id),
+        units, entry, reservation.units_reserved, CREDIT_RESERVATION_STATE_TTL_SECS,
+    ))
+    if start >= 0:
+        _stats["consumed"] += units
+    return start
+
+
+async def settle_reservation(reservation_id: str) -> dict | None:
+    """
+    Close a reservation and settle it: ledger rows and daily_usage for what
+    was used, its cost debited from the wallet and the hold released.
+    Idempotent; returns None if it was already settled.
+    """
+    r = await get_redis()
+    existed, raw_entries = await r.eval(
+        _CLOSE_LUA, 2, _left_key(reservation_id), _entries_key(reservation_id),
+        CREDIT_RESERVATION_STATE_TTL_SECS,
+    )
+    entries = [json.loads(e) for e in raw_entries]
+    now = datetime.now(timezone.utc)
+
+    async with SessionLocal() as db:
+        res = await db.scalar(
+            select(CreditReservation)
+            .where(CreditReservation.id == reservation_id, CreditReservation.status == "open")
+            .with_for_update()
+        )
+        if res is None:
+            await r.delete(_left_key(reservation_id), _entries_key(reservation_id))
+            return None
+
+        if not existed and not entries:
+            _stats["state_lost"] += 1
+            log.warning("[CREDITS] no redis state for id=%s, refunding the whole block", reservation_id)
+
+        rows = []
+        used = 0
+        charged = 0
+        for entry in entries:
+            units = int(entry["units"])
+            cost = _paid_units(used, units, res.free_units) * res.unit_price_cents
+            used += units
+            charged += cost
+            rows.append({
+                "user_id": res.user_id,
+                "influencer_id": res.influencer_id,
+                "feature": res.feature,
+                "units": -units,
+                "amount_cents": -cost,
+                "meta": entry.get("meta"),
+                "created_at": datetime.fromisoformat(entry["ts"]),
+            })
+        used = min(used, res.units_reserved)
+        refund = max(res.held_cents - charged, 0)
+        unused = res.units_reserved - used
+
+        new_balance = None
+        if charged or res.held_cents:
+            new_balance = await db.scalar(
+                update(InfluencerWallet)
+                .where(
+                    InfluencerWallet.user_id == res.user_id,
+                    InfluencerWallet.influencer_id == res.influencer_id,
+                    InfluencerWallet.is_18 == res.is_18,
+                )
+                .values(
+                    balance_cents=InfluencerWallet.balance_cents - charged,
+                    held_cents=func.greatest(InfluencerWallet.held_cents - res.held_cents, 0),
+                    updated_at=now,
+                )
+                .returning(InfluencerWallet.balance_cents)
+            )
+        if used:
+            usage_t = DailyUsage.__table__
+            col = _USAGE_COLUMN[_usage_key(res.feature)]
+            upsert = pg_insert(usage_t).values({
+                "user_id": res.user_id, "date": res.usage_date, "is_18": res.is_18,
+                "free_allowance": 0, "text_count": 0, "voice_secs": 0, "live_secs": 0,
+                col: used,
+            })
+            await db.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=["user_id", "date", "is_18"],
+                    set_={col: func.coalesce(usage_t.c[col], 0) + upsert.excluded[col]},
+                )
+            )
+        if rows:
+            await db.execute(insert(InfluencerCreditTransaction), rows)
+
+        res.status = "settled"
+        res.units_used = used
+        res.charged_cents = charged
+        res.settled_at = now
+        user_id, influencer_id = res.user_id, res.influencer_id
+        await db.commit()
+
+        if new_balance is not None and charged and new_balance < LOW_BALANCE_THRESHOLD_CENTS <= new_balance + charged:
+            user_obj = await db.get(User, user_id)
+            if user_obj and user_obj.email:
+                try:
+                    from app.api.notify_ws import notify_low_balance
+                    await notify_low_balance(user_obj.email, new_balance)
+                except Exception as e:
+                    log.warning("[CREDITS] low balance notification failed user=%s: %s", user_id, e)
+
+    await r.delete(_left_key(reservation_id), _entries_key(reservation_id))
+    _stats["settled"] += 1
+    _stats["refunded_cents"] += refund
+    log.info(
+        "[CREDITS] settled id=%s user=%s infl=%s used=%d unused=%d charged=%d refunded=%d",
+        reservation_id, user_id, influencer_id, used, unused, charged, refund,
+    )
+    return {"used": used, "unused": unused, "charged_cents": charged, "refunded_cents": refund}
+
+
+async def settle_expired_reservations(limit: int = 500) -> dict:
+    """Settle open reservations whose session is gone (crash, lost socket)."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=CREDIT_RESERVATION_SWEEP_GRACE_SECS)
+    async with SessionLocal() as db:
+        ids = (
+            await db.execute(
+                select(CreditReservation.id)
+                .where(CreditReservation.status == "open", CreditReservation.expires_at < cutoff)
+                .order_by(CreditReservation.expires_at)
+                .limit(limit)
+            )
+        ).scalars().all()
+
+    settled, failed = 0, 0
+    for reservation_id in ids:
+        try:
+            if await settle_reservation(reservation_id) is not None:
+                settled += 1
+        except Exception:
+            failed += 1
+            _stats["settle_failed"] += 1
+            log.exception("[CREDITS] sweep failed to settle id=%s", reservation_id)
+
+    _stats["swept"] += settled
+    if ids:
+        log.info("[CREDITS] sweep expired=%d settled=%d failed=%d", len(ids), settled, failed)
+    return {"expired": len(ids), "settled": settled, "failed": failed}
+
+
+def get_credit_reservation_stats() -> dict:
+    return {**_stats, "enabled": CREDIT_RESERVATIONS_ENABLED}
+
+
+class CreditSession:
+    """
+    What one websocket spends from: today's free allowance, claimed per
+    message, then a paid reservation that refills on exhaustion or expiry;
+    close() settles it. After close() every consume fails so late flushes
+    fall back to charge_feature.
+
+    ensure() runs from the receive loop and consume() from the flush task,
+    so anything that can refill or settle holds _lock; otherwise both could
+    reserve a block at once and orphan one until the sweep.
+    """
+
+    def __init__(
+        self,
+        *,
+        user_id: int,
+        influencer_id: str,
+        feature: str,
+        is_18: bool = False,
+        block_units: int = CREDIT_RESERVATION_UNITS,
+    ) -> None:
+        self.user_id = user_id
+        self.influencer_id = influencer_id
+        self.feature = feature
+        self.is_18 = is_18
+        self.block_units = block_units
+        self._reservation: CreditReservation | None = None
+        self._used = 0
+        self._closed = False
+        self._lock = asyncio.Lock()
+        # Day on which the free allowance ran out; it resets at midnight
+        self._free_gone_on: datetime | None = None
+
+    def _free_possible(self) -> bool:
+        return self._free_gone_on != _today_midnight_naive()
+
+    def _expired(self) -> bool:
+        res = self._reservation
+        return res is None or datetime.now(timezone.utc) >= res.expires_at
+
+    def _has_room(self, units: int) -> bool:
+        res = self._reservation
+        return res is not None and not self._expired() and res.units_reserved - self._used >= units
+
+    async def _refill(self) -> bool:
+        await self._settle_current()
+        self._reservation = await reserve_credits(
+            user_id=self.user_id,
+            influencer_id=self.influencer_id,
+            feature=self.feature,
+            is_18=self.is_18,
+            units=self.block_units,
+        )
+        self._used = 0
+        return self._reservation is not None
+
+    async def _settle_current(self) -> None:
+        res, self._reservation = self._reservation, None
+        if res is None:
+            return
+        try:
+            await settle_reservation(res.id)
+        except Exception:
+            # Still open in the table; the sweep settles it after expiry
+            _stats["settle_failed"] += 1
+            log.exception("[CREDITS] settle failed id=%s", res.id)
+
+    async def ensure(self, units: int = 1) -> bool:
+        """
+        Whether `units` can be spent, reserving a new block if needed. False
+        also when reserving fails, so callers fall back to can_afford.
+        """
+        if self._closed:
+            return False
+        if self._free_possible():
+            try:
+                if await free_units_left(user_id=self.user_id, feature=self.feature, is_18=self.is_18) >= units:
+                    return True
+            except Exception:
+                log.exception("[CREDITS] free allowance lookup failed user=%s", self.user_id)
+                return False
+            self._free_gone_on = _today_midnight_naive()
+        if self._has_room(units):
+            return True
+        async with self._lock:
+            # Someone else may have refilled or closed while we waited
+            if self._closed:
+                return False
+            if self._has_room(units):
+                return True
+            try:
+                return await self._refill()
+            except Exception:
+                log.exception("[CREDITS] reserve failed user=%s infl=%s", self.user_id, self.influencer_id)
+                return False
+
+    async def consume(self, units: int = 1, meta: dict | None = None) -> bool:
+        """Spend `units`; False means the caller has to charge_feature instead."""
+        if self._closed:
+            return False
+        async with self._lock:
+            if self._closed:
+                return False
+            try:
+                if self._free_possible():
+                    if await claim_free_units(
+                        user_id=self.user_id,
+                        influencer_id=self.influencer_id,
+                        feature=self.feature,
+                        is_18=self.is_18,
+                        units=units,
+                        meta=meta,
+                    ):
+                        return True
+                    self._free_gone_on = _today_midnight_naive()
+                for attempt in range(2):
+                    if attempt or self._reservation is None or self._expired():
+                        if not await self._refill():
+                            return False
+                    start = await consume_reserved(self._reservation, units, meta)
+                    if start >= 0:
+                        self._used = start + units
+                        return True
+            except Exception:
+                log.exception("[CREDITS] consume failed user=%s infl=%s", self.user_id, self.influencer_id)
+            return False
+
+    async def close(self) -> None:
+        self._closed = True
+        async with self._lock:
+            await self._settle_current()
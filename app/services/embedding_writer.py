@@ -0,0 +1,315 @@
+"""
+Deferred, batched writer for message embeddings.
+
+Messages are inserted without a vector and queued here; a background worker
+drains the queue in batches through get_embeddings_batch and writes the
+message_embeddings / message_18_embeddings side tables. The request path only
+pays for a put_nowait().
+
+- Backpressure: the queue is bounded. When it is full the job is dropped and
+  counted; the row is simply left without an embedding.
+- Crash safety: anything lost (full queue, failed batch, process restart) is
+  recovered by the periodic backfill, which re-queues recent messages that
+  still have no side-table row. One process runs it at a time (advisory
+  lock), and ids it queued within EMBED_BACKFILL_RETRY_SECS are skipped, so
+  in-flight or repeatedly failing messages are not queued again by every
+  worker on every pass.
+- Metrics: get_embedding_writer_stats() returns counters and queue depth.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from sqlalchemy import select, or_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.models import Message, Message18
+from app.db.session import SessionLocal
+from app.services.embeddings import get_embeddings_batch, message_embedding_model
+from app.utils.infrastructure.concurrency import advisory_lock
+from app.utils.infrastructure.redis_pool import get_redis
+
+log = logging.getLogger("embedding-writer")
+
+EMBED_QUEUE_MAXSIZE = int(os.getenv("EMBED_QUEUE_MAXSIZE", "10000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_FLUSH_INTERVAL_SECS = float(os.getenv("EMBED_FLUSH_INTERVAL_SECS", "0.5"))
+EMBED_MAX_INFLIGHT_BATCHES = int(os.getenv("EMBED_MAX_INFLIGHT_BATCHES", "2"))
+EMBED_BACKFILL_INTERVAL_SECS = int(os.getenv("EMBED_BACKFILL_INTERVAL_SECS", "300"))
+EMBED_BACKFILL_LOOKBACK_HOURS = int(os.getenv("EMBED_BACKFILL_LOOKBACK_HOURS", "24"))
+EMBED_BACKFILL_LIMIT = int(os.getenv("EMBED_BACKFILL_LIMIT", "2000"))
+# Younger messages may still be in some worker's queue
+EMBED_BACKFILL_MIN_AGE_SECS = int(os.getenv("EMBED_BACKFILL_MIN_AGE_SECS", "120"))
+# How long a backfilled id is skipped before it may be queued again
+EMBED_BACKFILL_RETRY_SECS = int(os.getenv("EMBED_BACKFILL_RETRY_SECS", "3600"))
+
+# Sorted set of "<table>:<message_id>" scored by when the backfill queued it
+BACKFILL_QUEUED_KEY = "embed:backfill:queued"
+
+
+@dataclass(slots=True)
+class EmbeddingJob:
+    message_model: type  # Message or Message18
+    message_id: int
+    chat_id: str
+    text: str
+
+
+_queue: asyncio.Queue[EmbeddingJob] = asyncio.Queue(maxsize=EMBED_QUEUE_MAXSIZE)
+_worker_task: asyncio.Task | None = None
+_backfill_task: asyncio.Task | None = None
+_inflight: set[asyncio.Task] = set()
+
+_stats: dict[str, float] = {
+    "enqueued": 0,
+    "dropped": 0,
+    "embedded": 0,
+    "failed": 0,
+    "batches": 0,
+    "backfill_requeued": 0,
+    "backfill_skipped": 0,
+    "last_batch_ms": 0.0,
+}
+
+
+def enqueue_message_embedding(message, text: str | None = None) -> bool:
+    """
+    Queue a persisted Message/Message18 for embedding without waiting.
+
+    Returns False when the queue is full; the backfill will pick the row up.
+    """
+    content = (text if text is not None else message.content) or ""
+    if not content.strip() or message.id is None:
+        return False
+
+    job = EmbeddingJob(
+        message_model=type(message),
+        message_id=message.id,
+        chat_id=message.chat_id,
+        text=content,
+    )
+    try:
+        _queue.put_nowait(job)
+    except asyncio.QueueFull:
+        _stats["dropped"] += 1
+        log.warning("[EMBED] queue full (size=%d), deferring msg=%s to backfill", _queue.qsize(), message.id)
+        return False
+
+    _stats["enqueued"] += 1
+    return True
+
+
+def get_embedding_writer_stats() -> dict:
+    """Counters plus current queue depth and in-flight batch count."""
+    return {
+        **_stats,
+        "queue_depth": _queue.qsize(),
+        "queue_maxsize": EMBED_QUEUE_MAXSIZE,
+        "inflight_batches": len(_inflight),
+        "running": _worker_task is not None and not _worker_task.done(),
+    }
+
+
+async def _write_batch(jobs: list[EmbeddingJob]) -> None:
+    started = time.perf_counter()
+    try:
+        embeddings = await get_embeddings_batch([j.text for j in jobs])
+    except Exception as exc:
+        _stats["failed"] += len(jobs)
+        log.error("[EMBED] batch embedding failed size=%d err=%s", len(jobs), exc, exc_info=True)
+        return
+
+    rows_by_model: dict[type, list[dict]] = {}
+    for job, emb in zip(jobs, embeddings):
+        if not emb:
+            _stats["failed"] += 1
+            continue
+        model = message_embedding_model(job.message_model)
+        rows_by_model.setdefault(model, []).append(
+            {"message_id": job.message_id, "chat_id": job.chat_id, "embedding": emb}
+        )
+
+    if not rows_by_model:
+        return
+
+    async with SessionLocal() as db:
+        try:
+            written = 0
+            for model, rows in rows_by_model.items():
+                await db.execute(
+                    pg_insert(model)
+                    .values(rows)
+                    .on_conflict_do_nothing(index_elements=["message_id"])
+                )
+                written += len(rows)
+            await db.commit()
+            _stats["embedded"] += written
+        except Exception as exc:
+            await db.rollback()
+            _stats["failed"] += sum(len(r) for r in rows_by_model.values())
+            log.error("[EMBED] batch write failed size=%d err=%s", len(jobs), exc, exc_info=True)
+            return
+
+    _stats["batches"] += 1
+    _stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def _next_batch() -> list[EmbeddingJob]:
+    """Block for the first job, then gather more until the batch fills or the interval elapses."""
+    batch = [await _queue.get()]
+    deadline = time.monotonic() + EMBED_FLUSH_INTERVAL_SECS
+    while len(batch) < EMBED_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(_queue.get(), timeout=remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+
+async def _worker_loop() -> None:
+    slots = asyncio.Semaphore(EMBED_MAX_INFLIGHT_BATCHES)
+    while True:
+        batch = await _next_batch()
+        await slots.acquire()
+
+        task = asyncio.create_task(_write_batch(batch))
+        _inflight.add(task)
+
+        def _done(t: asyncio.Task, n: int = len(batch)) -> None:
+            _inflight.discard(t)
+            slots.release()
+            for _ in range(n):
+                _queue.task_done()
+
+        task.add_done_callback(_done)
+
+
+async def backfill_missing_embeddings(
+    lookback_hours: int = EMBED_BACKFILL_LOOKBACK_HOURS,
+    limit: int = EMBED_BACKFILL_LIMIT,
+) -> int:
+    """
+    Re-queue recent user/call messages that still have no embedding row.
+
+    Covers jobs lost to a full queue, failed batches or a crash between the
+    message insert and the batch write. Returns how many jobs were queued.
+    """
+    r = await get_redis()
+    now = time.time()
+    await r.zremrangebyscore(BACKFILL_QUEUED_KEY, 0, now - EMBED_BACKFILL_RETRY_SECS)
+
+    requeued = 0
+    async with SessionLocal() as db:
+        for message_model in (Message, Message18):
+            emb_model = message_embedding_model(message_model)
+            rows = (
+                await db.execute(
+                    select(message_model.id, message_model.chat_id, message_model.content)
+                    .outerjoin(emb_model, emb_model.message_id == message_model.id)
+                    .where(
+                        emb_model.message_id.is_(None),
+                        or_(message_model.sender == "user", message_model.channel == "call"),
+                        message_model.created_at >= func.now() - timedelta(hours=lookback_hours),
+                        message_model.created_at < func.now() - timedelta(seconds=EMBED_BACKFILL_MIN_AGE_SECS),
+                    )
+                    .order_by(message_model.id.desc())
+                    .limit(limit)
+                )
+            ).all()
+            rows = [row for row in rows if (row.content or "").strip()]
+            if not rows:
+                continue
+
+            members = [f"{message_model.__tablename__}:{row.id}" for row in rows]
+            pipe = r.pipeline()
+            for member in members:
+                pipe.zscore(BACKFILL_QUEUED_KEY, member)
+            recent = await pipe.execute()
+
+            queued: dict[str, float] = {}
+            full = False
+            for row, member, seen in zip(rows, members, recent):
+                if seen is not None:
+                    _stats["backfill_skipped"] += 1
+                    continue
+                try:
+                    _queue.put_nowait(
+                        EmbeddingJob(message_model, row.id, row.chat_id, row.content)
+                    )
+                except asyncio.QueueFull:
+                    log.warning("[EMBED] backfill stopped early: queue full")
+                    full = True
+                    break
+                queued[member] = now
+                requeued += 1
+
+            if queued:
+                await r.zadd(BACKFILL_QUEUED_KEY, queued)
+            if full:
+                _stats["backfill_requeued"] += requeued
+                return requeued
+
+    _stats["backfill_requeued"] += requeued
+    if requeued:
+        log.info("[EMBED] backfill re-queued %d messages", requeued)
+    return requeued
+
+
+async def _backfill_loop() -> None:
+    while True:
+        try:
+            async with advisory_lock(
+                "embed-backfill",
+                timeout=EMBED_BACKFILL_INTERVAL_SECS,
+                retry_count=1,
+                raise_on_fail=False,
+            ) as acquired:
+                if acquired:
+                    await backfill_missing_embeddings()
+                else:
+                    log.debug("[EMBED] backfill running in another process, skipping")
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            log.exception("[EMBED] backfill failed: %s", exc)
+        await asyncio.sleep(EMBED_BACKFILL_INTERVAL_SECS)
+
+
+def start_embedding_writer() -> None:
+    global _worker_task, _backfill_task
+    if _worker_task is not None:
+        log.warning("[EMBED] writer already running")
+        return
+    _worker_task = asyncio.create_task(_worker_loop())
+    _backfill_task = asyncio.create_task(_backfill_loop())
+    log.info(
+        "[EMBED] writer started batch=%d interval=%.2fs maxsize=%d",
+        EMBED_BATCH_SIZE, EMBED_FLUSH_INTERVAL_SECS, EMBED_QUEUE_MAXSIZE,
+    )
+
+
+async def stop_embedding_writer(drain_timeout: float = 5.0) -> None:
+    """Give queued jobs a bounded chance to flush, then cancel the workers."""
+    global _worker_task, _backfill_task
+    if _worker_task is None:
+        return
+
+    if _backfill_task is not None:
+        _backfill_task.cancel()
+        _backfill_task = None
+
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=drain_timeout)
+    except asyncio.TimeoutError:
+        log.warning("[EMBED] stop: %d jobs left for backfill", _queue.qsize())
+
+    _worker_task.cancel()
+    _worker_task = None
+    log.info("[EMBED] writer stopped")
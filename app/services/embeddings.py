@@ -5,20 +5,28 @@ This module provides:
 - OpenAI text embeddings generation (single and batch)
 - Vector similarity search for memories and messages
 - Memory upsert with deduplication based on semantic similarity
+- Message embedding storage in the side tables (message_embeddings, message_18_embeddings)
 """
 
 import logging
+import os
 from datetime import datetime, timezone
 
 from openai import AsyncOpenAI
 from sqlalchemy import text, func
 
+from app.db.models import Message18, MessageEmbedding, Message18Embedding
+
 log = logging.getLogger(__name__)
 
 # Use AsyncOpenAI for non-blocking API calls
 # This prevents blocking the event loop during embedding requests
 client = AsyncOpenAI()
 
+# Vectors are stored as Vector(1536); a model change must keep that dimension
+# (or ship a migration) and be followed by `python -m app.scripts.reembed`.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
 
 async def get_embedding(text: str) -> list[float]:
     """
@@ -32,7 +40,7 @@ async def get_embedding(text: str) -> list[float]:
     """
     response = await client.embeddings.create(
         input=text,
-        model="text-embedding-3-small"
+        model=EMBEDDING_MODEL
     )
     return response.data[0].embedding
 
@@ -62,7 +70,7 @@ async def get_embeddings_batch(texts: list[str]) -> list[list[float]]:
     try:
         response = await client.embeddings.create(
             input=texts,
-            model="text-embedding-3-small"
+            model=EMBEDDING_MODEL
         )
         # API returns embeddings in order, but let's be safe
         # Sort by index to ensure order matches input
@@ -139,7 +147,9 @@ async def search_similar_messages(db, chat_id: str, embedding: list[float], top_
     """
     Search for similar messages using vector similarity with cosine distance.
     
-    Orders by similarity first (most relevant), then by recency (created_at DESC) as a tiebreaker.
+    Vectors live in message_embeddings; the messages table is only joined for
+    the top_k winners to fetch their content. Orders by similarity first, then
+    by recency (newest message id) as a tiebreaker.
     
     Args:
         db: Database session
@@ -155,13 +165,17 @@ async def search_similar_messages(db, chat_id: str, embedding: list[float], top_
     """
     if max_distance is not None:
         sql = text("""
-            SELECT content, embedding <=> :embedding AS distance
-            FROM messages
-            WHERE chat_id = :chat_id
-              AND embedding IS NOT NULL
-              AND embedding <=> :embedding <= :max_distance
-            ORDER BY distance ASC, created_at DESC
-            LIMIT :top_k
+            SELECT m.content, e.distance
+            FROM (
+                SELECT message_id, embedding <=> :embedding AS distance
+                FROM message_embeddings
+                WHERE chat_id = :chat_id
+                  AND embedding <=> :embedding <= :max_distance
+                ORDER BY distance ASC, message_id DESC
+                LIMIT :top_k
+            ) e
+            JOIN messages m ON m.id = e.message_id
+            ORDER BY e.distance ASC, e.message_id DESC
         """)
         params = {
             "chat_id": chat_id,
@@ -171,12 +185,16 @@ async def search_similar_messages(db, chat_id: str, embedding: list[float], top_
         }
     else:
         sql = text("""
-            SELECT content
-            FROM messages
-            WHERE chat_id = :chat_id
-              AND embedding IS NOT NULL
-            ORDER BY embedding <=> :embedding, created_at DESC
-            LIMIT :top_k
+            SELECT m.content
+            FROM (
+                SELECT message_id, embedding <=> :embedding AS distance
+                FROM message_embeddings
+                WHERE chat_id = :chat_id
+                ORDER BY distance ASC, message_id DESC
+                LIMIT :top_k
+            ) e
+            JOIN messages m ON m.id = e.message_id
+            ORDER BY e.distance ASC, e.message_id DESC
         """)
         params = {
             "chat_id": chat_id,
@@ -188,6 +206,36 @@ async def search_similar_messages(db, chat_id: str, embedding: list[float], top_
     return [row[0] for row in result.fetchall()]
 
 
+def message_embedding_model(message_model: type) -> type:
+    """Return the embedding side-table model for Message or Message18."""
+    return Message18Embedding if message_model is Message18 else MessageEmbedding
+
+
+def add_message_embeddings(db, messages: list, embeddings: list[list[float] | None]) -> int:
+    """
+    Stage embedding rows for already-flushed messages (ids must be assigned).
+    
+    Messages whose embedding is missing or empty are skipped; they can be
+    filled later by the embedding backfill. The caller commits.
+    
+    Args:
+        db: Database session
+        messages: Message or Message18 instances with primary keys
+        embeddings: Embeddings aligned with messages
+        
+    Returns:
+        Number of embedding rows added
+    """
+    added = 0
+    for msg, emb in zip(messages, embeddings):
+        if not emb:
+            continue
+        model = message_embedding_model(type(msg))
+        db.add(model(message_id=msg.id, chat_id=msg.chat_id, embedding=emb))
+        added += 1
+    return added
+
+
 async def upsert_memory(
     db,
     chat_id: str,
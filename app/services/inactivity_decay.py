@@ -0,0 +1,167 @@
+"""
+Nightly set-based inactivity decay for relationship_state.
+
+Decay used to happen lazily on a user's first turn back, so idle
+relationships kept their full scores until then and that turn paid for it.
+This job applies the same rules (app/relationship/inactivity.py DECAY_RULES)
+to every idle row with plain UPDATEs, walking the table in id ranges and
+committing per chunk so locks stay short.
+
+Each row records the idle days already decayed in decayed_idle_days; the job
+only subtracts decay(idle now) - decay(already decayed), so runs can be
+repeated or skipped without double-counting, and the per-turn path only
+applies whatever accrued since the last run. Rows whose absence is long
+enough that every dimension is capped are left alone.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update, func, case, literal, and_, DateTime
+
+from app.db.models import RelationshipState
+from app.db.session import SessionLocal
+from app.relationship.inactivity import (
+    DECAY_RULES,
+    DECAY_SATURATION_DAYS,
+    GIRLFRIEND_DECAY_MULTIPLIER,
+)
+from app.relationship.state_cache import flush_dirty_relationships, drop_clean_relationships
+
+log = logging.getLogger("inactivity-decay")
+
+INACTIVITY_DECAY_CHUNK_SIZE = int(os.getenv("INACTIVITY_DECAY_CHUNK_SIZE", "5000"))
+
+# Decay starts at the smallest threshold in DECAY_RULES
+_MIN_IDLE_DAYS = min(start for _, start, _, _, _ in DECAY_RULES)
+
+_last_run: dict = {}
+
+
+def _decay_columns(now: datetime) -> dict:
+    """Column -> new-value expressions, mirroring apply_inactivity_decay."""
+    t = RelationshipState.__table__
+    now_sql = literal(now, DateTime(timezone=True))
+    last = func.coalesce(t.c.last_interaction_at, t.c.updated_at)
+    days = func.extract("epoch", now_sql - last) / 86400.0
+    already = func.coalesce(t.c.decayed_idle_days, 0.0)
+    mult = case((t.c.girlfriend_confirmed.is_(True), GIRLFRIEND_DECAY_MULTIPLIER), else_=1.0)
+
+    def amount(d, start, offset, rate, cap):
+        return case((d >= start, func.least(cap, (d - offset) * rate * mult)), else_=0.0)
+
+    values = {}
+    for field, start, offset, rate, cap in DECAY_RULES:
+        col = t.c[field]
+        delta = func.greatest(
+            0.0,
+            amount(days, start, offset, rate, cap) - amount(already, start, offset, rate, cap),
+        )
+        values[field] = case((days >= start, func.greatest(0.0, col - delta)), else_=col)
+    values["decayed_idle_days"] = func.greatest(already, days)
+    return values
+
+
+def _idle_filter(now: datetime):
+    t = RelationshipState.__table__
+    return and_(
+        func.coalesce(t.c.last_interaction_at, t.c.updated_at) < now - timedelta(days=_MIN_IDLE_DAYS),
+        func.coalesce(t.c.decayed_idle_days, 0.0) < DECAY_SATURATION_DAYS,
+    )
+
+
+async def _decay_chunk(db, lo: int, hi: int, now: datetime, dry_run: bool) -> dict:
+    t = RelationshipState.__table__
+    where = and_(t.c.id >= lo, t.c.id < hi, _idle_filter(now))
+    values = _decay_columns(now)
+
+    if dry_run:
+        row = (
+            await db.execute(
+                select(
+                    func.count().label("rows"),
+                    *(func.coalesce(func.sum(t.c[f] - values[f]), 0.0).label(f) for f, *_ in DECAY_RULES),
+                ).where(where)
+            )
+        ).one()
+        return {"rows": int(row.rows), **{f: float(getattr(row, f)) for f, *_ in DECAY_RULES}, "pairs": []}
+
+    result = await db.execute(
+        update(t).where(where).values(**values).returning(t.c.user_id, t.c.influencer_id)
+    )
+    pairs = [(r.user_id, r.influencer_id) for r in result]
+    await db.commit()
+    return {"rows": len(pairs), "pairs": pairs}
+
+
+async def run_inactivity_decay_job(
+    *,
+    chunk_size: int = INACTIVITY_DECAY_CHUNK_SIZE,
+    dry_run: bool = False,
+    now: datetime | None = None,
+) -> dict:
+    """
+    Decay every idle relationship up to `now`.
+
+    Returns row-count metrics; a dry run also reports the points each
+    dimension would lose, without writing anything.
+    """
+    global _last_run
+    started = time.perf_counter()
+    now = now or datetime.now(timezone.utc)
+    log.info("[DECAY] Starting job: chunk_size=%d dry_run=%s now=%s", chunk_size, dry_run, now.isoformat())
+
+    # Cached hashes may be ahead of Postgres; write them out before decaying the rows
+    if not dry_run:
+        try:
+            await flush_dirty_relationships()
+        except Exception as exc:
+            log.warning("[DECAY] pre-run cache flush failed: %s", exc)
+
+    totals: dict = {"chunks": 0, "failed_chunks": 0, "rows": 0, "cache_dropped": 0}
+    if dry_run:
+        totals.update({f"{f}_points": 0.0 for f, *_ in DECAY_RULES})
+
+    t = RelationshipState.__table__
+    async with SessionLocal() as db:
+        lo, hi = (await db.execute(select(func.min(t.c.id), func.max(t.c.id)).where(_idle_filter(now)))).one()
+
+    if lo is not None:
+        for start in range(lo, hi + 1, chunk_size):
+            async with SessionLocal() as db:
+                try:
+                    res = await _decay_chunk(db, start, start + chunk_size, now, dry_run)
+                except Exception as exc:
+                    await db.rollback()
+                    totals["failed_chunks"] += 1
+                    log.exception("[DECAY] chunk id=[%d, %d) failed: %s", start, start + chunk_size, exc)
+                    continue
+
+            totals["chunks"] += 1
+            totals["rows"] += res["rows"]
+            if dry_run:
+                for f, *_ in DECAY_RULES:
+                    totals[f"{f}_points"] += res[f]
+            elif res["pairs"]:
+                totals["cache_dropped"] += await drop_clean_relationships(res["pairs"])
+
+    if dry_run:
+        for f, *_ in DECAY_RULES:
+            totals[f"{f}_points"] = round(totals[f"{f}_points"], 2)
+    totals["duration_secs"] = round(time.perf_counter() - started, 2)
+    totals["dry_run"] = dry_run
+    totals["finished_at"] = datetime.now(timezone.utc).isoformat()
+    _last_run = totals
+
+    log.info(
+        "[DECAY] Job complete: rows=%d chunks=%d failed_chunks=%d cache_dropped=%d dry_run=%s in %.1fs",
+        totals["rows"], totals["chunks"], totals["failed_chunks"], totals["cache_dropped"],
+        dry_run, totals["duration_secs"],
+    )
+    return totals
+
+
+def get_inactivity_decay_stats() -> dict:
+    return {"last_run": _last_run or None}
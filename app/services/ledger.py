@@ -0,0 +1,231 @@
+"""
+Credit ledger partitions, rollups and archiving.
+
+influencer_credit_transactions is range-partitioned by month
+(influencer_credit_transactions_YYYY_MM, plus a DEFAULT partition that
+should stay empty). A trigger folds every ledger insert/delete into
+credit_ledger_daily, so reporting reads a few rows per day instead of one
+row per message or voice second.
+
+run_ledger_maintenance (scheduler, daily):
+- creates the next LEDGER_PARTITION_MONTHS_AHEAD monthly partitions;
+- when LEDGER_ARCHIVE_ENABLED, exports partitions older than
+  LEDGER_RETENTION_MONTHS to S3 as gzipped JSON lines, checks the row count,
+  then detaches and drops them. Rollups for those months are kept.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.db.models import CreditLedgerDaily
+from app.db.session import SessionLocal
+
+log = logging.getLogger("ledger")
+
+LEDGER_TABLE = "influencer_credit_transactions"
+LEDGER_PARTITION_MONTHS_AHEAD = int(os.getenv("LEDGER_PARTITION_MONTHS_AHEAD", "3"))
+LEDGER_ARCHIVE_ENABLED = os.getenv("LEDGER_ARCHIVE_ENABLED", "false").lower() == "true"
+LEDGER_RETENTION_MONTHS = int(os.getenv("LEDGER_RETENTION_MONTHS", "13"))
+LEDGER_ARCHIVE_PREFIX = os.getenv("LEDGER_ARCHIVE_PREFIX", "ledger-archive")
+
+_PARTITION_RE = re.compile(rf"^{LEDGER_TABLE}_(\d{{4}})_(\d{{2}})$")
+
+_last_run: dict = {}
+
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def _add_months(d: date, months: int) -> date:
+    y, m = divmod(d.month - 1 + months, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{LEDGER_TABLE}_{month:%Y_%m}"
+
+
+async def list_ledger_partitions(db) -> dict[date, str]:
+    """Monthly partitions currently attached, by first day of month."""
+    rows = await db.execute(
+        text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = :table
+        """),
+        {"table": LEDGER_TABLE},
+    )
+    out: dict[date, str] = {}
+    for (name,) in rows.all():
+        m = _PARTITION_RE.match(name)
+        if m:
+            out[date(int(m.group(1)), int(m.group(2)), 1)] = name
+    return out
+
+
+async def ensure_ledger_partitions(months_ahead: int = LEDGER_PARTITION_MONTHS_AHEAD) -> list[str]:
+    """Create any missing partition from this month to `months_ahead` out."""
+    this_month = _month_start(datetime.now(timezone.utc).date())
+    created: list[str] = []
+    async with SessionLocal() as db:
+        existing = await list_ledger_partitions(db)
+        for i in range(months_ahead + 1):
+            month = _add_months(this_month, i)
+            if month in existing:
+                continue
+            name = partition_name(month)
+            # Fails if the DEFAULT partition already holds rows for this month
+            await db.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {LEDGER_TABLE} '
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+            ))
+            await db.commit()
+            created.append(name)
+            log.info("[LEDGER] created partition %s", name)
+    return created
+
+
+def _upload_archive(path: str, key: str) -> None:
+    from app.utils.storage.s3 import s3
+    s3.upload_file(path, settings.BUCKET_NAME, key, ExtraArgs={"ContentType": "application/gzip"})
+
+
+async def _export_partition(name: str, key: str) -> int:
+    """Write one partition to S3; returns the number of rows exported."""
+    exported = 0
+    with tempfile.NamedTemporaryFile(suffix=".jsonl.gz") as tmp:
+        with gzip.open(tmp.name, "wt", encoding="utf-8") as out:
+            async with SessionLocal() as db:
+                result = await db.stream(text(
+                    f'SELECT id, user_id, influencer_id, feature, units, amount_cents, meta, created_at '
+                    f'FROM "{name}" ORDER BY id'
+                ))
+                async for row in result:
+                    record = dict(row._mapping)
+                    record["created_at"] = record["created_at"].isoformat()
+                    out.write(json.dumps(record, default=str) + "\n")
+                    exported += 1
+        await asyncio.to_thread(_upload_archive, tmp.name, key)
+    return exported
+
+
+async def archive_ledger_partitions(
+    retention_months: int = LEDGER_RETENTION_MONTHS,
+    dry_run: bool = False,
+) -> list[dict]:
+    """
+    Export partitions that ended more than `retention_months` ago to S3,
+    then detach and drop them. A partition is only dropped once the exported
+    row count matches the table.
+    """
+    cutoff = _add_months(_month_start(datetime.now(timezone.utc).date()), -retention_months)
+    async with SessionLocal() as db:
+        partitions = await list_ledger_partitions(db)
+
+    archived: list[dict] = []
+    for month, name in sorted(partitions.items()):
+        if month >= cutoff:
+            continue
+        async with SessionLocal() as db:
+            rows = int(await db.scalar(text(f'SELECT count(*) FROM "{name}"')) or 0)
+        key = f"{LEDGER_ARCHIVE_PREFIX}/{LEDGER_TABLE}/{month:%Y_%m}.jsonl.gz"
+        if dry_run:
+            archived.append({"partition": name, "rows": rows, "key": key, "dry_run": True})
+            continue
+
+        exported = await _export_partition(name, key)
+        if exported != rows:
+            log.error("[LEDGER] %s export mismatch rows=%d exported=%d, keeping partition", name, rows, exported)
+            continue
+
+        async with SessionLocal() as db:
+            await db.execute(text(f'ALTER TABLE {LEDGER_TABLE} DETACH PARTITION "{name}"'))
+            await db.execute(text(f'DROP TABLE "{name}"'))
+            await db.commit()
+        archived.append({"partition": name, "rows": rows, "key": key})
+        log.info("[LEDGER] archived %s rows=%d to s3://%s/%s", name, rows, settings.BUCKET_NAME, key)
+    return archived
+
+
+async def run_ledger_maintenance() -> dict:
+    global _last_run
+    started = time.perf_counter()
+    created = await ensure_ledger_partitions()
+    archived = await archive_ledger_partitions() if LEDGER_ARCHIVE_ENABLED else []
+
+    async with SessionLocal() as db:
+        default_rows = int(await db.scalar(text(f"SELECT count(*) FROM {LEDGER_TABLE}_default")) or 0)
+    if default_rows:
+        log.warning("[LEDGER] %d rows landed in the default partition", default_rows)
+
+    _last_run = {
+        "created": created,
+        "archived": [a["partition"] for a in archived],
+        "default_partition_rows": default_rows,
+        "duration_secs": round(time.perf_counter() - started, 2),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return _last_run
+
+
+async def get_ledger_summary(db, *, user_id: int, influencer_id: str, days: int = 30) -> dict:
+    """Spend and top-ups for one (user, influencer) from the daily rollups."""
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    rows = (
+        await db.execute(
+            select(
+                CreditLedgerDaily.day,
+                CreditLedgerDaily.feature,
+                CreditLedgerDaily.tx_count,
+                CreditLedgerDaily.units,
+                CreditLedgerDaily.debit_cents,
+                CreditLedgerDaily.credit_cents,
+            )
+            .where(
+                CreditLedgerDaily.user_id == user_id,
+                CreditLedgerDaily.influencer_id == influencer_id,
+                CreditLedgerDaily.day >= since,
+            )
+            .order_by(CreditLedgerDaily.day)
+        )
+    ).all()
+
+    by_feature: dict[str, dict] = {}
+    by_day: dict[str, dict] = {}
+    for r in rows:
+        f = by_feature.setdefault(r.feature, {"transactions": 0, "units": 0, "spent_cents": 0, "added_cents": 0})
+        f["transactions"] += r.tx_count
+        f["units"] += abs(int(r.units))
+        f["spent_cents"] += int(r.debit_cents)
+        f["added_cents"] += int(r.credit_cents)
+        d = by_day.setdefault(r.day.isoformat(), {"spent_cents": 0, "added_cents": 0})
+        d["spent_cents"] += int(r.debit_cents)
+        d["added_cents"] += int(r.credit_cents)
+
+    return {
+        "influencer_id": influencer_id,
+        "since": since.isoformat(),
+        "days": days,
+        "total_spent_cents": sum(f["spent_cents"] for f in by_feature.values()),
+        "total_added_cents": sum(f["added_cents"] for f in by_feature.values()),
+        "by_feature": by_feature,
+        "by_day": [{"day": k, **v} for k, v in by_day.items()],
+    }
+
+
+def get_ledger_stats() -> dict:
+    return {"last_run": _last_run or None, "archive_enabled": LEDGER_ARCHIVE_ENABLED}
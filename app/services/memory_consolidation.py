@@ -0,0 +1,314 @@
+"""
+Periodic consolidation of long-term memories.
+
+upsert_memory only merges a new fact into its single nearest neighbour, so a
+chat's `memories` keeps growing with paraphrases of the same facts. This job,
+per chat:
+
+1. Clusters memories with vectorized cosine similarity (NumPy), computed
+   MEMORY_CONSOLIDATION_BLOCK_ROWS rows at a time so memory stays at
+   block x n however large the chat is. Clustering is greedy and
+   recency-led: the newest unassigned memory absorbs every unassigned
+   memory within `distance_threshold`, mirroring upsert_memory where the
+   newest phrasing wins.
+2. Deletes the absorbed near-duplicates.
+3. Enforces a per-chat cap, evicting by a recency-weighted score where
+   facts that were restated often (large clusters) decay more slowly.
+
+Every removed row is first copied whole (content, embedding, timestamps)
+into memory_consolidation_audit under the run's id, in the same
+transaction as the delete; restore_consolidation_run() puts a run back.
+
+Chats are read with a server-side streaming cursor and processed in parallel
+batches, each chat in its own session.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import numpy as np
+from sqlalchemy import select, delete, func, insert
+
+from app.db.models import Memory, MemoryConsolidationAudit
+from app.db.session import SessionLocal
+
+log = logging.getLogger("memory-consolidation")
+
+MEMORY_CAP_PER_CHAT = int(os.getenv("MEMORY_CAP_PER_CHAT", "300"))
+MEMORY_MERGE_DISTANCE = float(os.getenv("MEMORY_MERGE_DISTANCE", "0.15"))
+MEMORY_RECENCY_HALF_LIFE_DAYS = float(os.getenv("MEMORY_RECENCY_HALF_LIFE_DAYS", "30"))
+MEMORY_CONSOLIDATION_BATCH = int(os.getenv("MEMORY_CONSOLIDATION_BATCH", "50"))
+MEMORY_CONSOLIDATION_CONCURRENCY = int(os.getenv("MEMORY_CONSOLIDATION_CONCURRENCY", "4"))
+# Chats at or below this size are skipped; nothing meaningful to consolidate
+MEMORY_CONSOLIDATION_MIN_COUNT = int(os.getenv("MEMORY_CONSOLIDATION_MIN_COUNT", "20"))
+MEMORY_CONSOLIDATION_BLOCK_ROWS = int(os.getenv("MEMORY_CONSOLIDATION_BLOCK_ROWS", "1024"))
+
+
+def cluster_near_duplicates(
+    embeddings: np.ndarray,
+    distance_threshold: float,
+    block_rows: int = MEMORY_CONSOLIDATION_BLOCK_ROWS,
+) -> np.ndarray:
+    """
+    Assign each row to a cluster leader; rows must be ordered newest first.
+
+    Returns an int array where labels[i] is the row index of i's leader
+    (leaders point at themselves). Similarities are computed block_rows
+    rows at a time, never as a full n x n matrix.
+    """
+    n = embeddings.shape[0]
+    labels = np.arange(n)
+    if n < 2:
+        return labels
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = (embeddings / np.where(norms == 0, 1.0, norms)).astype(np.float32, copy=False)
+    min_sim = 1.0 - distance_threshold
+    block_rows = max(1, block_rows)
+
+    unassigned = np.ones(n, dtype=bool)
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        if not unassigned[start:stop].any():
+            continue
+        block = unit[start:stop] @ unit.T
+        for i in range(start, stop):
+            if not unassigned[i]:
+                continue
+            members = unassigned & (block[i - start] >= min_sim)
+            members[i] = True
+            labels[members] = i
+            unassigned &= ~members
+    return labels
+
+
+def retention_scores(
+    ages_days: np.ndarray,
+    cluster_sizes: np.ndarray,
+    half_life_days: float,
+) -> np.ndarray:
+    """Recency-weighted keep score; restated facts get a longer effective half-life."""
+    effective_half_life = half_life_days * (1.0 + np.log(np.maximum(cluster_sizes, 1)))
+    return np.exp(-math.log(2) * ages_days / effective_half_life)
+
+
+async def consolidate_chat_memories(
+    db,
+    chat_id: str,
+    *,
+    cap: int = MEMORY_CAP_PER_CHAT,
+    distance_threshold: float = MEMORY_MERGE_DISTANCE,
+    half_life_days: float = MEMORY_RECENCY_HALF_LIFE_DAYS,
+    dry_run: bool = False,
+    run_id: str | None = None,
+) -> dict:
+    """
+    Merge near-duplicate memories for one chat and enforce the cap.
+
+    Returns before/after counts plus how many rows were merged or evicted.
+    Removed rows are copied to memory_consolidation_audit under `run_id`.
+    """
+    run_id = run_id or uuid4().hex
+    rows = (
+        await db.execute(
+            select(Memory.id, Memory.embedding, Memory.created_at, Memory.content, Memory.sender)
+            .where(Memory.chat_id == chat_id)
+            .order_by(Memory.created_at.desc(), Memory.id.desc())
+        )
+    ).all()
+
+    before = len(rows)
+    if before == 0:
+        return {"chat_id": chat_id, "before": 0, "after": 0, "merged": 0, "evicted": 0}
+
+    ids = np.array([r.id for r in rows], dtype=np.int64)
+    has_emb = np.array([r.embedding is not None for r in rows], dtype=bool)
+
+    labels = np.arange(before)
+    emb_idx = np.flatnonzero(has_emb)
+    if emb_idx.size > 1:
+        matrix = np.vstack([np.asarray(rows[i].embedding, dtype=np.float32) for i in emb_idx])
+        local = cluster_near_duplicates(matrix, distance_threshold)
+        labels[emb_idx] = emb_idx[local]
+
+    leaders = labels == np.arange(before)
+    merged_ids = ids[~leaders]
+    cluster_sizes = np.bincount(labels, minlength=before)[leaders]
+
+    now = datetime.now(timezone.utc)
+    ages_days = np.array(
+        [
+            max(0.0, (now - _as_utc(r.created_at)).total_seconds() / 86400.0) if r.created_at else 0.0
+            for r in rows
+        ],
+        dtype=np.float64,
+    )[leaders]
+    leader_ids = ids[leaders]
+
+    evicted_ids = np.array([], dtype=np.int64)
+    if cap > 0 and leader_ids.size > cap:
+        scores = retention_scores(ages_days, cluster_sizes, half_life_days)
+        # Stable sort keeps newest-first order among equal scores
+        order = np.argsort(-scores, kind="stable")
+        evicted_ids = leader_ids[order[cap:]]
+
+    to_delete = np.concatenate([merged_ids, evicted_ids])
+    if to_delete.size and not dry_run:
+        merged_into = dict(zip(merged_ids.tolist(), ids[labels[~leaders]].tolist()))
+        evicted = set(evicted_ids.tolist())
+        audit = [
+            {
+                "run_id": run_id,
+                "memory_id": r.id,
+                "chat_id": chat_id,
+                "content": r.content,
+                "embedding": r.embedding,
+                "sender": r.sender,
+                "memory_created_at": r.created_at,
+                "reason": "evicted" if r.id in evicted else "merged",
+                "merged_into": merged_into.get(r.id),
+            }
+            for r in rows
+            if r.id in evicted or r.id in merged_into
+        ]
+        await db.execute(insert(MemoryConsolidationAudit), audit)
+        await db.execute(delete(Memory).where(Memory.id.in_(to_delete.tolist())))
+        await db.commit()
+
+    return {
+        "chat_id": chat_id,
+        "run_id": run_id,
+        "before": before,
+        "after": before - int(to_delete.size),
+        "merged": int(merged_ids.size),
+        "evicted": int(evicted_ids.size),
+    }
+
+
+def _as_utc(dt: datetime) -> datetime:
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+async def _consolidate_one(chat_id: str, slots: asyncio.Semaphore, **kwargs) -> dict:
+    async with slots:
+        async with SessionLocal() as db:
+            try:
+                return await consolidate_chat_memories(db, chat_id, **kwargs)
+            except Exception as exc:
+                await db.rollback()
+                log.exception("[MEMCON] chat=%s failed: %s", chat_id, exc)
+                return {"chat_id": chat_id, "error": str(exc)}
+
+
+async def run_memory_consolidation_job(
+    *,
+    cap: int = MEMORY_CAP_PER_CHAT,
+    distance_threshold: float = MEMORY_MERGE_DISTANCE,
+    half_life_days: float = MEMORY_RECENCY_HALF_LIFE_DAYS,
+    batch_size: int = MEMORY_CONSOLIDATION_BATCH,
+    concurrency: int = MEMORY_CONSOLIDATION_CONCURRENCY,
+    min_count: int = MEMORY_CONSOLIDATION_MIN_COUNT,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Consolidate every chat with more than `min_count` memories.
+
+    Candidate chats are streamed from a server-side cursor and processed in
+    batches of `batch_size`, `concurrency` chats at a time.
+    """
+    started = time.perf_counter()
+    run_id = uuid4().hex
+    log.info(
+        "[MEMCON] Starting job run=%s: cap=%d distance=%.2f half_life=%.0fd dry_run=%s",
+        run_id, cap, distance_threshold, half_life_days, dry_run,
+    )
+
+    totals = {"chats": 0, "failed": 0, "before": 0, "after": 0, "merged": 0, "evicted": 0}
+    slots = asyncio.Semaphore(concurrency)
+    job_kwargs = {
+        "cap": cap,
+        "distance_threshold": distance_threshold,
+        "half_life_days": half_life_days,
+        "dry_run": dry_run,
+        "run_id": run_id,
+    }
+
+    async def _run_batch(chat_ids: list[str]) -> None:
+        results = await asyncio.gather(
+            *(_consolidate_one(cid, slots, **job_kwargs) for cid in chat_ids)
+        )
+        for res in results:
+            if "error" in res:
+                totals["failed"] += 1
+                continue
+            totals["chats"] += 1
+            for key in ("before", "after", "merged", "evicted"):
+                totals[key] += res[key]
+
+    async with SessionLocal() as cursor_db:
+        stream = await cursor_db.stream(
+            select(Memory.chat_id)
+            .group_by(Memory.chat_id)
+            .having(func.count(Memory.id) > min_count)
+            .execution_options(yield_per=batch_size)
+        )
+        async for partition in stream.partitions(batch_size):
+            await _run_batch([row.chat_id for row in partition])
+
+    totals["duration_secs"] = round(time.perf_counter() - started, 2)
+    totals["dry_run"] = dry_run
+    totals["run_id"] = run_id
+    log.info(
+        "[MEMCON] Job complete run=%s: chats=%d failed=%d memories %d -> %d (merged=%d evicted=%d) in %.1fs",
+        run_id, totals["chats"], totals["failed"], totals["before"], totals["after"],
+        totals["merged"], totals["evicted"], totals["duration_secs"],
+    )
+    return totals
+
+
+async def restore_consolidation_run(db, run_id: str, chat_id: str | None = None) -> dict:
+    """Put back the memories a run removed (optionally one chat's), with their original ids."""
+    query = select(MemoryConsolidationAudit).where(MemoryConsolidationAudit.run_id == run_id)
+    if chat_id:
+        query = query.where(MemoryConsolidationAudit.chat_id == chat_id)
+    audit_rows = (await db.execute(query)).scalars().all()
+
+    existing = set()
+    if audit_rows:
+        existing = set(
+            (
+                await db.execute(
+                    select(Memory.id).where(Memory.id.in_([a.memory_id for a in audit_rows]))
+                )
+            ).scalars().all()
+        )
+    restore = [a for a in audit_rows if a.memory_id not in existing]
+    if restore:
+        await db.execute(
+            insert(Memory),
+            [
+                {
+                    "id": a.memory_id,
+                    "chat_id": a.chat_id,
+                    "content": a.content,
+                    "embedding": a.embedding,
+                    "sender": a.sender,
+                    "created_at": a.memory_created_at,
+                }
+                for a in restore
+            ],
+        )
+        await db.execute(
+            delete(MemoryConsolidationAudit).where(
+                MemoryConsolidationAudit.id.in_([a.id for a in restore])
+            )
+        )
+        await db.commit()
+
+    log.info("[MEMCON] Restored run=%s chat=%s rows=%d", run_id, chat_id or "*", len(restore))
+    return {"run_id": run_id, "restored": len(restore), "already_present": len(existing)}
@@ -0,0 +1,146 @@
+"""
+In-process pricing catalog.
+
+The pricing table is a handful of rows that change only when someone runs
+seed_pricing or edits prices, yet every message used to re-read it (often
+more than once). The active rows are loaded once per process into an
+immutable mapping and served from memory.
+
+Writers call bump_pricing_version() after committing, which INCRs the Redis
+key pricing:version. Readers compare their loaded version with that key at
+most every PRICING_VERSION_CHECK_SECS and reload on a mismatch, so a change
+reaches every worker within a few seconds. If Redis is unreachable the
+catalog is still reloaded after PRICING_CATALOG_MAX_AGE_SECS.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+
+from sqlalchemy import select
+
+from app.db.models import Pricing
+from app.db.session import SessionLocal
+from app.utils.infrastructure.redis_pool import get_redis
+
+log = logging.getLogger("pricing-catalog")
+
+PRICING_VERSION_KEY = "pricing:version"
+PRICING_VERSION_CHECK_SECS = float(os.getenv("PRICING_VERSION_CHECK_SECS", "5"))
+PRICING_CATALOG_MAX_AGE_SECS = float(os.getenv("PRICING_CATALOG_MAX_AGE_SECS", "300"))
+
+
+@dataclass(frozen=True, slots=True)
+class PriceInfo:
+    feature: str
+    unit: str | None
+    price_cents: int
+    free_allowance: int
+
+
+@dataclass(frozen=True, slots=True)
+class PricingCatalog:
+    version: str | None
+    prices: Mapping[str, PriceInfo] = field(default_factory=lambda: MappingProxyType({}))
+    loaded_at: float = 0.0
+
+    def get(self, feature: str) -> PriceInfo | None:
+        return self.prices.get(feature)
+
+    def price_and_free(self, feature: str) -> tuple[int, int]:
+        p = self.prices.get(feature)
+        if not p:
+            return 0, 0
+        return p.price_cents, p.free_allowance
+
+
+_catalog: PricingCatalog | None = None
+_checked_at: float = 0.0
+_lock = asyncio.Lock()
+
+_stats: dict[str, int] = {"loads": 0, "version_checks": 0, "redis_errors": 0}
+
+
+async def _remote_version() -> str | None:
+    r = await get_redis()
+    return await r.get(PRICING_VERSION_KEY)
+
+
+async def _load(version: str | None) -> PricingCatalog:
+    # Own session: callers may be mid-transaction or running concurrently
+    async with SessionLocal() as db:
+        rows = (await db.execute(select(Pricing).where(Pricing.is_active.is_(True)))).scalars().all()
+
+    prices: dict[str, PriceInfo] = {}
+    for p in rows:
+        # First active row wins, as with the previous scalar() lookups
+        prices.setdefault(p.feature, PriceInfo(
+            feature=p.feature,
+            unit=p.unit,
+            price_cents=int(p.price_cents or 0),
+            free_allowance=int(p.free_allowance or 0),
+        ))
+    _stats["loads"] += 1
+    log.info("[PRICING] catalog loaded version=%s features=%s", version, sorted(prices))
+    return PricingCatalog(version=version, prices=MappingProxyType(prices), loaded_at=time.monotonic())
+
+
+async def get_pricing_catalog() -> PricingCatalog:
+    """The current catalog; reloads only when the Redis version moved."""
+    global _catalog, _checked_at
+
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and now - _checked_at < PRICING_VERSION_CHECK_SECS:
+        return catalog
+
+    async with _lock:
+        catalog = _catalog
+        now = time.monotonic()
+        if catalog is not None and now - _checked_at < PRICING_VERSION_CHECK_SECS:
+            return catalog
+
+        try:
+            version = await _remote_version()
+            _stats["version_checks"] += 1
+            stale = catalog is None or catalog.version != version
+        except Exception as exc:
+            _stats["redis_errors"] += 1
+            log.warning("[PRICING] version check failed: %s", exc)
+            version = catalog.version if catalog else None
+            stale = catalog is None or now - catalog.loaded_at > PRICING_CATALOG_MAX_AGE_SECS
+
+        if stale:
+            _catalog = await _load(version)
+        _checked_at = now
+        return _catalog
+
+
+async def get_price(feature: str) -> PriceInfo | None:
+    return (await get_pricing_catalog()).get(feature)
+
+
+async def bump_pricing_version() -> None:
+    """Call after committing a pricing change so every process reloads."""
+    global _catalog
+    _catalog = None
+    try:
+        r = await get_redis()
+        version = await r.incr(PRICING_VERSION_KEY)
+        log.info("[PRICING] version bumped to %s", version)
+    except Exception as exc:
+        log.error("[PRICING] version bump failed, other workers refresh within %ss: %s",
+                  int(PRICING_CATALOG_MAX_AGE_SECS), exc)
+
+
+def get_pricing_catalog_stats() -> dict:
+    catalog = _catalog
+    return {
+        **_stats,
+        "version": catalog.version if catalog else None,
+        "features": len(catalog.prices) if catalog else 0,
+    }
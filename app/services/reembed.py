@@ -0,0 +1,349 @@
+"""
+Resumable re-embedding pipeline for memories and message side tables.
+
+Used after an embedding model change, or to fill rows whose embedding failed
+(store_facts_batch keeps such facts with a NULL vector). Per target:
+
+1. Rows are read in keyset pages (`id > last_id ORDER BY id`), each page
+   through a server-side cursor, so no transaction stays open for the whole
+   run and memory stays flat.
+2. Texts are packed into token-aware batches (REEMBED_MAX_BATCH_TOKENS /
+   REEMBED_MAX_BATCH_ITEMS) and embedded by up to `concurrency` batches at a
+   time, throttled by requests/tokens-per-minute buckets.
+3. Vectors are written back in one statement per batch: UPDATE ... FROM
+   (VALUES ...) for memories, INSERT ... ON CONFLICT DO UPDATE for the
+   message_embeddings / message_18_embeddings side tables.
+4. After every page the last id is saved in reembed_checkpoints; a rerun of
+   the same job resumes from there.
+
+Rows whose batch fails are counted and skipped; rerun with missing_only to
+pick them up. The embedding provider is injectable (`embed_fn`) and
+fake_embeddings is provided for dry runs and tests.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+import numpy as np
+from sqlalchemy import select, or_, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.db.models import Memory, Message, Message18, ReembedCheckpoint
+from app.db.session import SessionLocal
+from app.services.embeddings import get_embeddings_batch, message_embedding_model
+
+log = logging.getLogger("reembed")
+
+REEMBED_PAGE_SIZE = int(os.getenv("REEMBED_PAGE_SIZE", "5000"))
+REEMBED_MAX_BATCH_ITEMS = int(os.getenv("REEMBED_MAX_BATCH_ITEMS", "256"))
+REEMBED_MAX_BATCH_TOKENS = int(os.getenv("REEMBED_MAX_BATCH_TOKENS", "100000"))
+REEMBED_MAX_INPUT_TOKENS = int(os.getenv("REEMBED_MAX_INPUT_TOKENS", "8000"))
+REEMBED_CONCURRENCY = int(os.getenv("REEMBED_CONCURRENCY", "4"))
+REEMBED_REQUESTS_PER_MIN = int(os.getenv("REEMBED_REQUESTS_PER_MIN", "500"))
+REEMBED_TOKENS_PER_MIN = int(os.getenv("REEMBED_TOKENS_PER_MIN", "1000000"))
+
+EMBEDDING_DIM = 1536
+
+EmbedFn = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed or encoding file unavailable offline
+    _ENCODING = None
+
+
+def count_tokens(value: str) -> int:
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(value, disallowed_special=()))
+    # ~4 chars per token for English text
+    return max(1, len(value) // 4)
+
+
+def truncate_tokens(value: str, max_tokens: int = REEMBED_MAX_INPUT_TOKENS) -> str:
+    """Cut text to the model input limit instead of failing the whole batch."""
+    if _ENCODING is not None:
+        tokens = _ENCODING.encode(value, disallowed_special=())
+        return value if len(tokens) <= max_tokens else _ENCODING.decode(tokens[:max_tokens])
+    return value[: max_tokens * 4]
+
+
+async def fake_embeddings(texts: list[str]) -> list[list[float]]:
+    """Deterministic unit vectors derived from the text hash; no network."""
+    out = []
+    for value in texts:
+        seed = int.from_bytes(hashlib.sha256(value.encode()).digest()[:8], "big")
+        vec = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM)
+        out.append((vec / np.linalg.norm(vec)).tolist())
+    return out
+
+
+class RateLimiter:
+    """Token bucket refilled continuously at `per_minute` units per minute."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self._available = float(per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: int = 1) -> None:
+        if self.rate <= 0:
+            return
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._available >= amount:
+                    self._available -= amount
+                    return
+                await asyncio.sleep((amount - self._available) / self.rate)
+
+
+@dataclass(frozen=True, slots=True)
+class ReembedTarget:
+    name: str
+    source: type  # model the text is read from
+
+    def select_page(self, last_id: int, limit: int, missing_only: bool):
+        src = self.source
+        if src is Memory:
+            stmt = select(Memory.id, Memory.chat_id, Memory.content).where(
+                Memory.id > last_id,
+                Memory.content.is_not(None),
+            )
+            if missing_only:
+                stmt = stmt.where(Memory.embedding.is_(None))
+        else:
+            emb = message_embedding_model(src)
+            # Same population the embedding writer covers
+            stmt = select(src.id, src.chat_id, src.content).where(
+                src.id > last_id,
+                src.content.is_not(None),
+                or_(src.sender == "user", src.channel == "call"),
+            )
+            if missing_only:
+                stmt = stmt.outerjoin(emb, emb.message_id == src.id).where(emb.message_id.is_(None))
+        return stmt.order_by(src.id).limit(limit)
+
+
+TARGETS: dict[str, ReembedTarget] = {
+    "memories": ReembedTarget("memories", Memory),
+    "messages": ReembedTarget("messages", Message),
+    "messages_18": ReembedTarget("messages_18", Message18),
+}
+
+
+def _vector_literal(embedding: list[float]) -> str:
+    return "[" + ",".join(str(x) for x in embedding) + "]"
+
+
+async def write_embeddings(db, target: ReembedTarget, rows: list[tuple[int, str, list[float]]]) -> None:
+    """Write a batch of (id, chat_id, embedding) in a single statement."""
+    if not rows:
+        return
+
+    params: dict = {}
+    values = []
+    for i, (row_id, chat_id, emb) in enumerate(rows):
+        params[f"id_{i}"] = row_id
+        params[f"emb_{i}"] = _vector_literal(emb)
+        if target.source is Memory:
+            values.append(f"(CAST(:id_{i} AS integer), CAST(:emb_{i} AS vector))")
+        else:
+            params[f"chat_{i}"] = chat_id
+            values.append(f"(CAST(:id_{i} AS integer), CAST(:chat_{i} AS varchar), CAST(:emb_{i} AS vector))")
+
+    if target.source is Memory:
+        sql = f"""
+            UPDATE memories AS m
+            SET embedding = v.embedding
+            FROM (VALUES {", ".join(values)}) AS v(id, embedding)
+            WHERE m.id = v.id
+        """
+    else:
+        table = message_embedding_model(target.source).__tablename__
+        sql = f"""
+            INSERT INTO {table} (message_id, chat_id, embedding, created_at)
+            SELECT v.message_id, v.chat_id, v.embedding, NOW()
+            FROM (VALUES {", ".join(values)}) AS v(message_id, chat_id, embedding)
+            ON CONFLICT (message_id) DO UPDATE SET embedding = EXCLUDED.embedding
+        """
+    await db.execute(text(sql), params)
+
+
+def pack_batches(
+    rows: list[tuple[int, str, str]],
+    max_items: int = REEMBED_MAX_BATCH_ITEMS,
+    max_tokens: int = REEMBED_MAX_BATCH_TOKENS,
+) -> list[tuple[list[tuple[int, str, str]], int]]:
+    """Group (id, chat_id, text) rows into batches under both limits; returns (batch, tokens)."""
+    batches = []
+    current: list[tuple[int, str, str]] = []
+    current_tokens = 0
+    for row_id, chat_id, content in rows:
+        content = truncate_tokens(content)
+        tokens = count_tokens(content)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append((current, current_tokens))
+            current, current_tokens = [], 0
+        current.append((row_id, chat_id, content))
+        current_tokens += tokens
+    if current:
+        batches.append((current, current_tokens))
+    return batches
+
+
+async def _load_checkpoint(job: str, target: str, restart: bool) -> ReembedCheckpoint:
+    async with SessionLocal() as db:
+        cp = await db.get(ReembedCheckpoint, job)
+        if cp is None:
+            cp = ReembedCheckpoint(job=job, target=target, last_id=0, processed=0, failed=0)
+            db.add(cp)
+        elif restart:
+            cp.last_id, cp.processed, cp.failed, cp.completed_at = 0, 0, 0, None
+        cp.updated_at = datetime.now(timezone.utc)
+        await db.commit()
+        return cp
+
+
+async def _save_checkpoint(db, cp: ReembedCheckpoint, completed: bool = False) -> None:
+    now = datetime.now(timezone.utc)
+    values = {
+        "job": cp.job,
+        "target": cp.target,
+        "last_id": cp.last_id,
+        "processed": cp.processed,
+        "failed": cp.failed,
+        "completed_at": now if completed else None,
+        "updated_at": now,
+    }
+    await db.execute(
+        pg_insert(ReembedCheckpoint)
+        .values(**values)
+        .on_conflict_do_update(index_elements=["job"], set_={k: v for k, v in values.items() if k != "job"})
+    )
+    await db.commit()
+
+
+async def run_reembed(
+    target_name: str,
+    *,
+    job: str | None = None,
+    missing_only: bool = False,
+    restart: bool = False,
+    embed_fn: EmbedFn = get_embeddings_batch,
+    page_size: int = REEMBED_PAGE_SIZE,
+    max_items: int = REEMBED_MAX_BATCH_ITEMS,
+    max_tokens: int = REEMBED_MAX_BATCH_TOKENS,
+    concurrency: int = REEMBED_CONCURRENCY,
+    requests_per_min: int = REEMBED_REQUESTS_PER_MIN,
+    tokens_per_min: int = REEMBED_TOKENS_PER_MIN,
+    limit: int | None = None,
+) -> dict:
+    """
+    Re-embed one target ("memories", "messages" or "messages_18").
+
+    `job` names the checkpoint row (defaults to "<target>:all" or
+    "<target>:missing"); rerunning the same job resumes after its last page.
+    `limit` stops after roughly that many rows, for trial runs.
+    """
+    target = TARGETS[target_name]
+    job = job or f"{target_name}:{'missing' if missing_only else 'all'}"
+    cp = await _load_checkpoint(job, target_name, restart)
+    if cp.completed_at is not None:
+        log.info("[REEMBED] job=%s already completed at %s (use restart)", job, cp.completed_at)
+        return {"job": job, "target": target_name, "last_id": cp.last_id,
+                "processed": cp.processed, "failed": cp.failed, "completed": True}
+
+    slots = asyncio.Semaphore(concurrency)
+    request_bucket = RateLimiter(requests_per_min)
+    token_bucket = RateLimiter(tokens_per_min)
+    started = time.perf_counter()
+    seen = 0
+
+    async def _embed_and_write(batch: list[tuple[int, str, str]], tokens: int) -> tuple[int, int]:
+        async with slots:
+            await request_bucket.acquire(1)
+            await token_bucket.acquire(tokens)
+            try:
+                embeddings = await embed_fn([content for _, _, content in batch])
+            except Exception as exc:
+                log.error("[REEMBED] embed failed size=%d err=%s", len(batch), exc)
+                return 0, len(batch)
+
+            rows = [
+                (row_id, chat_id, emb)
+                for (row_id, chat_id, _), emb in zip(batch, embeddings)
+                if emb and len(emb) == EMBEDDING_DIM
+            ]
+            async with SessionLocal() as db:
+                try:
+                    await write_embeddings(db, target, rows)
+                    await db.commit()
+                except Exception as exc:
+                    await db.rollback()
+                    log.error("[REEMBED] write failed size=%d err=%s", len(rows), exc)
+                    return 0, len(batch)
+            return len(rows), len(batch) - len(rows)
+
+    log.info("[REEMBED] job=%s target=%s resume_after=%d missing_only=%s", job, target_name, cp.last_id, missing_only)
+
+    while True:
+        page: list[tuple[int, str, str]] = []
+        async with SessionLocal() as read_db:
+            stream = await read_db.stream(
+                target.select_page(cp.last_id, page_size, missing_only).execution_options(yield_per=1000)
+            )
+            async for row in stream:
+                page.append((row[0], row[1], row[2]))
+
+        if not page:
+            break
+
+        # Blank rows advance the cursor but are never sent to the provider
+        embeddable = [r for r in page if r[2] and r[2].strip()]
+        results = await asyncio.gather(
+            *(_embed_and_write(batch, tokens) for batch, tokens in pack_batches(embeddable, max_items, max_tokens))
+        )
+
+        cp.processed += sum(ok for ok, _ in results)
+        cp.failed += sum(bad for _, bad in results)
+        cp.last_id = page[-1][0]
+        seen += len(page)
+        async with SessionLocal() as db:
+            await _save_checkpoint(db, cp)
+
+        elapsed = time.perf_counter() - started
+        log.info(
+            "[REEMBED] job=%s last_id=%d processed=%d failed=%d (%.0f rows/s)",
+            job, cp.last_id, cp.processed, cp.failed, seen / elapsed if elapsed else 0.0,
+        )
+
+        if len(page) < page_size or (limit is not None and seen >= limit):
+            break
+
+    completed = limit is None or seen < limit
+    if completed:
+        async with SessionLocal() as db:
+            await _save_checkpoint(db, cp, completed=True)
+
+    return {
+        "job": job,
+        "target": target_name,
+        "last_id": cp.last_id,
+        "processed": cp.processed,
+        "failed": cp.failed,
+        "completed": completed,
+        "duration_secs": round(time.perf_counter() - started, 2),
+    }
@@ -0,0 +1,140 @@
+"""
+"User returned" events and the worker that acts on them.
+
+When a turn arrives after REENGAGEMENT_INACTIVE_DAYS or more of silence,
+process_relationship_turn emits a UserReturned event with put_nowait() and
+moves on. A background worker consumes the events, each in its own
+session, and runs check_and_trigger_reengagement (eligibility read + push).
+The turn never waits on wallet/log/subscription queries or push delivery,
+and no task outlives the request's session any more.
+
+The queue is bounded and in-process: when it is full, or on a restart, the
+event is dropped and counted. The scheduled re-engagement job still covers
+idle users.
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+from app.db.session import SessionLocal
+from app.relationship.inactivity import REENGAGEMENT_INACTIVE_DAYS, check_and_trigger_reengagement
+
+log = logging.getLogger("re_engagement")
+
+REENGAGE_QUEUE_MAXSIZE = int(os.getenv("REENGAGE_QUEUE_MAXSIZE", "1000"))
+REENGAGE_WORKER_CONCURRENCY = int(os.getenv("REENGAGE_WORKER_CONCURRENCY", "2"))
+
+
+@dataclass(slots=True)
+class UserReturned:
+    user_id: int
+    influencer_id: str
+    days_idle: float
+    # Interaction before this return; the row itself may already be updated
+    last_interaction_at: datetime | None
+
+
+_queue: asyncio.Queue[UserReturned] = asyncio.Queue(maxsize=REENGAGE_QUEUE_MAXSIZE)
+_worker_task: asyncio.Task | None = None
+_inflight: set[asyncio.Task] = set()
+
+_stats: dict[str, float] = {
+    "emitted": 0,
+    "dropped": 0,
+    "processed": 0,
+    "triggered": 0,
+    "failed": 0,
+}
+
+
+def emit_user_returned(
+    user_id: int,
+    influencer_id: str,
+    days_idle: float,
+    last_interaction_at: datetime | None,
+) -> bool:
+    """Queue a return event without waiting; False if ignored or dropped."""
+    if days_idle < REENGAGEMENT_INACTIVE_DAYS:
+        return False
+    event = UserReturned(int(user_id), influencer_id, float(days_idle), last_interaction_at)
+    try:
+        _queue.put_nowait(event)
+    except asyncio.QueueFull:
+        _stats["dropped"] += 1
+        log.warning("[RE-ENGAGE] event queue full, dropping user=%s influencer=%s", user_id, influencer_id)
+        return False
+    _stats["emitted"] += 1
+    return True
+
+
+async def _handle(event: UserReturned) -> None:
+    async with SessionLocal() as db:
+        try:
+            triggered = await check_and_trigger_reengagement(
+                db=db,
+                user_id=event.user_id,
+                influencer_id=event.influencer_id,
+                days_idle=event.days_idle,
+                last_interaction_at=event.last_interaction_at,
+            )
+            _stats["processed"] += 1
+            _stats["triggered"] += int(triggered)
+        except Exception as exc:
+            await db.rollback()
+            _stats["failed"] += 1
+            log.exception(
+                "[RE-ENGAGE] event failed user=%s influencer=%s: %s",
+                event.user_id, event.influencer_id, exc,
+            )
+
+
+async def _worker_loop() -> None:
+    slots = asyncio.Semaphore(REENGAGE_WORKER_CONCURRENCY)
+    while True:
+        event = await _queue.get()
+        await slots.acquire()
+
+        task = asyncio.create_task(_handle(event))
+        _inflight.add(task)
+
+        def _done(t: asyncio.Task) -> None:
+            _inflight.discard(t)
+            slots.release()
+            _queue.task_done()
+
+        task.add_done_callback(_done)
+
+
+def get_reengagement_event_stats() -> dict:
+    return {
+        **_stats,
+        "queue_depth": _queue.qsize(),
+        "inflight": len(_inflight),
+        "running": _worker_task is not None and not _worker_task.done(),
+    }
+
+
+def start_reengagement_worker() -> None:
+    global _worker_task
+    if _worker_task is not None:
+        log.warning("[RE-ENGAGE] event worker already running")
+        return
+    _worker_task = asyncio.create_task(_worker_loop())
+    log.info("[RE-ENGAGE] event worker started concurrency=%d", REENGAGE_WORKER_CONCURRENCY)
+
+
+async def stop_reengagement_worker(drain_timeout: float = 5.0) -> None:
+    """Give queued events a bounded chance to finish, then cancel the worker."""
+    global _worker_task
+    if _worker_task is None:
+        return
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=drain_timeout)
+    except asyncio.TimeoutError:
+        log.warning("[RE-ENGAGE] stop: dropping %d queued events", _queue.qsize())
+    _worker_task.cancel()
+    _worker_task = None
+    log.info("[RE-ENGAGE] event worker stopped")
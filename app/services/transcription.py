@@ -0,0 +1,177 @@
+"""
+Speech-to-text for voice notes.
+
+transcribe() sends the in-memory audio to the configured backend, at most
+TRANSCRIBE_CONCURRENCY at a time per process. A caller that can't get a slot
+within TRANSCRIBE_QUEUE_TIMEOUT_SECS gets a 503 rather than queueing
+forever. Timeouts, connection errors, rate limits and 5xx responses are
+retried with exponential backoff and jitter, up to TRANSCRIBE_MAX_ATTEMPTS.
+
+Backends:
+- "openai" (default): AsyncOpenAI audio transcriptions, file sent as a
+  (filename, bytes) tuple.
+- "stub": StubTranscriber, a local stand-in that returns a fixed text after
+  an optional delay. For load tests and local runs without an API key.
+
+set_transcriber() swaps the backend at runtime.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Protocol
+
+import openai
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+
+log = logging.getLogger("transcription")
+
+TRANSCRIBE_BACKEND = os.getenv("TRANSCRIBE_BACKEND", "openai").lower()
+TRANSCRIBE_MODEL = os.getenv("TRANSCRIBE_MODEL", "whisper-1")
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "8"))
+TRANSCRIBE_QUEUE_TIMEOUT_SECS = float(os.getenv("TRANSCRIBE_QUEUE_TIMEOUT_SECS", "30"))
+TRANSCRIBE_TIMEOUT_SECS = float(os.getenv("TRANSCRIBE_TIMEOUT_SECS", "60"))
+TRANSCRIBE_MAX_ATTEMPTS = int(os.getenv("TRANSCRIBE_MAX_ATTEMPTS", "3"))
+TRANSCRIBE_RETRY_BASE_SECS = float(os.getenv("TRANSCRIBE_RETRY_BASE_SECS", "0.5"))
+
+_RETRYABLE = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class Transcriber(Protocol):
+    async def transcribe(self, audio: bytes, filename: str) -> str: ...
+
+
+class OpenAITranscriber:
+    def __init__(self, model: str = TRANSCRIBE_MODEL, timeout: float = TRANSCRIBE_TIMEOUT_SECS):
+        self.model = model
+        # Retries are ours, so they share the concurrency slot and stats
+        self.client = AsyncOpenAI(timeout=timeout, max_retries=0)
+
+    async def transcribe(self, audio: bytes, filename: str) -> str:
+        result = await self.client.audio.transcriptions.create(
+            file=(filename, audio),
+            model=self.model,
+        )
+        return result.text
+
+
+class StubTranscriber:
+    def __init__(self, text: str | None = None, delay_secs: float = 0.0):
+        self.text = text
+        self.delay_secs = delay_secs
+
+    async def transcribe(self, audio: bytes, filename: str) -> str:
+        if self.delay_secs:
+            await asyncio.sleep(self.delay_secs)
+        return self.text if self.text is not None else f"stub transcript of {filename} ({len(audio)} bytes)"
+
+
+_transcriber: Transcriber | None = None
+_slots: asyncio.Semaphore | None = None
+
+_stats: dict = {
+    "requests": 0,
+    "succeeded": 0,
+    "failed": 0,
+    "retries": 0,
+    "queue_timeouts": 0,
+    "inflight": 0,
+    "waiting": 0,
+    "total_ms": 0.0,
+}
+
+
+def _make_transcriber() -> Transcriber:
+    if TRANSCRIBE_BACKEND == "stub":
+        return StubTranscriber(
+            text=os.getenv("TRANSCRIBE_STUB_TEXT"),
+            delay_secs=float(os.getenv("TRANSCRIBE_STUB_DELAY_SECS", "0")),
+        )
+    return OpenAITranscriber()
+
+
+def get_transcriber() -> Transcriber:
+    global _transcriber
+    if _transcriber is None:
+        _transcriber = _make_transcriber()
+    return _transcriber
+
+
+def set_transcriber(transcriber: Transcriber | None) -> None:
+    """Swap the backend; None goes back to the TRANSCRIBE_BACKEND default."""
+    global _transcriber
+    _transcriber = transcriber
+
+
+def _semaphore() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(TRANSCRIBE_CONCURRENCY)
+    return _slots
+
+
+def _backoff(attempt: int) -> float:
+    return TRANSCRIBE_RETRY_BASE_SECS * (2 ** attempt) * (0.5 + random.random())
+
+
+async def _acquire_slot() -> asyncio.Semaphore:
+    slots = _semaphore()
+    _stats["waiting"] += 1
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=TRANSCRIBE_QUEUE_TIMEOUT_SECS)
+    except asyncio.TimeoutError:
+        _stats["queue_timeouts"] += 1
+        raise HTTPException(status_code=503, detail="Transcription busy, please retry")
+    finally:
+        _stats["waiting"] -= 1
+    return slots
+
+
+async def transcribe(audio: bytes, filename: str) -> str:
+    """Text of `audio`; raises HTTPException 503/422 when it can't be had."""
+    _stats["requests"] += 1
+    transcriber = get_transcriber()
+    slots = await _acquire_slot()
+    _stats["inflight"] += 1
+    started = time.perf_counter()
+    try:
+        for attempt in range(TRANSCRIBE_MAX_ATTEMPTS):
+            try:
+                text = await transcriber.transcribe(audio, filename)
+                _stats["succeeded"] += 1
+                return text
+            except _RETRYABLE as e:
+                if attempt + 1 >= TRANSCRIBE_MAX_ATTEMPTS:
+                    _stats["failed"] += 1
+                    log.error("[TRANSCRIBE] giving up after %d attempts: %r", attempt + 1, e)
+                    raise HTTPException(status_code=503, detail="Transcription unavailable, please retry")
+                _stats["retries"] += 1
+                delay = _backoff(attempt)
+                log.warning("[TRANSCRIBE] attempt %d failed (%r), retrying in %.2fs", attempt + 1, e, delay)
+                await asyncio.sleep(delay)
+            except openai.APIStatusError as e:
+                _stats["failed"] += 1
+                log.error("[TRANSCRIBE] rejected: %r", e)
+                raise HTTPException(status_code=422, detail="Transcription error")
+    finally:
+        _stats["inflight"] -= 1
+        _stats["total_ms"] += (time.perf_counter() - started) * 1000
+        slots.release()
+
+
+def get_transcription_stats() -> dict:
+    done = _stats["succeeded"] + _stats["failed"]
+    return {
+        **{k: v for k, v in _stats.items() if k != "total_ms"},
+        "avg_ms": round(_stats["total_ms"] / done, 1) if done else None,
+        "backend": type(get_transcriber()).__name__,
+        "concurrency": TRANSCRIBE_CONCURRENCY,
+    }
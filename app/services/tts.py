@@ -0,0 +1,166 @@
+"""
+Streaming text-to-speech.
+
+TTSStream calls the ElevenLabs streaming endpoint through the shared pooled
+client and tees every chunk to two places as it arrives: the listener (a
+chunked HTTP response) and an S3StreamUpload. The listener can start
+playing after the first chunk instead of waiting for the whole MP3 and its
+S3 upload.
+
+The producer runs as its own task, so the S3 copy is still completed if the
+listener disconnects half way.
+
+Short lines go through the TTS cache: a hit is sent as a single chunk with
+no ElevenLabs call, and a miss is stored once the stream completes.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator
+
+from app.services.tts_cache import get_cached_tts, is_cacheable, store_tts_in_background
+from app.utils.infrastructure.elevenlabs_client import get_elevenlabs_client
+from app.utils.messaging.chat import TTS_TIMEOUT, tts_headers
+from app.utils.storage.s3 import S3StreamUpload
+
+log = logging.getLogger("tts")
+
+TTS_STREAM_LATENCY_OPTIMIZATION = os.getenv("TTS_STREAM_LATENCY_OPTIMIZATION", "")
+
+_DONE = object()
+
+_stats: dict = {
+    "streams": 0,
+    "failed": 0,
+    "cache_hits": 0,
+    "listener_detached": 0,
+    "bytes": 0,
+    "first_chunk_ms_total": 0.0,
+    "total_ms_total": 0.0,
+}
+
+
+class TTSError(Exception):
+    pass
+
+
+class TTSStream:
+    def __init__(self, voice_id: str, payload: dict, s3_key: str, content_type: str = "audio/mpeg"):
+        self.voice_id = voice_id
+        self.payload = payload
+        self.s3_key = s3_key
+        self.content_type = content_type
+        self.first_chunk_ms: float | None = None
+        self.total_ms: float | None = None
+        self.size = 0
+        self.cache_hit = False
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._listening = True
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> "TTSStream":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def _emit(self, item) -> None:
+        if self._listening:
+            self._queue.put_nowait(item)
+
+    async def _take(self, chunk: bytes, upload: S3StreamUpload, started: float) -> None:
+        if self.first_chunk_ms is None:
+            self.first_chunk_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.size += len(chunk)
+        self._emit(chunk)
+        await upload.write(chunk)
+
+    async def _run(self) -> str:
+        upload = S3StreamUpload(self.s3_key, self.content_type)
+        started = time.perf_counter()
+        params = {}
+        if TTS_STREAM_LATENCY_OPTIMIZATION:
+            params["optimize_streaming_latency"] = TTS_STREAM_LATENCY_OPTIMIZATION
+        keep: list[bytes] | None = None
+        try:
+            cached = await get_cached_tts(self.voice_id, self.payload)
+            if cached is not None:
+                self.cache_hit = True
+                await self._take(cached, upload, started)
+            else:
+                keep = [] if is_cacheable(self.payload) else None
+                client = await get_elevenlabs_client()
+                async with client.stream(
+                    "POST",
+                    f"/text-to-speech/{self.voice_id}/stream",
+                    headers=tts_headers(),
+                    params=params,
+                    json=self.payload,
+                    timeout=TTS_TIMEOUT,
+                ) as resp:
+                    if resp.status_code != 200:
+                        body = await resp.aread()
+                        raise TTSError(f"ElevenLabs stream error {resp.status_code}: {body[:200]!r}")
+                    async for chunk in resp.aiter_bytes():
+                        if not chunk:
+                            continue
+                        await self._take(chunk, upload, started)
+                        if keep is not None:
+                            keep.append(chunk)
+            if not self.size:
+                raise TTSError("ElevenLabs stream returned no audio")
+            await upload.close()
+        except BaseException as e:
+            _stats["failed"] += 1
+            await upload.abort()
+            self._emit(e)
+            raise
+        if keep:
+            store_tts_in_background(self.voice_id, self.payload, b"".join(keep))
+        self.total_ms = round((time.perf_counter() - started) * 1000, 1)
+        _stats["streams"] += 1
+        _stats["cache_hits"] += int(self.cache_hit)
+        _stats["bytes"] += self.size
+        _stats["first_chunk_ms_total"] += self.first_chunk_ms or 0.0
+        _stats["total_ms_total"] += self.total_ms
+        self._emit(_DONE)
+        return self.s3_key
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Audio chunks as they arrive; raises if synthesis fails."""
+        try:
+            while True:
+                item = await self._queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            if self._task is not None and not self._task.done():
+                # Listener went away; keep producing for the S3 copy only
+                _stats["listener_detached"] += 1
+                self._listening = False
+
+    def cancel(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def wait(self) -> str:
+        """S3 key once the whole stream is stored; raises if it failed."""
+        if self._task is None:
+            raise RuntimeError("TTSStream not started")
+        return await self._task
+
+
+def get_tts_stats() -> dict:
+    streams = _stats["streams"]
+    return {
+        "streams": streams,
+        "failed": _stats["failed"],
+        "cache_hits": _stats["cache_hits"],
+        "listener_detached": _stats["listener_detached"],
+        "bytes": _stats["bytes"],
+        "avg_first_chunk_ms": round(_stats["first_chunk_ms_total"] / streams, 1) if streams else None,
+        "avg_total_ms": round(_stats["total_ms_total"] / streams, 1) if streams else None,
+    }
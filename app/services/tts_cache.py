@@ -0,0 +1,258 @@
+"""
+Content-addressed cache for synthesized speech.
+
+A clip is identified by the SHA-256 of (voice_id, model_id, voice_settings,
+output_format, text), with the text taken after V3 formatting, so the same
+line in the same voice always maps to the same S3 object,
+tts-cache/<2 hex>/<digest>.mp3. Redis holds the index
+(tts:cache:<digest> -> S3 key), so a miss costs one GET instead of an S3
+HEAD. Clips up to TTS_CACHE_LRU_MAX_BYTES are also kept in a small
+per-process LRU. A hit makes no ElevenLabs call.
+
+Only lines the caller marks static are looked up and stored (see
+synthesize_payload's cache flag): in practice the canned replies in
+CANNED_REPLIES, and only up to TTS_CACHE_MAX_CHARS. Generated replies almost
+never repeat, so caching them would only fill S3.
+
+Cache failures are logged and counted, never raised: a broken cache only
+means synthesizing again.
+
+run_tts_prerender() voices the canned replies in every influencer voice
+ahead of time, skipping lines already cached. It is off by default
+(TTS_PRERENDER_ENABLED in the scheduler).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import Influencer
+from app.db.session import SessionLocal
+from app.utils.infrastructure.concurrency import advisory_lock
+from app.utils.infrastructure.redis_pool import get_redis
+from app.utils.storage.s3 import s3
+
+log = logging.getLogger("tts-cache")
+
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_MAX_CHARS = int(os.getenv("TTS_CACHE_MAX_CHARS", "160"))
+TTS_CACHE_TTL_DAYS = int(os.getenv("TTS_CACHE_TTL_DAYS", "30"))
+TTS_CACHE_LRU_ITEMS = int(os.getenv("TTS_CACHE_LRU_ITEMS", "256"))
+TTS_CACHE_LRU_MAX_BYTES = int(os.getenv("TTS_CACHE_LRU_MAX_BYTES", str(64 * 1024)))
+TTS_PRERENDER_TIME_BUDGET_SECS = float(os.getenv("TTS_PRERENDER_TIME_BUDGET_SECS", "600"))
+
+_INDEX_PREFIX = "tts:cache:"
+_S3_PREFIX = "tts-cache"
+
+# Returned verbatim by the turn handlers when a turn fails
+CANNED_REPLIES = (
+    "Sorry, something went wrong. 😔",
+    "Sorry, something went wrong.",
+)
+
+_lru: OrderedDict[str, bytes] = OrderedDict()
+_pending: set[asyncio.Task] = set()
+
+_stats: dict = {
+    "lru_hits": 0,
+    "hits": 0,
+    "misses": 0,
+    "stored": 0,
+    "errors": 0,
+    "prerender_runs": 0,
+    "prerendered": 0,
+}
+
+
+def tts_cache_digest(voice_id: str, payload: dict) -> str:
+    ident = {
+        "voice_id": voice_id,
+        "model_id": payload.get("model_id"),
+        "voice_settings": payload.get("voice_settings"),
+        "output_format": payload.get("output_format"),
+        "text": payload.get("text"),
+    }
+    blob = json.dumps(ident, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def tts_cache_s3_key(digest: str) -> str:
+    return f"{_S3_PREFIX}/{digest[:2]}/{digest}.mp3"
+
+
+def is_static_line(text: str | None) -> bool:
+    """Whether a reply is one of the fixed lines worth caching."""
+    return (text or "").strip() in CANNED_REPLIES
+
+
+def is_cacheable(payload: dict) -> bool:
+    text = payload.get("text") or ""
+    return TTS_CACHE_ENABLED and 0 < len(text) <= TTS_CACHE_MAX_CHARS
+
+
+def _remember(digest: str, audio: bytes) -> None:
+    if len(audio) > TTS_CACHE_LRU_MAX_BYTES or TTS_CACHE_LRU_ITEMS <= 0:
+        return
+    _lru[digest] = audio
+    _lru.move_to_end(digest)
+    while len(_lru) > TTS_CACHE_LRU_ITEMS:
+        _lru.popitem(last=False)
+
+
+def _read_object(key: str) -> bytes:
+    return s3.get_object(Bucket=settings.BUCKET_NAME, Key=key)["Body"].read()
+
+
+async def get_cached_tts(voice_id: str, payload: dict) -> bytes | None:
+    """Cached audio for this voice and payload, or None on a miss."""
+    if not is_cacheable(payload):
+        return None
+    digest = tts_cache_digest(voice_id, payload)
+
+    audio = _lru.get(digest)
+    if audio is not None:
+        _lru.move_to_end(digest)
+        _stats["lru_hits"] += 1
+        return audio
+
+    try:
+        r = await get_redis()
+        key = await r.get(_INDEX_PREFIX + digest)
+        if not key:
+            _stats["misses"] += 1
+            return None
+        audio = await asyncio.to_thread(_read_object, key)
+    except s3.exceptions.NoSuchKey:
+        # Object was removed behind the index; forget it and re-synthesize
+        _stats["misses"] += 1
+        try:
+            await r.delete(_INDEX_PREFIX + digest)
+        except Exception:
+            pass
+        return None
+    except Exception as e:
+        _stats["errors"] += 1
+        log.warning("[TTS-CACHE] lookup failed for %s: %s", digest, e)
+        return None
+
+    _stats["hits"] += 1
+    _remember(digest, audio)
+    return audio
+
+
+async def has_cached_tts(voice_id: str, payload: dict) -> bool:
+    """Whether the clip is cached, without fetching it."""
+    if not is_cacheable(payload):
+        return False
+    digest = tts_cache_digest(voice_id, payload)
+    if digest in _lru:
+        return True
+    try:
+        r = await get_redis()
+        return bool(await r.exists(_INDEX_PREFIX + digest))
+    except Exception as e:
+        _stats["errors"] += 1
+        log.warning("[TTS-CACHE] lookup failed for %s: %s", digest, e)
+        return False
+
+
+async def put_cached_tts(voice_id: str, payload: dict, audio: bytes) -> str | None:
+    """Store audio under its content address; returns the S3 key, or None if not stored."""
+    if not audio or not is_cacheable(payload):
+        return None
+    digest = tts_cache_digest(voice_id, payload)
+    key = tts_cache_s3_key(digest)
+    try:
+        await asyncio.to_thread(
+            s3.put_object,
+            Bucket=settings.BUCKET_NAME,
+            Key=key,
+            Body=audio,
+            ContentType="audio/mpeg",
+        )
+        r = await get_redis()
+        await r.set(_INDEX_PREFIX + digest, key, ex=TTS_CACHE_TTL_DAYS * 86400)
+    except Exception as e:
+        _stats["errors"] += 1
+        log.warning("[TTS-CACHE] store failed for %s: %s", digest, e)
+        return None
+    _stats["stored"] += 1
+    _remember(digest, audio)
+    return key
+
+
+def store_tts_in_background(voice_id: str, payload: dict, audio: bytes) -> None:
+    """put_cached_tts without holding up the reply."""
+    if not audio or not is_cacheable(payload):
+        return
+    task = asyncio.create_task(put_cached_tts(voice_id, payload, audio))
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+async def run_tts_prerender(time_budget_secs: float = TTS_PRERENDER_TIME_BUDGET_SECS) -> dict:
+    """Voice every canned reply in every influencer voice that isn't cached yet."""
+    from app.utils.messaging.chat import _ensure_v3_compatibility, synthesize_payload, v3_tts_payload
+
+    if not TTS_CACHE_ENABLED:
+        return {"skipped": True}
+
+    started = time.perf_counter()
+    totals = {"voices": 0, "cached": 0, "rendered": 0, "failed": 0}
+
+    async with advisory_lock(
+        "tts-prerender",
+        timeout=int(time_budget_secs) + 60,
+        retry_count=1,
+        raise_on_fail=False,
+    ) as acquired:
+        if not acquired:
+            log.info("[TTS-CACHE] another prerender holds the lock, skipping")
+            return {"skipped": True}
+
+        async with SessionLocal() as db:
+            influencers = (
+                await db.execute(select(Influencer).where(Influencer.voice_id.is_not(None)))
+            ).scalars().all()
+
+        lines = [
+            (voice_id, line)
+            for voice_id in dict.fromkeys(influencer.voice_id for influencer in influencers)
+            for line in CANNED_REPLIES
+        ]
+        totals["voices"] = len({voice_id for voice_id, _ in lines})
+        for voice_id, line in lines:
+            if time.perf_counter() - started > time_budget_secs:
+                log.info("[TTS-CACHE] prerender out of time budget, continuing next run")
+                break
+            payload = v3_tts_payload(_ensure_v3_compatibility(line))
+            if await has_cached_tts(voice_id, payload):
+                totals["cached"] += 1
+                continue
+            audio = await synthesize_payload(voice_id, payload, store_in_background=False, cache=True)
+            if audio:
+                totals["rendered"] += 1
+            else:
+                totals["failed"] += 1
+
+    _stats["prerender_runs"] += 1
+    _stats["prerendered"] += totals["rendered"]
+    log.info("[TTS-CACHE] prerender done: %s", totals)
+    return totals
+
+
+def get_tts_cache_stats() -> dict:
+    lookups = _stats["lru_hits"] + _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "enabled": TTS_CACHE_ENABLED,
+        "lru_items": len(_lru),
+        "hit_rate": round((_stats["lru_hits"] + _stats["hits"]) / lookups, 3) if lookups else None,
+    }
@@ -0,0 +1,157 @@
+"""
+Sentence-pipelined text-to-speech for audio replies.
+
+SentenceTTS is fed the LLM reply as it streams. TTSTextStream sanitizes the
+deltas and hands out finished sentences, which are merged up to
+TTS_PIPELINE_MIN_CHARS (tiny segments sound choppy). Each segment is voiced
+as soon as it's complete, at most TTS_PIPELINE_CONCURRENCY at a time, while
+the LLM keeps generating. segments() yields the audio in reply order as
+each piece becomes ready, and audio() joins it for the S3 copy; MP3 frames
+concatenate cleanly. The first audio is ready roughly one sentence after
+the LLM starts, not after the whole reply plus a full TTS request.
+
+finish() takes the final reply text. If the streamed text doesn't match it
+(the LLM failed and the turn fell back to a canned reply), the segments
+are re-voiced from the final text, unless the listener already got audio.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import AsyncIterator
+
+from app.services.tts import TTSError
+from app.utils.messaging.chat import _ensure_v3_compatibility, synthesize_payload, v3_tts_payload
+from app.utils.messaging.tts_sanitizer import TTSTextStream
+
+log = logging.getLogger("tts-pipeline")
+
+TTS_PIPELINE_ENABLED = os.getenv("TTS_PIPELINE_ENABLED", "true").lower() == "true"
+TTS_PIPELINE_CONCURRENCY = int(os.getenv("TTS_PIPELINE_CONCURRENCY", "3"))
+TTS_PIPELINE_MIN_CHARS = int(os.getenv("TTS_PIPELINE_MIN_CHARS", "40"))
+
+_stats: dict = {
+    "replies": 0,
+    "failed": 0,
+    "segments": 0,
+    "revoiced": 0,
+    "first_audio_ms_total": 0.0,
+}
+
+
+class SentenceTTS:
+    def __init__(
+        self,
+        voice_id: str,
+        concurrency: int = TTS_PIPELINE_CONCURRENCY,
+        min_chars: int = TTS_PIPELINE_MIN_CHARS,
+    ):
+        self.voice_id = voice_id
+        self.min_chars = min_chars
+        self.first_audio_ms: float | None = None
+        self._started = time.perf_counter()
+        self._text = TTSTextStream()
+        self._buffer = ""
+        self._spoken: list[str] = []
+        self._parts: list[asyncio.Task] = []
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._changed = asyncio.Event()
+        self._closed = False
+        self._error: BaseException | None = None
+        self._yielded = 0
+
+    def feed(self, delta: str) -> None:
+        """Add an LLM delta; voices every segment it completes."""
+        for sentence in self._text.feed(delta):
+            self._add(sentence)
+
+    def _add(self, sentence: str) -> None:
+        self._buffer += sentence
+        if len(self._buffer.strip()) >= self.min_chars:
+            self._submit()
+
+    def _submit(self) -> None:
+        text, self._buffer = self._buffer, ""
+        if not text.strip():
+            return
+        self._spoken.append(text)
+        self._parts.append(asyncio.create_task(self._voice(text.strip())))
+        self._changed.set()
+
+    async def _voice(self, text: str) -> bytes:
+        async with self._slots:
+            payload = v3_tts_payload(_ensure_v3_compatibility(text))
+            # Reply segments don't repeat; caching them would only fill S3
+            audio = await synthesize_payload(self.voice_id, payload, cache=False)
+        if not audio:
+            raise TTSError(f"No audio for segment {text[:40]!r}")
+        if self.first_audio_ms is None:
+            self.first_audio_ms = round((time.perf_counter() - self._started) * 1000, 1)
+        return audio
+
+    def finish(self, reply: str) -> None:
+        """The reply is complete; `reply` is the sanitized text that gets stored."""
+        for sentence in self._text.finish():
+            self._add(sentence)
+        self._submit()
+        if "".join(self._spoken) != reply:
+            if self._yielded:
+                log.warning("[TTS-PIPELINE] reply changed after audio was sent; keeping streamed audio")
+            else:
+                _stats["revoiced"] += 1
+                for task in self._parts:
+                    task.cancel()
+                self._spoken, self._parts = [], []
+                self._buffer = reply
+                self._submit()
+        self._closed = True
+        self._changed.set()
+        _stats["segments"] += len(self._parts)
+
+    def cancel(self, error: BaseException | None = None) -> None:
+        self._error = error or asyncio.CancelledError()
+        for task in self._parts:
+            task.cancel()
+        self._closed = True
+        self._changed.set()
+
+    async def segments(self) -> AsyncIterator[bytes]:
+        """Audio for each segment, in reply order, as soon as it's ready."""
+        i = 0
+        while True:
+            if self._error is not None:
+                raise self._error
+            if i < len(self._parts):
+                audio = await self._parts[i]
+                i += 1
+                self._yielded = max(self._yielded, i)
+                yield audio
+                continue
+            if self._closed:
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def audio(self) -> bytes:
+        """The whole reply as one MP3; raises if any segment failed."""
+        try:
+            data = b"".join([segment async for segment in self.segments()])
+        except BaseException:
+            _stats["failed"] += 1
+            raise
+        _stats["replies"] += 1
+        _stats["first_audio_ms_total"] += self.first_audio_ms or 0.0
+        return data
+
+
+def get_tts_pipeline_stats() -> dict:
+    replies = _stats["replies"]
+    return {
+        "enabled": TTS_PIPELINE_ENABLED,
+        "replies": replies,
+        "failed": _stats["failed"],
+        "revoiced": _stats["revoiced"],
+        "avg_segments": round(_stats["segments"] / replies, 2) if replies else None,
+        "avg_first_audio_ms": round(_stats["first_audio_ms_total"] / replies, 1) if replies else None,
+    }
@@ -2,7 +2,8 @@ from datetime import date
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import InfluencerWallet, DailyUsage, Pricing
+from app.db.models import InfluencerWallet, DailyUsage
+from app.services.pricing_catalog import get_pricing_catalog
 
 
 async def _get_usage_snapshot_simple(
@@ -14,19 +15,8 @@ async def _get_usage_snapshot_simple(
 ) -> dict:
     today = date.today()
 
-    pricing_rows = (
-        await db.execute(
-            select(Pricing).where(Pricing.is_active.is_(True))
-        )
-    ).scalars().all()
-
-    pricing = {p.feature: p for p in pricing_rows}
-
-    def _price_and_free(feature: str) -> tuple[int, int]:
-        p = pricing.get(feature)
-        if not p:
-            return 0, 0
-        return int(p.price_cents or 0), int(p.free_allowance or 0)
+    pricing = await get_pricing_catalog()
+    _price_and_free = pricing.price_and_free
 
     text_price, text_free = _price_and_free("text")
     text18_price, text18_free = _price_and_free("text_18")
@@ -0,0 +1,456 @@
+"""
+Voice-note turn pipeline shared by /chat/chat_audio and /chat18/chat_audio.
+
+The upload is read once and every stage works on that one bytes object
+(BytesIO over bytes shares the buffer, it doesn't copy it). The user audio
+upload and the transcription start straight away and run while the
+duration is read and the voice seconds are charged. The LLM starts as soon
+as the transcript and the user message are in. The AI audio is uploaded
+while its message is committed.
+
+The LLM reply is voiced sentence by sentence while it streams
+(SentenceTTS, TTS_PIPELINE_ENABLED), so only the last segment's TTS is left
+once the LLM is done.
+
+With stream=True the AI audio is not waited for; it goes out as a chunked
+audio/mpeg response. With the TTS pipeline on, the response starts
+right after the user message is saved, and segments are sent as they are
+voiced. The LLM runs in the background on its own session, and the AI
+message (text and audio) is saved once the reply and its S3 copy are done.
+The AI text isn't known when the headers go out, so only X-Transcript and
+the audio URLs are sent. With the pipeline off, the whole reply is
+streamed through TTSStream after the LLM, and X-AI-Text is included.
+
+get_reply(text, db, on_delta) produces the reply on the given session and
+passes the text deltas to on_delta as they stream.
+
+Per-stage timings (ms) are logged for every turn and averaged in
+get_voice_pipeline_stats.
+"""
+
+import asyncio
+import io
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+from urllib.parse import quote
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import SessionLocal
+from app.services.billing import can_afford, charge_feature, get_duration_seconds
+from app.services.embedding_writer import enqueue_message_embedding
+from app.services.tts import TTSStream
+from app.services.tts_pipeline import TTS_PIPELINE_ENABLED, SentenceTTS
+from app.utils.messaging.chat import (
+    _ensure_v3_compatibility,
+    get_tts_voice_id,
+    synthesize_audio_with_elevenlabs_V3,
+    transcribe_audio,
+    v3_tts_payload,
+)
+from app.utils.storage.s3 import (
+    delete_file_from_s3,
+    generate_presigned_url,
+    ia_audio_key,
+    save_audio_to_s3,
+    save_ia_audio_to_s3,
+    user_audio_key,
+)
+
+log = logging.getLogger("voice-pipeline")
+
+_stats: dict = {"turns": 0, "failed": 0, "stage_ms": {}}
+_last_timings: dict[str, float] = {}
+_background: set[asyncio.Task] = set()
+
+
+async def _timed(timings: dict[str, float], stage: str, aw: Awaitable):
+    started = time.perf_counter()
+    try:
+        return await aw
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def _record(timings: dict[str, float], ok: bool) -> None:
+    global _last_timings
+    if not ok:
+        _stats["failed"] += 1
+        return
+    _stats["turns"] += 1
+    for stage, ms in timings.items():
+        _stats["stage_ms"][stage] = _stats["stage_ms"].get(stage, 0.0) + ms
+    _last_timings = dict(timings)
+
+
+async def _discard_user_audio(upload_task: asyncio.Task, transcribe_task: asyncio.Task) -> None:
+    """Stop an abandoned turn: drop the transcription and the uploaded audio."""
+    transcribe_task.cancel()
+    results = await asyncio.gather(upload_task, transcribe_task, return_exceptions=True)
+    key = results[0]
+    if isinstance(key, str):
+        try:
+            await delete_file_from_s3(key)
+        except Exception as e:
+            log.warning("[VOICE] could not delete abandoned upload %s: %s", key, e)
+
+
+async def _finish_streamed_audio(
+    tts: TTSStream,
+    message_model,
+    message_id: int,
+    chat_id: str,
+    timings: dict[str, float],
+    started: float,
+) -> None:
+    """Wait for the streamed reply to land in S3; drop the audio link if it didn't."""
+    ok = False
+    try:
+        await tts.wait()
+        ok = True
+    except BaseException as e:
+        log.error("[VOICE] streamed audio for chat=%s failed: %r", chat_id, e)
+        async with SessionLocal() as db:
+            await db.execute(
+                update(message_model).where(message_model.id == message_id).values(audio_url=None)
+            )
+            await db.commit()
+    finally:
+        if tts.first_chunk_ms is not None:
+            timings["tts_first_chunk"] = tts.first_chunk_ms
+        if tts.total_ms is not None:
+            timings["tts_stream"] = tts.total_ms
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        _record(timings, ok)
+        log.info("[VOICE] chat=%s ok=%s streamed timings_ms=%s", chat_id, ok, timings)
+
+
+async def _finish_pipelined_reply(
+    tts: SentenceTTS,
+    *,
+    get_reply: Callable,
+    transcript_text: str,
+    chat_id: str,
+    user_id: int,
+    message_model,
+    ai_key: str,
+    timings: dict[str, float],
+    started: float,
+) -> None:
+    """LLM, remaining TTS, S3 copy and AI message for a pipelined stream."""
+    ok = False
+    try:
+        # The request session is closed once the response starts streaming
+        async with SessionLocal() as db:
+            ai_reply = await _timed(timings, "llm", get_reply(transcript_text, db, tts.feed))
+            if not ai_reply:
+                raise RuntimeError("No AI reply")
+            tts.finish(ai_reply)
+            audio_bytes = await _timed(timings, "tts_tail", tts.audio())
+            await _timed(timings, "ai_upload", save_ia_audio_to_s3(audio_bytes, user_id, key=ai_key))
+            db.add(message_model(
+                chat_id=chat_id,
+                sender="ai",
+                content=ai_reply,
+                audio_url=ai_key,
+            ))
+            await _timed(timings, "save_ai", db.commit())
+        ok = True
+    except BaseException as e:
+        tts.cancel(e)
+        log.error("[VOICE] pipelined reply for chat=%s failed: %r", chat_id, e)
+    finally:
+        if tts.first_audio_ms is not None:
+            timings["tts_first_audio"] = tts.first_audio_ms
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        _record(timings, ok)
+        log.info("[VOICE] chat=%s ok=%s pipelined timings_ms=%s", chat_id, ok, timings)
+
+
+def _stream_pipelined_reply(
+    voice_id: str,
+    *,
+    get_reply: Callable,
+    transcript_text: str,
+    chat_id: str,
+    user_id: int,
+    message_model,
+    user_key: str,
+    timings: dict[str, float],
+    started: float,
+) -> StreamingResponse:
+    ai_key = ia_audio_key(user_id)
+    tts = SentenceTTS(voice_id)
+    task = asyncio.create_task(_finish_pipelined_reply(
+        tts,
+        get_reply=get_reply,
+        transcript_text=transcript_text,
+        chat_id=chat_id,
+        user_id=user_id,
+        message_model=message_model,
+        ai_key=ai_key,
+        timings=timings,
+        started=started,
+    ))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+    return StreamingResponse(
+        tts.segments(),
+        media_type="audio/mpeg",
+        headers={
+            "X-Transcript": quote(transcript_text),
+            "X-AI-Audio-URL": generate_presigned_url(ai_key),
+            "X-User-Audio-URL": generate_presigned_url(user_key),
+        },
+    )
+
+
+async def _pipelined_reply(
+    db: AsyncSession,
+    voice_id: str,
+    get_reply: Callable,
+    transcript_text: str,
+    timings: dict[str, float],
+) -> tuple[str, bytes]:
+    tts = SentenceTTS(voice_id)
+    try:
+        ai_reply = await _timed(timings, "llm", get_reply(transcript_text, db, tts.feed))
+        if not ai_reply:
+            raise HTTPException(status_code=500, detail="No AI reply")
+        tts.finish(ai_reply)
+        audio_bytes = await _timed(timings, "tts_tail", tts.audio())
+    except BaseException as e:
+        tts.cancel(e)
+        raise
+    finally:
+        if tts.first_audio_ms is not None:
+            timings["tts_first_audio"] = tts.first_audio_ms
+    return ai_reply, audio_bytes
+
+
+async def _stream_reply(
+    db: AsyncSession,
+    *,
+    chat_id: str,
+    influencer_id: str,
+    user_id: int,
+    message_model,
+    ai_reply: str,
+    transcript_text: str,
+    user_key: str,
+    timings: dict[str, float],
+    started: float,
+) -> StreamingResponse:
+    voice_id = await get_tts_voice_id(db, influencer_id)
+    ai_key = ia_audio_key(user_id)
+    tts = TTSStream(voice_id, v3_tts_payload(_ensure_v3_compatibility(ai_reply)), ai_key).start()
+
+    msg_ai = message_model(
+        chat_id=chat_id,
+        sender="ai",
+        content=ai_reply,
+        audio_url=ai_key,
+    )
+    db.add(msg_ai)
+    try:
+        await _timed(timings, "save_ai", db.commit())
+    except BaseException:
+        tts.cancel()
+        raise
+
+    task = asyncio.create_task(
+        _finish_streamed_audio(tts, message_model, msg_ai.id, chat_id, timings, started)
+    )
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+    return StreamingResponse(
+        tts.chunks(),
+        media_type="audio/mpeg",
+        headers={
+            "X-AI-Text": quote(ai_reply),
+            "X-Transcript": quote(transcript_text),
+            "X-AI-Audio-URL": generate_presigned_url(ai_key),
+            "X-User-Audio-URL": generate_presigned_url(user_key),
+        },
+    )
+
+
+async def run_voice_turn(
+    db: AsyncSession,
+    *,
+    upload: UploadFile,
+    chat_id: str,
+    influencer_id: str,
+    user_id: int,
+    feature: str,
+    message_model,
+    get_reply: Callable[[str, AsyncSession, Optional[Callable[[str], None]]], Awaitable[str]],
+    is_18: bool = False,
+    stream: bool = False,
+) -> dict | StreamingResponse:
+    """Bill, transcribe, reply to and voice one uploaded voice note."""
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    ok = False
+    finished_later = False
+    try:
+        audio = await _timed(timings, "read", upload.read())
+        if not audio:
+            raise HTTPException(status_code=400, detail="Audio file empty")
+        filename = upload.filename or "audio.webm"
+        content_type = upload.content_type
+
+        user_key = user_audio_key(user_id, filename)
+        upload_task = asyncio.create_task(_timed(
+            timings, "user_upload",
+            save_audio_to_s3(io.BytesIO(audio), filename, content_type, user_id, key=user_key),
+        ))
+        transcribe_task = asyncio.create_task(_timed(
+            timings, "transcribe",
+            transcribe_audio(io.BytesIO(audio), filename, content_type),
+        ))
+
+        try:
+            seconds = int(await _timed(timings, "duration", get_duration_seconds(audio, content_type)))
+            affordable, cost, free_left = await can_afford(
+                db,
+                user_id=user_id,
+                influencer_id=influencer_id,
+                feature=feature,
+                units=seconds,
+                is_18=is_18,
+            )
+            if not affordable:
+                raise HTTPException(
+                    status_code=402,
+                    detail={
+                        "error": "INSUFFICIENT_CREDITS",
+                        "message": "You're out of free voice and credits. Please top up to continue.",
+                        "needed_cents": cost,
+                        "free_left": free_left,
+                    },
+                )
+            await _timed(timings, "charge", charge_feature(
+                db,
+                user_id=user_id,
+                influencer_id=influencer_id,
+                feature=feature,
+                units=seconds,
+                is_18=is_18,
+                meta={"chat_id": chat_id, "seconds": seconds},
+            ))
+            user_key, transcript = await asyncio.gather(upload_task, transcribe_task)
+        except BaseException:
+            await _discard_user_audio(upload_task, transcribe_task)
+            raise
+
+        if not transcript or "error" in transcript:
+            raise HTTPException(status_code=422, detail=(transcript or {}).get("error", "Transcription error"))
+        transcript_text = transcript.get("text") or ""
+        if not transcript_text.strip():
+            raise HTTPException(status_code=422, detail="Empty transcript")
+
+        msg_user = message_model(
+            chat_id=chat_id,
+            sender="user",
+            content=transcript_text,
+            audio_url=user_key,
+        )
+        db.add(msg_user)
+        await _timed(timings, "save_user", db.commit())
+        enqueue_message_embedding(msg_user, transcript_text)
+
+        if TTS_PIPELINE_ENABLED:
+            voice_id = await get_tts_voice_id(db, influencer_id)
+            if stream:
+                response = _stream_pipelined_reply(
+                    voice_id,
+                    get_reply=get_reply,
+                    transcript_text=transcript_text,
+                    chat_id=chat_id,
+                    user_id=user_id,
+                    message_model=message_model,
+                    user_key=user_key,
+                    timings=timings,
+                    started=started,
+                )
+                finished_later = True
+                return response
+            ai_reply, audio_bytes = await _pipelined_reply(db, voice_id, get_reply, transcript_text, timings)
+        else:
+            ai_reply = await _timed(timings, "llm", get_reply(transcript_text, db, None))
+            if not ai_reply:
+                raise HTTPException(status_code=500, detail="No AI reply")
+
+            if stream:
+                response = await _stream_reply(
+                    db,
+                    chat_id=chat_id,
+                    influencer_id=influencer_id,
+                    user_id=user_id,
+                    message_model=message_model,
+                    ai_reply=ai_reply,
+                    transcript_text=transcript_text,
+                    user_key=user_key,
+                    timings=timings,
+                    started=started,
+                )
+                finished_later = True
+                return response
+
+            audio_bytes, _ = await _timed(timings, "tts", synthesize_audio_with_elevenlabs_V3(ai_reply, db, influencer_id))
+            if not audio_bytes:
+                raise HTTPException(status_code=500, detail="No audio returned from any TTS provider")
+
+        ai_key = ia_audio_key(user_id)
+        ai_upload = asyncio.create_task(_timed(
+            timings, "ai_upload", save_ia_audio_to_s3(audio_bytes, user_id, key=ai_key),
+        ))
+        msg_ai = message_model(
+            chat_id=chat_id,
+            sender="ai",
+            content=ai_reply,
+            audio_url=ai_key,
+        )
+        db.add(msg_ai)
+        try:
+            await _timed(timings, "save_ai", db.commit())
+        finally:
+            upload_error = (await asyncio.gather(ai_upload, return_exceptions=True))[0]
+        if isinstance(upload_error, BaseException):
+            # Keep the text reply, just without audio
+            msg_ai.audio_url = None
+            await db.commit()
+            raise upload_error
+
+        response = {
+            "ai_text": ai_reply,
+            "ai_audio_url": generate_presigned_url(ai_key),
+            "user_audio_url": generate_presigned_url(user_key),
+            "transcript": transcript_text,
+        }
+        ok = True
+        return response
+    finally:
+        if not finished_later:
+            timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+            _record(timings, ok)
+            log.info("[VOICE] chat=%s ok=%s timings_ms=%s", chat_id, ok, timings)
+
+
+def get_voice_pipeline_stats() -> dict:
+    turns = _stats["turns"]
+    return {
+        "turns": turns,
+        "failed": _stats["failed"],
+        "avg_stage_ms": {
+            stage: round(total / turns, 1) for stage, total in _stats["stage_ms"].items()
+        } if turns else {},
+        "last_timings_ms": _last_timings or None,
+    }
@@ -0,0 +1,366 @@
+"""
+Incremental wallet/ledger reconciliation.
+
+Every change to a wallet balance should have a matching ledger row, so for
+each (user, influencer) pair:
+
+    balance of both wallets == sum of ledger rows
+
+Ledger rows don't record is_18, which is why pairs rather than wallets are
+checked. Open reservation holds live in the wallet's held_cents and are
+debited and ledgered together at settlement, so they don't enter the
+equation; they are only reported alongside a drift.
+
+Each pair has a checkpoint (last_tx_id and the running ledger sum up to it),
+so a run only reads ledger rows newer than the checkpoint. The checkpoint
+also keeps the newest created_at it covers, so that read is bounded on the
+ledger's partition key (less WALLET_RECONCILE_SETTLE_SECS for late commits)
+and only touches recent partitions. A pair is
+re-checked when it has new ledger rows (global id cursor) or its wallet
+changed (updated_at cursor). Pairs are processed in batches with one
+snapshot query each; a change in drift is written to wallet_reconcile_audit.
+
+Checkpoints and cursors only move past rows older than
+WALLET_RECONCILE_SETTLE_SECS, so a transaction that took an id but hadn't
+committed yet is still picked up on a later run. A pair seen for the first
+time gets an opening balance for whatever the ledger doesn't explain and is
+not flagged.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.types import Integer, String
+
+from app.db.models import WalletReconcileAudit, WalletReconcileCheckpoint, WalletReconcileCursor
+from app.db.session import SessionLocal
+from app.utils.infrastructure.concurrency import advisory_lock
+
+log = logging.getLogger("wallet-reconciler")
+
+WALLET_RECONCILE_BATCH_SIZE = int(os.getenv("WALLET_RECONCILE_BATCH_SIZE", "500"))
+WALLET_RECONCILE_SCAN_ROWS = int(os.getenv("WALLET_RECONCILE_SCAN_ROWS", "5000"))
+WALLET_RECONCILE_TIME_BUDGET_SECS = float(os.getenv("WALLET_RECONCILE_TIME_BUDGET_SECS", "60"))
+WALLET_RECONCILE_SETTLE_SECS = int(os.getenv("WALLET_RECONCILE_SETTLE_SECS", "300"))
+
+_CURSOR_ID = 1
+
+# One consistent snapshot of balances, holds and new ledger rows per pair
+_SNAPSHOT_SQL = text("""
+WITH pairs AS (
+    SELECT * FROM unnest(CAST(:user_ids AS integer[]), CAST(:influencer_ids AS varchar[]))
+        AS p(user_id, influencer_id)
+),
+cp AS (
+    SELECT p.user_id, p.influencer_id,
+           c.user_id IS NOT NULL AS known,
+           coalesce(c.last_tx_id, 0) AS last_tx_id,
+           c.last_created_at,
+           c.last_created_at - make_interval(secs => :settle_secs) AS min_created_at,
+           coalesce(c.ledger_sum_cents, 0) AS ledger_sum_cents,
+           coalesce(c.drift_cents, 0) AS drift_cents
+    FROM pairs p
+    LEFT JOIN wallet_reconcile_checkpoints c
+        ON c.user_id = p.user_id AND c.influencer_id = p.influencer_id
+),
+bal AS (
+    SELECT w.user_id, w.influencer_id, sum(w.balance_cents) AS balance_cents
+    FROM influencer_wallets w
+    JOIN pairs p ON p.user_id = w.user_id AND p.influencer_id = w.influencer_id
+    GROUP BY 1, 2
+),
+held AS (
+    SELECT r.user_id, r.influencer_id, sum(r.held_cents) AS held_cents
+    FROM credit_reservations r
+    JOIN pairs p ON p.user_id = r.user_id AND p.influencer_id = r.influencer_id
+    WHERE r.status = 'open'
+    GROUP BY 1, 2
+),
+new_tx AS (
+    SELECT t.user_id, t.influencer_id, t.id, t.amount_cents, t.created_at
+    FROM cp
+    JOIN influencer_credit_transactions t
+        ON t.user_id = cp.user_id AND t.influencer_id = cp.influencer_id AND t.id > cp.last_tx_id
+       AND t.created_at >= coalesce(cp.min_created_at, '-infinity'::timestamptz)
+),
+tx AS (
+    SELECT user_id, influencer_id,
+           sum(amount_cents) AS new_cents,
+           max(id) FILTER (WHERE created_at < :settled_before) AS settled_tx_id,
+           max(created_at) FILTER (WHERE created_at < :settled_before) AS settled_created_at
+    FROM new_tx
+    GROUP BY 1, 2
+)
+SELECT cp.user_id, cp.influencer_id, cp.known, cp.last_tx_id, cp.last_created_at,
+       cp.ledger_sum_cents, cp.drift_cents,
+       coalesce(bal.balance_cents, 0) AS balance_cents,
+       coalesce(held.held_cents, 0) AS held_cents,
+       coalesce(tx.new_cents, 0) AS new_cents,
+       tx.settled_tx_id, tx.settled_created_at,
+       coalesce((
+           SELECT sum(n.amount_cents) FROM new_tx n
+           WHERE n.user_id = cp.user_id AND n.influencer_id = cp.influencer_id AND n.id <= tx.settled_tx_id
+       ), 0) AS settled_cents
+FROM cp
+LEFT JOIN bal ON bal.user_id = cp.user_id AND bal.influencer_id = cp.influencer_id
+LEFT JOIN held ON held.user_id = cp.user_id AND held.influencer_id = cp.influencer_id
+LEFT JOIN tx ON tx.user_id = cp.user_id AND tx.influencer_id = cp.influencer_id
+""").bindparams(
+    bindparam("user_ids", type_=ARRAY(Integer)),
+    bindparam("influencer_ids", type_=ARRAY(String)),
+)
+
+_stats: dict[str, int] = {
+    "runs": 0,
+    "pairs_checked": 0,
+    "ledger_rows_scanned": 0,
+    "drift_flagged": 0,
+    "drift_cleared": 0,
+    "budget_exhausted": 0,
+}
+_last_run: dict = {}
+
+
+async def _load_cursor(db) -> WalletReconcileCursor:
+    await db.execute(
+        pg_insert(WalletReconcileCursor)
+        .values(id=_CURSOR_ID, ledger_tx_id=0)
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    return await db.get(WalletReconcileCursor, _CURSOR_ID, with_for_update=True)
+
+
+async def reconcile_pairs(db, pairs: list[tuple[int, str]], now: datetime) -> dict:
+    """Check a batch of (user_id, influencer_id) pairs; caller commits."""
+    if not pairs:
+        return {"checked": 0, "flagged": 0, "cleared": 0}
+
+    settled_before = now - timedelta(seconds=WALLET_RECONCILE_SETTLE_SECS)
+    rows = (
+        await db.execute(
+            _SNAPSHOT_SQL,
+            {
+                "user_ids": [p[0] for p in pairs],
+                "influencer_ids": [p[1] for p in pairs],
+                "settled_before": settled_before,
+                "settle_secs": float(WALLET_RECONCILE_SETTLE_SECS),
+            },
+        )
+    ).all()
+
+    checkpoints: list[dict] = []
+    audits: list[dict] = []
+    cleared = 0
+    for r in rows:
+        actual = int(r.balance_cents)
+        if r.known:
+            expected = int(r.ledger_sum_cents) + int(r.new_cents)
+            ledger_sum = int(r.ledger_sum_cents)
+            opening = None
+        else:
+            # Whatever predates the ledger becomes the opening balance
+            opening = actual - int(r.new_cents)
+            expected = actual
+            ledger_sum = opening
+        drift = actual - expected
+
+        row = {
+            "user_id": r.user_id,
+            "influencer_id": r.influencer_id,
+            "last_tx_id": int(r.settled_tx_id or r.last_tx_id),
+            "last_created_at": r.settled_created_at or r.last_created_at,
+            "ledger_sum_cents": ledger_sum + int(r.settled_cents),
+            "drift_cents": drift,
+            "checked_at": now,
+        }
+        if opening is not None:
+            row["opening_cents"] = opening
+        checkpoints.append(row)
+
+        if drift != int(r.drift_cents):
+            if drift == 0:
+                cleared += 1
+            audits.append({
+                "user_id": r.user_id,
+                "influencer_id": r.influencer_id,
+                "balance_cents": int(r.balance_cents),
+                "held_cents": int(r.held_cents),
+                "expected_cents": expected,
+                "drift_cents": drift,
+                "previous_drift_cents": int(r.drift_cents),
+                "last_tx_id": row["last_tx_id"],
+                "detected_at": now,
+            })
+            log.warning(
+                "[RECONCILE] user=%s influencer=%s drift %d -> %d cents (balance=%d held=%d expected=%d)",
+                r.user_id, r.influencer_id, int(r.drift_cents), drift,
+                int(r.balance_cents), int(r.held_cents), expected,
+            )
+
+    new_pairs = [c for c in checkpoints if "opening_cents" in c]
+    known_pairs = [c for c in checkpoints if "opening_cents" not in c]
+    for batch in (new_pairs, known_pairs):
+        if not batch:
+            continue
+        stmt = pg_insert(WalletReconcileCheckpoint).values(batch)
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "influencer_id"],
+                set_={
+                    "last_tx_id": stmt.excluded.last_tx_id,
+                    "last_created_at": stmt.excluded.last_created_at,
+                    "ledger_sum_cents": stmt.excluded.ledger_sum_cents,
+                    "drift_cents": stmt.excluded.drift_cents,
+                    "checked_at": stmt.excluded.checked_at,
+                },
+            )
+        )
+    if audits:
+        await db.execute(pg_insert(WalletReconcileAudit).values(audits))
+
+    return {"checked": len(checkpoints), "flagged": len(audits) - cleared, "cleared": cleared}
+
+
+async def _ledger_candidates(db, cursor: WalletReconcileCursor, settled_before: datetime) -> tuple[list, int]:
+    """Pairs with ledger rows past the cursor; returns (pairs, rows scanned)."""
+    rows = (
+        await db.execute(
+            text("""
+                SELECT id, user_id, influencer_id, created_at
+                FROM influencer_credit_transactions
+                WHERE id > :after
+                ORDER BY id
+                LIMIT :limit
+            """),
+            {"after": cursor.ledger_tx_id, "limit": WALLET_RECONCILE_SCAN_ROWS},
+        )
+    ).all()
+
+    pairs: set[tuple[int, str]] = set()
+    scanned = 0
+    for r in rows:
+        # Stop at the first row that may still have uncommitted neighbours
+        if r.created_at >= settled_before:
+            break
+        pairs.add((r.user_id, r.influencer_id))
+        cursor.ledger_tx_id = r.id
+        scanned += 1
+    return sorted(pairs), scanned
+
+
+async def _wallet_candidates(db, cursor: WalletReconcileCursor, settled_before: datetime) -> list:
+    """Pairs whose wallets changed since the last scan."""
+    since = cursor.wallets_scanned_at or datetime.fromtimestamp(0, timezone.utc)
+    rows = (
+        await db.execute(
+            text("""
+                SELECT user_id, influencer_id, max(updated_at) AS updated_at
+                FROM influencer_wallets
+                WHERE updated_at > :since AND updated_at < :until
+                GROUP BY 1, 2
+                ORDER BY 3
+                LIMIT :limit
+            """),
+            {"since": since, "until": settled_before, "limit": WALLET_RECONCILE_BATCH_SIZE},
+        )
+    ).all()
+    if len(rows) < WALLET_RECONCILE_BATCH_SIZE:
+        cursor.wallets_scanned_at = settled_before
+    elif rows:
+        cursor.wallets_scanned_at = rows[-1].updated_at
+    return [(r.user_id, r.influencer_id) for r in rows]
+
+
+async def _reconcile_step(now: datetime) -> dict:
+    """One bounded chunk of work in its own transaction."""
+    settled_before = now - timedelta(seconds=WALLET_RECONCILE_SETTLE_SECS)
+    async with SessionLocal() as db:
+        cursor = await _load_cursor(db)
+        ledger_pairs, scanned = await _ledger_candidates(db, cursor, settled_before)
+        wallet_pairs = await _wallet_candidates(db, cursor, settled_before)
+        pairs = sorted(set(ledger_pairs) | set(wallet_pairs))
+
+        totals = {"checked": 0, "flagged": 0, "cleared": 0}
+        for i in range(0, len(pairs), WALLET_RECONCILE_BATCH_SIZE):
+            result = await reconcile_pairs(db, pairs[i:i + WALLET_RECONCILE_BATCH_SIZE], now)
+            for k in totals:
+                totals[k] += result[k]
+        await db.commit()
+
+    done = scanned < WALLET_RECONCILE_SCAN_ROWS and len(wallet_pairs) < WALLET_RECONCILE_BATCH_SIZE
+    return {**totals, "scanned": scanned, "done": done}
+
+
+async def run_wallet_reconciliation(time_budget_secs: float = WALLET_RECONCILE_TIME_BUDGET_SECS) -> dict:
+    """Reconcile every pair touched since the last run, within the time budget."""
+    global _last_run
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    totals = {"checked": 0, "flagged": 0, "cleared": 0, "scanned": 0, "steps": 0}
+    done = False
+
+    async with advisory_lock(
+        "wallet-reconcile",
+        timeout=int(time_budget_secs) + 60,
+        retry_count=1,
+        raise_on_fail=False,
+    ) as acquired:
+        if not acquired:
+            log.info("[RECONCILE] another run holds the lock, skipping")
+            return {"skipped": True}
+
+        while time.perf_counter() - started < time_budget_secs:
+            step = await _reconcile_step(now)
+            totals["steps"] += 1
+            for k in ("checked", "flagged", "cleared", "scanned"):
+                totals[k] += step[k]
+            if step["done"]:
+                done = True
+                break
+
+    _stats["runs"] += 1
+    _stats["pairs_checked"] += totals["checked"]
+    _stats["ledger_rows_scanned"] += totals["scanned"]
+    _stats["drift_flagged"] += totals["flagged"]
+    _stats["drift_cleared"] += totals["cleared"]
+    if not done:
+        _stats["budget_exhausted"] += 1
+        log.info("[RECONCILE] time budget used up after %d steps, resuming next run", totals["steps"])
+
+    _last_run = {
+        **totals,
+        "caught_up": done,
+        "duration_secs": round(time.perf_counter() - started, 2),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    }
+    return _last_run
+
+
+async def list_wallet_drift(db, limit: int = 100) -> list[dict]:
+    """Pairs whose wallets currently disagree with the ledger, largest first."""
+    rows = (
+        await db.execute(
+            select(WalletReconcileCheckpoint)
+            .where(WalletReconcileCheckpoint.drift_cents != 0)
+            .order_by(func.abs(WalletReconcileCheckpoint.drift_cents).desc())
+            .limit(limit)
+        )
+    ).scalars().all()
+    return [
+        {
+            "user_id": c.user_id,
+            "influencer_id": c.influencer_id,
+            "drift_cents": int(c.drift_cents),
+            "last_tx_id": int(c.last_tx_id),
+            "checked_at": c.checked_at.isoformat() if c.checked_at else None,
+        }
+        for c in rows
+    ]
+
+
+def get_wallet_reconcile_stats() -> dict:
+    return {**_stats, "last_run": _last_run or None}
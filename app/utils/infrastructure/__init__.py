@@ -1,9 +1,10 @@
-"""Infrastructure utilities (concurrency, rate limiting, Redis, idempotency)."""
+"""Infrastructure utilities (concurrency, rate limiting, Redis, idempotency, HTTP clients)."""
 
 from .concurrency import AdvisoryLock, advisory_lock, with_lock
 from .idempotency import IdempotencyLock, idempotent
 from .rate_limiter import check_rate_limit, rate_limit, get_user_key
 from .redis_pool import get_redis, close_redis
+from .elevenlabs_client import get_elevenlabs_client, close_elevenlabs_client
 
 __all__ = [
     # Concurrency
@@ -20,4 +21,7 @@ __all__ = [
     # Redis
     "get_redis",
     "close_redis",
+    # HTTP clients
+    "get_elevenlabs_client",
+    "close_elevenlabs_client",
 ]
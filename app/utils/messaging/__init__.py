@@ -20,7 +20,7 @@ from .email import (
     compose_email_header_image_url,
 )
 from .push import send_push, send_push_rich
-from .tts_sanitizer import sanitize_tts_text
+from .tts_sanitizer import TTSTextStream, sanitize_tts_text
 
 __all__ = [
     # Chat
@@ -45,4 +45,5 @@ __all__ = [
     "send_push_rich",
     # TTS
     "sanitize_tts_text",
+    "TTSTextStream",
 ]
@@ -1,15 +1,17 @@
 import os
 import io
 import wave
-import openai
-import tempfile
 import httpx
 import logging
 import re
+from typing import Callable
 
 from fastapi import HTTPException
 from app.core.config import settings
 from app.db.models import Influencer
+from app.services.transcription import transcribe
+from app.services.tts_cache import get_cached_tts, is_static_line, put_cached_tts, store_tts_in_background
+from app.utils.infrastructure.elevenlabs_client import get_elevenlabs_client
 from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
@@ -23,6 +25,10 @@ async def transcribe_audio(file_or_bytesio, filename=None, content_type=None):
         content = await file_or_bytesio.read()
         filename = file_or_bytesio.filename
         content_type = file_or_bytesio.content_type
+    elif isinstance(file_or_bytesio, (bytes, bytearray)):
+        content = bytes(file_or_bytesio)
+        if filename is None:
+            filename = "audio.webm"
     else:
         file_or_bytesio.seek(0)
         content = file_or_bytesio.read()
@@ -36,21 +42,14 @@ async def transcribe_audio(file_or_bytesio, filename=None, content_type=None):
             "audio/wav": ".wav",
             "audio/mp3": ".mp3"
         }[content_type]
+        filename = f"{filename}{suffix}"
     if suffix not in [".webm", ".wav", ".mp3"]:
         raise HTTPException(status_code=415, detail="Format not supported. Use .webm, .wav or .mp3")
     if len(content) < 512:
         raise HTTPException(status_code=422, detail="Audio File empty.")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(content)
-        tmp_path = tmp.name
-    with open(tmp_path, "rb") as f:
-        transcript = openai.audio.transcriptions.create(
-            file=f,
-            model="whisper-1"
-        )
-    os.remove(tmp_path)
-    logger.info(f"Transcription successful: {transcript.text[:50]}...")
-    return {"text": transcript.text}
+    text = await transcribe(content, filename)
+    logger.info(f"Transcription successful: {text[:50]}...")
+    return {"text": text}
 
 async def get_ai_reply_via_websocket(
     chat_id: str,
@@ -58,10 +57,12 @@ async def get_ai_reply_via_websocket(
     influencer_id: str,
     user_id: int,
     db: AsyncSession,
+    on_delta: Callable[[str], None] | None = None,
 ) -> str:
     """
     Get AI reply using handle_turn function.
     This function should be called with a validated user_id from the token.
+    on_delta, if given, receives the reply as it streams.
     """
     # Import here to avoid circular dependency
     from app.agents.turn_handler import handle_turn
@@ -75,24 +76,59 @@ async def get_ai_reply_via_websocket(
         influencer_id=influencer_id,
         user_id=user_id,
         db=db,
-        is_audio=True
+        is_audio=True,
+        on_delta=on_delta,
     )
     return reply
 
-async def synthesize_audio_with_elevenlabs(text: str, db, influencer_id: str = None):
+TTS_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+
+def tts_headers() -> dict:
+    return {
+        "xi-api-key": ELEVENLABS_API_KEY,
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+    }
+
+
+async def get_tts_voice_id(db, influencer_id: str) -> str:
     influencer = await db.get(Influencer, influencer_id)
     if not influencer:
         raise HTTPException(404, "Influencer not found")
     if not influencer.voice_id:
         raise HTTPException(500, f"Voice ID not set for influencer '{influencer_id}'")
+    return influencer.voice_id
 
-    voice_id = influencer.voice_id
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": ELEVENLABS_API_KEY,
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-    }
+
+async def synthesize_payload(
+    voice_id: str, data: dict, store_in_background: bool = True, cache: bool = False
+) -> bytes | None:
+    """
+    Voice one TTS payload.
+
+    Pass cache=True only for static lines (see tts_cache.is_static_line); those
+    are served from and stored in the TTS cache. Anything else goes straight
+    to ElevenLabs and is not stored.
+    """
+    if cache:
+        cached = await get_cached_tts(voice_id, data)
+        if cached is not None:
+            return cached
+    client = await get_elevenlabs_client()
+    resp = await client.post(f"/text-to-speech/{voice_id}", headers=tts_headers(), json=data, timeout=TTS_TIMEOUT)
+    if resp.status_code != 200:
+        logger.error(f"ElevenLabs error: {resp.status_code} - {resp.text}")
+        return None
+    if cache and store_in_background:
+        store_tts_in_background(voice_id, data, resp.content)
+    elif cache:
+        await put_cached_tts(voice_id, data, resp.content)
+    return resp.content
+
+
+async def synthesize_audio_with_elevenlabs(text: str, db, influencer_id: str = None):
+    voice_id = await get_tts_voice_id(db, influencer_id)
     data = {
         "text": text, 
         "model_id": "eleven_multilingual_v2", 
@@ -104,12 +140,10 @@ async def synthesize_audio_with_elevenlabs(text: str, db, influencer_id: str = N
         },
         "output_format": "mp3_44100_128"
     }
-    async with httpx.AsyncClient(timeout=120) as client:
-        resp = await client.post(url, headers=headers, json=data)
-        if resp.status_code != 200:
-            logger.error(f"ElevenLabs error: {resp.status_code} - {resp.text}")
-            return None, None
-        return resp.content, "audio/mpeg"
+    audio = await synthesize_payload(voice_id, data, cache=is_static_line(text))
+    if not audio:
+        return None, None
+    return audio, "audio/mpeg"
 
 # ElevenLabs V3 style tags mapping
 # Based on: https://elevenlabs.io/docs/best-practices/prompting/eleven-v3
@@ -135,15 +169,39 @@ STYLE_TAGS = {
 }
 
 
+_V3_MARKDOWN_RE = re.compile(r'[*_`>#]')
+_V3_WHITESPACE_RE = re.compile(r'\s+')
+_V3_SENTENCE_END_RE = re.compile(r'[.!?…]$')
+_V3_EXPRESSION_TAG_RE = re.compile(
+    r'\[(slowly|quickly|whispers|shouts|softly|sad|angry|happy|happily|excited|sorrowful|laughs|laughing|chuckles|sighs|exhales|coughs|gulps|giggles|gasp|sarcastic|curious|crying|snorts|mischievously|thoughtful|surprised|annoyed|professional|sympathetic|reassuring|warm|playful|flirty)\]',
+    re.IGNORECASE,
+)
+
+# (pattern, tag) pairs tried in order by _enhance_text_with_v3_tags
+_GENTLE_PATTERNS = [
+    (re.compile(r'\b(miss you|missed you|thinking of you|love you|right here|here for you)\b', re.IGNORECASE), '[softly]'),
+    (re.compile(r'\b(secret|whisper|quiet|hush)\b', re.IGNORECASE), '[whispers]'),
+]
+_HAPPY_PATTERNS = [
+    (re.compile(r'\b(great|awesome|wonderful|amazing|excited|happy|glad|yes|yeah|sure)\b', re.IGNORECASE), '[happy]'),
+    (re.compile(r'\b(ha|heh|haha|hehe|lol)\b', re.IGNORECASE), '[chuckles]'),
+    (re.compile(r'[!]{2,}', re.IGNORECASE), '[excited]'),  # Multiple exclamation marks
+    (re.compile(r'^\s*(yes|yeah|sure|of course|absolutely)\b', re.IGNORECASE), '[happy]'),  # Positive responses at start
+]
+_SLOW_PATTERNS = [
+    (re.compile(r'\b(remember|back then|once|used to|long ago|think|wonder|consider)\b', re.IGNORECASE), '[thoughtful]'),
+]
+
+
 def format_for_eleven_v3(message: str, style: str = "neutral") -> str:
     if not message:
         return ""
     
     text = message.strip()
-    text = re.sub(r'[*_`>#]', '', text)
-    text = re.sub(r'\s+', ' ', text)
+    text = _V3_MARKDOWN_RE.sub('', text)
+    text = _V3_WHITESPACE_RE.sub(' ', text)
     
-    if not re.search(r'[.!?…]$', text):
+    if not _V3_SENTENCE_END_RE.search(text):
         text += "."
     
     tags = STYLE_TAGS.get(style, "")
@@ -163,8 +221,7 @@ def _enhance_text_with_v3_tags(text: str) -> str:
     Adds tags based on text patterns and emotional cues.
     Based on: https://elevenlabs.io/docs/best-practices/prompting/eleven-v3
     """
-    v3_tag_pattern = r'\[(slowly|quickly|whispers|shouts|softly|sad|angry|happy|happily|excited|sorrowful|laughs|laughing|chuckles|sighs|exhales|coughs|gulps|giggles|gasp|sarcastic|curious|crying|snorts|mischievously|thoughtful|surprised|annoyed|professional|sympathetic|reassuring|warm|playful|flirty)\]'
-    has_tags = bool(re.search(v3_tag_pattern, text, re.IGNORECASE))
+    has_tags = bool(_V3_EXPRESSION_TAG_RE.search(text))
     
     if has_tags:
         logger.debug("Text already contains V3 expression tags, skipping enhancement")
@@ -175,50 +232,25 @@ def _enhance_text_with_v3_tags(text: str) -> str:
     
     enhanced = text
     
-    gentle_patterns = [
-        (r'\b(miss you|missed you|thinking of you|love you|right here|here for you)\b', '[softly]'),
-        (r'\b(secret|whisper|quiet|hush)\b', '[whispers]'),
-    ]
-    
-    happy_patterns = [
-        (r'\b(great|awesome|wonderful|amazing|excited|happy|glad|yes|yeah|sure)\b', '[happy]'),
-        (r'\b(ha|heh|haha|hehe|lol)\b', '[chuckles]'),
-        (r'[!]{2,}', '[excited]'),  # Multiple exclamation marks
-        (r'^\s*(yes|yeah|sure|of course|absolutely)\b', '[happy]'),  # Positive responses at start
-    ]
-    
-    contemplative_patterns = [
-        (r'\b(well|hmm|um|ah|oh)\b', '[sighs]'),
-        (r'\.\.\.', '[thoughtful]'),  # Ellipses suggest thoughtful pause
-    ]
-    
-    slow_patterns = [
-        (r'\b(remember|back then|once|used to|long ago|think|wonder|consider)\b', '[thoughtful]'),
-    ]
-    
-    surprised_patterns = [
-        (r'\b(what|wow|really|seriously|no way|unbelievable)\b', '[surprised]'),
-    ]
-    
-    for pattern, tag in gentle_patterns:
-        if re.search(pattern, enhanced, re.IGNORECASE):
+    for pattern, tag in _GENTLE_PATTERNS:
+        if pattern.search(enhanced):
             if not enhanced.strip().startswith('['):
                 enhanced = f"{tag} {enhanced}"
                 break
     
-    for pattern, tag in happy_patterns:
-        if re.search(pattern, enhanced, re.IGNORECASE):
+    for pattern, tag in _HAPPY_PATTERNS:
+        if pattern.search(enhanced):
             if tag not in enhanced:
-                match = re.search(pattern, enhanced, re.IGNORECASE)
+                match = pattern.search(enhanced)
                 if match:
                     pos = match.start()
                     if not enhanced[:pos].strip().startswith('['):
                         enhanced = enhanced[:pos] + f"{tag} " + enhanced[pos:]
                         break
     
-    for pattern, tag in slow_patterns:
-        if re.search(pattern, enhanced, re.IGNORECASE) and tag not in enhanced:
-            match = re.search(pattern, enhanced, re.IGNORECASE)
+    for pattern, tag in _SLOW_PATTERNS:
+        if pattern.search(enhanced) and tag not in enhanced:
+            match = pattern.search(enhanced)
             if match:
                 pos = match.start()
                 if not enhanced[:pos].strip().startswith('['):
@@ -239,8 +271,7 @@ def _ensure_v3_compatibility(text: str, style: str = "neutral") -> str:
     else:
         enhanced_text = formatted_text
     
-    v3_tag_pattern = r'\[(slowly|quickly|whispers|shouts|softly|sad|angry|happy|happily|excited|sorrowful|laughs|laughing|chuckles|sighs|exhales|coughs|gulps|giggles|gasp|sarcastic|curious|crying|snorts|mischievously|thoughtful|surprised|annoyed|professional|sympathetic|reassuring|warm|playful|flirty)\]'
-    has_tags = bool(re.search(v3_tag_pattern, enhanced_text, re.IGNORECASE))
+    has_tags = bool(_V3_EXPRESSION_TAG_RE.search(enhanced_text))
     
     if has_tags:
         logger.debug("Text contains V3 expression tags")
@@ -250,30 +281,13 @@ def _ensure_v3_compatibility(text: str, style: str = "neutral") -> str:
     return enhanced_text
 
 
-async def synthesize_audio_with_elevenlabs_V3(text: str, db, influencer_id: str = None, style: str = "neutral"):
-    influencer = await db.get(Influencer, influencer_id)
-    if not influencer:
-        raise HTTPException(404, "Influencer not found")
-    if not influencer.voice_id:
-        raise HTTPException(500, f"Voice ID not set for influencer '{influencer_id}'")
-
-    # Ensure V3 compatibility - format with style tags and cleanup
-    text = _ensure_v3_compatibility(text, style=style)
-
-    voice_id = influencer.voice_id
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "xi-api-key": ELEVENLABS_API_KEY,
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-    }
-    
+def v3_tts_payload(text: str) -> dict:
     # V3-compatible voice settings
     # stability: Must be 0.0, 0.5, or 1.0 (0.0=Creative, 0.5=Natural, 1.0=Robust)
     # similarity_boost: 0.0 to 1.0 (how similar to original voice)
     # style: 0.0 to 1.0 (how much style variation)
     # use_speaker_boost: Boolean (enhances similarity to original voice)
-    data = {
+    return {
         "text": text,  # Expression tags like [slowly], [chuckles], [whispers] are supported natively by V3
         "model_id": "eleven_v3",  # Using ElevenLabs V3 model
         "voice_settings": {
@@ -284,18 +298,25 @@ async def synthesize_audio_with_elevenlabs_V3(text: str, db, influencer_id: str
         },
         "output_format": "mp3_44100_128"
     }
+
+
+async def synthesize_audio_with_elevenlabs_V3(text: str, db, influencer_id: str = None, style: str = "neutral"):
+    voice_id = await get_tts_voice_id(db, influencer_id)
+    static = is_static_line(text)
+
+    # Ensure V3 compatibility - format with style tags and cleanup
+    text = _ensure_v3_compatibility(text, style=style)
+    data = v3_tts_payload(text)
     
     logger.info(f"[ELEVENLABS V3] Synthesizing audio with V3 model")
     logger.info(f"[ELEVENLABS V3] Text (length: {len(text)}): {text}")
     logger.info(f"[ELEVENLABS V3] Voice ID: {voice_id}, Influencer ID: {influencer_id}")
     logger.debug(f"[ELEVENLABS V3] Voice settings: stability={data['voice_settings']['stability']}, similarity_boost={data['voice_settings']['similarity_boost']}, style={data['voice_settings']['style']}")
     
-    async with httpx.AsyncClient(timeout=120) as client:
-        resp = await client.post(url, headers=headers, json=data)
-        if resp.status_code != 200:
-            logger.error(f"ElevenLabs error: {resp.status_code} - {resp.text}")
-            return None, None
-        return resp.content, "audio/mpeg"
+    audio = await synthesize_payload(voice_id, data, cache=static)
+    if not audio:
+        return None, None
+    return audio, "audio/mpeg"
 
 def pcm_bytes_to_wav_bytes(pcm_bytes, sample_rate=44100):
     wav_io = io.BytesIO()
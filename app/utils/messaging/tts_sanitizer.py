@@ -1,3 +1,26 @@
+"""
+Text cleanup before text-to-speech.
+
+sanitize_tts_text() unescapes HTML entities, collapses runs of spaces and
+tabs, drops emoji, markdown characters and the math display marker, and
+keeps ElevenLabs V3 audio tags. It does that in one precompiled regex scan
+and must give exactly what _sanitize_tts_text_reference (the original
+multi-pass version) gives.
+
+Note what the reference effectively does:
+- Every ">" is removed before the <break> and HTML tag passes run, so
+  those passes never match anything.
+- Audio tags contain nothing that gets removed, so shielding them behind
+  placeholders changes nothing.
+- The one input that depends on the placeholder bookkeeping is text that
+  itself contains the "V3TAG" marker. That text is handed to the reference.
+
+TTSTextStream runs the same cleanup over streamed LLM deltas. It hands out
+each sentence as soon as nothing later can change it. "".join() of
+everything it returns equals sanitize_tts_text() of the whole text. The
+exception is "V3TAG" text, where leftover markers are just removed.
+"""
+
 import re
 from html import unescape
 
@@ -13,7 +36,106 @@ _BREAK_RE = re.compile(r'<\s*break\s+time\s*=\s*"([0-2](?:\.\d)?s)"\s*/\s*>', re
 # Regex to match ElevenLabs V3 expression tags: [tag]
 _V3_TAG_RE = re.compile(r'\[(' + '|'.join(re.escape(tag) for tag in _ALLOWED_AUDIO_TAGS) + r')\]', re.IGNORECASE)
 
+_MATH_MARKER = "$begin:math:display$$end:math:display$$begin:math:text$$end:math:text$"
+_PLACEHOLDER_MARK = "V3TAG"
+_EMPTY = "\u2026"
+
+# Space runs collapse to the captured space (tabs are spaces by then);
+# markdown characters and emoji have no group and become ""
+_SCAN_RE = re.compile(r'( ) +|[*_`~#>\U0001F300-\U0001FAFF\U00002700-\U000027BF]+')
+# "&" that may still grow into an entity once more text arrives
+_ENTITY_TAIL_RE = re.compile(r'&(?:#[xX]?[0-9a-fA-F]*|[^\t\n\f <&#;]{0,32})\Z')
+_BLANK_TAIL_RE = re.compile(r'[ \t]+\Z')
+_SENTENCE_END_RE = re.compile(r'[.!?\u2026](?=\s)')
+_LEFTOVER_PLACEHOLDER_RE = re.compile(r'V3TAG\d+V3?')
+
+
+def _scan(text: str) -> str:
+    """Collapse space runs and drop markdown and emoji; entities must be unescaped already."""
+    return _SCAN_RE.sub(r'\1', text.replace("\t", " "))
+
+
+def _drop_math_marker(text: str) -> str:
+    if "$" in text:
+        text = text.replace(_MATH_MARKER, "")
+    return text
+
+
 def sanitize_tts_text(text: str) -> str:
+    if not text:
+        return ""
+    cleaned = _drop_math_marker(_scan(unescape(text))).strip()
+    if _PLACEHOLDER_MARK in cleaned:
+        return _sanitize_tts_text_reference(text)
+    return cleaned if cleaned else _EMPTY
+
+
+class TTSTextStream:
+    """Incremental sanitize_tts_text over streamed deltas, one sentence at a time."""
+
+    def __init__(self):
+        self._raw = ""
+        self._plain = ""
+        self._clean = ""
+        self._fed = False
+        self._emitted = False
+
+    def feed(self, delta: str) -> list[str]:
+        """Add a delta; returns the sentences that are now final."""
+        if not delta:
+            return []
+        self._fed = True
+        # Hold back what the next delta could still change: a half-received
+        # entity, then a trailing run of spaces/tabs
+        raw = self._raw + delta
+        m = _ENTITY_TAIL_RE.search(raw)
+        cut = m.start() if m else len(raw)
+        self._raw = raw[cut:]
+        plain = self._plain + unescape(raw[:cut])
+        m = _BLANK_TAIL_RE.search(plain)
+        cut = m.start() if m else len(plain)
+        self._plain = plain[cut:]
+        self._clean += _scan(plain[:cut])
+        return self._release(final=False)
+
+    def finish(self) -> list[str]:
+        """Flush everything left; call once after the last delta."""
+        self._clean += _scan(self._plain + unescape(self._raw))
+        self._raw = self._plain = ""
+        chunks = self._release(final=True)
+        if self._fed and not self._emitted:
+            self._emitted = True
+            return [_EMPTY]
+        return chunks
+
+    def _release(self, final: bool) -> list[str]:
+        if final:
+            ready, self._clean = self._clean, ""
+        else:
+            end = None
+            for end in _SENTENCE_END_RE.finditer(self._clean):
+                pass
+            if end is None:
+                return []
+            # Whitespace after the sentence stays behind: if nothing follows
+            # it, the final strip drops it
+            ready, self._clean = self._clean[:end.end()], self._clean[end.end():]
+
+        ready = _drop_math_marker(ready)
+        if _PLACEHOLDER_MARK in ready:
+            ready = _LEFTOVER_PLACEHOLDER_RE.sub("", ready)
+        if not self._emitted:
+            ready = ready.lstrip()
+        if final:
+            ready = ready.rstrip()
+        if not ready:
+            return []
+        self._emitted = True
+        return [ready]
+
+
+def _sanitize_tts_text_reference(text: str) -> str:
+    """The original multi-pass sanitizer; sanitize_tts_text must match it exactly."""
     if not text:
         return ""
     
@@ -1,3 +1,4 @@
+import asyncio
 import boto3
 import uuid
 import io
@@ -21,16 +22,28 @@ s3 = boto3.client(
     region_name=getattr(settings, "AWS_REGION", None) or "us-east-1",
 )
 
-async def save_audio_to_s3(file_obj, filename, content_type, user_id):
-    ext = filename.split('.')[-1] if '.' in filename else 'webm'
-    key = f"useraudio/{user_id}/{uuid.uuid4()}.{ext}"
+def user_audio_key(user_id, filename) -> str:
+    ext = filename.split('.')[-1] if filename and '.' in filename else 'webm'
+    return f"useraudio/{user_id}/{uuid.uuid4()}.{ext}"
+
+
+def ia_audio_key(user_id) -> str:
+    return f"iaudio/{user_id}/{uuid.uuid4()}.mp3"
+
+
+async def save_audio_to_s3(file_obj, filename, content_type, user_id, key: str | None = None):
+    key = key or user_audio_key(user_id, filename)
     file_obj.seek(0)
-    s3.upload_fileobj(file_obj, settings.BUCKET_NAME, key, ExtraArgs={"ContentType": content_type})
+    await asyncio.to_thread(
+        s3.upload_fileobj, file_obj, settings.BUCKET_NAME, key, ExtraArgs={"ContentType": content_type}
+    )
     return key
  
-async def save_ia_audio_to_s3(audio_bytes: bytes, user_id: str) -> str:
-    filename = f"iaudio/{user_id}/{uuid.uuid4()}.mp3"
-    s3.upload_fileobj(io.BytesIO(audio_bytes), settings.BUCKET_NAME, filename, ExtraArgs={"ContentType": "audio/mpeg"})
+async def save_ia_audio_to_s3(audio_bytes: bytes, user_id: str, key: str | None = None) -> str:
+    filename = key or ia_audio_key(user_id)
+    await asyncio.to_thread(
+        s3.upload_fileobj, io.BytesIO(audio_bytes), settings.BUCKET_NAME, filename, ExtraArgs={"ContentType": "audio/mpeg"}
+    )
     return filename   
 
 def generate_presigned_url(key: str, expires: int = 3600) -> str:
@@ -261,3 +274,78 @@ async def save_user_photo_to_s3(file_obj, filename: str, content_type: str, user
 
 def generate_user_presigned_url(key: str, expires: int = 3600) -> str:
     return generate_presigned_url(key, expires)
+
+
+# S3 rejects multipart parts under 5 MiB (except the last one)
+S3_MULTIPART_PART_SIZE = 5 * 1024 * 1024
+
+
+class S3StreamUpload:
+    """
+    Upload a stream of chunks as it is produced.
+
+    Small objects (the usual TTS reply) end up as a single put_object at
+    close(); once more than S3_MULTIPART_PART_SIZE has been fed, it switches
+    to a multipart upload and sends each full part while the stream goes on.
+    """
+
+    def __init__(self, key: str, content_type: str, part_size: int = S3_MULTIPART_PART_SIZE):
+        self.key = key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id: str | None = None
+        self._parts: list[dict] = []
+
+    async def write(self, chunk: bytes) -> None:
+        self._buffer += chunk
+        self.size += len(chunk)
+        if len(self._buffer) >= self.part_size:
+            await self._flush_part()
+
+    async def _flush_part(self) -> None:
+        if self._upload_id is None:
+            resp = await asyncio.to_thread(
+                s3.create_multipart_upload,
+                Bucket=settings.BUCKET_NAME, Key=self.key, ContentType=self.content_type,
+            )
+            self._upload_id = resp["UploadId"]
+        part_number = len(self._parts) + 1
+        body = bytes(self._buffer)
+        self._buffer.clear()
+        resp = await asyncio.to_thread(
+            s3.upload_part,
+            Bucket=settings.BUCKET_NAME, Key=self.key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=body,
+        )
+        self._parts.append({"ETag": resp["ETag"], "PartNumber": part_number})
+
+    async def close(self) -> str:
+        if self._upload_id is None:
+            await asyncio.to_thread(
+                s3.put_object,
+                Bucket=settings.BUCKET_NAME, Key=self.key, Body=bytes(self._buffer), ContentType=self.content_type,
+            )
+            self._buffer.clear()
+            return self.key
+        if self._buffer:
+            await self._flush_part()
+        await asyncio.to_thread(
+            s3.complete_multipart_upload,
+            Bucket=settings.BUCKET_NAME, Key=self.key, UploadId=self._upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+        return self.key
+
+    async def abort(self) -> None:
+        self._buffer.clear()
+        if self._upload_id is None:
+            return
+        try:
+            await asyncio.to_thread(
+                s3.abort_multipart_upload,
+                Bucket=settings.BUCKET_NAME, Key=self.key, UploadId=self._upload_id,
+            )
+        except botocore.exceptions.ClientError as e:
+            log.warning("Failed to abort multipart upload %s: %s", self.key, e)